@@ -1,27 +1,88 @@
-import logging
-from logging.handlers import RotatingFileHandler
+import copy     # Deep copies of the default settings
+import os       # OS library for paths and environment variable access
+
+from utils.logging import get_logger
+
+# Directory of the YAML configuration files and the repository root relative paths are resolved against
+CONFIG_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(CONFIG_DIR)
+
+# Throughput settings of the ingestion pipeline, overridden by the YAML file and a tuned profile
+PIPELINE_CONFIG_PATH = os.getenv('PIPELINE_CONFIG', os.path.join(CONFIG_DIR, 'pipeline_config.yml'))
+DEFAULT_PIPELINE_SETTINGS = {
+    "chunking": {"chunker": "tokens", "chunk_tokens": 256, "chunk_characters": 500},
+    "embedding": {"batch_size": 32, "window_size": 256, "torch_threads": None, "embed_workers": 1,
+                  "inference_backend": "eager"},
+    "extraction": {"workers": None, "queue_size": 8},
+    "upload": {"batch_size": 50, "min_batch_size": 5, "max_batch_size": 100, "max_in_flight": 4},
+    "autotune": {
+        "profile_path": "config/tuned_profile.yml",
+        "memory_cap_mb": 4096,
+        "calibration_chunks": 128,
+        "calibration_documents": 2000,
+        "candidates": {"embedding_batch_size": [8, 16, 32, 64], "torch_threads": [1, 2, 4, 8],
+                       "upload_max_in_flight": [1, 2, 4, 8], "upload_batch_size": [20, 50, 100]},
+    },
+}
+
 
 class Logger:
     @staticmethod
     def get_logger(name):
-        logger = logging.getLogger(name)
-        logger.setLevel(logging.DEBUG)
+        """Returns a logger of the shared, queue-based logging setup (see `utils.logging`)."""
+        return get_logger(name)
+
+
+def load_yaml(path):
+    """Reads a YAML file; a missing or empty file gives an empty dict."""
+    import yaml     # Imported on first use to keep imports fast
+
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return yaml.safe_load(f) or {}
+
+
+def merge_settings(base, override):
+    """Returns `base` updated recursively with the values of `override`."""
+    merged = copy.deepcopy(base)
+    for key, value in (override or {}).items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_settings(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
 
-        # Console handler
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(logging.DEBUG)
+def resolve_path(path):
+    """Resolves a path from a configuration file against the repository root."""
+    return path if os.path.isabs(path) else os.path.join(REPO_ROOT, path)
 
-        # File handler (rotating)
-        file_handler = RotatingFileHandler('app.log', maxBytes=5_000_000, backupCount=3)
-        file_handler.setLevel(logging.DEBUG)
 
-        # Formatter
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        console_handler.setFormatter(formatter)
-        file_handler.setFormatter(formatter)
+def load_pipeline_config(path=None, use_profile=True):
+    """
+    Loads the pipeline throughput settings: the built-in defaults, overridden by
+    pipeline_config.yml, overridden by the tuned profile written by autotune (if it exists).
+    Args:
+        path (str, optional): The settings file. Defaults to PIPELINE_CONFIG (env) or config/pipeline_config.yml.
+        use_profile (bool): Apply the tuned profile named by `autotune.profile_path`.
+    Returns:
+        dict: Sections chunking, embedding, extraction, upload and autotune; "profile" holds the
+        path of the applied tuned profile, or None.
+    """
+    settings = merge_settings(DEFAULT_PIPELINE_SETTINGS, load_yaml(path or PIPELINE_CONFIG_PATH))
+    settings["profile"] = None
+    profile_path = settings["autotune"].get("profile_path")
+    if use_profile and profile_path:
+        profile_path = resolve_path(profile_path)
+        profile = load_yaml(profile_path)
+        if profile:
+            settings = merge_settings(settings, {section: profile[section] for section in ("embedding", "upload")
+                                                 if section in profile})
+            settings["profile"] = profile_path
+    return settings
 
-        # Add handlers
-        logger.addHandler(console_handler)
-        logger.addHandler(file_handler)
 
-        return logger
\ No newline at end of file
+def chunk_size_setting(settings, chunker):
+    """Returns the configured chunk size of a chunker ("tokens" or "characters")."""
+    return settings["chunking"]["chunk_tokens" if chunker == "tokens" else "chunk_characters"]
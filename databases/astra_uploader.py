@@ -0,0 +1,244 @@
+# Class for uploading documents to an Astra DB collection concurrently (Class: `AstraBulkUploader`)
+
+import logging
+import random       # Jitter for the exponential backoff
+import threading    # Semaphore bounding the in-flight batches
+import time         # Latency measurement and backoff sleeps
+from concurrent.futures import ThreadPoolExecutor, wait     # Thread pool sending the batches
+
+from databases.vector_codec import to_transport_vector
+
+logger = logging.getLogger(__name__)
+
+# HTTP status codes worth retrying (timeouts, throttling and server-side failures)
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# Data API error code returned when a re-sent document was already stored by an earlier attempt
+DUPLICATE_ERROR_CODE = "DOCUMENT_ALREADY_EXISTS"
+
+
+class UploadError(Exception):
+    """Raised by `AstraBulkUploader.flush` when some documents could not be uploaded."""
+
+    def __init__(self, failed_documents, errors):
+        super().__init__(f"{len(failed_documents)} documents failed to upload: {errors[:3]}")
+        self.failed_documents = failed_documents
+        self.errors = errors
+
+
+def _nested_exceptions(exc):
+    """Returns the exception and the root exceptions wrapped by an insert_many exception."""
+    return [exc] + list(getattr(exc, "exceptions", None) or [])
+
+
+def _error_codes(exc):
+    """Returns the Data API error codes carried by an exception and the errors it wraps."""
+    return [descriptor.error_code
+            for error in _nested_exceptions(exc)
+            for descriptor in getattr(error, "error_descriptors", None) or []]
+
+
+def is_transient_error(exc):
+    """
+    Decides whether a failed insert is worth retrying.
+    Args:
+        exc (Exception): The exception raised by `insert_many`.
+    Returns:
+        bool: True for timeouts, connection errors, throttling and 5xx responses.
+    """
+    roots = _nested_exceptions(exc)
+    if len(roots) > 1:
+        roots = roots[1:]   # Judge an insert_many exception by the errors it wraps
+    for error in roots:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+        if isinstance(error, (TimeoutError, ConnectionError)) or "Timeout" in type(error).__name__:
+            continue
+        if type(error).__name__ in ("ConnectError", "ReadError", "WriteError", "RemoteProtocolError"):
+            continue
+        if status_code in TRANSIENT_STATUS_CODES:
+            continue
+        if _error_codes(error) and all(code == DUPLICATE_ERROR_CODE for code in _error_codes(error)):
+            continue
+        return False
+    return True
+
+
+def delete_documents(collection, document_ids, batch_size=100):
+    """
+    Deletes documents by `_id`, with at most `batch_size` IDs per `$in` filter.
+    Args:
+        collection (object): The collection; anything with an Astra-style `delete_many(filter)`.
+        document_ids (iterable): The IDs of the documents to delete.
+    Returns:
+        int: The number of deleted documents reported by the collection.
+    """
+    document_ids = list(document_ids)
+    deleted = 0
+    for start in range(0, len(document_ids), batch_size):
+        result = collection.delete_many({"_id": {"$in": document_ids[start : start + batch_size]}})
+        deleted += getattr(result, "deleted_count", 0) or 0
+    return deleted
+
+
+class AstraBulkUploader:
+    """
+    Uploads documents to an Astra DB collection with several batches in flight at once.
+    `submit` only queues the documents and returns, so the caller can compute the next
+    batch of embeddings while earlier batches are uploading. Failed batches are retried
+    with exponential backoff; re-sends are idempotent because every document carries a
+    stable `_id` and documents the server already stored are never sent again.
+    The batch size adapts to the observed latency: it grows while batches finish under
+    `target_latency` and is halved after slow batches or transient errors.
+    Vectors are kept as float32 arrays until a batch is sent, and then go out binary-encoded
+    instead of as JSON lists of numbers.
+    """
+
+    def __init__(self, collection, batch_size=50, max_in_flight=4, max_retries=5, backoff_base=0.5,
+                 backoff_max=30.0, min_batch_size=5, max_batch_size=100, target_latency=2.0, encode_vectors=True):
+        """
+        Args:
+            collection (object): The collection to insert into; anything with an Astra-style
+                `insert_many(documents, ordered=False)` method.
+            batch_size (int): The initial number of documents per `insert_many` call.
+            max_in_flight (int): The maximum number of concurrent `insert_many` calls.
+            max_retries (int): The number of retries after a transient failure.
+            backoff_base (float): The base delay in seconds of the exponential backoff.
+            backoff_max (float): The maximum delay in seconds between two retries.
+            min_batch_size (int): The lower bound of the adaptive batch size.
+            max_batch_size (int): The upper bound of the adaptive batch size.
+            target_latency (float): The per-batch latency in seconds the batch size adapts to.
+            encode_vectors (bool): Send "$vector" arrays as binary-encoded DataAPIVectors.
+        """
+        self.collection = collection
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.target_latency = target_latency
+        self.encode_vectors = encode_vectors
+
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="astra-upload")
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._futures = []
+        self._failed_documents = []
+        self._errors = []
+        self.stats = {"documents": 0, "batches": 0, "retries": 0, "failed_documents": 0, "upload_seconds": 0.0}
+
+    def submit(self, documents):
+        """
+        Queues documents for upload and returns once they are handed to the sender threads.
+        Blocks only while `max_in_flight` batches are already being sent.
+        Args:
+            documents (list): Astra DB documents, e.g. from `create_astra_db_document`.
+        """
+        for doc in documents:
+            # The `_id` makes re-sends idempotent: Astra rejects a second copy instead of duplicating it
+            if "_id" not in doc and "id" in doc:
+                doc = dict(doc, _id=doc["id"])
+            self._buffer.append(doc)
+        while len(self._buffer) >= self.batch_size:
+            batch_documents, self._buffer = self._buffer[: self.batch_size], self._buffer[self.batch_size :]
+            self._send_async(batch_documents)
+
+    def flush(self):
+        """
+        Sends any buffered documents and waits for every in-flight batch.
+        Returns:
+            dict: The upload counters (documents, batches, retries, failed_documents, upload_seconds).
+        Raises:
+            UploadError: If some documents still failed after all retries.
+        """
+        if self._buffer:
+            batch_documents, self._buffer = self._buffer, []
+            self._send_async(batch_documents)
+        wait(self._futures)
+        self._futures = []
+        if self._failed_documents:
+            failed, errors = self._failed_documents, self._errors
+            self._failed_documents, self._errors = [], []
+            raise UploadError(failed, errors)
+        return dict(self.stats)
+
+    def close(self):
+        """Flushes the remaining documents and shuts the sender threads down."""
+        try:
+            return self.flush()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._executor.shutdown(wait=True)
+
+    def _send_async(self, batch_documents):
+        self._slots.acquire()   # Backpressure: wait for a free in-flight slot
+        future = self._executor.submit(self._send_with_retry, batch_documents)
+        future.add_done_callback(lambda _: self._slots.release())
+        self._futures.append(future)
+
+    def _send_with_retry(self, batch_documents):
+        remaining = batch_documents
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                self.collection.insert_many(self._payload(remaining), ordered=False)
+                self._record_success(len(batch_documents), time.perf_counter() - start)
+                return
+            except Exception as e:
+                # Never re-send documents the server confirmed, so a retry cannot duplicate them
+                stored = set(getattr(e, "inserted_ids", None) or [])
+                remaining = [doc for doc in remaining if doc.get("_id") not in stored]
+                only_duplicates = bool(_error_codes(e)) and all(code == DUPLICATE_ERROR_CODE for code in _error_codes(e))
+                if not remaining or only_duplicates:
+                    self._record_success(len(batch_documents), time.perf_counter() - start)
+                    return
+                if not is_transient_error(e) or attempt >= self.max_retries:
+                    self._record_failure(remaining, e)
+                    return
+                self._shrink_batch_size()
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+                attempt += 1
+                with self._lock:
+                    self.stats["retries"] += 1
+                logger.warning(f"Transient insert error, retry {attempt}/{self.max_retries} in {delay:.2f}s: {e}")
+                time.sleep(random.uniform(0, delay))     # Full jitter spreads retries of concurrent batches
+
+    def _payload(self, documents):
+        """Converts the document vectors to their transport form just before sending."""
+        if not self.encode_vectors:
+            return documents
+        return [dict(doc, **{"$vector": to_transport_vector(doc["$vector"])})
+                if doc.get("$vector") is not None else doc for doc in documents]
+
+    def _record_success(self, count, latency):
+        with self._lock:
+            self.stats["documents"] += count
+            self.stats["batches"] += 1
+            self.stats["upload_seconds"] += latency
+            # Additive increase while batches are fast, multiplicative decrease when they are slow
+            if latency < self.target_latency:
+                self.batch_size = min(self.max_batch_size, self.batch_size + max(1, self.batch_size // 10))
+            elif latency > 2 * self.target_latency:
+                self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+
+    def _shrink_batch_size(self):
+        with self._lock:
+            self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+
+    def _record_failure(self, documents, exc):
+        with self._lock:
+            self.stats["failed_documents"] += len(documents)
+            self._failed_documents.extend(documents)
+            self._errors.append(repr(exc))
+        logger.error(f"Failed to upload {len(documents)} documents: {exc}")
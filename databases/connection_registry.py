@@ -0,0 +1,226 @@
+# Process-wide registry of pooled database engines and Data API clients (Functions: `get_engine`, `get_astra_database`)
+
+import hashlib  # Registry keys that never hold a credential in clear text
+import logging
+import os       # OS library for environment variable access
+import threading    # Locks so concurrent callers share one engine or client
+import time     # Health check timings
+
+logger = logging.getLogger(__name__)
+
+# Pool settings shared by every SQLAlchemy engine, each overridable with an environment variable.
+# pool_pre_ping checks a pooled connection before handing it out, so dropped connections are replaced.
+DEFAULT_POOL_SETTINGS = {
+    "pool_size": int(os.getenv('SQL_POOL_SIZE', '5')),
+    "max_overflow": int(os.getenv('SQL_POOL_MAX_OVERFLOW', '10')),
+    "pool_timeout": float(os.getenv('SQL_POOL_TIMEOUT', '30')),
+    "pool_recycle": int(os.getenv('SQL_POOL_RECYCLE', '1800')),
+    "pool_pre_ping": True,
+}
+
+_engines = {}           # key -> SQLAlchemy engine
+_async_engines = {}     # key -> SQLAlchemy async engine
+_pool_stats = {}        # key -> pool event counters of an engine
+_clients = {}           # token hash -> astrapy DataAPIClient
+_databases = {}         # (token hash, endpoint, keyspace) -> astrapy Database
+_lock = threading.Lock()
+
+
+def _secret_key(*parts):
+    """Returns a registry key for values that include a credential."""
+    return hashlib.sha256("\0".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+def build_postgres_url(user, password, host, port, database, driver="postgresql"):
+    """
+    Builds a PostgreSQL URL with the credentials escaped.
+    Args:
+        user (str): The database user.
+        password (str): The password.
+        host (str): The host name.
+        port (int): The port.
+        database (str): The database name.
+        driver (str): The SQLAlchemy driver name, e.g. "postgresql+psycopg2" or "postgresql+asyncpg".
+    Returns:
+        sqlalchemy.engine.URL: The URL.
+    """
+    from sqlalchemy.engine import URL     # Imported on first use to keep imports fast
+    return URL.create(driver, username=user, password=password, host=host, port=int(port) if port else None,
+                      database=database)
+
+
+def postgres_url_from_env(driver="postgresql"):
+    """Builds the PostgreSQL URL from DB_HOST, DB_PORT, DB_NAME, DB_USER and DB_PASSWORD."""
+    settings = {name: os.getenv(name) for name in ("DB_HOST", "DB_PORT", "DB_NAME", "DB_USER", "DB_PASSWORD")}
+    if not all(settings.values()):
+        raise ValueError("Environment variables for PostgreSQL are missing")
+    return build_postgres_url(settings["DB_USER"], settings["DB_PASSWORD"], settings["DB_HOST"], settings["DB_PORT"],
+                              settings["DB_NAME"], driver)
+
+
+def _track_pool(engine, stats):
+    """Counts pool events of an engine for `pool_metrics`."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        stats["connects"] += 1
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        stats["checkouts"] += 1
+        checked_out = engine.pool.checkedout()
+        stats["peak_checked_out"] = max(stats["peak_checked_out"], checked_out)
+        if stats["capacity"] and checked_out >= stats["capacity"]:
+            stats["saturated_checkouts"] += 1     # Every further caller waits up to pool_timeout
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        stats["invalidated"] += 1     # Includes connections found dead by the pre-ping
+
+
+def get_engine(url, **pool_settings):
+    """
+    Returns the shared SQLAlchemy engine for a database URL, creating it on first use.
+    Creating an engine opens no connection; connections are checked out from its pool per
+    unit of work (`with engine.connect() as connection: ...`) and returned afterwards.
+    Args:
+        url (str or sqlalchemy.engine.URL): The database URL.
+        **pool_settings: Overrides of DEFAULT_POOL_SETTINGS for this engine.
+    Returns:
+        sqlalchemy.engine.Engine: The same engine for every caller with the same URL and settings.
+    """
+    from sqlalchemy import create_engine
+    from sqlalchemy.engine import make_url
+
+    url = make_url(url)
+    settings = dict(DEFAULT_POOL_SETTINGS, **pool_settings)
+    key = _secret_key(url.render_as_string(hide_password=False), sorted(settings.items()))
+    with _lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = create_engine(url, **settings)
+            capacity = settings.get("pool_size", 0) + max(settings.get("max_overflow", 0), 0)
+            _pool_stats[key] = {"connects": 0, "checkouts": 0, "peak_checked_out": 0, "saturated_checkouts": 0,
+                                "invalidated": 0, "capacity": capacity}
+            _track_pool(engine, _pool_stats[key])
+            _engines[key] = engine
+            logger.debug(f"Created engine for {url.render_as_string(hide_password=True)}")
+        return engine
+
+
+def get_async_engine(url, **pool_settings):
+    """
+    Returns the shared asyncio engine for a database URL with an async driver, e.g.
+    "postgresql+asyncpg://...", for query paths that run on an event loop.
+    Args:
+        url (str or sqlalchemy.engine.URL): The database URL.
+        **pool_settings: Overrides of DEFAULT_POOL_SETTINGS for this engine.
+    Returns:
+        sqlalchemy.ext.asyncio.AsyncEngine: The same engine for every caller with the same URL and settings.
+    """
+    from sqlalchemy.engine import make_url
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = make_url(url)
+    settings = dict(DEFAULT_POOL_SETTINGS, **pool_settings)
+    key = _secret_key(url.render_as_string(hide_password=False), sorted(settings.items()))
+    with _lock:
+        if key not in _async_engines:
+            _async_engines[key] = create_async_engine(url, **settings)
+        return _async_engines[key]
+
+
+def get_data_api_client(token):
+    """Returns the shared astrapy DataAPIClient for an application token."""
+    key = _secret_key(token)
+    with _lock:
+        if key not in _clients:
+            from astrapy import DataAPIClient     # Imported on first use to keep imports fast
+            _clients[key] = DataAPIClient(token)
+        return _clients[key]
+
+
+def get_astra_database(token, api_endpoint, keyspace=None):
+    """
+    Returns the shared astrapy Database for an endpoint. No request is made until the
+    database is used; `health_check` verifies that it answers.
+    Args:
+        token (str): The Astra DB application token.
+        api_endpoint (str): The Data API endpoint.
+        keyspace (str, optional): The keyspace; the database default if None.
+    """
+    key = (_secret_key(token), api_endpoint, keyspace)
+    client = get_data_api_client(token)
+    with _lock:
+        if key not in _databases:
+            kwargs = {"keyspace": keyspace} if keyspace else {}
+            _databases[key] = client.get_database(api_endpoint, **kwargs)
+        return _databases[key]
+
+
+def pool_metrics():
+    """
+    Returns one dict per engine with its (password-free) URL, pool capacity, the connections
+    checked out and idle now, the overflow in use, and the event counters. `saturation` is the
+    share of the capacity checked out now; `saturated_checkouts` counts checkouts that took the
+    last free connection, after which callers wait for one to be returned.
+    """
+    with _lock:
+        metrics = []
+        for key, engine in _engines.items():
+            pool, stats = engine.pool, _pool_stats[key]
+            checked_out = pool.checkedout() if hasattr(pool, "checkedout") else 0
+            entry = dict(stats, url=engine.url.render_as_string(hide_password=True), checked_out=checked_out,
+                         checked_in=pool.checkedin() if hasattr(pool, "checkedin") else 0,
+                         overflow=max(pool.overflow(), 0) if hasattr(pool, "overflow") else 0)
+            entry["saturation"] = checked_out / stats["capacity"] if stats["capacity"] else 0.0
+            metrics.append(entry)
+        return metrics
+
+
+def health_check():
+    """
+    Checks every registered engine with "SELECT 1" and every Astra database by listing its
+    collections.
+    Returns:
+        list: One dict per resource with name, ok, seconds and the error if the check failed.
+    """
+    from sqlalchemy import text
+
+    with _lock:
+        engines = list(_engines.values())
+        databases = [(endpoint, database) for (_, endpoint, _), database in _databases.items()]
+    results = []
+    for engine in engines:
+        start = time.perf_counter()
+        try:
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+            error = None
+        except Exception as e:
+            error = repr(e)
+        results.append({"name": engine.url.render_as_string(hide_password=True), "ok": error is None,
+                        "seconds": time.perf_counter() - start, "error": error})
+    for endpoint, database in databases:
+        start = time.perf_counter()
+        try:
+            database.list_collection_names()
+            error = None
+        except Exception as e:
+            error = repr(e)
+        results.append({"name": endpoint, "ok": error is None, "seconds": time.perf_counter() - start, "error": error})
+    return results
+
+
+def dispose_all():
+    """Closes the pooled connections of every engine and forgets all engines and clients."""
+    with _lock:
+        engines = list(_engines.values())
+        _engines.clear()
+        _pool_stats.clear()
+        _async_engines.clear()
+        _clients.clear()
+        _databases.clear()
+    for engine in engines:
+        engine.dispose()
@@ -1,19 +1,20 @@
 import os
 from dotenv import load_dotenv
 import logging
-from astrapy import DataAPIClient
-from sqlalchemy import create_engine
+from databases import connection_registry
+from databases.local_vector_database import LocalVectorDB
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize logger
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# Module logger; handlers are configured once by utils.logging.setup_logging
 logger = logging.getLogger(__name__)
 
 class DbConnector:
     """
-    Class for connecting to different types of databases.
+    Class for connecting to different types of databases. Engines and Data API clients come
+    from the process-wide connection registry, so every DbConnector shares them, and nothing
+    is opened until `get_connection` is called.
     """
 
     def __init__(self, db_type):
@@ -25,41 +26,56 @@ class DbConnector:
         self.db_password = os.getenv('DB_PASSWORD')
         self.astra_db_application_token = os.getenv('ASTRA_DB_APPLICATION_TOKEN')
         self.astra_db_api_endpoint = os.getenv('ASTRA_DB_API_ENDPOINT')
+        self.local_vector_db_path = os.getenv('LOCAL_VECTOR_DB_PATH', 'data/embeddings/local_vector_db')
+        self.local_vector_format = os.getenv('LOCAL_VECTOR_FORMAT', 'float32')  # float32, float16 or int8
 
-        # Debug statements to check environment variables
-        logger.info(f"DB_TYPE: {self.db_type}")
-        logger.info(f"DB_HOST: {self.db_host}")
-        logger.info(f"DB_PORT: {self.db_port}")
-        logger.info(f"DB_NAME: {self.db_name}")
-        logger.info(f"DB_USER: {self.db_user}")
-        logger.info(f"ASTRA_DB_APPLICATION_TOKEN: {self.astra_db_application_token}")
-        logger.info(f"ASTRA_DB_API_ENDPOINT: {self.astra_db_api_endpoint}")
+        # Connection settings without credentials (passwords and tokens are never logged)
+        logger.debug(f"DB_TYPE: {self.db_type}, DB_HOST: {self.db_host}, DB_PORT: {self.db_port}, "
+                     f"DB_NAME: {self.db_name}, ASTRA_DB_API_ENDPOINT: {self.astra_db_api_endpoint}")
 
-        if self.db_type == 'postgresql':
-            self.connection = self._connect_to_postgresql()
-        elif self.db_type == 'vector_db':
-            self.connection = self._connect_to_astra()
-        else:
+        if self.db_type not in ('postgresql', 'vector_db', 'local_vector_db'):
             raise ValueError("Unsupported database type")
+        self._connection = None
+
+    @property
+    def connection(self):
+        """The database connection, opened on first use."""
+        if self._connection is None:
+            if self.db_type == 'postgresql':
+                self._connection = self._connect_to_postgresql()
+            elif self.db_type == 'vector_db':
+                self._connection = self._connect_to_astra()
+            else:
+                self._connection = self._connect_to_local_vector_db()
+        return self._connection
 
     def _connect_to_postgresql(self):
+        # The shared pooled engine; callers check out a connection per unit of work
         if not self.db_host or not self.db_port or not self.db_name or not self.db_user or not self.db_password:
             raise ValueError("Environment variables for PostgreSQL are missing")
-        connection_string = f"postgresql://{self.db_user}:{self.db_password}@{self.db_host}:{self.db_port}/{self.db_name}"
-        engine = create_engine(connection_string)
-        return engine.connect()
+        url = connection_registry.build_postgres_url(self.db_user, self.db_password, self.db_host, self.db_port,
+                                                     self.db_name)
+        return connection_registry.get_engine(url)
 
     def _connect_to_astra(self):
         if not self.astra_db_application_token or not self.astra_db_api_endpoint:
             raise ValueError("Environment variables for Astra DB are missing")
-        client = DataAPIClient(self.astra_db_application_token)
-        return client.get_database(self.astra_db_api_endpoint)
+        return connection_registry.get_astra_database(self.astra_db_application_token, self.astra_db_api_endpoint)
+
+    def _connect_to_local_vector_db(self):
+        # Local, memory-mapped vector store with the same collection surface as Astra DB
+        return LocalVectorDB(self.local_vector_db_path, vector_format=self.local_vector_format)
 
     def get_connection(self):
+        """
+        Returns the connection: the shared, pooled SQLAlchemy engine for PostgreSQL (use
+        `with engine.connect() as connection:` per unit of work), the shared astrapy Database
+        for Astra DB, or the LocalVectorDB.
+        """
         return self.connection
 
 # Usage example
 if __name__ == "__main__":
     db_connector = DbConnector(db_type="postgresql")
-    connection = db_connector.get_connection()
-    logger.info(f"Connected to DB: {connection}")
\ No newline at end of file
+    engine = db_connector.get_connection()
+    logger.info(f"Connected to DB: {engine.url.render_as_string(hide_password=True)}")
\ No newline at end of file
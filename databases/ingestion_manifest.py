@@ -0,0 +1,161 @@
+# Class recording what has been ingested, for incremental re-ingestion (Class: `IngestionManifest`)
+
+import hashlib  # Content hashes of files, pages and chunks
+import json     # JSON manifest file
+import os       # OS library for file system operations
+import threading    # Lock so the corpus collector thread can record files safely
+import uuid     # Deterministic (name-based) chunk IDs
+
+# Namespace of the name-based UUIDs used as chunk IDs
+CHUNK_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "financial-analyst/chunks")
+
+# Default location of the manifest
+DEFAULT_MANIFEST_PATH = "data/processed/ingestion_manifest.json"
+
+
+def hash_file(path, block_size=1 << 20):
+    """Returns the SHA-256 hex digest of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_text(text):
+    """Returns the SHA-256 hex digest of a text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def hash_metadata(metadata):
+    """Returns a stable hash of a metadata dictionary."""
+    return hash_text(json.dumps(metadata, sort_keys=True, default=str))
+
+
+class ChunkIdGenerator:
+    """
+    Assigns deterministic IDs to the chunks of one source document.
+    The ID is a name-based UUID of the source, the chunk's content hash and how many
+    identical chunks came before it in the document, so re-processing the same content
+    always yields the same IDs.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self._occurrences = {}
+
+    def next_id(self, chunk):
+        """
+        Returns the ID and content hash of the next chunk of the document.
+        Args:
+            chunk (str): The chunk text.
+        Returns:
+            tuple: (chunk_id, chunk_hash)
+        """
+        chunk_hash = hash_text(chunk)
+        occurrence = self._occurrences.get(chunk_hash, 0)
+        self._occurrences[chunk_hash] = occurrence + 1
+        chunk_id = uuid.uuid5(CHUNK_ID_NAMESPACE, f"{self.source}\0{chunk_hash}\0{occurrence}")
+        return str(chunk_id), chunk_hash
+
+
+class IngestionManifest:
+    """
+    Records, per source file, the file content hash, the metadata hash, the hash of every
+    page and the ID, hash and page of every chunk stored in the vector database.
+    Re-ingestion compares against it to skip unchanged files, embed and upsert only new or
+    changed chunks, and delete chunks that no longer exist. A near-duplicate chunk has no
+    document of its own; its entry carries the ID of the "canonical" chunk instead.
+    """
+
+    def __init__(self, path=DEFAULT_MANIFEST_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.sources = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.sources = json.load(f)
+
+    def get(self, source):
+        """Returns the manifest entry of a source file, or None if it was never ingested."""
+        return self.sources.get(source)
+
+    def is_unchanged(self, source, file_hash):
+        """Returns True if the source was ingested before with identical file content."""
+        entry = self.sources.get(source)
+        return entry is not None and entry["file_hash"] == file_hash
+
+    def known_chunk_ids(self, source, metadata_hash):
+        """
+        Returns the chunk IDs that are already stored with up-to-date metadata.
+        If the document metadata changed, no stored chunk is reusable.
+        """
+        entry = self.sources.get(source)
+        if entry is None or entry["metadata_hash"] != metadata_hash:
+            return set()
+        return {chunk_id for chunk_id, chunk in entry["chunks"].items() if "canonical" not in chunk}
+
+    def stored_chunk_ids(self, source):
+        """Returns every chunk ID stored as a document for the source (not the duplicate references)."""
+        entry = self.sources.get(source)
+        if not entry:
+            return set()
+        return {chunk_id for chunk_id, chunk in entry["chunks"].items() if "canonical" not in chunk}
+
+    def invalidate_references(self, deleted_ids, except_source=None):
+        """
+        Forces the re-ingestion of every other source with duplicates referencing deleted chunks,
+        so those duplicates become documents of their own on the next run.
+        Returns:
+            list: The invalidated sources.
+        """
+        deleted_ids = set(deleted_ids)
+        invalidated = []
+        with self._lock:
+            for source, entry in self.sources.items():
+                if source == except_source:
+                    continue
+                if any(chunk.get("canonical") in deleted_ids for chunk in entry["chunks"].values()):
+                    entry["file_hash"] = None
+                    invalidated.append(source)
+        return invalidated
+
+    def record(self, source, file_hash, metadata_hash, page_hashes, chunks):
+        """
+        Records a successfully ingested source file.
+        Args:
+            source (str): The source file path.
+            file_hash (str): The hash of the file content.
+            metadata_hash (str): The hash of the document metadata stored with the chunks.
+            page_hashes (dict): Page number -> page text hash.
+            chunks (dict): Chunk ID -> {"hash": chunk hash, "page": page number}, plus
+                "canonical": canonical chunk ID for near-duplicates stored as references.
+        """
+        with self._lock:
+            self.sources[source] = {
+                "file_hash": file_hash,
+                "metadata_hash": metadata_hash,
+                "pages": {str(page): page_hash for page, page_hash in page_hashes.items()},
+                "chunks": chunks,
+            }
+
+    def remove(self, source):
+        with self._lock:
+            self.sources.pop(source, None)
+
+    def save(self):
+        """Atomically writes the manifest to disk."""
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.sources, f)
+            os.replace(tmp_path, self.path)
+
+    def fingerprint(self):
+        """Returns a hash of the manifest content; it changes whenever any source is re-ingested."""
+        with self._lock:
+            return hash_text(json.dumps({source: [entry["file_hash"], entry["metadata_hash"]]
+                                         for source, entry in self.sources.items()}, sort_keys=True))
@@ -0,0 +1,369 @@
+# Columnar on-disk store of the intermediate pipeline artifacts (Class: `IntermediateStore`)
+# Document metadata, pages, chunks, entities and embeddings are written once per document and read
+# back through memory mapping, so re-embedding, re-indexing or re-running NER works from the stored
+# artifacts without re-parsing the PDFs, and scans over millions of chunks never load a table into RAM.
+
+import hashlib  # Partition names derived from the source path
+import json     # Partition metadata of the NumPy layout
+import os       # OS library for file system operations
+import shutil   # Replacing and deleting partition directories
+
+import numpy as np  # Memory-mapped column buffers
+
+# Root of the data directory; each table lives in the zone the README assigns to its stage
+DEFAULT_STORE_ROOT = os.getenv('INTERMEDIATE_STORE_DIR', 'data')
+
+# Table -> (zone directory, column -> type). "string" columns are stored as UTF-8 bytes plus
+# offsets, as in Arrow; "float32[]" is a fixed-size list whose size is the embedding dimension.
+TABLES = {
+    "documents": ("preprocessed", {"file_hash": "string", "metadata": "string"}),     # One row; metadata as JSON
+    "pages": ("preprocessed", {"page": "int32", "page_hash": "string", "text": "string"}),
+    "chunks": ("preprocessed", {"chunk_id": "string", "page": "int32", "chunk_hash": "string", "text": "string"}),
+    "entities": ("processed", {"chunk_id": "string", "start": "int32", "end": "int32", "label": "string",
+                               "text": "string"}),
+    "embeddings": ("embeddings", {"chunk_id": "string", "vector": "float32[]"}),
+}
+
+META_FILE = "_meta.json"
+
+
+def arrow_available():
+    """Returns True if pyarrow can be imported; the store falls back to its NumPy layout otherwise."""
+    try:
+        import pyarrow  # noqa: F401 (only checks that it loads)
+    except ImportError:
+        return False
+    return True
+
+
+def partition_key(source):
+    """Returns the file name of a document's partition: a short hash of its source path."""
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()[:16]
+
+
+class StringColumn:
+    """
+    A read-only column of strings over a UTF-8 data buffer and an offsets buffer, both usually
+    memory-mapped. Strings are decoded only when accessed.
+    """
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets      # len + 1 positions into `data`
+        self.data = data            # uint8 buffer
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        return bytes(self.data[self.offsets[index] : self.offsets[index + 1]]).decode("utf-8")
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def to_list(self):
+        return list(self)
+
+
+class ColumnarTable:
+    """One partition of a table: the rows of one document, with columns loaded on first access."""
+
+    def __init__(self, table, source, num_rows, loaders):
+        self.table = table
+        self.source = source
+        self.num_rows = num_rows
+        self._loaders = loaders     # Column -> callable returning a NumPy array or StringColumn
+        self._columns = {}
+
+    @property
+    def column_names(self):
+        return list(self._loaders)
+
+    def column(self, name):
+        """Returns a column: a (memory-mapped) NumPy array, a 2-D array for vectors, or a StringColumn."""
+        if name not in self._columns:
+            self._columns[name] = self._loaders[name]()
+        return self._columns[name]
+
+    def __len__(self):
+        return self.num_rows
+
+
+def _check_columns(table, columns):
+    """Validates the columns of a write against the table schema and returns the row count."""
+    if table not in TABLES:
+        raise ValueError(f"Unknown table {table!r}, expected one of {list(TABLES)}")
+    schema = TABLES[table][1]
+    if set(columns) != set(schema):
+        raise ValueError(f"Table {table} needs the columns {sorted(schema)}, got {sorted(columns)}")
+    lengths = {name: len(values) for name, values in columns.items()}
+    if len(set(lengths.values())) > 1:
+        raise ValueError(f"Columns of different lengths: {lengths}")
+    return next(iter(lengths.values()), 0)
+
+
+def _encode_strings(values):
+    """Returns (int64 offsets, uint8 data) of a list of strings."""
+    encoded = [str(value).encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def _vectors(values):
+    vectors = np.asarray(values, dtype=np.float32)
+    return vectors.reshape(len(vectors), -1) if vectors.size else vectors.reshape(0, 0)
+
+
+class IntermediateStore:
+    """
+    Stores one partition per (table, document). With pyarrow, a partition is an uncompressed
+    Arrow IPC file that is memory-mapped and read zero-copy; without it, a directory of .npy
+    column files in the same layout (values, or UTF-8 data plus offsets) opened with
+    `mmap_mode="r"`. Either layout can be exported to Parquet for analysts.
+    Writing a document's partition replaces the previous one atomically.
+    """
+
+    def __init__(self, root=DEFAULT_STORE_ROOT, backend=None):
+        """
+        Args:
+            root (str): The data directory; tables go to its preprocessed, processed and embeddings zones.
+            backend (str, optional): "arrow" or "numpy". Defaults to "arrow" when pyarrow is usable.
+        """
+        self.root = root
+        self.backend = backend or ("arrow" if arrow_available() else "numpy")
+        if self.backend not in ("arrow", "numpy"):
+            raise ValueError(f"Unsupported backend {self.backend!r}, expected 'arrow' or 'numpy'")
+
+    def table_dir(self, table):
+        zone, _ = TABLES[table]
+        return os.path.join(self.root, zone, table)
+
+    def _partition_path(self, table, source, backend):
+        path = os.path.join(self.table_dir(table), partition_key(source))
+        return path + ".arrow" if backend == "arrow" else path
+
+    # Writing
+
+    def write(self, table, source, columns):
+        """
+        Writes the rows of one document, replacing its previous partition.
+        Args:
+            table (str): "documents", "pages", "chunks", "entities" or "embeddings".
+            source (str): The source document, e.g. the PDF path.
+            columns (dict): Column -> values (lists or arrays of equal length; vectors as an (n, dim) array).
+        Returns:
+            str: The path of the written partition.
+        """
+        num_rows = _check_columns(table, columns)
+        os.makedirs(self.table_dir(table), exist_ok=True)
+        for backend in ("arrow", "numpy"):
+            if backend != self.backend:
+                self._remove(self._partition_path(table, source, backend))     # Never leave two versions of a document
+        if self.backend == "arrow":
+            return self._write_arrow(table, source, columns, num_rows)
+        return self._write_numpy(table, source, columns, num_rows)
+
+    def _write_arrow(self, table, source, columns, num_rows):
+        import pyarrow as pa    # Imported on first use to keep imports fast
+
+        arrays, fields = [], []
+        for name, kind in TABLES[table][1].items():
+            values = columns[name]
+            if kind == "string":
+                array = pa.array([str(value) for value in values], type=pa.string())
+            elif kind == "float32[]":
+                vectors = _vectors(values)
+                array = pa.FixedSizeListArray.from_arrays(pa.array(vectors.ravel(), type=pa.float32()), vectors.shape[1])
+            else:
+                array = pa.array(np.asarray(values, dtype=kind), type=getattr(pa, kind)())
+            arrays.append(array)
+            fields.append(pa.field(name, array.type))
+        schema = pa.schema(fields, metadata={"source": source, "table": table})
+        batch = pa.record_batch(arrays, schema=schema)
+
+        path = self._partition_path(table, source, "arrow")
+        with pa.OSFile(path + ".tmp", "wb") as sink:
+            with pa.ipc.new_file(sink, schema) as writer:
+                writer.write_batch(batch)   # One batch, so every column is a single contiguous buffer
+        os.replace(path + ".tmp", path)
+        return path
+
+    def _write_numpy(self, table, source, columns, num_rows):
+        path = self._partition_path(table, source, "numpy")
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        self._remove(tmp_path)
+        os.makedirs(tmp_path)
+        schema = {}
+        for name, kind in TABLES[table][1].items():
+            values = columns[name]
+            if kind == "string":
+                offsets, data = _encode_strings(values)
+                np.save(os.path.join(tmp_path, f"{name}.offsets.npy"), offsets)
+                np.save(os.path.join(tmp_path, f"{name}.data.npy"), data)
+            elif kind == "float32[]":
+                np.save(os.path.join(tmp_path, f"{name}.npy"), _vectors(values))
+            else:
+                np.save(os.path.join(tmp_path, f"{name}.npy"), np.asarray(values, dtype=kind))
+            schema[name] = kind
+        with open(os.path.join(tmp_path, META_FILE), "w") as f:
+            json.dump({"source": source, "table": table, "rows": num_rows, "schema": schema}, f)
+
+        # Swap the directories so readers see either the old or the new partition
+        old_path = f"{path}.old-{os.getpid()}"
+        if os.path.exists(path):
+            os.rename(path, old_path)
+        os.rename(tmp_path, path)
+        self._remove(old_path)
+        return path
+
+    @staticmethod
+    def _remove(path):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def delete(self, source):
+        """Deletes every partition of a document."""
+        for table in TABLES:
+            for backend in ("arrow", "numpy"):
+                self._remove(self._partition_path(table, source, backend))
+
+    # Reading
+
+    def _partitions(self, table):
+        """Yields the partition paths of a table in name order."""
+        directory = self.table_dir(table)
+        if not os.path.isdir(directory):
+            return
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if name.endswith(".arrow") or os.path.exists(os.path.join(path, META_FILE)):
+                yield path
+
+    def _open(self, table, path):
+        if path.endswith(".arrow"):
+            return self._open_arrow(table, path)
+        return self._open_numpy(table, path)
+
+    def _open_arrow(self, table, path):
+        import pyarrow as pa    # Imported on first use to keep imports fast
+
+        # The Arrow buffers point into the memory-mapped file; nothing is copied
+        batch = pa.ipc.open_file(pa.memory_map(path, "r")).get_batch(0)
+        schema = TABLES[table][1]
+
+        def loader(name):
+            array = batch.column(batch.schema.get_field_index(name))
+            kind = schema[name]
+            if kind == "string":
+                _, offsets, data = array.buffers()
+                offsets = np.frombuffer(offsets, dtype=np.int32)[array.offset : array.offset + len(array) + 1]
+                return lambda: StringColumn(offsets, np.frombuffer(data, dtype=np.uint8) if data else np.empty(0, np.uint8))
+            if kind == "float32[]":
+                size = array.type.list_size
+                return lambda: array.flatten().to_numpy(zero_copy_only=True).reshape(len(array), size)
+            return lambda: array.to_numpy(zero_copy_only=True)
+
+        source = batch.schema.metadata[b"source"].decode("utf-8")
+        return ColumnarTable(table, source, batch.num_rows, {name: loader(name) for name in schema})
+
+    def _open_numpy(self, table, path):
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+
+        def loader(name, kind):
+            if kind == "string":
+                return lambda: StringColumn(np.load(os.path.join(path, f"{name}.offsets.npy"), mmap_mode="r"),
+                                            np.load(os.path.join(path, f"{name}.data.npy"), mmap_mode="r"))
+            return lambda: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+
+        return ColumnarTable(table, meta["source"], meta["rows"],
+                             {name: loader(name, kind) for name, kind in meta["schema"].items()})
+
+    def read(self, table, source):
+        """
+        Opens the partition of one document.
+        Returns:
+            ColumnarTable: The memory-mapped partition, or None if the document has none.
+        """
+        for backend in ("arrow", "numpy"):
+            path = self._partition_path(table, source, backend)
+            if os.path.exists(path):
+                return self._open(table, path)
+        return None
+
+    def scan(self, table, sources=None):
+        """
+        Yields the partitions of a table one document at a time, so a scan holds only the
+        pages of the columns it touches in memory.
+        Args:
+            table (str): The table.
+            sources (iterable, optional): Only these documents. Defaults to all.
+        """
+        if sources is not None:
+            for source in sources:
+                partition = self.read(table, source)
+                if partition is not None:
+                    yield partition
+            return
+        for path in self._partitions(table):
+            yield self._open(table, path)
+
+    def sources(self, table):
+        """Returns the documents that have a partition in a table."""
+        return [partition.source for partition in self.scan(table)]
+
+    def stats(self):
+        """
+        Returns:
+            dict: Table -> documents, rows and bytes on disk.
+        """
+        stats = {}
+        for table in TABLES:
+            documents = rows = size = 0
+            for path in self._partitions(table):
+                documents += 1
+                rows += self._open(table, path).num_rows
+                if os.path.isdir(path):
+                    size += sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+                else:
+                    size += os.path.getsize(path)
+            stats[table] = {"documents": documents, "rows": rows, "bytes": size}
+        return stats
+
+    def export_parquet(self, table, path):
+        """
+        Writes a whole table to one Parquet file (with a source column), for analysis tools.
+        Requires pyarrow. Returns the number of rows written.
+        """
+        import pyarrow as pa    # Imported on first use to keep imports fast
+        import pyarrow.parquet as pq
+
+        writer, rows = None, 0
+        try:
+            for partition in self.scan(table):
+                columns = {"source": pa.array([partition.source] * partition.num_rows, type=pa.string())}
+                for name, kind in TABLES[table][1].items():
+                    values = partition.column(name)
+                    if kind == "string":
+                        columns[name] = pa.array(values.to_list(), type=pa.string())
+                    elif kind == "float32[]":
+                        columns[name] = pa.FixedSizeListArray.from_arrays(pa.array(np.ravel(values), type=pa.float32()),
+                                                                          values.shape[1])
+                    else:
+                        columns[name] = pa.array(np.asarray(values))
+                batch = pa.table(columns)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, batch.schema)
+                writer.write_table(batch)
+                rows += partition.num_rows
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows
@@ -0,0 +1,527 @@
+# Local, persistent vector database with the Astra DB collection surface (Classes: `LocalVectorDB`, `LocalVectorCollection`)
+
+import json     # JSON lines document log and collection metadata
+import logging
+import os       # OS library for file system operations
+import threading    # Lock serializing writes to a collection
+
+import numpy as np  # Contiguous, memory-mapped vector storage and scoring
+
+from databases.vector_codec import (DEFAULT_VECTOR_FORMAT, FILE_SUFFIXES, STORAGE_DTYPES, check_vector_format,
+                                    decode_vectors, encode_vectors)
+
+logger = logging.getLogger(__name__)
+
+# Collections larger than this are searched through the IVF index once it is built
+IVF_THRESHOLD = 20_000
+
+# Rows added to the vector file each time it has to grow
+GROWTH_ROWS = 4_096
+
+# Rows decoded at once when whole-collection passes need float32 vectors
+DECODE_BLOCK_ROWS = 65_536
+
+
+class LocalDataAPIError(Exception):
+    """Error with Data API style error descriptors (e.g. DOCUMENT_ALREADY_EXISTS)."""
+
+    def __init__(self, error_code, message):
+        super().__init__(f"{error_code}: {message}")
+        self.error_code = error_code
+        self.error_descriptors = [self]
+
+
+class LocalInsertManyException(Exception):
+    """Raised by insert_many when some documents failed; mirrors astrapy's CollectionInsertManyException."""
+
+    def __init__(self, inserted_ids, exceptions):
+        super().__init__(f"{len(exceptions)} documents failed, {len(inserted_ids)} inserted")
+        self.inserted_ids = inserted_ids
+        self.exceptions = exceptions
+
+
+class InsertManyResult:
+    def __init__(self, inserted_ids):
+        self.inserted_ids = inserted_ids
+
+
+class DeleteResult:
+    def __init__(self, deleted_count):
+        self.deleted_count = deleted_count
+
+
+def _get_path(document, path):
+    """Returns the value at a dotted path such as "metadata.source", or None."""
+    value = document
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def matches_filter(document, filter):
+    """
+    Evaluates a Data API style filter against a document.
+    Supports equality on dotted paths, $eq, $ne, $in, $nin, $gt, $gte, $lt, $lte, $exists,
+    $and and $or.
+    Args:
+        document (dict): The stored document.
+        filter (dict): The filter, e.g. {"metadata.source": "call.pdf", "metadata.page": {"$lte": 3}}.
+    Returns:
+        bool: True if the document matches.
+    """
+    for key, condition in (filter or {}).items():
+        if key == "$and":
+            if not all(matches_filter(document, sub) for sub in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches_filter(document, sub) for sub in condition):
+                return False
+            continue
+        value = _get_path(document, key)
+        if isinstance(condition, dict) and condition and all(op.startswith("$") for op in condition):
+            for op, operand in condition.items():
+                if op == "$eq" and value != operand:
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$nin" and value in operand:
+                    return False
+                if op == "$exists" and (value is not None) != operand:
+                    return False
+                if op in ("$gt", "$gte", "$lt", "$lte"):
+                    if value is None:
+                        return False
+                    if op == "$gt" and not value > operand:
+                        return False
+                    if op == "$gte" and not value >= operand:
+                        return False
+                    if op == "$lt" and not value < operand:
+                        return False
+                    if op == "$lte" and not value <= operand:
+                        return False
+        elif value != condition:
+            return False
+    return True
+
+
+def spherical_kmeans(vectors, n_clusters, iterations=10, seed=0, block_size=65_536):
+    """
+    Clusters unit-normalized vectors by cosine similarity.
+    Args:
+        vectors (numpy.ndarray): The (n, dim) unit-normalized training vectors.
+        n_clusters (int): The number of centroids.
+        iterations (int): The number of Lloyd iterations.
+        seed (int): The random seed for the initial centroids.
+        block_size (int): The number of vectors assigned per block to bound memory.
+    Returns:
+        numpy.ndarray: The (n_clusters, dim) unit-normalized centroids.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = assign_to_centroids(vectors, centroids, block_size)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        empty = norms[:, 0] == 0
+        centroids = np.where(empty[:, None], centroids, sums / np.where(norms == 0, 1, norms))
+    return centroids.astype(np.float32)
+
+
+def assign_to_centroids(vectors, centroids, block_size=65_536):
+    """Returns the index of the most similar centroid for every vector, computed in blocks."""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), block_size):
+        block = vectors[start : start + block_size]
+        assignments[start : start + block_size] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+class LocalVectorCollection:
+    """
+    A collection stored on local disk with the insert/find surface of an Astra DB collection.
+    Vectors live in a contiguous, memory-mapped file (one row per document) and the
+    documents without their vectors in an append-only JSON lines log. The vector format is
+    chosen per collection: float32, float16, or int8 with a float32 scale per row. Similarity search is an
+    exact brute-force top-k over the rows passing the metadata filter; collections above
+    `ivf_threshold` are searched through an IVF index (k-means centroids, `nprobe` lists
+    probed per query) once `build_index` (or `refresh_index`, after each ingestion) has trained it.
+    """
+
+    def __init__(self, path, dimension=None, metric="cosine", ivf_threshold=IVF_THRESHOLD,
+                 vector_format=DEFAULT_VECTOR_FORMAT):
+        self.path = path
+        self.metric = metric
+        self.ivf_threshold = ivf_threshold
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self._meta_path = os.path.join(path, "meta.json")
+        self._log_path = os.path.join(path, "documents.jsonl")
+        self._ivf_path = os.path.join(path, "ivf.npz")
+
+        # An existing collection keeps the dimension, metric and format it was created with
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                meta = json.load(f)
+            dimension, self.metric = meta["dimension"], meta["metric"]
+            vector_format = meta.get("vector_format", "float32")
+        self.dimension = dimension
+        self.vector_format = check_vector_format(vector_format)
+        self._vectors_path = os.path.join(path, f"vectors.{FILE_SUFFIXES[self.vector_format]}")
+        self._scales_path = os.path.join(path, "scales.f32")
+
+        self._documents = []    # Row -> document without its vector, None once deleted
+        self._rows = {}         # _id -> row
+        self._vectors = None
+        self._scales = None     # Per-row scales of int8 vectors
+        self._capacity = 0
+        self._load()
+
+        self.centroids = None
+        self.nprobe = 8
+        self._assignments = None
+        self.trained_rows = 0   # Live rows when the centroids were trained
+        if os.path.exists(self._ivf_path):
+            ivf = np.load(self._ivf_path)
+            self.centroids, self._assignments, self.nprobe = ivf["centroids"], ivf["assignments"], int(ivf["nprobe"])
+            # Indexes saved before trained_rows was recorded count every assigned row
+            self.trained_rows = int(ivf["trained_rows"]) if "trained_rows" in ivf else len(self._assignments)
+            self._assign_new_rows()
+
+
+    def _load(self):
+        if os.path.exists(self._log_path):
+            with open(self._log_path) as f:
+                for line in f:
+                    entry = json.loads(line)
+                    if "insert" in entry:
+                        self._rows[entry["insert"]["_id"]] = len(self._documents)
+                        self._documents.append(entry["insert"])
+                    else:
+                        row = self._rows.pop(entry["delete"])
+                        self._documents[row] = None
+        if self.dimension is not None:
+            self._open_vectors(max(len(self._documents), GROWTH_ROWS))
+
+    def _open_vectors(self, capacity):
+        """Opens the vector file with room for `capacity` rows, growing the file if needed."""
+        if self._vectors is not None:
+            self._vectors.flush()
+        dtype = STORAGE_DTYPES[self.vector_format]
+        self._vectors = self._open_memmap(self._vectors_path, dtype, (capacity, self.dimension))
+        if self.vector_format == "int8":
+            if self._scales is not None:
+                self._scales.flush()
+            self._scales = self._open_memmap(self._scales_path, np.float32, (capacity,))
+        self._capacity = capacity
+        self._norms = np.zeros(capacity, dtype=np.float32)
+        for start in range(0, len(self._documents), DECODE_BLOCK_ROWS):
+            rows = np.arange(start, min(start + DECODE_BLOCK_ROWS, len(self._documents)))
+            self._norms[rows] = np.linalg.norm(self._decoded(rows), axis=1)
+
+    @staticmethod
+    def _open_memmap(path, dtype, shape):
+        """Memory-maps a file, growing it first so it holds `shape` items of `dtype`."""
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        with open(path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    def _decoded(self, rows):
+        """Returns the float32 vectors of the given rows."""
+        return decode_vectors(self._vectors[rows], None if self._scales is None else self._scales[rows])
+
+    def _write_meta(self):
+        with open(self._meta_path, "w") as f:
+            json.dump({"dimension": self.dimension, "metric": self.metric, "vector_format": self.vector_format}, f)
+
+    @property
+    def vectors(self):
+        """
+        The (rows, dimension) float32 vector matrix, including deleted rows. It is the
+        memory-mapped file itself for float32 collections and a decoded copy otherwise.
+        """
+        if self._vectors is None:
+            return np.empty((0, self.dimension or 0), dtype=np.float32)
+        if self.vector_format == "float32":
+            return self._vectors[: len(self._documents)]
+        return self._decoded(np.arange(len(self._documents)))
+
+
+    def insert_one(self, document):
+        return self.insert_many([document])
+
+    def insert_many(self, documents, ordered=False, **kwargs):
+        """
+        Inserts documents with their vectors taken from "$vector" (or "vector"), given as
+        lists, NumPy arrays or DataAPIVectors, and stores them in the collection's format.
+        Args:
+            documents (list): The documents; "_id" (or "id") identifies each of them.
+            ordered (bool): If True, stop at the first duplicate like the Data API does.
+        Returns:
+            InsertManyResult: The ids of the inserted documents.
+        Raises:
+            LocalInsertManyException: If some documents already existed or had no valid vector; the
+                others are inserted.
+        """
+        inserted_ids, errors = [], []
+        with self._lock:
+            with open(self._log_path, "a") as log:
+                for document in documents:
+                    document = dict(document)
+                    doc_id = document.setdefault("_id", document.get("id"))
+                    vector = document.pop("$vector", None)
+                    if vector is None:
+                        vector = document.pop("vector", None)
+                    if doc_id in self._rows:
+                        errors.append(LocalDataAPIError("DOCUMENT_ALREADY_EXISTS", f"_id {doc_id!r} already exists"))
+                        if ordered:
+                            break
+                        continue
+                    if vector is None:
+                        errors.append(LocalDataAPIError("MISSING_VECTOR", f"_id {doc_id!r} has no $vector"))
+                        if ordered:
+                            break
+                        continue
+                    try:
+                        vector = np.asarray(vector, dtype=np.float32)
+                    except (TypeError, ValueError):
+                        vector = None
+                    if vector is None or vector.ndim != 1 or not len(vector):
+                        errors.append(LocalDataAPIError("INVALID_VECTOR", f"_id {doc_id!r} has no valid $vector"))
+                        if ordered:
+                            break
+                        continue
+                    if self.dimension is None:
+                        self.dimension = len(vector)
+                        self._write_meta()
+                        self._open_vectors(GROWTH_ROWS)
+                    elif not os.path.exists(self._meta_path):
+                        self._write_meta()
+                    if len(vector) != self.dimension:
+                        errors.append(LocalDataAPIError("VECTOR_DIMENSION_MISMATCH", f"expected {self.dimension} dimensions"))
+                        continue
+
+                    row = len(self._documents)
+                    if row >= self._capacity:
+                        self._open_vectors(self._capacity + max(GROWTH_ROWS, self._capacity // 2))
+                    codes, scales = encode_vectors(vector, self.vector_format)
+                    self._vectors[row] = codes
+                    if scales is not None:
+                        self._scales[row] = scales
+                    # Norms of the stored (decoded) vector keep the cosine scores consistent
+                    self._norms[row] = np.linalg.norm(decode_vectors(codes, scales))
+                    self._documents.append(document)
+                    self._rows[doc_id] = row
+                    log.write(json.dumps({"insert": document}) + "\n")
+                    inserted_ids.append(doc_id)
+            if self._vectors is not None:
+                self._vectors.flush()
+            if self._scales is not None:
+                self._scales.flush()
+            self._assign_new_rows()
+        if errors:
+            raise LocalInsertManyException(inserted_ids, errors)
+        return InsertManyResult(inserted_ids)
+
+    def delete_many(self, filter):
+        """Deletes every document matching the filter and returns a DeleteResult."""
+        with self._lock:
+            rows = self._candidate_rows(filter)
+            with open(self._log_path, "a") as log:
+                for row in rows:
+                    doc_id = self._documents[row]["_id"]
+                    del self._rows[doc_id]
+                    self._documents[row] = None
+                    log.write(json.dumps({"delete": doc_id}) + "\n")
+        return DeleteResult(len(rows))
+
+    def delete_one(self, filter):
+        rows = self._candidate_rows(filter)
+        if not rows:
+            return DeleteResult(0)
+        return self.delete_many({"_id": self._documents[rows[0]]["_id"]})
+
+
+    def _id_rows(self, filter):
+        """Returns the rows of an `_id` or `_id $in` filter from the _id index, or None for other filters."""
+        if not filter or set(filter) != {"_id"}:
+            return None
+        ids = filter["_id"]
+        if not isinstance(ids, dict):
+            row = self._rows.get(ids)
+            return [] if row is None else [row]
+        if set(ids) == {"$in"}:
+            return sorted({self._rows[i] for i in ids["$in"] if i in self._rows})
+        return None
+
+    def _candidate_rows(self, filter):
+        """Returns the live rows matching the filter, using the _id index for id lookups."""
+        rows = self._id_rows(filter)
+        if rows is not None:
+            return rows
+        return [row for row, document in enumerate(self._documents)
+                if document is not None and matches_filter(document, filter)]
+
+    def _scores(self, rows, query):
+        """Scores rows against the query vector with the Data API similarity of the metric."""
+        vectors = self._decoded(rows)
+        if self.metric == "euclidean":
+            distances = np.sum((vectors - query) ** 2, axis=1)
+            return 1.0 / (1.0 + distances)
+        dots = vectors @ query
+        if self.metric == "dot_product":
+            return (1.0 + dots) / 2.0
+        norms = self._norms[rows] * np.linalg.norm(query)
+        return (1.0 + dots / np.where(norms == 0, 1, norms)) / 2.0
+
+    def _ivf_rows(self, query):
+        """Returns the rows stored in the `nprobe` inverted lists closest to the query."""
+        query = query / (np.linalg.norm(query) or 1.0)
+        probed = np.argsort(-(self.centroids @ query))[: self.nprobe]
+        return np.flatnonzero(np.isin(self._assignments[: len(self._documents)], probed))
+
+    def find(self, filter=None, sort=None, limit=None, include_similarity=False, projection=None, **kwargs):
+        """
+        Finds documents, optionally ranked by vector similarity.
+        Args:
+            filter (dict, optional): A Data API style metadata filter.
+            sort (dict, optional): {"$vector": query_vector} to rank by similarity.
+            limit (int, optional): The maximum number of documents returned.
+            include_similarity (bool): Add "$similarity" to every returned document.
+            projection (dict, optional): {"$vector": True} to include the stored vectors.
+        Returns:
+            list: The matching documents, most similar first when sorting by vector.
+        """
+        query = None if not sort or "$vector" not in sort else np.asarray(sort["$vector"], dtype=np.float32)
+        if query is None:
+            rows = self._candidate_rows(filter)[:limit]
+            return [self._result(row, None, projection) for row in rows]
+
+        # Restrict the search to the probed IVF lists on large, indexed collections; an id
+        # prefilter (e.g. lexical candidates) is scored exactly instead
+        if self.centroids is not None and len(self._rows) >= self.ivf_threshold and self._id_rows(filter) is None:
+            rows = [row for row in self._ivf_rows(query)
+                    if self._documents[row] is not None and matches_filter(self._documents[row], filter)]
+        else:
+            rows = self._candidate_rows(filter)
+        if not rows:
+            return []
+        rows = np.asarray(rows)
+        scores = self._scores(rows, query)
+
+        # Partial sort: only the top `limit` scores are fully ordered
+        k = min(limit or len(rows), len(rows))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(rows) else np.arange(len(rows))
+        top = top[np.argsort(-scores[top])]
+        return [self._result(rows[i], scores[i] if include_similarity else None, projection) for i in top]
+
+    def find_one(self, filter=None, sort=None, include_similarity=False, projection=None, **kwargs):
+        results = self.find(filter, sort=sort, limit=1, include_similarity=include_similarity, projection=projection)
+        return results[0] if results else None
+
+    def count_documents(self, filter=None, upper_bound=None):
+        return len(self._candidate_rows(filter))
+
+    def _result(self, row, similarity, projection):
+        document = dict(self._documents[row])
+        if projection and projection.get("$vector"):
+            document["$vector"] = self._decoded([row])[0].tolist()
+        if similarity is not None:
+            document["$similarity"] = float(similarity)
+        return document
+
+
+    def build_index(self, n_lists=None, nprobe=8, sample_size=100_000, iterations=10):
+        """
+        Trains the IVF index: spherical k-means centroids over a sample of the vectors, then
+        every row is assigned to its nearest centroid. New rows are assigned on insert.
+        Args:
+            n_lists (int, optional): The number of inverted lists. Defaults to sqrt(rows).
+            nprobe (int): The number of lists probed per query (recall vs. latency).
+            sample_size (int): The maximum number of vectors used to train the centroids.
+            iterations (int): The number of k-means iterations.
+        Raises:
+            ValueError: If the collection has no documents.
+        """
+        with self._lock:
+            live = np.asarray(sorted(self._rows.values()))
+            if not len(live):
+                raise ValueError("Cannot build an IVF index over an empty collection")
+            n_lists = n_lists or max(1, int(np.sqrt(len(live))))
+            rng = np.random.default_rng(0)
+            sample = live if len(live) <= sample_size else rng.choice(live, sample_size, replace=False)
+            training = self._normalized(np.sort(sample))
+            self.centroids = spherical_kmeans(training, min(n_lists, len(training)), iterations)
+            self.nprobe = nprobe
+            self._assignments = np.full(len(self._documents), -1, dtype=np.int32)
+            self._assign_new_rows()
+            self.trained_rows = len(live)
+            np.savez(self._ivf_path, centroids=self.centroids, assignments=self._assignments, nprobe=nprobe,
+                     trained_rows=self.trained_rows)
+
+    def refresh_index(self, growth=2.0, **kwargs):
+        """
+        Builds the IVF index once the collection reaches `ivf_threshold`, and retrains it when the
+        collection has grown `growth` times since the centroids were trained; rows added in
+        between are assigned to the existing centroids. Called after each ingestion run.
+        Args:
+            growth (float): The growth in live rows that triggers retraining.
+            **kwargs: Passed to build_index.
+        Returns:
+            bool: Whether the index was (re)built.
+        """
+        live = len(self._rows)
+        if live < self.ivf_threshold:
+            return False
+        if self.centroids is not None and live < growth * self.trained_rows:
+            return False
+        self.build_index(**kwargs)
+        return True
+
+    def _normalized(self, rows):
+        vectors = self._decoded(rows)
+        norms = self._norms[rows][:, None]
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def _assign_new_rows(self):
+        """Assigns rows added since the index was trained to their nearest centroid."""
+        if self.centroids is None:
+            return
+        if len(self._assignments) < len(self._documents):
+            self._assignments = np.concatenate([
+                self._assignments, np.full(len(self._documents) - len(self._assignments), -1, dtype=np.int32)])
+        pending = np.flatnonzero(self._assignments[: len(self._documents)] < 0)
+        if len(pending):
+            self._assignments[pending] = assign_to_centroids(self._normalized(pending), self.centroids)
+
+
+class LocalVectorDB:
+    """
+    A directory of local vector collections with the get_collection surface of an Astra database.
+    `vector_format` is the format of collections created without an explicit one.
+    """
+
+    def __init__(self, path, vector_format=DEFAULT_VECTOR_FORMAT):
+        self.path = path
+        self.vector_format = check_vector_format(vector_format)
+        self._collections = {}
+        os.makedirs(path, exist_ok=True)
+
+    def create_collection(self, name, dimension=None, metric="cosine", vector_format=None, **kwargs):
+        if name not in self._collections:
+            self._collections[name] = LocalVectorCollection(os.path.join(self.path, name), dimension, metric,
+                                                            vector_format=vector_format or self.vector_format)
+        return self._collections[name]
+
+    def get_collection(self, name, **kwargs):
+        return self.create_collection(name)
+
+    def list_collection_names(self):
+        return sorted(entry for entry in os.listdir(self.path) if os.path.isdir(os.path.join(self.path, entry)))
@@ -1,18 +1,18 @@
 import os
 from dotenv import load_dotenv
 import logging
-from sqlalchemy import create_engine
+from databases import connection_registry
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize logger
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# Module logger; handlers are configured once by utils.logging.setup_logging
 logger = logging.getLogger(__name__)
 
 class SQLDBConnection:
     """
-    Class for connecting to the SQL database.
+    Class for connecting to the SQL database. The engine and its connection pool are shared
+    with every other user of the same database through the connection registry.
     """
 
     def __init__(self):
@@ -22,30 +22,26 @@ class SQLDBConnection:
         self.db_user = os.getenv('DB_USER')
         self.db_password = os.getenv('DB_PASSWORD')
         
-        # Debug statements to check environment variables
-        logger.info(f"DB_HOST: {self.db_host}")
-        logger.info(f"DB_PORT: {self.db_port}")
-        logger.info(f"DB_NAME: {self.db_name}")
-        logger.info(f"DB_USER: {self.db_user}")
+        # Connection settings without credentials
+        logger.debug(f"DB_HOST: {self.db_host}, DB_PORT: {self.db_port}, DB_NAME: {self.db_name}")
         
         if not self.db_host or not self.db_port or not self.db_name or not self.db_user or not self.db_password:
             raise ValueError("Environment variables for SQL DB are missing")
         
         self.engine = self._initialize_engine()
-        self.connection = self._connect_to_db()
 
     def _initialize_engine(self):
-        connection_string = f"postgresql://{self.db_user}:{self.db_password}@{self.db_host}:{self.db_port}/{self.db_name}"
-        return create_engine(connection_string)
-
-    def _connect_to_db(self):
-        return self.engine.connect()
+        # Shared pooled engine; no connection is opened until one is checked out
+        url = connection_registry.build_postgres_url(self.db_user, self.db_password, self.db_host, self.db_port,
+                                                     self.db_name)
+        return connection_registry.get_engine(url)
 
     def get_connection(self):
-        return self.connection
+        """Checks out a pooled connection; close it (or use it as a context manager) to return it to the pool."""
+        return self.engine.connect()
 
 # Usage example
 if __name__ == "__main__":
     sql_db_connection = SQLDBConnection()
-    connection = sql_db_connection.get_connection()
-    logger.info(f"Connected to SQL DB: {connection}")
\ No newline at end of file
+    with sql_db_connection.get_connection() as connection:
+        logger.info(f"Connected to SQL DB: {connection.engine.url.render_as_string(hide_password=True)}")
\ No newline at end of file
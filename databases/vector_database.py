@@ -1,13 +1,12 @@
 import os
 from dotenv import load_dotenv
 import logging
-from astrapy import DataAPIClient
+from databases import connection_registry
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize logger
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# Module logger; handlers are configured once by utils.logging.setup_logging
 logger = logging.getLogger(__name__)
 
 class VectorDBConnection:   # Class for Astra DB connection setup
@@ -18,9 +17,8 @@ class VectorDBConnection:   # Class for Astra DB connection setup
         self.astra_db_application_token = os.getenv('ASTRA_DB_TOKEN')   # Get the Astra DB application token from the environment
         self.astra_db_api_endpoint = os.getenv('ASTRA_DB_ENDPOINT')    # Get the Astra DB API endpoint from the environment 
         
-        # Debug statements to check environment variables
-        logger.info(f"ASTRA_DB_APPLICATION_TOKEN: {self.astra_db_application_token}")
-        logger.info(f"ASTRA_DB_API_ENDPOINT: {self.astra_db_api_endpoint}")
+        # Debug statement without the token
+        logger.debug(f"ASTRA_DB_API_ENDPOINT: {self.astra_db_api_endpoint}")
         
         if not self.astra_db_application_token or not self.astra_db_api_endpoint:
             raise ValueError("Environment variables for Astra DB are missing")
@@ -29,12 +27,12 @@ class VectorDBConnection:   # Class for Astra DB connection setup
         self.db = self._connect_to_db()
 
     def _initialize_client(self):
-        """Initialize the DataAPIClient."""
-        return DataAPIClient(self.astra_db_application_token)
+        """Return the DataAPIClient shared by every connection with the same token."""
+        return connection_registry.get_data_api_client(self.astra_db_application_token)
 
     def _connect_to_db(self):
-        """Connect to the vector database."""
-        return self.client.get_database(self.astra_db_api_endpoint)
+        """Return the shared database object; it makes no request until it is used."""
+        return connection_registry.get_astra_database(self.astra_db_application_token, self.astra_db_api_endpoint)
 
     def get_db(self):
         """Return the connected database object."""
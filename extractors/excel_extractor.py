@@ -0,0 +1,344 @@
+# Streaming extraction of Excel workbooks into typed column batches and PostgreSQL (Class: `ExcelExtractor`)
+
+import datetime     # Date and time cells
+import io       # In-memory CSV buffer for COPY
+import os       # OS library for table names from file names
+import re       # Column names and number formats
+import time     # Load timings
+
+import numpy as np  # Typed column batches and vectorized parsing
+
+# Rows per column batch; memory stays bounded by one batch whatever the sheet size
+DEFAULT_BATCH_ROWS = 50_000
+
+# Column kinds of a batch (float64, datetime64[us] and object arrays) and their PostgreSQL types
+POSTGRES_TYPES = {"number": "DOUBLE PRECISION", "timestamp": "TIMESTAMP", "text": "TEXT"}
+
+# Numbers as written in financial sheets: 1,234.5, $1.2, (500) for -500, 12% for 0.12
+NUMBER_PATTERN = re.compile(r"^\(?-?[$€£]?\s*-?\d[\d,]*(?:\.\d+)?(?:[eE][-+]?\d+)?\s*%?\)?$")
+NUMBER_STRIP_CHARACTERS = ("$", "€", "£", ",", " ", "(", ")", "%")
+
+# Date formats tried for text cells that are not ISO 8601
+DATE_FORMATS = ("%m/%d/%Y", "%d.%m.%Y", "%b %d, %Y", "%d %b %Y", "%B %d, %Y")
+
+
+def column_names(header):
+    """Returns unique snake_case column names for a header row; empty headers become column_<n>."""
+    names = []
+    for position, value in enumerate(header, start=1):
+        name = re.sub(r"[^0-9a-z]+", "_", str(value).strip().lower()).strip("_") if value is not None else ""
+        name = name or f"column_{position}"
+        if name[0].isdigit():
+            name = "c_" + name
+        while name in names:
+            name = f"{name}_{position}"
+        names.append(name)
+    return names
+
+
+def parse_numbers(values):
+    """
+    Parses a column of numbers written as text in one vectorized pass; cells that are not
+    numbers become NaN.
+    Args:
+        values (numpy.ndarray): Strings, or None for empty cells.
+    Returns:
+        tuple: (float64 array, number of non-empty cells that could not be parsed)
+    """
+    text = np.array(["" if value is None else value for value in values], dtype=str)
+    text = np.char.strip(text)
+    empty = text == ""
+    negative = np.char.startswith(text, "(") & np.char.endswith(text, ")")
+    percent = np.char.find(text, "%") >= 0
+    cleaned = text
+    for character in NUMBER_STRIP_CHARACTERS:
+        cleaned = np.char.replace(cleaned, character, "")
+    cleaned = np.where(empty, "nan", cleaned)
+    try:
+        numbers = cleaned.astype(np.float64)
+        invalid = 0
+    except ValueError:
+        # Some cells are not numbers: parse the valid ones, the others become NaN
+        valid = np.array([bool(NUMBER_PATTERN.match(value)) for value in text]) & ~empty
+        numbers = np.full(len(text), np.nan)
+        numbers[valid] = cleaned[valid].astype(np.float64)
+        invalid = int((~valid & ~empty).sum())
+    numbers = np.where(negative, -np.abs(numbers), numbers)
+    numbers = np.where(percent, numbers / 100, numbers)
+    return numbers, invalid
+
+
+def parse_timestamps(values):
+    """
+    Parses a column of dates written as text; ISO 8601 dates are parsed in one vectorized
+    pass, other formats (DATE_FORMATS) cell by cell. Unparseable cells become NaT.
+    Args:
+        values (numpy.ndarray): Strings, or None for empty cells.
+    Returns:
+        tuple: (datetime64[us] array, number of non-empty cells that could not be parsed)
+    """
+    text = np.array(["NaT" if value is None or not str(value).strip() else str(value).strip() for value in values])
+    try:
+        return text.astype("datetime64[us]"), 0
+    except ValueError:
+        pass
+    timestamps = np.full(len(text), np.datetime64("NaT"), dtype="datetime64[us]")
+    invalid = 0
+    for i, value in enumerate(text):
+        if value == "NaT":
+            continue
+        try:
+            timestamps[i] = np.datetime64(value, "us")
+            continue
+        except ValueError:
+            pass
+        for date_format in DATE_FORMATS:
+            try:
+                timestamps[i] = np.datetime64(datetime.datetime.strptime(value, date_format), "us")
+                break
+            except ValueError:
+                continue
+        else:
+            invalid += 1
+    return timestamps, invalid
+
+
+def infer_column_kind(values):
+    """
+    Chooses "number", "timestamp" or "text" for a column from its first batch of cells:
+    typed cells decide directly, text cells are tried as numbers, then as dates.
+    """
+    present = [value for value in values if value is not None and value != ""]
+    if not present:
+        return "text"
+    if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+        return "number"
+    if all(isinstance(value, (datetime.date, datetime.datetime)) for value in present):
+        return "timestamp"
+    text = np.array([str(value) for value in present], dtype=object)
+    if parse_numbers(text)[1] == 0:
+        return "number"
+    if parse_timestamps(text)[1] == 0:
+        return "timestamp"
+    return "text"
+
+
+def to_column(values, kind):
+    """
+    Converts the cells of one column to the typed array of its kind.
+    Returns:
+        tuple: (numpy.ndarray, number of cells that did not fit the kind and became null)
+    """
+    if kind == "text":
+        return np.array([None if value is None else str(value) for value in values], dtype=object), 0
+    if kind == "number":
+        if all(value is None or (isinstance(value, (int, float)) and not isinstance(value, bool)) for value in values):
+            return np.array([np.nan if value is None else value for value in values], dtype=np.float64), 0
+        return parse_numbers(np.array([None if value is None else str(value) for value in values], dtype=object))
+    if all(value is None or isinstance(value, (datetime.date, datetime.datetime)) for value in values):
+        return np.array([np.datetime64("NaT") if value is None else np.datetime64(value, "us") for value in values],
+                        dtype="datetime64[us]"), 0
+    return parse_timestamps(np.array([None if value is None else str(value) for value in values], dtype=object))
+
+
+def batch_to_csv(batch):
+    """
+    Renders a column batch as CSV for PostgreSQL COPY: nulls as unquoted empty fields, text
+    quoted, timestamps in ISO 8601 and numbers with full precision.
+    Args:
+        batch (dict): Column name -> typed array.
+    Returns:
+        str: The CSV rows without a header.
+    """
+    columns = []
+    for values in batch.values():
+        if values.dtype == np.float64:
+            rendered = np.char.mod("%.17g", values).astype(object)
+            rendered[np.isnan(values)] = ""
+        elif values.dtype.kind == "M":
+            rendered = np.datetime_as_string(values, unit="us").astype(object)
+            rendered[np.isnat(values)] = ""
+        else:
+            rendered = np.array(["" if value is None else '"' + value.replace('"', '""') + '"' for value in values],
+                                dtype=object)
+        columns.append(rendered)
+    if not columns:
+        return ""
+    return "".join(",".join(row) + "\n" for row in zip(*columns))
+
+
+def quote_identifier(name):
+    """Quotes a PostgreSQL identifier."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+class ExcelExtractor:
+    """
+    Extracts tables from Excel workbooks. Sheets are streamed in read-only mode and turned
+    into typed column batches (float64, datetime64 or text arrays) of at most `batch_rows`
+    rows, which `load_to_postgres` bulk-loads with COPY; memory stays bounded by one batch.
+    """
+
+    def __init__(self, batch_rows=DEFAULT_BATCH_ROWS):
+        """
+        Args:
+            batch_rows (int): The maximum number of rows per column batch.
+        """
+        self.batch_rows = batch_rows
+
+    def sheet_names(self, file_path):
+        """Returns the names of the worksheets of a workbook."""
+        from openpyxl import load_workbook     # Imported on first use to keep imports fast
+        workbook = load_workbook(file_path, read_only=True)
+        try:
+            return list(workbook.sheetnames)
+        finally:
+            workbook.close()
+
+    def read_excel(self, file_path, sheet_name=None):
+        """
+        Streams the non-empty rows of a worksheet without loading the workbook into memory.
+        Args:
+            file_path (str): The .xlsx file.
+            sheet_name (str, optional): The worksheet. Defaults to the first one.
+        Yields:
+            tuple: The cell values of one row (numbers, dates and strings as stored in the sheet).
+        """
+        from openpyxl import load_workbook     # Imported on first use to keep imports fast
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            sheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+            for row in sheet.iter_rows(values_only=True):
+                if any(value is not None and value != "" for value in row):
+                    yield row
+        finally:
+            workbook.close()
+
+    def _rows(self, file_path, sheet_name):
+        # The first sheet unless one is named, so `read_excel` can be replaced by a one-argument reader
+        return self.read_excel(file_path, sheet_name) if sheet_name else self.read_excel(file_path)
+
+    def extract_table(self, file_path, sheet_name=None):
+        """
+        Returns the rows of a small worksheet, header first, as lists of cell values.
+        Use `iter_batches` for large sheets.
+        """
+        return [list(row) for row in self._rows(file_path, sheet_name)]
+
+    def iter_batches(self, file_path, sheet_name=None, stats=None):
+        """
+        Streams a worksheet as typed column batches. The first row is the header; the column
+        kinds are inferred from the first batch. A number or timestamp column whose later cells
+        do not fit its kind (e.g. "N/A" or a note) is widened to text from that batch on, rather
+        than turning those cells into nulls; the widened columns are listed in stats["widened"].
+        Args:
+            file_path (str): The .xlsx file.
+            sheet_name (str, optional): The worksheet. Defaults to the first one.
+            stats (dict, optional): Receives "rows", "invalid_values", "kinds" and "widened".
+        Yields:
+            dict: Column name -> numpy array (float64, datetime64[us] or object for text).
+        """
+        stats = stats if stats is not None else {}
+        stats.update(rows=0, invalid_values=0, kinds={}, widened=[])
+        rows = iter(self._rows(file_path, sheet_name))
+        header = next(rows, None)
+        if header is None:
+            return
+        names = column_names(header)
+        kinds = None
+
+        def flush(buffer):
+            nonlocal kinds
+            # Transpose the buffered rows, padding short rows with empty cells
+            columns = [[row[i] if i < len(row) else None for row in buffer] for i in range(len(names))]
+            if kinds is None:
+                kinds = [infer_column_kind(values) for values in columns]
+                stats["kinds"] = dict(zip(names, kinds))
+            batch = {}
+            for i, (name, values) in enumerate(zip(names, columns)):
+                batch[name], invalid = to_column(values, kinds[i])
+                if invalid and kinds[i] != "text":
+                    # Keep the cells: the column becomes text, including for the batches still to come
+                    kinds[i] = stats["kinds"][name] = "text"
+                    stats["widened"].append(name)
+                    batch[name], invalid = to_column(values, "text")
+                stats["invalid_values"] += invalid
+            stats["rows"] += len(buffer)
+            return batch
+
+        buffer = []
+        for row in rows:
+            buffer.append(row)
+            if len(buffer) == self.batch_rows:
+                yield flush(buffer)
+                buffer = []
+        if buffer:
+            yield flush(buffer)
+
+    def load_to_postgres(self, file_path, engine, table_prefix=None, sheets=None, replace=False, table_names=None):
+        """
+        Bulk-loads worksheets into PostgreSQL tables with COPY, one column batch at a time and
+        one transaction per sheet. Tables are created from the inferred column kinds if missing;
+        a column widened to text by a later batch is altered to TEXT in the same transaction.
+        Args:
+            file_path (str): The .xlsx file.
+            engine (sqlalchemy.engine.Engine): The PostgreSQL engine, e.g. from `connection_registry.get_engine`.
+            table_prefix (str, optional): Prefix of the table names (<prefix>_<sheet>). Defaults to the file name.
+            sheets (list, optional): The worksheets to load. Defaults to all.
+            replace (bool): Empty existing tables before loading.
+            table_names (dict, optional): Sheet -> table name replacing <prefix>_<sheet>, e.g. to
+                load a sheet into the metrics table of the SQL query route.
+        Returns:
+            list: One dict per sheet with table, rows, invalid_values, widened, seconds and rows_per_second.
+        """
+        prefix = table_prefix or os.path.splitext(os.path.basename(file_path))[0]
+        report = []
+        for sheet_name in sheets or self.sheet_names(file_path):
+            table = (table_names or {}).get(sheet_name) or column_names([f"{prefix}_{sheet_name}"])[0]
+            start = time.perf_counter()
+            stats = {}
+            connection = engine.raw_connection()    # A pooled DBAPI connection for COPY
+            try:
+                cursor = connection.cursor()
+                altered = 0
+                for batch_number, batch in enumerate(self.iter_batches(file_path, sheet_name, stats)):
+                    if batch_number == 0:
+                        self._create_table(cursor, table, stats["kinds"], replace)
+                    for name in stats["widened"][altered:]:
+                        cursor.execute(f"ALTER TABLE {quote_identifier(table)} ALTER COLUMN {quote_identifier(name)} TYPE TEXT")
+                    altered = len(stats["widened"])
+                    copy_batch(cursor, table, batch)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                connection.close()
+            seconds = time.perf_counter() - start
+            report.append({"sheet": sheet_name, "table": table, "rows": stats.get("rows", 0),
+                           "invalid_values": stats.get("invalid_values", 0), "widened": stats.get("widened", []),
+                           "seconds": seconds,
+                           "rows_per_second": stats.get("rows", 0) / seconds if seconds else 0.0})
+        return report
+
+    @staticmethod
+    def _create_table(cursor, table, kinds, replace):
+        columns = ", ".join(f"{quote_identifier(name)} {POSTGRES_TYPES[kind]}" for name, kind in kinds.items())
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {quote_identifier(table)} ({columns})")
+        if replace:
+            cursor.execute(f"TRUNCATE {quote_identifier(table)}")
+
+
+def copy_batch(cursor, table, batch):
+    """
+    Streams one column batch into a table with COPY ... FROM STDIN (CSV), using the COPY API
+    of psycopg2 (`copy_expert`) or psycopg 3 (`copy`).
+    """
+    columns = ", ".join(quote_identifier(name) for name in batch)
+    sql = f"COPY {quote_identifier(table)} ({columns}) FROM STDIN WITH (FORMAT csv)"
+    data = batch_to_csv(batch)
+    if hasattr(cursor, "copy_expert"):
+        cursor.copy_expert(sql, io.StringIO(data))
+    else:
+        with cursor.copy(sql) as copy:
+            copy.write(data)
@@ -1,2 +1,731 @@
 # main.py
+# Main entry point to orchestrate pipelines and workflows
 
+import argparse     # Command line parsing
+import functools    # Picklable embedder and entity processor factories for the worker processes
+import json         # JSON report output
+import os           # OS library for environment variable access
+import time         # Throughput of the NER command
+
+from config.config import chunk_size_setting, load_pipeline_config
+from databases.vector_codec import VECTOR_FORMATS
+from models.finbert import INFERENCE_BACKENDS, MIN_COSINE, MIN_RECALL
+
+
+def build_parser(settings=None):
+    """
+    Builds the command line parser with one sub-command per workflow. The throughput options
+    default to the pipeline settings (config/pipeline_config.yml and the tuned profile).
+    """
+    settings = settings or load_pipeline_config()
+    embedding, upload = settings["embedding"], settings["upload"]
+    parser = argparse.ArgumentParser(description="Reddit business analysis pipeline")
+    parser.add_argument("--metrics-file", default=os.getenv('PIPELINE_METRICS_FILE'),
+                        help="Write the stage metrics in Prometheus text format to this file when the command ends")
+    parser.add_argument("--metrics-port", type=int, default=None, help="Serve the metrics at http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--trace-file", default=os.getenv('PIPELINE_TRACE_FILE'), help="Append per-document traces as JSON lines")
+    parser.add_argument("--profile", default=os.getenv('PIPELINE_PROFILE'),
+                        help="Profile the pipeline stages with cProfile: 'all' or a comma-separated list of stages")
+    parser.add_argument("--profile-dir", default=os.getenv('PIPELINE_PROFILE_DIR', 'logs/profiles'),
+                        help="Directory of the .prof files and summaries")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser("ingest-corpus", help="Extract, embed and load every PDF in a directory")
+    ingest.add_argument("input_dir", nargs="?", default="data/raw_data", help="Directory with the PDF filings")
+    ingest.add_argument("--extract-workers", type=int, default=settings["extraction"]["workers"],
+                        help="Processes extracting and chunking PDFs")
+    ingest.add_argument("--embed-workers", type=int, default=embedding["embed_workers"], help="FinBERT embedding worker processes")
+    ingest.add_argument("--torch-threads", type=int, default=embedding["torch_threads"], help="Torch threads per embedding worker")
+    ingest.add_argument("--queue-size", type=int, default=settings["extraction"]["queue_size"],
+                        help="Chunk windows waiting for the embedding workers")
+    ingest.add_argument("--embedding-batch-size", type=int, default=embedding["batch_size"], help="Chunks per forward pass")
+    ingest.add_argument("--window-size", type=int, default=embedding["window_size"], help="Chunks per queued window")
+    ingest.add_argument("--inference-backend", default=os.getenv('INFERENCE_BACKEND', embedding["inference_backend"]),
+                        choices=INFERENCE_BACKENDS, help="FinBERT CPU inference backend of the embedding workers")
+    ingest.add_argument("--chunker", default=os.getenv('CHUNKER', settings["chunking"]["chunker"]), choices=["tokens", "characters"],
+                        help="Chunk on FinBERT token budgets or on characters")
+    ingest.add_argument("--chunk-size", type=int, default=None,
+                        help="Chunk size in tokens or characters; defaults to the configured size of the chunker")
+    ingest.add_argument("--upload-concurrency", type=int, default=upload["max_in_flight"], help="Astra insert_many batches in flight")
+    ingest.add_argument("--upload-batch-size", type=int, default=upload["batch_size"], help="Initial documents per insert_many call")
+    ingest.add_argument("--db-type", default=os.getenv('VECTOR_DB_TYPE', 'vector_db'),
+                        choices=["vector_db", "local_vector_db"], help="Astra DB or the local vector DB")
+    ingest.add_argument("--vector-format", default=os.getenv('LOCAL_VECTOR_FORMAT', 'float32'), choices=VECTOR_FORMATS,
+                        help="Storage format of a new local collection (Astra always indexes float32)")
+    ingest.add_argument("--manifest", default=os.getenv('INGESTION_MANIFEST_PATH', 'data/processed/ingestion_manifest.json'),
+                        help="Ingestion manifest used to skip unchanged files and chunks")
+    ingest.add_argument("--full", action="store_true", help="Ignore the manifest and ingest every chunk")
+    ingest.add_argument("--dedup-index", default=os.getenv('DEDUP_INDEX_PATH', 'data/processed/dedup_index.npz'),
+                        help="Near-duplicate index kept next to the manifest")
+    ingest.add_argument("--no-dedup", action="store_true", help="Embed and store near-duplicate chunks as well")
+    ingest.add_argument("--ner-workers", type=int, default=1,
+                        help="NER worker processes tagging the chunks next to the embedding workers; 0 disables NER")
+    ingest.add_argument("--ner-engine", default="lexicon", choices=["spacy", "lexicon", "both"],
+                        help="Compiled financial lexicon, spaCy model, or the lexicon as a pre-pass before spaCy")
+    ingest.add_argument("--ner-model", default=os.getenv('SPACY_MODEL', 'en_core_web_sm'), help="spaCy model of the NER workers")
+    ingest.add_argument("--lexicon", help="CSV of term,label rows replacing the built-in financial lexicon")
+    ingest.add_argument("--report", default=None, help="Write the JSON ingestion report to this file")
+
+    formats = commands.add_parser("vector-format-report", help="Measure recall against size for each vector format")
+    formats.add_argument("--vectors", default=None, help="A .npy file of embeddings; synthetic vectors if omitted")
+    formats.add_argument("--count", type=int, default=20_000, help="Number of synthetic vectors")
+    formats.add_argument("--dimension", type=int, default=768, help="Dimension of the synthetic vectors")
+    formats.add_argument("--queries", type=int, default=200, help="Number of query vectors")
+    formats.add_argument("--k", type=int, default=10, help="Neighbours compared for recall@k")
+    formats.add_argument("--report", default=None, help="Write the JSON report to this file")
+
+    inference = commands.add_parser("inference-benchmark", help="Compare FinBERT inference backends on real chunks")
+    inference.add_argument("pdf", nargs="?", default="data/raw_data/reddit_earnings_call_transcript.pdf",
+                           help="PDF whose chunks are embedded")
+    inference.add_argument("--limit", type=int, default=256, help="Number of chunks embedded")
+    inference.add_argument("--backends", nargs="+", default=list(INFERENCE_BACKENDS), choices=INFERENCE_BACKENDS)
+    inference.add_argument("--batch-size", type=int, default=32, help="Chunks per forward pass")
+    inference.add_argument("--repeats", type=int, default=3, help="Timed runs per backend")
+    inference.add_argument("--min-cosine", type=float, default=MIN_COSINE, help="Minimum cosine to eager float32")
+    inference.add_argument("--min-recall", type=float, default=MIN_RECALL, help="Minimum neighbour recall@10")
+    inference.add_argument("--report", default=None, help="Write the JSON report to this file")
+
+    startup = commands.add_parser("startup-report", help="Measure module import and model load times")
+    startup.add_argument("--load-model", action="store_true", help="Also measure the FinBERT load time")
+    startup.add_argument("--report", default=None, help="Write the JSON report to this file")
+
+    query = commands.add_parser("query", help="Answer a question from the SQL and vector databases")
+    query.add_argument("question", help="The question, e.g. 'What was ad revenue in Q3 2024?'")
+    query.add_argument("--budget", type=float, default=None, help="Latency budget in seconds for this question")
+    query.add_argument("--db-type", default=os.getenv('VECTOR_DB_TYPE', 'vector_db'),
+                       choices=["vector_db", "local_vector_db"], help="Vector database searched for passages")
+    query.add_argument("--top-k", type=int, default=5, help="Passages returned by the vector search")
+    query.add_argument("--metrics-table", default=os.getenv('METRICS_TABLE', 'financial_metrics'),
+                       help="Table of (metric, period, value, unit, source) rows, e.g. filled by load-excel --metrics-sheet")
+    query.add_argument("--retrieval", default=os.getenv('RETRIEVAL_MODE', 'vector'),
+                       choices=["vector", "prefilter", "rrf", "lexical"],
+                       help="Vector search only, vector search over the BM25 candidates, both rankings fused, or BM25 only")
+    query.add_argument("--lexical-index", default=os.getenv('LEXICAL_INDEX_PATH', 'data/processed/bm25_index.npz'),
+                       help="BM25 index of the hybrid retrieval modes")
+    query.add_argument("--manifest", default=os.getenv('INGESTION_MANIFEST_PATH', 'data/processed/ingestion_manifest.json'),
+                       help="Ingestion manifest telling whether the BM25 index and the query cache are up to date")
+    query.add_argument("--cache", action="store_true", default=os.getenv('QUERY_CACHE', '').lower() in ("1", "true"),
+                       help="Answer repeated and equivalent questions from the query cache, cleared by each ingestion")
+    query.add_argument("--cache-path", default=os.getenv('QUERY_CACHE_PATH', 'data/processed/query_cache.json'),
+                       help="Query cache kept between runs")
+
+    ner = commands.add_parser("ner", help="Run batched spaCy NER over the chunks of PDF filings")
+    ner.add_argument("input_dir", nargs="?", default="data/raw_data", help="Directory with the PDF filings")
+    ner.add_argument("--model", default=os.getenv('SPACY_MODEL', 'en_core_web_sm'), help="spaCy model or model directory")
+    ner.add_argument("--batch-size", type=int, default=256, help="Chunks per nlp.pipe batch")
+    ner.add_argument("--processes", type=int, default=1, help="nlp.pipe worker processes")
+    ner.add_argument("--chunker", default=os.getenv('CHUNKER', 'tokens'), choices=["tokens", "characters"])
+    ner.add_argument("--output", default="data/processed/entities.jsonl", help="JSON lines of (chunk id, entities)")
+    ner.add_argument("--engine", default="both", choices=["spacy", "lexicon", "both"],
+                     help="spaCy model, compiled financial lexicon, or the lexicon as a pre-pass before spaCy")
+    ner.add_argument("--lexicon", help="CSV of term,label rows replacing the built-in financial lexicon")
+
+    excel = commands.add_parser("load-excel", help="Bulk-load the sheets of a workbook into PostgreSQL")
+    excel.add_argument("workbook", help="The .xlsx file")
+    excel.add_argument("--table-prefix", default=None, help="Table name prefix; defaults to the file name")
+    excel.add_argument("--sheets", nargs="+", default=None, help="Sheets to load; defaults to all")
+    excel.add_argument("--batch-rows", type=int, default=50_000, help="Rows per COPY batch")
+    excel.add_argument("--replace", action="store_true", help="Empty existing tables first")
+    excel.add_argument("--metrics-sheet", default=None,
+                       help="Sheet with metric, period, value, unit and source columns (periods like 'Q3 2024' or "
+                            "'FY2023') loaded into the metrics table the query command looks figures up in")
+    excel.add_argument("--metrics-table", default=os.getenv('METRICS_TABLE', 'financial_metrics'),
+                       help="Table the metrics sheet is loaded into")
+
+    bench = commands.add_parser("benchmark", help="Benchmark every pipeline stage on a synthetic corpus")
+    bench.add_argument("--documents", type=int, default=4, help="Synthetic filing PDFs generated")
+    bench.add_argument("--pages", type=int, default=10, help="Pages per synthetic PDF")
+    bench.add_argument("--workbook-rows", type=int, default=5_000, help="Rows of the synthetic metrics workbook")
+    bench.add_argument("--no-bundled", action="store_true", help="Leave out the bundled earnings call transcript")
+    bench.add_argument("--stages", nargs="+", default=None, help="Stages reported; defaults to all")
+    bench.add_argument("--chunker", default=os.getenv('CHUNKER', 'tokens'), choices=["tokens", "characters"])
+    bench.add_argument("--chunk-size", type=int, default=None, help="Chunk size in tokens or characters")
+    bench.add_argument("--batch-size", type=int, default=32, help="Chunks per embedding forward pass")
+    bench.add_argument("--workdir", default=None, help="Keep the corpus and local databases here instead of a temp dir")
+    bench.add_argument("--output", default="data/processed/benchmark.json", help="JSON benchmark result")
+    bench.add_argument("--baseline", default=None, help="Earlier JSON result; exit with status 1 on regressions")
+    bench.add_argument("--max-regression", type=float, default=0.2, help="Tolerated relative slowdown per metric")
+
+    tune = commands.add_parser("autotune", help="Calibrate batch sizes, torch threads and upload concurrency on this machine")
+    tune.add_argument("--pdf", default=None, help="Embed the chunks of this PDF instead of synthetic filing text")
+    tune.add_argument("--stages", nargs="+", default=["embed", "upload"], choices=["embed", "upload"])
+    tune.add_argument("--memory-cap-mb", type=float, default=settings["autotune"]["memory_cap_mb"],
+                      help="Settings whose peak resident memory exceeds this are rejected")
+    tune.add_argument("--db-type", default="local_vector_db", choices=["vector_db", "local_vector_db"],
+                      help="Calibrate uploads against the configured Astra collection, or measure a throwaway "
+                           "local one without writing upload settings")
+    tune.add_argument("--profile-path", default=settings["autotune"]["profile_path"], help="Tuned profile written")
+    tune.add_argument("--dry-run", action="store_true", help="Print the selected settings without writing the profile")
+
+    automate = commands.add_parser("automate", help="Run the extract -> NLP -> embed -> load DAG with checkpoint/resume")
+    automate.add_argument("input_dir", nargs="?", default="data/raw_data", help="Directory with the PDF filings")
+    automate.add_argument("--checkpoint-dir", default=os.getenv('PIPELINE_CHECKPOINT_DIR', 'data/processed/checkpoints'),
+                          help="Checkpointed task outputs; a later run resumes from them")
+    automate.add_argument("--workers", type=int, default=settings["extraction"]["workers"], help="Tasks running at once")
+    automate.add_argument("--embed-concurrency", type=int, default=1, help="Embedding tasks running at once")
+    automate.add_argument("--force", action="store_true", help="Re-run every task, ignoring the checkpoints")
+    automate.add_argument("--db-type", default=os.getenv('VECTOR_DB_TYPE', 'vector_db'),
+                          choices=["vector_db", "local_vector_db"], help="Astra DB or the local vector DB")
+    automate.add_argument("--store-dir", default=os.getenv('INTERMEDIATE_STORE_DIR', 'data'),
+                          help="Data directory of the columnar intermediate store (pages, chunks, entities, embeddings)")
+    automate.add_argument("--no-store", action="store_true", help="Do not persist the intermediate artifacts")
+    automate.add_argument("--manifest", default=os.getenv('INGESTION_MANIFEST_PATH', 'data/processed/ingestion_manifest.json'),
+                          help="Ingestion manifest; chunks of changed PDFs that no longer exist are deleted")
+    automate.add_argument("--lexical-index", default=os.getenv('LEXICAL_INDEX_PATH', 'data/processed/bm25_index.npz'),
+                          help="BM25 index rebuilt from the stored chunks after a successful run")
+    automate.add_argument("--report", default=None, help="Write the JSON run report to this file")
+
+    artifacts = commands.add_parser("artifacts", help="Inspect the intermediate store or re-run a stage from it")
+    artifacts.add_argument("action", choices=["stats", "ner", "embed", "index", "export"],
+                           help="stats, re-run NER or embedding from the stored chunks, load the stored embeddings "
+                                "into the vector DB, or export a table to Parquet")
+    artifacts.add_argument("--store-dir", default=os.getenv('INTERMEDIATE_STORE_DIR', 'data'))
+    artifacts.add_argument("--sources", nargs="+", default=None, help="Only these documents")
+    artifacts.add_argument("--db-type", default=os.getenv('VECTOR_DB_TYPE', 'vector_db'),
+                           choices=["vector_db", "local_vector_db"], help="Vector database of the index action")
+    artifacts.add_argument("--table", default="chunks", help="Table exported by the export action")
+    artifacts.add_argument("--output", default=None, help="Parquet file of the export action")
+
+    lexical = commands.add_parser("lexical-index", help="Build the BM25 index of the hybrid retrieval modes")
+    lexical.add_argument("--source", default="store", choices=["store", "collection"],
+                         help="Index the chunks of the intermediate store or the documents of the vector collection")
+    lexical.add_argument("--store-dir", default=os.getenv('INTERMEDIATE_STORE_DIR', 'data'))
+    lexical.add_argument("--db-type", default=os.getenv('VECTOR_DB_TYPE', 'vector_db'),
+                         choices=["vector_db", "local_vector_db"], help="Vector database of the collection source")
+    lexical.add_argument("--output", default=os.getenv('LEXICAL_INDEX_PATH', 'data/processed/bm25_index.npz'),
+                         help="The index file written")
+    lexical.add_argument("--manifest", default=os.getenv('INGESTION_MANIFEST_PATH', 'data/processed/ingestion_manifest.json'),
+                         help="Ingestion manifest whose fingerprint is stored with the index")
+
+    vector_index = commands.add_parser("vector-index", help="Train the IVF index of a local vector collection")
+    vector_index.add_argument("--collection", default=os.getenv('ASTRA_DB_COLLECTION_NAME', 'reddit_earnings_call_transcripts'),
+                              help="The local collection indexed")
+    vector_index.add_argument("--n-lists", type=int, default=None, help="Inverted lists; defaults to sqrt(documents)")
+    vector_index.add_argument("--nprobe", type=int, default=8, help="Lists probed per query (recall vs. latency)")
+    vector_index.add_argument("--sample-size", type=int, default=100_000, help="Vectors used to train the centroids")
+
+    health = commands.add_parser("db-health", help="Check the database connections and report pool usage")
+    health.add_argument("--db-type", default=os.getenv('VECTOR_DB_TYPE', 'vector_db'),
+                        choices=["vector_db", "local_vector_db"], help="Vector database checked besides PostgreSQL")
+    return parser
+
+
+def run_ingest_corpus(args):
+    """Runs the multi-process corpus ingestion into the Astra DB collection."""
+    from databases.astra_uploader import AstraBulkUploader, UploadError, delete_documents
+    from databases.db_connector import DbConnector
+    from databases.ingestion_manifest import IngestionManifest
+    from pipelines.embedding_pipeline import ingest_corpus
+    from pipelines.embedding_pipeline import load_default_embedder
+    from pipelines.extraction_pipeline import list_pdf_files
+    from pipelines.nlp_pipeline import load_entity_processor
+    from nlp.dedup import NearDuplicateIndex
+
+    db = DbConnector(db_type=args.db_type).get_connection()
+    collection_name = os.getenv('ASTRA_DB_COLLECTION_NAME', 'reddit_earnings_call_transcripts')
+    if args.db_type == "local_vector_db":
+        collection = db.create_collection(collection_name, vector_format=args.vector_format)
+    else:
+        collection = db.get_collection(collection_name)
+    settings = load_pipeline_config()
+    uploader = AstraBulkUploader(collection, batch_size=args.upload_batch_size, max_in_flight=args.upload_concurrency,
+                                 min_batch_size=min(settings["upload"]["min_batch_size"], args.upload_batch_size),
+                                 max_batch_size=max(settings["upload"]["max_batch_size"], args.upload_batch_size))
+    manifest = None if args.full else IngestionManifest(args.manifest)
+    # The persisted index only stays consistent with the manifest; a full run deduplicates from scratch
+    if args.no_dedup:
+        dedup_index = None
+    elif manifest is None:
+        dedup_index = NearDuplicateIndex()
+    else:
+        dedup_index = NearDuplicateIndex.load(args.dedup_index)
+
+    report = ingest_corpus(
+        list_pdf_files(args.input_dir),
+        uploader.submit,
+        embedder_factory=functools.partial(load_default_embedder, inference_backend=args.inference_backend),
+        extract_workers=args.extract_workers,
+        embed_workers=args.embed_workers,
+        torch_threads=args.torch_threads,
+        queue_size=args.queue_size,
+        window_size=args.window_size,
+        batch_size=args.embedding_batch_size,
+        manifest=manifest,
+        chunker=args.chunker,
+        chunk_size=args.chunk_size or chunk_size_setting(settings, args.chunker),
+        dedup=not args.no_dedup,
+        dedup_index=dedup_index,
+        delete_documents=lambda document_ids: delete_documents(collection, document_ids),
+        flush_documents=uploader.flush,     # Files enter the manifest only once their uploads are confirmed
+        entity_processor_factory=functools.partial(load_entity_processor, args.ner_engine, args.lexicon, args.ner_model),
+        ner_workers=args.ner_workers,
+    )
+    try:
+        report["upload"] = uploader.close()
+    except UploadError as e:
+        report["upload"] = dict(uploader.stats)     # Nothing is left queued after the flush above
+        print(e)
+    report["upload_failed_sources"] = [entry["source"] for entry in report["files"] if entry.get("failed_stage") == "upload"]
+    print(f"Ingested {report['succeeded']} files ({report['failed']} failed, {report['unchanged']} unchanged), "
+          f"{report['chunks']} chunks at {report['chunks_per_second']:.1f} chunks/s")
+    print(f"Near-duplicates: {report['dedup']['duplicates']} chunks stored as references, "
+          f"{report['dedup']['inference_saved']:.1%} of embeddings and {report['dedup']['storage_saved']:.1%} of documents saved")
+    if report["upload_failed_sources"]:
+        print(f"Upload failed for {len(report['upload_failed_sources'])} files; they will be re-ingested next run")
+    if args.db_type == "local_vector_db":
+        report["vector_index"] = refresh_vector_index(collection)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    if report["failed"]:
+        raise SystemExit(1)
+    return report
+
+
+def run_vector_format_report(args):
+    """Measures recall@k and the storage and upload size of every vector format."""
+    import numpy as np
+    from databases.vector_codec import recall_vs_size_report, synthetic_embeddings
+
+    if args.vectors:
+        vectors = np.load(args.vectors).astype(np.float32)
+    else:
+        vectors = synthetic_embeddings(args.count, args.dimension)
+    # Queries are perturbed corpus vectors, so each has true neighbours in the corpus
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)]
+    queries = queries + 0.3 * np.std(vectors) * rng.normal(size=queries.shape).astype(np.float32)
+
+    report = recall_vs_size_report(vectors, queries, k=args.k)
+    for row in report:
+        print(f"{row['format']:>12}: {row['bytes_per_vector']:>6} B/vector, "
+              f"{row['mb_per_million_vectors']:>8.0f} MB per million, {row['upload_bytes_per_vector']:>6} B uploaded, "
+              f"recall@{args.k} {row['recall_at_k']:.3f}")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def run_inference_benchmark(args):
+    """Benchmarks the FinBERT inference backends on chunks of a PDF and picks the fastest within tolerance."""
+    import itertools
+    from models.finbert import benchmark_backends, select_backend
+    from preprocessor import PDFPreprocessor, chunk_pages, get_text_splitter, stream_pages_and_metadata_from_pdf
+
+    preprocessor = PDFPreprocessor()
+    preprocessor.embedding_cache = None     # Measure inference, not cache hits
+    pages, _ = stream_pages_and_metadata_from_pdf(args.pdf)
+    splitter = get_text_splitter(preprocessor.chunker, tokenizer=preprocessor.tokenizer)
+    texts = [chunk for _, chunk in itertools.islice(chunk_pages(pages, splitter), args.limit)]
+
+    def embed(texts, backend):
+        preprocessor.inference_backend = backend
+        return preprocessor.generate_embeddings(texts, batch_size=args.batch_size)
+
+    report = benchmark_backends(embed, texts, backends=args.backends, repeats=args.repeats)
+    for entry in report:
+        print(f"{entry['backend']:>13}: {entry['texts_per_second']:7.1f} chunks/s, min cosine {entry['min_cosine']:.4f}, "
+              f"recall@10 {entry['recall_at_k']:.3f} (prepared in {entry['prepare_seconds']:.1f}s)")
+    selected = select_backend(report, args.min_cosine, args.min_recall)
+    print(f"Fastest backend within tolerance: {selected}")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"chunks": len(texts), "backends": report, "selected": selected}, f, indent=2)
+    return report
+
+
+def run_startup_report(args):
+    """Measures the cold import time of the project modules and, optionally, the model load time."""
+    from utils.startup import startup_report
+
+    report = startup_report(load_model=args.load_model, cwd=os.path.dirname(os.path.abspath(__file__)))
+    for entry in report["imports"]:
+        heavy = ", ".join(entry["heavy_modules"]) or "none"
+        print(f"{entry['module']:>32}: {entry['seconds']:.3f}s (heavy dependencies loaded: {heavy})")
+    for entry in report["models"]:
+        print(f"{entry['model']:>32}: loaded in {entry['load_seconds']:.2f}s")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def run_query(args):
+    """Routes one question and prints the merged results with the per-stage timings."""
+    from databases.db_connector import DbConnector
+    from query_handler.query_router import QueryRouter
+
+    vector_db = DbConnector(db_type=args.db_type).get_connection()
+    sql_db = DbConnector(db_type="postgresql").get_connection() if os.getenv('DB_HOST') else None
+    cache = None
+    if args.cache:
+        from query_handler.query_cache import ManifestWatcher, QueryCache
+        watcher = ManifestWatcher(args.manifest)
+        # Answers depend on the ingested data and on how the question is routed
+        settings = f"{args.db_type}|{sql_db is not None}|{args.metrics_table}|{args.retrieval}|{args.top_k}"
+        cache = QueryCache.load(args.cache_path, version=lambda: f"{watcher.version()}|{settings}")
+    router = QueryRouter(sql_db=sql_db, vector_db=vector_db, top_k=args.top_k, metrics_table=args.metrics_table,
+                         cache=cache)
+    if args.retrieval != "vector":
+        from databases.ingestion_manifest import IngestionManifest
+        from pipelines.retrieval_pipeline import BM25Index, HybridRetriever
+        index = BM25Index.load(args.lexical_index)
+        stale = not index.is_current(IngestionManifest(args.manifest))
+        if stale:
+            print("The BM25 index predates the last ingestion; prefilter falls back to rrf (run lexical-index)")
+        router.retriever = HybridRetriever(vector_db.get_collection(router.collection_name), index,
+                                           router.embed_query, mode=args.retrieval, stale=stale)
+    try:
+        result = router.route_query(args.question, budget=args.budget)
+    finally:
+        router.close()
+    if cache is not None:
+        cache.save(args.cache_path)
+    for item in result["results"]:
+        if item["source"] == "sql":
+            print(f"[sql] {item['metric']} {item['period']}: {item['value']} {item['unit'] or ''}")
+        elif item.get("score") is not None:
+            print(f"[{args.retrieval} {item['score']:.4f}] {item['text'][:200]}")
+        else:
+            print(f"[vector {item['similarity']:.3f}] {item['text'][:200]}")
+    timings = ", ".join(f"{stage} {seconds * 1000:.0f} ms" for stage, seconds in result["timings"].items())
+    print(f"Intent: {result['intent']} ({timings})")
+    if result.get("cache"):
+        print(f"Answered from the {result['cache']} query cache")
+    if result["timed_out"]:
+        print(f"Over the latency budget: {', '.join(result['timed_out'])}")
+    for stage, error in result["errors"].items():
+        print(f"{stage} failed: {error}")
+    return result
+
+
+def run_ner(args):
+    """Streams the chunks of every PDF through batched NER and writes one JSON line per chunk."""
+    from pipelines.extraction_pipeline import extract_and_chunk_pdf, list_pdf_files
+    from pipelines.nlp_pipeline import load_entity_processor
+
+    def chunks():
+        for path in list_pdf_files(args.input_dir):
+            for _, chunk_id, _, chunk in extract_and_chunk_pdf(path, chunker=args.chunker)["chunks"]:
+                yield chunk_id, str(chunk)
+
+    processor = load_entity_processor(args.engine, args.lexicon, args.model, batch_size=args.batch_size,
+                                      n_process=args.processes)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    count, start = 0, time.perf_counter()
+    with open(args.output, "w") as f:
+        for chunk_id, entities in processor.iter_entities(chunks()):
+            f.write(json.dumps({"id": chunk_id, "entities": entities}) + "\n")
+            count += 1
+    seconds = time.perf_counter() - start
+    print(f"Tagged {count} chunks in {seconds:.1f}s ({count / seconds if seconds else 0.0:.1f} chunks/s) -> {args.output}")
+
+
+def run_load_excel(args):
+    """Streams the sheets of a workbook into PostgreSQL tables with COPY."""
+    from databases import connection_registry
+    from extractors.excel_extractor import ExcelExtractor, column_names
+    from query_handler.query_router import METRICS_COLUMNS
+
+    extractor = ExcelExtractor(batch_rows=args.batch_rows)
+    sheets, table_names = args.sheets, None
+    if args.metrics_sheet:
+        # The SQL route selects these columns, so a sheet without them would only fail at query time
+        rows = extractor.read_excel(args.workbook, args.metrics_sheet)
+        header = column_names(next(rows, ()))
+        rows.close()    # Closes the workbook after the header row
+        missing = [column for column in METRICS_COLUMNS if column not in header]
+        if missing:
+            raise SystemExit(f"Sheet {args.metrics_sheet} lacks the metrics columns {', '.join(missing)}")
+        table_names = {args.metrics_sheet: args.metrics_table}
+        if sheets and args.metrics_sheet not in sheets:
+            sheets = sheets + [args.metrics_sheet]
+    engine = connection_registry.get_engine(connection_registry.postgres_url_from_env())
+    report = extractor.load_to_postgres(args.workbook, engine, table_prefix=args.table_prefix, sheets=sheets,
+                                        replace=args.replace, table_names=table_names)
+    for entry in report:
+        print(f"{entry['sheet']} -> {entry['table']}: {entry['rows']} rows at {entry['rows_per_second']:.0f} rows/s "
+              f"({entry['invalid_values']} values could not be parsed)")
+        if entry["widened"]:
+            print(f"  Widened to text by later rows: {', '.join(entry['widened'])}")
+    return report
+
+
+def run_benchmark(args):
+    """Generates the benchmark corpus, measures every stage and writes the JSON result."""
+    import tempfile
+    from utils.benchmark import STAGES, benchmark_report, build_corpus, compare_results, run_benchmarks
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or tmp
+        corpus = build_corpus(os.path.join(workdir, "corpus"), args.documents, args.pages, args.workbook_rows,
+                              include_bundled=not args.no_bundled)
+        results = run_benchmarks(corpus, workdir, stages=args.stages or STAGES, chunker=args.chunker,
+                                 chunk_size=args.chunk_size, batch_size=args.batch_size)
+    config = {key: getattr(args, key) for key in ("documents", "pages", "workbook_rows", "no_bundled", "stages",
+                                                  "chunker", "chunk_size", "batch_size")}
+    report = benchmark_report(corpus, results, config)
+    for result in results.values():
+        rss = f"{result['peak_rss_mb']:.0f} MB" if result["peak_rss_mb"] is not None else "n/a"
+        print(f"{result['stage']:>9}: {result['docs_per_second']:8.2f} docs/s, {result['chunks_per_second']:9.1f} chunks/s, "
+              f"p50 {result['p50_ms']:8.2f} ms, p99 {result['p99_ms']:8.2f} ms, peak RSS {rss}")
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_results(json.load(f), report, args.max_regression)
+        for entry in regressions:
+            print(f"Regression in {entry['stage']} {entry['metric']}: {entry['baseline']:.2f} -> "
+                  f"{entry['current']:.2f} ({entry['change']:+.0%})")
+        if regressions:
+            raise SystemExit(1)
+    return report
+
+
+def run_autotune(args):
+    """Measures the throughput settings on this machine and writes the tuned profile."""
+    from utils.autotune import autotune, save_profile
+
+    settings = load_pipeline_config(use_profile=False)
+    settings["autotune"]["memory_cap_mb"] = args.memory_cap_mb
+    collection = None
+    if args.db_type == "vector_db" and "upload" in args.stages:
+        from databases.db_connector import DbConnector
+        collection = DbConnector(db_type="vector_db").get_connection().get_collection(
+            os.getenv('ASTRA_DB_COLLECTION_NAME', 'reddit_earnings_call_transcripts'))
+    profile = autotune(settings, collection=collection, pdf_path=args.pdf, stages=args.stages)
+    for entry in profile["measurements"].get("embedding", []):
+        print(f"embed  batch {entry['batch_size']:>4}, {entry['torch_threads']:>2} threads: "
+              f"{entry['chunks_per_second']:8.1f} chunks/s, est. peak RSS {entry['estimated_rss_mb'] or 0:.0f} MB")
+    for entry in profile["measurements"].get("upload", []):
+        print(f"upload batch {entry['batch_size']:>4}, {entry['max_in_flight']:>2} in flight: "
+              f"{entry['documents_per_second']:8.1f} docs/s, est. peak RSS {entry['estimated_rss_mb'] or 0:.0f} MB")
+    if collection is None and "upload" in args.stages:
+        print("Uploads were measured against a local database; no upload settings are written (use --db-type vector_db)")
+    print(f"Selected: embedding {profile['embedding']}, upload {profile['upload']}")
+    if not args.dry_run:
+        print(f"Tuned profile written to {save_profile(profile, args.profile_path)}")
+    return profile
+
+
+def run_automate(args):
+    """Runs the ingestion DAG, skipping the tasks whose checkpoints are up to date."""
+    from databases.db_connector import DbConnector
+    from databases.ingestion_manifest import IngestionManifest
+    from databases.intermediate_store import IntermediateStore
+    from pipelines.automation import DAGRunner, build_ingestion_dag
+    from pipelines.extraction_pipeline import list_pdf_files
+
+    settings = load_pipeline_config()
+    db = DbConnector(db_type=args.db_type).get_connection()
+    collection_name = os.getenv('ASTRA_DB_COLLECTION_NAME', 'reddit_earnings_call_transcripts')
+    if args.db_type == "local_vector_db":
+        collection = db.create_collection(collection_name)
+    else:
+        collection = db.get_collection(collection_name)
+    chunker = os.getenv('CHUNKER', settings["chunking"]["chunker"])
+    store = None if args.no_store else IntermediateStore(args.store_dir)
+    manifest = IngestionManifest(args.manifest)
+    dag = build_ingestion_dag(list_pdf_files(args.input_dir), collection, chunker=chunker,
+                              chunk_size=chunk_size_setting(settings, chunker),
+                              batch_size=settings["embedding"]["batch_size"], upload_settings=settings["upload"],
+                              store=store, manifest=manifest)
+    runner = DAGRunner(dag, args.checkpoint_dir, max_workers=args.workers,
+                       stage_limits={"embed": args.embed_concurrency})
+    report = runner.run(force=args.force)
+    print(f"{report['ok']} tasks ran, {report['skipped']} up to date, {report['failed']} failed, "
+          f"{report['blocked']} blocked in {report['seconds']:.1f}s")
+    for name, result in report["tasks"].items():
+        if result["status"] in ("failed", "blocked"):
+            print(f"  {result['status']}: {name}: {result['error']}")
+    path = report["critical_path"]
+    print(f"Critical path ({path['seconds']:.1f}s from scratch): {' -> '.join(path['tasks'])}")
+    if store is not None and report["ok"] and not report["failed"]:
+        from pipelines.retrieval_pipeline import BM25Index
+        index = BM25Index.from_store(store)
+        if set(store.sources("chunks")) >= set(manifest.sources):     # Every ingested file is in the store
+            index.fingerprint = manifest.fingerprint()
+        print(f"BM25 index written to {index.save(args.lexical_index)}")
+    if args.db_type == "local_vector_db" and report["ok"]:
+        report["vector_index"] = refresh_vector_index(collection)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    if report["failed"]:
+        raise SystemExit(1)
+    return report
+
+
+def refresh_vector_index(collection):
+    """
+    Builds or retrains the IVF index of a local collection once it is large enough, so its
+    searches stop being brute force. Returns whether the index was (re)built.
+    """
+    if not collection.refresh_index():
+        return False
+    print(f"IVF index trained on {collection.trained_rows} documents ({len(collection.centroids)} lists)")
+    return True
+
+
+def run_vector_index(args):
+    """Trains the IVF index of a local vector collection, whatever its size."""
+    from databases.db_connector import DbConnector
+
+    db = DbConnector(db_type="local_vector_db").get_connection()
+    if args.collection not in db.list_collection_names():
+        raise SystemExit(f"No local collection named {args.collection!r}")
+    collection = db.get_collection(args.collection)
+    try:
+        collection.build_index(n_lists=args.n_lists, nprobe=args.nprobe, sample_size=args.sample_size)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print(f"IVF index trained on {collection.trained_rows} documents ({len(collection.centroids)} lists, "
+          f"nprobe {collection.nprobe})")
+    if collection.trained_rows < collection.ivf_threshold:
+        print(f"Searches stay exact until the collection reaches {collection.ivf_threshold} documents")
+    return collection
+
+
+def run_artifacts(args):
+    """Reports on the intermediate store or re-runs NER, embedding or indexing from it."""
+    from databases.intermediate_store import IntermediateStore
+    from pipelines import artifact_pipeline
+
+    store = IntermediateStore(args.store_dir)
+    settings = load_pipeline_config()
+    if args.action == "stats":
+        report = store.stats()
+        for table, entry in report.items():
+            print(f"{table:>10}: {entry['documents']} documents, {entry['rows']} rows, {entry['bytes'] / 1e6:.1f} MB")
+    elif args.action == "ner":
+        report = artifact_pipeline.retag_from_store(store, sources=args.sources)
+        print(f"Tagged {report['chunks']} chunks of {report['documents']} documents: {report['entities']} entities")
+    elif args.action == "embed":
+        from pipelines.embedding_pipeline import load_default_embedder
+        report = artifact_pipeline.reembed_from_store(store, load_default_embedder(), sources=args.sources,
+                                                      batch_size=settings["embedding"]["batch_size"])
+        print(f"Embedded {report['chunks']} chunks at {report['chunks_per_second']:.1f} chunks/s")
+    elif args.action == "index":
+        from databases.db_connector import DbConnector
+        db = DbConnector(db_type=args.db_type).get_connection()
+        collection_name = os.getenv('ASTRA_DB_COLLECTION_NAME', 'reddit_earnings_call_transcripts')
+        collection = (db.create_collection(collection_name) if args.db_type == "local_vector_db"
+                      else db.get_collection(collection_name))
+        report = artifact_pipeline.reindex_from_store(store, collection, sources=args.sources,
+                                                      upload_settings=settings["upload"])
+        print(f"Loaded {report['chunks']} chunks of {report['documents']} documents "
+              f"({report['skipped']} without embeddings skipped)")
+    else:
+        output = args.output or f"{args.table}.parquet"
+        report = {"table": args.table, "rows": store.export_parquet(args.table, output), "path": output}
+        print(f"Exported {report['rows']} rows of {args.table} to {output}")
+    return report
+
+
+def run_lexical_index(args):
+    """Builds the BM25 index from the intermediate store or the vector collection and saves it."""
+    from databases.ingestion_manifest import IngestionManifest
+    from pipelines.retrieval_pipeline import BM25Index
+
+    manifest = IngestionManifest(args.manifest)
+    if args.source == "store":
+        from databases.intermediate_store import IntermediateStore
+        store = IntermediateStore(args.store_dir)
+        index = BM25Index.from_store(store)
+        # Files ingested by ingest-corpus are not in the store; the index then stays marked stale
+        missing = set(manifest.sources) - set(store.sources("chunks"))
+        if missing:
+            print(f"{len(missing)} ingested files are not in the store; build with --source collection to cover them")
+        else:
+            index.fingerprint = manifest.fingerprint()
+    else:
+        from databases.db_connector import DbConnector
+        db = DbConnector(db_type=args.db_type).get_connection()
+        index = BM25Index.from_collection(db.get_collection(os.getenv('ASTRA_DB_COLLECTION_NAME', 'reddit_earnings_call_transcripts')))
+        index.fingerprint = manifest.fingerprint()
+    report = dict(index.stats(), path=index.save(args.output))
+    print(f"Indexed {report['documents']} chunks: {report['terms']} terms, {report['postings']} postings, "
+          f"{report['bytes'] / 1e6:.1f} MB written to {report['path']}")
+    return report
+
+
+def run_db_health(args):
+    """Opens the configured databases through the connection registry and reports health and pool usage."""
+    from databases import connection_registry
+    from databases.db_connector import DbConnector
+
+    if args.db_type == "vector_db":
+        DbConnector(db_type="vector_db").get_connection()
+    if os.getenv('DB_HOST'):
+        DbConnector(db_type="postgresql").get_connection()
+    for check in connection_registry.health_check():
+        status = "ok" if check["ok"] else f"failed: {check['error']}"
+        print(f"{check['name']}: {status} ({check['seconds'] * 1000:.0f} ms)")
+    for pool in connection_registry.pool_metrics():
+        print(f"{pool['url']}: {pool['checked_out']}/{pool['capacity']} checked out "
+              f"(peak {pool['peak_checked_out']}, {pool['saturated_checkouts']} checkouts at capacity)")
+
+
+def configure_instrumentation(args):
+    """Applies the metrics, tracing and profiling options shared by every command."""
+    from utils.metrics import instrumentation, start_metrics_server
+
+    instrumentation.trace_file = args.trace_file
+    instrumentation.profiler.configure(args.profile)
+    if args.metrics_port is not None:
+        start_metrics_server(args.metrics_port)
+    return instrumentation
+
+
+def main(argv=None):
+    from utils.logging import setup_logging
+
+    args = build_parser().parse_args(argv)
+    setup_logging()
+    instrumentation = configure_instrumentation(args)
+    try:
+        run_command(args)
+    finally:
+        if args.metrics_file:
+            instrumentation.registry.write_prometheus(args.metrics_file)
+        if instrumentation.profiler.enabled:
+            for path in instrumentation.profiler.dump(args.profile_dir):
+                print(f"Profile written to {path}")
+
+
+def run_command(args):
+    if args.command == "ingest-corpus":
+        run_ingest_corpus(args)
+    elif args.command == "vector-format-report":
+        run_vector_format_report(args)
+    elif args.command == "inference-benchmark":
+        run_inference_benchmark(args)
+    elif args.command == "startup-report":
+        run_startup_report(args)
+    elif args.command == "query":
+        run_query(args)
+    elif args.command == "ner":
+        run_ner(args)
+    elif args.command == "load-excel":
+        run_load_excel(args)
+    elif args.command == "benchmark":
+        run_benchmark(args)
+    elif args.command == "autotune":
+        run_autotune(args)
+    elif args.command == "automate":
+        run_automate(args)
+    elif args.command == "artifacts":
+        run_artifacts(args)
+    elif args.command == "lexical-index":
+        run_lexical_index(args)
+    elif args.command == "vector-index":
+        run_vector_index(args)
+    elif args.command == "db-health":
+        run_db_health(args)
+
+
+if __name__ == "__main__":
+    main()
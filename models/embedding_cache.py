@@ -0,0 +1,236 @@
+# Class for caching FinBERT embeddings on disk (Class: `EmbeddingCache`)
+
+import contextlib   # Context manager for the cross-process file lock
+import fcntl    # Advisory lock shared by every process using the cache directory
+import hashlib  # Hashing of the chunk text and model settings into cache keys
+import json     # JSON for the cache metadata file
+import os       # OS library for file system operations
+import threading    # Lock so the cache can be shared by threads in one process
+from collections import OrderedDict     # Ordered mapping used as the LRU list
+
+import numpy as np  # NumPy memory-mapped vector file and compact key index
+
+# Number of vectors the cache holds before it starts evicting the least recently used ones
+DEFAULT_CAPACITY = 50_000
+
+# Record layout of the key index: 16-byte key digest, slot in the vector file
+INDEX_DTYPE = np.dtype([("key", "u1", (16,)), ("slot", "<i8")])
+
+
+class EmbeddingCache:
+    """
+    Content-addressed, persistent cache of text embeddings.
+    Vectors are stored in a memory-mapped float32 file with one row per slot, and a compact
+    index maps each key digest to its slot. A key is the hash of the chunk text together with
+    the model name, model revision, max_length and pooling, so changing any of them never
+    returns a stale vector. When the cache is full the least recently used entry is evicted.
+    Several processes may share a cache directory (e.g. the embedding workers of
+    `ingest_corpus`): each slot's key is stored next to its vector and checked on every read,
+    and slot allocation, reads and index rewrites are serialized by a lock file.
+    """
+
+    def __init__(self, cache_dir, dim, model_name, revision=None, max_length=512, pooling="cls",
+                 capacity=DEFAULT_CAPACITY):
+        """
+        Opens the cache in `cache_dir`, creating the vector file and index if needed.
+        Args:
+            cache_dir (str): The directory holding the vector file, index and metadata.
+            dim (int): The embedding dimension (768 for FinBERT).
+            model_name (str): The name of the model producing the embeddings.
+            revision (str, optional): The model revision (e.g. Hugging Face commit hash).
+            max_length (int): The tokenizer truncation length used for the embeddings.
+            pooling (str): The pooling strategy used for the embeddings, e.g. "cls".
+            capacity (int): The maximum number of vectors kept in the cache.
+        """
+        self.cache_dir = cache_dir
+        self.dim = dim
+        self.max_length = max_length
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        # The namespace is hashed into every key so different model settings never collide
+        self._namespace = f"{model_name}\0{revision}\0{max_length}\0{pooling}\0".encode("utf-8")
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._vectors_path = os.path.join(cache_dir, "vectors.f32")
+        self._slot_keys_path = os.path.join(cache_dir, "slot_keys.u1")
+        self._index_path = os.path.join(cache_dir, "index.npy")
+        self._meta_path = os.path.join(cache_dir, "meta.json")
+        self._lock_file = open(os.path.join(cache_dir, "cache.lock"), "a+")
+
+        with self._file_lock(fcntl.LOCK_EX):
+            self._check_metadata()
+            mode = "r+" if os.path.exists(self._vectors_path) else "w+"
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode=mode, shape=(capacity, dim))
+            # The key owning each slot (all zeros while free), the authority on what a slot holds
+            migrate = not os.path.exists(self._slot_keys_path)
+            mode = "r+" if not migrate else "w+"
+            self._slot_keys = np.memmap(self._slot_keys_path, dtype=np.uint8, mode=mode, shape=(capacity, 16))
+
+            # Key digest -> slot, ordered from least to most recently used
+            self._slots = OrderedDict()
+            for key, slot in self._read_index():
+                if migrate:     # A cache written before slot keys existed
+                    self._slot_keys[slot] = np.frombuffer(key, dtype=np.uint8)
+                if self._slot_keys[slot].tobytes() == key:
+                    self._slots[key] = slot
+            if migrate:
+                self._slot_keys.flush()
+        used = set(self._slots.values())
+        self._free_slots = [slot for slot in range(capacity - 1, -1, -1) if slot not in used]
+
+    @contextlib.contextmanager
+    def _file_lock(self, operation):
+        """Holds the cache directory's lock file, shared (LOCK_SH) or exclusive (LOCK_EX)."""
+        fcntl.flock(self._lock_file, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _read_index(self):
+        """Returns the (key, slot) pairs of the persisted index, least recently used first."""
+        if not os.path.exists(self._index_path):
+            return []
+        index = np.load(self._index_path)
+        return [(key.tobytes(), int(slot)) for key, slot in zip(index["key"], index["slot"])]
+
+    def _check_metadata(self):
+        """Writes the cache metadata, or verifies that an existing cache has the same shape."""
+        meta = {"dim": self.dim, "capacity": self.capacity}
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                stored = json.load(f)
+            if stored != meta:
+                raise ValueError(f"Embedding cache at {self.cache_dir} has shape {stored}, expected {meta}")
+        else:
+            with open(self._meta_path, "w") as f:
+                json.dump(meta, f)
+
+    def key(self, text):
+        """
+        Returns the 16-byte cache key for a chunk of text under this cache's model settings.
+        Args:
+            text (str): The chunk text.
+        Returns:
+            bytes: The key digest.
+        """
+        return hashlib.blake2b(self._namespace + text.encode("utf-8"), digest_size=16).digest()
+
+    def get(self, text):
+        """
+        Looks up the embedding of a single text.
+        Args:
+            text (str): The chunk text.
+        Returns:
+            numpy.ndarray or None: A copy of the cached embedding, or None on a miss.
+        """
+        vectors, missing = self.get_many([text])
+        return None if missing else vectors[0]
+
+    def get_many(self, texts):
+        """
+        Looks up the embeddings of many texts.
+        Args:
+            texts (list): The chunk texts.
+        Returns:
+            tuple: A tuple containing:
+                - vectors (numpy.ndarray): A (len(texts), dim) float32 matrix with the cached
+                  rows filled in; rows of missing texts are left uninitialized.
+                - missing (list): The positions in `texts` that were not in the cache.
+        """
+        vectors = np.empty((len(texts), self.dim), dtype=np.float32)
+        missing = []
+        with self._lock, self._file_lock(fcntl.LOCK_SH):
+            for i, text in enumerate(texts):
+                key = self.key(text)
+                slot = self._slots.get(key)
+                if slot is not None and self._slot_keys[slot].tobytes() != key:
+                    del self._slots[key]    # Another process reused the slot for a different key
+                    slot = None
+                if slot is None:
+                    missing.append(i)
+                    continue
+                self._slots.move_to_end(key)   # Mark the entry as most recently used
+                vectors[i] = self._vectors[slot]
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        return vectors, missing
+
+    def put(self, text, vector):
+        """Stores the embedding of a single text."""
+        self.put_many([text], np.asarray(vector).reshape(1, -1))
+
+    def put_many(self, texts, vectors):
+        """
+        Stores the embeddings of many texts, evicting least recently used entries when full.
+        Args:
+            texts (list): The chunk texts.
+            vectors (numpy.ndarray): A (len(texts), dim) matrix of their embeddings.
+        """
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            for text, vector in zip(texts, vectors):
+                key = self.key(text)
+                slot = self._slots.get(key)
+                if slot is not None and self._slot_keys[slot].tobytes() != key:
+                    del self._slots[key]
+                    slot = None
+                if slot is None:
+                    slot = self._allocate_slot()
+                    self._slots[key] = slot
+                else:
+                    self._slots.move_to_end(key)
+                self._vectors[slot] = vector
+                self._slot_keys[slot] = np.frombuffer(key, dtype=np.uint8)
+
+    def _allocate_slot(self):
+        """Returns a free slot, or evicts the least recently used entry. Called with the file lock held."""
+        while self._free_slots:
+            slot = self._free_slots.pop()
+            if not self._slot_keys[slot].any():     # Not taken by another process since this one opened
+                return slot
+        self.evictions += 1
+        if self._slots:
+            return self._slots.popitem(last=False)[1]     # Evict the least recently used entry
+        return 0    # Every slot belongs to other processes: reuse the first one
+
+    def flush(self):
+        """
+        Flushes the vector file and atomically rewrites the key index in LRU order. Entries
+        other processes flushed are kept, ahead of this process's own entries.
+        """
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            self._vectors.flush()
+            self._slot_keys.flush()
+            entries = OrderedDict((key, slot) for key, slot in self._read_index() if key not in self._slots)
+            entries.update(self._slots)
+            entries = [(key, slot) for key, slot in entries.items() if self._slot_keys[slot].tobytes() == key]
+            index = np.empty(len(entries), dtype=INDEX_DTYPE)
+            index["key"] = np.frombuffer(b"".join(key for key, _ in entries), dtype=np.uint8).reshape(-1, 16)
+            index["slot"] = [slot for _, slot in entries]
+            tmp_path = self._index_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, index)
+            os.replace(tmp_path, self._index_path)
+
+    def stats(self):
+        """
+        Returns the cache counters.
+        Returns:
+            dict: The number of entries, capacity, hits, misses, evictions and the hit rate.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._slots),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def __len__(self):
+        return len(self._slots)
@@ -1,27 +1,193 @@
 # Class to load and initialize FinBERT model
 
-from transformers import AutoTokenizer, AutoModel
-import os
-from dotenv import load_dotenv
+import threading    # Lock so a backend is prepared only once when shared by threads
+import time     # Throughput measurement of the backends
+import warnings     # Silence the tracer warnings while exporting the graph
+import weakref  # Per-model backend cache that does not keep unloaded models alive
 
-# Load environment variables from .env file
-load_dotenv()
+import numpy as np  # Cosine parity and neighbour recall of the backends
 
-# Access the Hugging Face token from the environment variables
-finbert_huggingface_token = os.getenv('FINBERT_HUGGINGFACE_TOKEN')
+from models.model_registry import DEFAULT_MODEL_NAME, get_model    # Process-wide registry, so FinBERT is loaded once
 
-def load_finbert():
+# CPU inference backends for the embedding code
+INFERENCE_BACKENDS = ("eager", "dynamic_int8", "torchscript")
+DEFAULT_INFERENCE_BACKEND = "eager"
+
+# Default parity requirements a backend must meet against eager float32 to be selected
+MIN_COSINE = 0.99
+MIN_RECALL = 0.95
+
+def load_finbert(revision=None):
     """
     Load the FinBERT tokenizer and model.
+    The pair comes from the process-wide model registry, so the preprocessor, the query path
+    and any other caller share a single copy.
 
     Returns:
     tokenizer, model: The loaded FinBERT tokenizer and model.
     """
-    # Load the FinBERT tokenizer and model using the Hugging Face token
-    tokenizer = AutoTokenizer.from_pretrained("ProsusAI/finbert", token=finbert_huggingface_token)
-    model = AutoModel.from_pretrained("ProsusAI/finbert", token=finbert_huggingface_token)
+    # Load (or reuse) the FinBERT tokenizer and model; the Hugging Face token is read from FINBERT_HUGGINGFACE_TOKEN
+    tokenizer, model = get_model(DEFAULT_MODEL_NAME, revision)
     return tokenizer, model
 
+class FinBERTEncoder:
+    """
+    Computes the [CLS] embeddings of tokenized batches with a selectable CPU backend:
+    - "eager": the float32 model as loaded, in plain PyTorch.
+    - "dynamic_int8": the Linear layers (nearly all of BERT's compute) use int8 weights with
+      activations quantized on the fly.
+    - "torchscript": the model is traced once, frozen and optimized for inference (constant
+      folding and fused operators), so batches run through a static graph without Python overhead.
+    Backends other than eager are prepared on the first batch.
+    """
+
+    def __init__(self, model, backend=DEFAULT_INFERENCE_BACKEND):
+        if backend not in INFERENCE_BACKENDS:
+            raise ValueError(f"Unsupported inference backend {backend!r}, expected one of {INFERENCE_BACKENDS}")
+        self.model = model
+        self.backend = backend
+        self._module = None
+        self._lock = threading.Lock()
+
+    def __call__(self, inputs):
+        """
+        Args:
+            inputs (dict): Padded tokenizer output with input_ids and attention_mask tensors.
+        Returns:
+            torch.Tensor: The (batch, hidden_size) [CLS] embeddings.
+        """
+        import torch
+
+        input_ids = inputs["input_ids"]
+        attention_mask = inputs["attention_mask"]
+        token_type_ids = inputs.get("token_type_ids")
+        if token_type_ids is None:
+            token_type_ids = torch.zeros_like(input_ids)
+        with torch.no_grad():   # Disable gradient calculation for faster processing
+            return self._prepared(input_ids, attention_mask, token_type_ids)(input_ids, attention_mask, token_type_ids)
+
+    def _prepared(self, input_ids, attention_mask, token_type_ids):
+        """Returns the module running the backend, building it on first use."""
+        with self._lock:
+            if self._module is None:
+                self._module = self._build(input_ids, attention_mask, token_type_ids)
+            return self._module
+
+    def _build(self, input_ids, attention_mask, token_type_ids):
+        import copy
+        import torch
+
+        module = _cls_pooling(self.model).eval()
+        if self.backend == "dynamic_int8":
+            return torch.ao.quantization.quantize_dynamic(copy.deepcopy(module), {torch.nn.Linear}, dtype=torch.qint8)
+        if self.backend == "torchscript":
+            # Trace with a padded example so the attention mask path is part of the graph
+            example_mask = attention_mask.clone()
+            if example_mask.shape[1] > 1:
+                example_mask[0, -1] = 0
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                traced = torch.jit.trace(module, (input_ids, example_mask, token_type_ids), strict=False)
+                return torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+        return module
+
+
+_CLSPooling = None  # torch.nn.Module subclass, defined on first use so torch is imported lazily
+
+
+def _cls_pooling(model):
+    """Wraps a BERT encoder in a module mapping (input_ids, attention_mask, token_type_ids) to [CLS] embeddings."""
+    global _CLSPooling
+    if _CLSPooling is None:
+        import torch
+
+        class CLSPooling(torch.nn.Module):
+            def __init__(self, model):
+                super().__init__()
+                self.model = model
+
+            def forward(self, input_ids, attention_mask, token_type_ids):
+                outputs = self.model(input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids)
+                return outputs.last_hidden_state[:, 0, :]
+
+        _CLSPooling = CLSPooling
+    return _CLSPooling(model)
+
+
+_encoders = weakref.WeakKeyDictionary()     # model -> {backend: FinBERTEncoder}
+_encoders_lock = threading.Lock()
+
+
+def get_encoder(model, backend=DEFAULT_INFERENCE_BACKEND):
+    """Returns the shared encoder of a model for a backend, so each backend is prepared once per process."""
+    with _encoders_lock:
+        backends = _encoders.setdefault(model, {})
+        if backend not in backends:
+            backends[backend] = FinBERTEncoder(model, backend)
+        return backends[backend]
+
+
+def _neighbour_recall(reference, candidate, k):
+    """Returns the overlap of the k nearest neighbours (by cosine, excluding self) of two embedding sets."""
+    def top_k(embeddings):
+        normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        scores = normalized @ normalized.T
+        np.fill_diagonal(scores, -np.inf)
+        return np.argsort(-scores, axis=1)[:, :k]
+    k = min(k, len(reference) - 1)
+    if k < 1:
+        return 1.0
+    hits = sum(len(set(a) & set(b)) for a, b in zip(top_k(reference), top_k(candidate)))
+    return hits / (len(reference) * k)
+
+
+def benchmark_backends(embed, texts, backends=INFERENCE_BACKENDS, repeats=3, k=10):
+    """
+    Measures the throughput of every backend and its parity with eager float32.
+    Args:
+        embed (callable): Called with (texts, backend); returns the (len(texts), hidden) embeddings.
+        texts (list): The benchmark texts, e.g. chunks of a real filing.
+        backends (tuple): The backends to measure; eager is always measured as the baseline.
+        repeats (int): Timed runs per backend after one warm-up run; the fastest run counts.
+        k (int): The number of neighbours compared for recall@k.
+    Returns:
+        list: One dict per backend with prepare_seconds, seconds, texts_per_second,
+        min_cosine, mean_cosine and recall_at_k.
+    """
+    backends = ["eager"] + [backend for backend in backends if backend != "eager"]
+    baseline = None
+    report = []
+    for backend in backends:
+        start = time.perf_counter()
+        embeddings = embed(texts, backend)  # Warm-up run, which also prepares the backend
+        prepare_seconds = time.perf_counter() - start
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            embed(texts, backend)
+            timings.append(time.perf_counter() - start)
+        if baseline is None:
+            baseline = embeddings
+        cosine = np.sum(embeddings * baseline, axis=1) / (
+            np.linalg.norm(embeddings, axis=1) * np.linalg.norm(baseline, axis=1))
+        seconds = min(timings) if timings else prepare_seconds
+        report.append({
+            "backend": backend,
+            "prepare_seconds": prepare_seconds,
+            "seconds": seconds,
+            "texts_per_second": len(texts) / seconds if seconds else 0.0,
+            "min_cosine": float(np.min(cosine)),
+            "mean_cosine": float(np.mean(cosine)),
+            "recall_at_k": _neighbour_recall(baseline, embeddings, k),
+        })
+    return report
+
+
+def select_backend(report, min_cosine=MIN_COSINE, min_recall=MIN_RECALL):
+    """Returns the fastest backend of a `benchmark_backends` report that meets the parity tolerances."""
+    passing = [entry for entry in report if entry["min_cosine"] >= min_cosine and entry["recall_at_k"] >= min_recall]
+    return max(passing, key=lambda entry: entry["texts_per_second"])["backend"] if passing else DEFAULT_INFERENCE_BACKEND
+
 # Example usage. Load the FinBERT model and tokenizer, and add to collection
 if __name__ == "__main__":
     tokenizer, model = load_finbert()
@@ -34,4 +200,4 @@ if __name__ == "__main__":
     inputs = tokenizer(text, return_tensors="pt")
 
     # Print the tokenized input
-    print(inputs)
\ No newline at end of file
+    print(inputs)
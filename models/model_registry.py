@@ -0,0 +1,115 @@
+# Process-wide registry of loaded models, so each (model, revision) is loaded once (Functions: `get_model`, `register_model`)
+
+import os       # OS library for environment variable access
+import threading    # Locks so concurrent callers never load the same model twice
+import time     # Load time measurement for the startup report
+
+# Model used for embeddings when no other name is given
+DEFAULT_MODEL_NAME = "ProsusAI/finbert"
+
+_registry = {}          # (model_name, revision) -> (tokenizer, model)
+_tokenizers = {}        # (model_name, revision) -> tokenizer loaded without its model
+_load_seconds = {}      # (model_name, revision) -> seconds spent loading
+_registry_lock = threading.Lock()
+_key_locks = {}         # (model_name, revision) -> lock held while that model loads
+_dotenv_loaded = False  # Whether .env was read, so FINBERT_HUGGINGFACE_TOKEN may come from it
+
+
+def _load_dotenv():
+    """Reads the .env file once, before the first model or tokenizer download reads the token."""
+    global _dotenv_loaded
+    if not _dotenv_loaded:
+        from dotenv import load_dotenv  # Imported on first use to keep imports fast
+        load_dotenv()
+        _dotenv_loaded = True
+
+
+def load_pretrained(model_name, revision=None):
+    """
+    Loads a Hugging Face tokenizer and encoder model in eval mode.
+    transformers (and torch) are only imported here, so importing modules that use the
+    registry stays fast until a model is actually needed.
+    Args:
+        model_name (str): The model name on the Hugging Face hub or a local path.
+        revision (str, optional): The model revision (branch, tag or commit hash).
+    Returns:
+        tuple: (tokenizer, model)
+    """
+    from transformers import AutoModel, AutoTokenizer
+
+    token = os.getenv('FINBERT_HUGGINGFACE_TOKEN')
+    tokenizer = AutoTokenizer.from_pretrained(model_name, revision=revision, token=token)
+    model = AutoModel.from_pretrained(model_name, revision=revision, token=token)
+    model.eval()
+    return tokenizer, model
+
+
+def get_model(model_name=DEFAULT_MODEL_NAME, revision=None, loader=load_pretrained):
+    """
+    Returns the shared (tokenizer, model) for a model name and revision, loading it on first use.
+    Args:
+        model_name (str): The model name. Default is DEFAULT_MODEL_NAME.
+        revision (str, optional): The model revision.
+        loader (callable): Called with (model_name, revision) to load a model that is not registered yet.
+    Returns:
+        tuple: (tokenizer, model), the same objects for every caller in the process.
+    """
+    key = (model_name, revision)
+    with _registry_lock:
+        if key in _registry:
+            return _registry[key]
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+
+    # Load outside the registry lock so other models stay available meanwhile
+    with key_lock:
+        with _registry_lock:
+            if key in _registry:
+                return _registry[key]
+        _load_dotenv()
+        start = time.perf_counter()
+        loaded = loader(model_name, revision)
+        with _registry_lock:
+            _registry[key] = loaded
+            _load_seconds[key] = time.perf_counter() - start
+        return loaded
+
+
+def get_tokenizer(model_name=DEFAULT_MODEL_NAME, revision=None):
+    """
+    Returns the shared fast tokenizer of a model without loading the model weights, e.g. for
+    chunking in extraction workers. Reuses the tokenizer of an already loaded model.
+    """
+    key = (model_name, revision)
+    with _registry_lock:
+        if key in _registry:
+            return _registry[key][0]
+        if key in _tokenizers:
+            return _tokenizers[key]
+    from transformers import AutoTokenizer
+
+    _load_dotenv()
+    tokenizer = AutoTokenizer.from_pretrained(model_name, revision=revision, token=os.getenv('FINBERT_HUGGINGFACE_TOKEN'))
+    with _registry_lock:
+        return _tokenizers.setdefault(key, tokenizer)
+
+
+def register_model(model_name, tokenizer, model, revision=None):
+    """Registers an already loaded model, e.g. a local or test model, under a name and revision."""
+    with _registry_lock:
+        _registry[(model_name, revision)] = (tokenizer, model)
+        _load_seconds.setdefault((model_name, revision), 0.0)
+
+
+def clear_registry():
+    """Drops every registered model so the next `get_model` loads it again."""
+    with _registry_lock:
+        _registry.clear()
+        _tokenizers.clear()
+        _load_seconds.clear()
+
+
+def registry_report():
+    """Returns one dict per loaded model with its name, revision and load time in seconds."""
+    with _registry_lock:
+        return [{"model": name, "revision": revision, "load_seconds": seconds}
+                for (name, revision), seconds in _load_seconds.items()]
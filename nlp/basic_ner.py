@@ -0,0 +1,121 @@
+# Batched named entity recognition with a pruned, per-process cached spaCy pipeline (Class: `BasicNERProcessor`)
+
+import threading    # Lock so concurrent callers load a model once
+import time     # Throughput measurement
+
+# Pretrained spaCy pipeline used when no other model is given
+DEFAULT_SPACY_MODEL = "en_core_web_sm"
+
+# Texts per nlp.pipe batch and worker processes used by default
+DEFAULT_NER_BATCH_SIZE = 256
+DEFAULT_NER_PROCESSES = 1
+
+# Components NER does not need; they are not even loaded
+UNUSED_COMPONENTS = ("parser", "lemmatizer", "tagger", "attribute_ruler", "morphologizer", "senter",
+                     "textcat", "textcat_multilabel")
+
+_models = {}        # (model_name, excluded components) -> loaded spaCy pipeline, one per process
+_models_lock = threading.Lock()
+
+
+def load_spacy_model(model_name=DEFAULT_SPACY_MODEL, exclude=UNUSED_COMPONENTS):
+    """
+    Loads a spaCy pipeline pruned for NER: the unused components are excluded, and the shared
+    tok2vec is disabled when the NER component does not listen to it.
+    Args:
+        model_name (str): An installed spaCy package or a model directory.
+        exclude (tuple): The components not to load.
+    Returns:
+        spacy.language.Language: The pipeline.
+    """
+    import spacy    # Imported on first use to keep imports fast
+
+    nlp = spacy.load(model_name, exclude=list(exclude))
+    if "tok2vec" in nlp.pipe_names:
+        listeners = getattr(nlp.get_pipe("tok2vec"), "listening_components", [])
+        if "ner" not in listeners:
+            nlp.disable_pipe("tok2vec")     # Only fed the excluded tagger and parser
+    return nlp
+
+
+def get_ner_model(model_name=DEFAULT_SPACY_MODEL, exclude=UNUSED_COMPONENTS):
+    """Returns the pruned pipeline of a model, loading it once per process."""
+    key = (model_name, tuple(exclude))
+    with _models_lock:
+        if key not in _models:
+            _models[key] = load_spacy_model(model_name, exclude)
+        return _models[key]
+
+
+class BasicNERProcessor:
+    """
+    Named entity recognition with a pretrained spaCy pipeline. Texts are processed with
+    `nlp.pipe` in batches (optionally in several processes), and results stream back as
+    compact (start_char, end_char, label) tuples per chunk.
+    """
+
+    def __init__(self, model_name=DEFAULT_SPACY_MODEL, batch_size=DEFAULT_NER_BATCH_SIZE,
+                 n_process=DEFAULT_NER_PROCESSES, labels=None, nlp=None):
+        """
+        Args:
+            model_name (str): The spaCy model, loaded once per process.
+            batch_size (int): Texts per `nlp.pipe` batch.
+            n_process (int): Processes used by `nlp.pipe`; 1 runs in this process.
+            labels (iterable, optional): Only these entity labels are returned, e.g. {"ORG", "MONEY"}.
+            nlp (spacy.language.Language, optional): An already loaded pipeline to use instead.
+        """
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self.labels = set(labels) if labels else None
+        self._nlp = nlp
+
+    @property
+    def nlp(self):
+        """The spaCy pipeline, loaded on first use."""
+        if self._nlp is None:
+            self._nlp = get_ner_model(self.model_name)
+        return self._nlp
+
+    def _entities(self, doc):
+        return tuple((ent.start_char, ent.end_char, ent.label_) for ent in doc.ents
+                     if self.labels is None or ent.label_ in self.labels)
+
+    def iter_entities(self, chunks, batch_size=None, n_process=None):
+        """
+        Runs NER over a stream of chunks.
+        Args:
+            chunks (iterable): (chunk_id, text) tuples, consumed lazily.
+            batch_size (int, optional): Overrides the batch size.
+            n_process (int, optional): Overrides the number of processes.
+        Yields:
+            tuple: (chunk_id, entities) in input order, entities as (start_char, end_char, label) tuples.
+        """
+        docs = self.nlp.pipe(((text, chunk_id) for chunk_id, text in chunks), as_tuples=True,
+                             batch_size=batch_size or self.batch_size, n_process=n_process or self.n_process)
+        for doc, chunk_id in docs:
+            yield chunk_id, self._entities(doc)
+
+    def extract_entities(self, text):
+        """
+        Args:
+            text (str): The text to analyze.
+        Returns:
+            dict: Entity text -> label, e.g. {"Tesla": "ORG", "Q4 2023": "DATE"}.
+        """
+        return {text[start:end]: label for start, end, label in self._entities(self.nlp(text))}
+
+    def benchmark(self, texts, batch_size=None, n_process=None):
+        """
+        Measures NER throughput over a list of texts.
+        Returns:
+            dict: texts, entities, seconds, texts_per_second and megabytes_per_second.
+        """
+        start = time.perf_counter()
+        entities = sum(len(found) for _, found in
+                       self.iter_entities(enumerate(texts), batch_size=batch_size, n_process=n_process))
+        seconds = time.perf_counter() - start
+        megabytes = sum(len(text.encode("utf-8")) for text in texts) / 1e6
+        return {"texts": len(texts), "entities": entities, "seconds": seconds,
+                "texts_per_second": len(texts) / seconds if seconds else 0.0,
+                "megabytes_per_second": megabytes / seconds if seconds else 0.0}
@@ -0,0 +1,27 @@
+# Named entity recognition with a fine-tuned spaCy model (Class: `CustomNERProcessor`)
+
+import os       # OS library for environment variable access
+
+from nlp.basic_ner import DEFAULT_NER_BATCH_SIZE, DEFAULT_NER_PROCESSES, BasicNERProcessor
+
+# Directory of the fine-tuned financial NER model
+DEFAULT_CUSTOM_NER_MODEL = os.getenv('CUSTOM_NER_MODEL_PATH', 'models/custom_ner')
+
+
+class CustomNERProcessor(BasicNERProcessor):
+    """
+    NER with a fine-tuned spaCy model saved with `nlp.to_disk`. Shares the batched,
+    pruned and per-process cached pipeline of BasicNERProcessor.
+    """
+
+    def __init__(self, model_path=DEFAULT_CUSTOM_NER_MODEL, batch_size=DEFAULT_NER_BATCH_SIZE,
+                 n_process=DEFAULT_NER_PROCESSES, labels=None, nlp=None):
+        """
+        Args:
+            model_path (str): The directory of the fine-tuned model.
+            batch_size (int): Texts per `nlp.pipe` batch.
+            n_process (int): Processes used by `nlp.pipe`.
+            labels (iterable, optional): Only these entity labels are returned.
+            nlp (spacy.language.Language, optional): An already loaded pipeline to use instead.
+        """
+        super().__init__(model_name=model_path, batch_size=batch_size, n_process=n_process, labels=labels, nlp=nlp)
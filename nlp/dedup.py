@@ -0,0 +1,237 @@
+# Near-duplicate chunk detection with MinHash signatures and LSH banding (Class: `NearDuplicateIndex`)
+
+import hashlib  # Stable 32-bit shingle hashes
+import os       # OS library for file system operations
+import re       # Word and number patterns
+
+import numpy as np  # Vectorized MinHash permutations and compact signature storage
+
+# Default estimated Jaccard similarity above which two chunks are near-duplicates
+DEFAULT_THRESHOLD = 0.9
+
+# Number of MinHash permutations per signature and words per shingle
+DEFAULT_NUM_PERM = 128
+DEFAULT_SHINGLE_SIZE = 5
+
+# Default location of the persisted index
+DEFAULT_DEDUP_INDEX_PATH = "data/processed/dedup_index.npz"
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+WORD_PATTERN = re.compile(r"\w+")
+# Figures such as 1,234.5, 20% or 2023; near-duplicates must state exactly the same ones
+NUMBER_PATTERN = re.compile(r"\d[\d,.]*%?")
+
+
+def shingle_hashes(text, shingle_size=DEFAULT_SHINGLE_SIZE):
+    """Returns the 32-bit hashes of the lowercase word shingles of a text."""
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < shingle_size:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i : i + shingle_size]) for i in range(len(words) - shingle_size + 1)}
+    return np.array([int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little")
+                     for shingle in shingles], dtype=np.uint64)
+
+
+def numbers_digest(text):
+    """Returns a digest of the figures in a text, so chunks differing only in a number never match."""
+    numbers = " ".join(number.rstrip(".,") for number in NUMBER_PATTERN.findall(text))
+    return hashlib.blake2b(numbers.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def lsh_bands(num_perm, threshold):
+    """
+    Chooses the LSH banding (bands, rows) of a signature. Two signatures become candidates
+    if all rows of one band agree; the chosen banding has the highest S-curve midpoint
+    (1/bands)^(1/rows) that is still below the threshold, so true near-duplicates are found
+    and the candidates are then verified on the full signature.
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        if (1 / bands) ** (1 / rows) <= threshold:
+            best = (bands, rows)
+    return best
+
+
+class NearDuplicateIndex:
+    """
+    Index of canonical chunks for near-duplicate detection within a document and across the corpus.
+    Every chunk gets a MinHash signature of its word shingles; LSH banding finds candidate
+    matches without comparing against every stored chunk, and a candidate is a duplicate if
+    the estimated Jaccard similarity reaches `threshold` and both chunks state the same figures.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, num_perm=DEFAULT_NUM_PERM, shingle_size=DEFAULT_SHINGLE_SIZE,
+                 seed=1, path=None):
+        """
+        Args:
+            threshold (float): The minimum estimated Jaccard similarity of near-duplicates.
+            num_perm (int): The number of MinHash permutations.
+            shingle_size (int): The number of words per shingle.
+            seed (int): The seed of the permutations; an index must be queried with the seed it was built with.
+            path (str, optional): Where `save` writes the index.
+        """
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.seed = seed
+        self.path = path
+        self.bands, self.rows = lsh_bands(num_perm, threshold)
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, int(MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, int(MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+
+        self._keys = []         # Row -> chunk ID, None once removed
+        self._sources = []      # Row -> source file of the chunk
+        self._signatures = []   # Row -> MinHash signature
+        self._numbers = []      # Row -> digest of the figures in the chunk
+        self._rows = {}         # Chunk ID -> row
+        self._buckets = [{} for _ in range(self.bands)]    # Per band: band hash -> rows
+
+    def signature(self, text):
+        """Returns the MinHash signature of a text."""
+        hashes = shingle_hashes(text, self.shingle_size)
+        # Universal hashing (a * x + b) mod p per permutation; uint64 overflow simply wraps
+        permuted = (np.outer(hashes, self._a) + self._b) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature):
+        return [signature[band * self.rows : (band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def find(self, text, signature=None):
+        """
+        Returns the ID of the canonical chunk the text is a near-duplicate of, or None.
+        Args:
+            text (str): The chunk text.
+            signature (numpy.ndarray, optional): The precomputed signature of the text.
+        """
+        signature = self.signature(text) if signature is None else signature
+        numbers = numbers_digest(text)
+        candidates = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            candidates |= self._buckets[band].get(key, set())
+        best, best_similarity = None, self.threshold
+        for row in sorted(candidates):
+            if self._numbers[row] != numbers:
+                continue
+            similarity = float(np.mean(self._signatures[row] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = row, similarity
+        return None if best is None else self._keys[best]
+
+    def add(self, key, text, source=None, signature=None):
+        """Adds a canonical chunk under its chunk ID."""
+        if key in self._rows:
+            return
+        signature = self.signature(text) if signature is None else signature
+        row = len(self._keys)
+        self._keys.append(key)
+        self._sources.append(source)
+        self._signatures.append(signature)
+        self._numbers.append(numbers_digest(text))
+        self._rows[key] = row
+        for band, band_key in enumerate(self._band_keys(signature)):
+            self._buckets[band].setdefault(band_key, set()).add(row)
+
+    def find_or_add(self, key, text, source=None):
+        """
+        Returns the canonical chunk ID if the text is a near-duplicate of an indexed chunk;
+        otherwise adds it as a new canonical chunk and returns None.
+        """
+        if key in self._rows:
+            return None     # Already indexed as canonical (e.g. re-processing the same chunk)
+        signature = self.signature(text)
+        canonical = self.find(text, signature)
+        if canonical is None:
+            self.add(key, text, source, signature)
+        return canonical
+
+    def source_of(self, key):
+        """Returns the source file of an indexed chunk, or None."""
+        row = self._rows.get(key)
+        return None if row is None else self._sources[row]
+
+    def remove(self, keys):
+        """Removes chunks from the index, e.g. once they are deleted from the vector database."""
+        for key in keys:
+            row = self._rows.pop(key, None)
+            if row is None:
+                continue
+            for band, band_key in enumerate(self._band_keys(self._signatures[row])):
+                self._buckets[band].get(band_key, set()).discard(row)
+            self._keys[row] = None
+
+    def remove_source(self, source):
+        """Removes every chunk of a source, before the source is deduplicated again."""
+        self.remove([key for key, row in list(self._rows.items()) if self._sources[row] == source])
+
+    def __len__(self):
+        return len(self._rows)
+
+    def save(self, path=None):
+        """Writes the live chunks of the index to an .npz file (atomically)."""
+        path = path or self.path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        rows = sorted(self._rows.values())
+        tmp_path = path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            keys=np.array([self._keys[row] for row in rows], dtype=str),
+            sources=np.array([self._sources[row] or "" for row in rows], dtype=str),
+            numbers=np.array([self._numbers[row] for row in rows], dtype=str),
+            signatures=np.array([self._signatures[row] for row in rows], dtype=np.uint32).reshape(len(rows), self.num_perm),
+            settings=np.array([self.threshold, self.num_perm, self.shingle_size, self.seed], dtype=np.float64),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """
+        Opens the index saved at `path`, or creates an empty one there if the file does not exist.
+        Keyword arguments configure a new index; a saved index keeps its own settings.
+        """
+        if not os.path.exists(path):
+            return cls(path=path, **kwargs)
+        data = np.load(path)
+        threshold, num_perm, shingle_size, seed = data["settings"]
+        index = cls(threshold=float(threshold), num_perm=int(num_perm), shingle_size=int(shingle_size),
+                    seed=int(seed), path=path)
+        for key, source, numbers, signature in zip(data["keys"], data["sources"], data["numbers"], data["signatures"]):
+            row = len(index._keys)
+            index._keys.append(str(key))
+            index._sources.append(str(source) or None)
+            index._signatures.append(signature)
+            index._numbers.append(str(numbers))
+            index._rows[str(key)] = row
+            for band, band_key in enumerate(index._band_keys(signature)):
+                index._buckets[band].setdefault(band_key, set()).add(row)
+        return index
+
+
+def dedup_report(chunks, duplicates, embedded, skipped_embeddings):
+    """
+    Summarizes what a dedup stage saved.
+    Args:
+        chunks (int): The number of chunks seen.
+        duplicates (int): The number of chunks stored as references instead of documents.
+        embedded (int): The number of chunks embedded.
+        skipped_embeddings (int): The number of duplicates that would have been embedded otherwise.
+    Returns:
+        dict: The counts plus inference_saved (fraction of embeddings avoided) and
+        storage_saved (fraction of documents not stored).
+    """
+    return {
+        "chunks": chunks,
+        "duplicates": duplicates,
+        "embedded": embedded,
+        "inference_saved": skipped_embeddings / (embedded + skipped_embeddings) if embedded + skipped_embeddings else 0.0,
+        "storage_saved": duplicates / chunks if chunks else 0.0,
+    }
@@ -0,0 +1,150 @@
+# Word tokenization and token-aware chunking with the fast FinBERT tokenizer (Classes: `Tokenizer`, `TokenChunker`)
+
+import re   # Word pattern of the basic tokenizer
+
+# Default chunk budget in tokens, and the tokens repeated at the start of the next chunk
+DEFAULT_CHUNK_TOKENS = 256
+DEFAULT_CHUNK_OVERLAP_TOKENS = 32
+
+# FinBERT's 512-token window minus the [CLS] and [SEP] tokens added around every chunk
+MAX_CHUNK_TOKENS = 510
+
+# Characters ending a sentence when followed by whitespace or the end of the text
+SENTENCE_END_CHARACTERS = ".!?;"
+
+
+# Words, numbers and amounts such as 5%, $1.2 or Q4, without surrounding punctuation
+WORD_PATTERN = re.compile(r"[$€£]?\w+(?:[.,'’]\w+)*%?")
+
+
+class Tokenizer:
+    """Basic word tokenizer: splits text into words and numbers and drops punctuation."""
+
+    def tokenize(self, text):
+        """
+        Args:
+            text (str): The text to tokenize.
+        Returns:
+            list: The word tokens in order, e.g. ['This', 'is', 'a', 'test', 'sentence'].
+        """
+        return WORD_PATTERN.findall(text)
+
+
+class TokenizedChunk(str):
+    """
+    A chunk of text that also carries its token IDs (without special tokens), so the
+    embedding code can feed them to the model instead of tokenizing the text again.
+    Behaves like the plain chunk string everywhere else (hashing, IDs, storage).
+    """
+
+    def __new__(cls, text, token_ids):
+        chunk = super().__new__(cls, text)
+        chunk.token_ids = list(token_ids)
+        return chunk
+
+    def __reduce__(self):
+        # The default str reduction calls __new__ with the text only; chunks cross process pools and checkpoints
+        return (TokenizedChunk, (str(self), self.token_ids))
+
+
+class TokenChunker:
+    """
+    Splits text into chunks of at most `chunk_size` tokens of the model's own tokenizer.
+    Each text is tokenized once; chunks are cut on the token sequence, preferably after the
+    last sentence end in the second half of the budget and never inside a word, and the next
+    chunk starts `chunk_overlap` tokens before the cut. Has the `split_text` interface of
+    the langchain splitters, so it plugs into `chunk_pages`.
+    """
+
+    def __init__(self, tokenizer, chunk_size=DEFAULT_CHUNK_TOKENS, chunk_overlap=DEFAULT_CHUNK_OVERLAP_TOKENS,
+                 min_sentence_fraction=0.5):
+        """
+        Args:
+            tokenizer (object): A fast (Rust) Hugging Face tokenizer; offsets and word IDs are required.
+            chunk_size (int): The maximum number of tokens per chunk, at most MAX_CHUNK_TOKENS.
+            chunk_overlap (int): The number of tokens shared by consecutive chunks.
+            min_sentence_fraction (float): A sentence boundary is only used as the cut if it
+                keeps at least this fraction of the budget in the chunk.
+        """
+        if not getattr(tokenizer, "is_fast", False):
+            raise ValueError("TokenChunker needs a fast tokenizer (offsets and word IDs)")
+        if not 0 < chunk_size <= MAX_CHUNK_TOKENS:
+            raise ValueError(f"chunk_size must be between 1 and {MAX_CHUNK_TOKENS} tokens")
+        if not 0 <= chunk_overlap < chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+        self.tokenizer = tokenizer
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.min_sentence_fraction = min_sentence_fraction
+
+    def split_text(self, text):
+        """
+        Args:
+            text (str): The text to split, e.g. one page.
+        Returns:
+            list: TokenizedChunk strings, each the span of the source text covered by its tokens.
+        """
+        encoding = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+        token_ids, offsets = encoding["input_ids"], encoding["offset_mapping"]
+        word_ids = encoding.word_ids()
+        count = len(token_ids)
+
+        def starts_word(i):
+            return i == 0 or word_ids[i] is None or word_ids[i] != word_ids[i - 1]
+
+        def ends_sentence(i):
+            end = offsets[i][1]
+            return text[end - 1] in SENTENCE_END_CHARACTERS and (end == len(text) or text[end].isspace())
+
+        chunks = []
+        start = 0
+        while start < count:
+            end = min(start + self.chunk_size, count)
+            if end < count:
+                end = self._cut(start, end, starts_word, ends_sentence)
+            chunks.append(TokenizedChunk(text[offsets[start][0] : offsets[end - 1][1]], token_ids[start:end]))
+            if end == count:
+                break
+
+            # Start the next chunk `chunk_overlap` tokens back, at the beginning of a word
+            next_start = max(end - self.chunk_overlap, start + 1)
+            while next_start > start + 1 and not starts_word(next_start):
+                next_start -= 1
+            start = next_start
+        return chunks
+
+    def _cut(self, start, end, starts_word, ends_sentence):
+        """Returns the end (exclusive) of the chunk starting at `start` whose budget ends at `end`."""
+        # Prefer the last sentence end that keeps enough of the budget
+        earliest = start + max(1, int(self.chunk_size * self.min_sentence_fraction))
+        for i in range(end - 1, earliest - 2, -1):
+            if ends_sentence(i):
+                return i + 1
+        # Otherwise cut before the word the budget ends in, unless the word fills the whole chunk
+        cut = end
+        while cut > start + 1 and not starts_word(cut):
+            cut -= 1
+        return cut
+
+
+def get_token_text_splitter(chunk_size=DEFAULT_CHUNK_TOKENS, chunk_overlap=None, tokenizer=None, model_name=None,
+                            revision=None):
+    """
+    Creates a TokenChunker for the FinBERT tokenizer.
+    Args:
+        chunk_size (int): The maximum number of tokens per chunk.
+        chunk_overlap (int, optional): The number of tokens shared by consecutive chunks.
+            Defaults to DEFAULT_CHUNK_OVERLAP_TOKENS, at most an eighth of the chunk size.
+        tokenizer (object, optional): The fast tokenizer to use; by default the tokenizer of
+            `model_name` is taken from the model registry (without loading the model weights).
+        model_name (str, optional): The model whose tokenizer is used. Defaults to FinBERT.
+        revision (str, optional): The model revision.
+    Returns:
+        TokenChunker: The chunker.
+    """
+    if tokenizer is None:
+        from models.model_registry import DEFAULT_MODEL_NAME, get_tokenizer
+        tokenizer = get_tokenizer(model_name or DEFAULT_MODEL_NAME, revision)
+    if chunk_overlap is None:
+        chunk_overlap = min(DEFAULT_CHUNK_OVERLAP_TOKENS, chunk_size // 8)
+    return TokenChunker(tokenizer, chunk_size, chunk_overlap)
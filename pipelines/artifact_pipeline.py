@@ -0,0 +1,148 @@
+# Stages working from the intermediate store: persisting extraction, NER and embedding outputs, and
+# re-running NER, embedding or indexing from the stored artifacts without re-parsing the PDFs
+
+import json     # Document metadata stored as JSON
+import logging
+import time     # Stage timings
+
+import numpy as np  # Embedding matrices
+
+from utils.metrics import instrumentation
+
+logger = logging.getLogger(__name__)
+
+
+def store_extraction(store, result):
+    """
+    Writes the outputs of `extract_and_chunk_pdf` for one document: its metadata, its pages
+    (when extracted with `keep_pages`) and its chunks.
+    """
+    source = result["source"]
+    store.write("documents", source, {"file_hash": [result["file_hash"]],
+                                      "metadata": [json.dumps(result["metadata"], default=str)]})
+    if "page_texts" in result:
+        pages = result["page_texts"]
+        store.write("pages", source, {"page": [page for page, _ in pages],
+                                      "page_hash": [result["page_hashes"][page] for page, _ in pages],
+                                      "text": [text for _, text in pages]})
+    chunks = result["chunks"]
+    store.write("chunks", source, {"chunk_id": [chunk_id for _, chunk_id, _, _ in chunks],
+                                   "page": [page for page, _, _, _ in chunks],
+                                   "chunk_hash": [chunk_hash for _, _, chunk_hash, _ in chunks],
+                                   "text": [str(chunk) for _, _, _, chunk in chunks]})
+
+
+def store_entities(store, source, texts, tagged):
+    """
+    Writes the entities of one document.
+    Args:
+        store (IntermediateStore): The store.
+        source (str): The document.
+        texts (dict): Chunk ID -> chunk text.
+        tagged (iterable): (chunk_id, entities) pairs, entities as (start, end, label) tuples.
+    Returns:
+        int: The number of entities written.
+    """
+    rows = [(chunk_id, start, end, label, texts[chunk_id][start:end])
+            for chunk_id, entities in tagged for start, end, label in entities]
+    store.write("entities", source, {name: [row[i] for row in rows]
+                                     for i, name in enumerate(("chunk_id", "start", "end", "label", "text"))})
+    return len(rows)
+
+
+def store_embeddings(store, source, chunk_ids, embeddings):
+    """Writes the embeddings of one document, one row per chunk ID."""
+    store.write("embeddings", source, {"chunk_id": list(chunk_ids), "vector": embeddings})
+
+
+def chunk_entities(store, source):
+    """Returns chunk ID -> sorted entity texts of a stored document (empty if NER has not run)."""
+    partition = store.read("entities", source)
+    entities = {}
+    if partition is not None:
+        for chunk_id, text in zip(partition.column("chunk_id"), partition.column("text")):
+            entities.setdefault(chunk_id, set()).add(text)
+    return {chunk_id: sorted(texts) for chunk_id, texts in entities.items()}
+
+
+def retag_from_store(store, entity_processor=None, sources=None):
+    """
+    Re-runs entity tagging over the stored chunks and replaces the stored entities.
+    Args:
+        store (IntermediateStore): The store.
+        entity_processor (FinancialEntityProcessor, optional): Defaults to the lexicon tagger.
+        sources (list, optional): Only these documents. Defaults to every document with chunks.
+    Returns:
+        dict: documents, chunks, entities and seconds.
+    """
+    if entity_processor is None:
+        from nlp.financial_entity import FinancialEntityProcessor
+        entity_processor = FinancialEntityProcessor()
+    start = time.perf_counter()
+    report = {"documents": 0, "chunks": 0, "entities": 0}
+    for partition in store.scan("chunks", sources):
+        chunk_ids, texts = partition.column("chunk_id").to_list(), partition.column("text").to_list()
+        with instrumentation.stage("ner", items=partition.num_rows):
+            tagged = list(entity_processor.iter_entities(zip(chunk_ids, texts)))
+        report["entities"] += store_entities(store, partition.source, dict(zip(chunk_ids, texts)), tagged)
+        report["documents"] += 1
+        report["chunks"] += partition.num_rows
+    report["seconds"] = time.perf_counter() - start
+    return report
+
+
+def reembed_from_store(store, embedder, sources=None, batch_size=None):
+    """
+    Re-embeds the stored chunks, e.g. after a model change, and replaces the stored embeddings.
+    Returns:
+        dict: documents, chunks, seconds and chunks_per_second.
+    """
+    start = time.perf_counter()
+    report = {"documents": 0, "chunks": 0}
+    for partition in store.scan("chunks", sources):
+        texts = partition.column("text").to_list()
+        with instrumentation.stage("embed", items=len(texts)):
+            embeddings = embedder.generate_embeddings(texts, batch_size=batch_size) if texts else np.empty((0, 0), np.float32)
+        store_embeddings(store, partition.source, partition.column("chunk_id").to_list(), embeddings)
+        report["documents"] += 1
+        report["chunks"] += len(texts)
+    report["seconds"] = time.perf_counter() - start
+    report["chunks_per_second"] = report["chunks"] / report["seconds"] if report["seconds"] else 0.0
+    return report
+
+
+def reindex_from_store(store, collection, sources=None, upload_settings=None):
+    """
+    Loads the stored chunks with their stored embeddings (and entities, if any) into a
+    collection, without re-parsing or re-embedding. Documents without embeddings are skipped.
+    Returns:
+        dict: documents, skipped, chunks, upload (the uploader counters) and seconds.
+    """
+    from databases.astra_uploader import AstraBulkUploader
+    from preprocessor import create_astra_db_document
+
+    start = time.perf_counter()
+    report = {"documents": 0, "skipped": 0, "chunks": 0}
+    with AstraBulkUploader(collection, **(upload_settings or {})) as uploader:
+        for chunks in store.scan("chunks", sources):
+            embeddings = store.read("embeddings", chunks.source)
+            if embeddings is None:
+                logger.warning(f"No stored embeddings for {chunks.source}; run the embedding stage first")
+                report["skipped"] += 1
+                continue
+            document = store.read("documents", chunks.source)
+            metadata = json.loads(document.column("metadata")[0]) if document is not None else {"source": chunks.source}
+            entities = chunk_entities(store, chunks.source)
+            rows = {chunk_id: row for row, chunk_id in enumerate(embeddings.column("chunk_id"))}
+            vectors = embeddings.column("vector")
+            documents = [create_astra_db_document(None, text, dict(metadata, page=int(page), entities=entities.get(chunk_id, [])),
+                                                  vectors[rows[chunk_id]], chunk_id)
+                         for chunk_id, page, text in zip(chunks.column("chunk_id"), chunks.column("page"), chunks.column("text"))
+                         if chunk_id in rows]
+            uploader.submit(documents)
+            report["documents"] += 1
+            report["chunks"] += len(documents)
+        report["upload"] = uploader.flush()
+    report["seconds"] = time.perf_counter() - start
+    return report
+
@@ -0,0 +1,440 @@
+# Local pipeline automation: a dependency-aware DAG runner with checkpoint/resume (Class: `DAGRunner`)
+# Runs the extraction -> NLP -> embedding -> load stages without Airflow. Independent tasks run in
+# parallel, every finished task is checkpointed so a crashed run resumes where it stopped, and tasks
+# whose inputs are unchanged since their checkpoint are skipped.
+
+import collections  # Ready queue of the scheduler
+import datetime     # Checkpoint timestamps
+import hashlib      # Task fingerprints and output digests
+import json         # Checkpoint state file
+import logging
+import os       # OS library for checkpoint paths and the CPU count
+import pickle   # Checkpointed task outputs
+import threading    # Locks of the checkpoint store and the lazily loaded embedder
+import time     # Task timings
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from databases.ingestion_manifest import hash_file
+from utils.metrics import instrumentation
+
+logger = logging.getLogger(__name__)
+
+# Directory of the checkpointed task outputs and the state file describing them
+DEFAULT_CHECKPOINT_DIR = os.getenv('PIPELINE_CHECKPOINT_DIR', 'data/processed/checkpoints')
+STATE_FILE = "state.json"
+
+# Tasks of one stage running at the same time; embedding already uses every core per call
+DEFAULT_STAGE_LIMITS = {"embed": 1}
+
+
+class Task:
+    """One node of a DAG: a function of its dependencies' outputs."""
+
+    def __init__(self, name, func, deps=(), inputs=(), params=None, stage=None, version=1):
+        """
+        Args:
+            name (str): The unique task name, e.g. "embed:data/raw_data/q4.pdf".
+            func (callable): Called with a dict of dependency name -> output; returns the task output.
+            deps (tuple): The names of the tasks whose outputs it needs.
+            inputs (tuple): Files read by the task; their content is part of its fingerprint.
+            params (dict, optional): JSON-serializable parameters that change its output.
+            stage (str, optional): The pipeline stage, used for metrics and concurrency limits.
+            version (int): Bump to invalidate the checkpoints after changing `func`.
+        """
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.inputs = tuple(inputs)
+        self.params = params or {}
+        self.stage = stage
+        self.version = version
+
+
+class DAG:
+    """A set of tasks; a dependency must be added before the tasks that use it, so there are no cycles."""
+
+    def __init__(self):
+        self.tasks = {}     # Insertion order is a topological order
+
+    def add(self, name, func, deps=(), inputs=(), params=None, stage=None, version=1):
+        """Adds a task (see `Task`) and returns it."""
+        if name in self.tasks:
+            raise ValueError(f"Duplicate task: {name}")
+        missing = [dep for dep in deps if dep not in self.tasks]
+        if missing:
+            raise ValueError(f"Task {name} depends on unknown tasks: {missing}")
+        task = Task(name, func, deps, inputs, params, stage, version)
+        self.tasks[name] = task
+        return task
+
+    def dependents(self):
+        """Returns task name -> names of the tasks depending on it."""
+        dependents = {name: [] for name in self.tasks}
+        for task in self.tasks.values():
+            for dep in task.deps:
+                dependents[dep].append(task.name)
+        return dependents
+
+    def subgraph(self, targets=None):
+        """Returns the tasks needed for `targets` (all tasks if None) in topological order."""
+        if targets is None:
+            return list(self.tasks.values())
+        needed, stack = set(), list(targets)
+        while stack:
+            name = stack.pop()
+            if name not in needed:
+                needed.add(name)
+                stack.extend(self.tasks[name].deps)
+        return [task for name, task in self.tasks.items() if name in needed]
+
+
+def critical_path(tasks, durations):
+    """
+    Finds the longest chain of dependent tasks, which bounds the run time however many
+    workers there are.
+    Args:
+        tasks (list): The tasks in topological order.
+        durations (dict): Task name -> seconds.
+    Returns:
+        dict: tasks (the chain, first to last) and seconds (its total duration).
+    """
+    finish, previous = {}, {}
+    for task in tasks:
+        start = 0.0
+        for dep in task.deps:
+            if dep in finish and finish[dep] > start:
+                start, previous[task.name] = finish[dep], dep
+        finish[task.name] = start + durations.get(task.name, 0.0)
+    if not finish:
+        return {"tasks": [], "seconds": 0.0}
+    name = max(finish, key=finish.get)
+    seconds, chain = finish[name], [name]
+    while chain[-1] in previous:
+        chain.append(previous[chain[-1]])
+    return {"tasks": chain[::-1], "seconds": seconds}
+
+
+class CheckpointStore:
+    """
+    Task outputs pickled to a directory, with a JSON state file recording for each task its
+    fingerprint, output digest and duration. Both are replaced atomically, so a crash leaves
+    either the previous or the new checkpoint of a task.
+    """
+
+    def __init__(self, directory=DEFAULT_CHECKPOINT_DIR):
+        self.directory = directory
+        self.state_path = os.path.join(directory, STATE_FILE)
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.state = {}
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                self.state = json.load(f)
+
+    def _path(self, name):
+        return os.path.join(self.directory, hashlib.sha256(name.encode("utf-8")).hexdigest()[:32] + ".pkl")
+
+    def get(self, name):
+        """Returns the state entry of a task whose output file exists, or None."""
+        entry = self.state.get(name)
+        return entry if entry and os.path.exists(self._path(name)) else None
+
+    def load(self, name):
+        with open(self._path(name), "rb") as f:
+            return pickle.load(f)
+
+    def discard(self, name):
+        """Forgets the checkpoint of a task, so the next run executes it again."""
+        with self._lock:
+            if self.state.pop(name, None) is None:
+                return
+            with open(self.state_path + ".tmp", "w") as f:
+                json.dump(self.state, f, indent=2)
+            os.replace(self.state_path + ".tmp", self.state_path)
+
+    def save(self, name, fingerprint, output, seconds):
+        """Writes a task output and returns its digest."""
+        data = pickle.dumps(output, protocol=pickle.HIGHEST_PROTOCOL)
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(name)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+        with self._lock:
+            self.state[name] = {"fingerprint": fingerprint, "digest": digest, "seconds": seconds,
+                                "finished_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")}
+            with open(self.state_path + ".tmp", "w") as f:
+                json.dump(self.state, f, indent=2)
+            os.replace(self.state_path + ".tmp", self.state_path)
+        return digest
+
+
+class DAGRunner:
+    """
+    Runs a DAG on a thread pool. A task starts as soon as its dependencies are done; a failed
+    task blocks only its own dependents. Heavy stages (PyMuPDF, FinBERT, database I/O) release
+    the GIL, so threads run them in parallel without pickling the outputs between processes.
+    """
+
+    def __init__(self, dag, checkpoint_dir=DEFAULT_CHECKPOINT_DIR, max_workers=None, stage_limits=None):
+        """
+        Args:
+            dag (DAG): The tasks to run.
+            checkpoint_dir (str): The checkpoint directory. Defaults to PIPELINE_CHECKPOINT_DIR (env).
+            max_workers (int, optional): The size of the thread pool. Defaults to the CPU count.
+            stage_limits (dict, optional): Stage -> maximum concurrent tasks. Defaults to DEFAULT_STAGE_LIMITS.
+        """
+        self.dag = dag
+        self.store = CheckpointStore(checkpoint_dir)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.stage_limits = DEFAULT_STAGE_LIMITS if stage_limits is None else stage_limits
+        self._outputs = {}
+        self._digests = {}
+        self._lock = threading.Lock()
+
+    def _fingerprint(self, task):
+        """Hashes everything a task output depends on: code version, parameters, input files and dependency outputs."""
+        payload = {"name": task.name, "version": task.version, "params": task.params,
+                   "inputs": {path: hash_file(path) for path in task.inputs},
+                   "deps": {dep: self._digests[dep] for dep in task.deps}}
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def _output(self, name):
+        with self._lock:
+            if name not in self._outputs:
+                try:
+                    self._outputs[name] = self.store.load(name)     # Skipped task: read its checkpoint on demand
+                except Exception as e:
+                    # Otherwise every resume would skip the task and fail its dependents the same way
+                    self.store.discard(name)
+                    raise RuntimeError(f"Unreadable checkpoint of {name} ({e!r}); it runs again next time") from e
+            return self._outputs[name]
+
+    def _execute(self, task, force):
+        """Runs or skips one task. Returns (status, seconds)."""
+        fingerprint = self._fingerprint(task)
+        entry = self.store.get(task.name)
+        if not force and entry is not None and entry["fingerprint"] == fingerprint:
+            with self._lock:
+                self._digests[task.name] = entry["digest"]
+            return "skipped", 0.0
+
+        inputs = {dep: self._output(dep) for dep in task.deps}
+        start = time.perf_counter()
+        if task.stage:
+            with instrumentation.stage(task.stage):
+                output = task.func(inputs)
+        else:
+            output = task.func(inputs)
+        seconds = time.perf_counter() - start
+        digest = self.store.save(task.name, fingerprint, output, seconds)
+        with self._lock:
+            self._outputs[task.name] = output
+            self._digests[task.name] = digest
+        return "ok", seconds
+
+    def _release(self, name, waiting_dependents):
+        """Drops an output from memory once every dependent task has used it."""
+        waiting_dependents[name] -= 1
+        if waiting_dependents[name] == 0:
+            with self._lock:
+                self._outputs.pop(name, None)
+
+    def run(self, targets=None, force=False):
+        """
+        Runs the tasks needed for `targets`, resuming from the checkpoints.
+        Args:
+            targets (list, optional): Task names to bring up to date. Defaults to every task.
+            force (bool): Re-run every task, ignoring the checkpoints.
+        Returns:
+            dict: A report with per-task status (ok, skipped, failed or blocked), seconds and
+            error, the counts per status, the wall time and the critical path. The critical path
+            uses the recorded duration of skipped tasks, i.e. the cost of a run from scratch.
+        """
+        run_start = time.perf_counter()
+        tasks = self.dag.subgraph(targets)
+        names = {task.name for task in tasks}
+        dependents = {name: [d for d in deps if d in names] for name, deps in self.dag.dependents().items() if name in names}
+        waiting_deps = {task.name: len(task.deps) for task in tasks}
+        waiting_dependents = {name: len(deps) for name, deps in dependents.items()}
+        results = {}
+        ready = collections.deque(task for task in tasks if not task.deps)
+        running = {}    # Future -> task
+        running_per_stage = collections.Counter()
+
+        def finish(name, status, seconds=0.0, error=None):
+            results[name] = {"status": status, "seconds": seconds, "stage": self.dag.tasks[name].stage}
+            if error:
+                results[name]["error"] = error
+            for dep in self.dag.tasks[name].deps:
+                self._release(dep, waiting_dependents)
+            for dependent in dependents[name]:
+                if status in ("failed", "blocked"):
+                    if dependent not in results:
+                        finish(dependent, "blocked", error=f"dependency {name} {status}")
+                    continue
+                waiting_deps[dependent] -= 1
+                if waiting_deps[dependent] == 0 and dependent not in results:
+                    ready.append(self.dag.tasks[dependent])
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="dag") as executor:
+            while ready or running:
+                # Start every ready task whose stage has a free slot
+                deferred = collections.deque()
+                while ready and len(running) < self.max_workers:
+                    task = ready.popleft()
+                    if task.name in results:
+                        continue
+                    limit = self.stage_limits.get(task.stage)
+                    if limit is not None and running_per_stage[task.stage] >= limit:
+                        deferred.append(task)
+                        continue
+                    running_per_stage[task.stage] += 1
+                    running[executor.submit(self._execute, task, force)] = task
+                ready.extendleft(reversed(deferred))
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    running_per_stage[task.stage] -= 1
+                    try:
+                        status, seconds = future.result()
+                    except Exception as e:
+                        logger.error(f"Task {task.name} failed: {e!r}")
+                        finish(task.name, "failed", error=repr(e))
+                    else:
+                        logger.info(f"Task {task.name} {status} in {seconds:.2f}s")
+                        finish(task.name, status, seconds)
+        self._outputs.clear()
+
+        durations = {name: result["seconds"] if result["status"] == "ok"
+                     else (self.store.get(name) or {}).get("seconds", 0.0) for name, result in results.items()}
+        counts = collections.Counter(result["status"] for result in results.values())
+        return {
+            "tasks": results,
+            **{status: counts.get(status, 0) for status in ("ok", "skipped", "failed", "blocked")},
+            "seconds": time.perf_counter() - run_start,
+            "critical_path": critical_path(tasks, durations),
+        }
+
+
+def build_ingestion_dag(pdf_paths, collection, embedder=None, entity_processor=None, chunker="tokens",
+                        chunk_size=None, batch_size=None, upload_settings=None, store=None, manifest=None):
+    """
+    Builds the per-document ingestion DAG: extract -> (nlp, embed) -> load for every PDF.
+    Documents are independent of each other, and NLP and embedding of one document run side by side.
+    Args:
+        pdf_paths (list): The PDF files.
+        collection (object): The Astra-style collection the documents are loaded into.
+        embedder (object, optional): Anything with `generate_embeddings`; defaults to a PDFPreprocessor
+            created on first use.
+        entity_processor (FinancialEntityProcessor, optional): Tags the chunks; the entity texts are
+            stored in the chunk metadata. Defaults to the lexicon tagger.
+        chunker (str): "tokens" or "characters".
+        chunk_size (int, optional): The chunk size in the chunker's unit.
+        batch_size (int, optional): The number of chunks per forward pass.
+        upload_settings (dict, optional): AstraBulkUploader arguments.
+        store (IntermediateStore, optional): Also persist the pages, chunks, entities and embeddings
+            of every document, so later runs can re-embed, re-tag or re-index without re-parsing.
+        manifest (IngestionManifest, optional): The ingestion manifest shared with `ingest-corpus`. A
+            load deletes the chunks the manifest lists for the document that it no longer has (e.g.
+            after the PDF changed), then records the document.
+    Returns:
+        DAG: The ingestion DAG.
+    """
+    from databases.astra_uploader import AstraBulkUploader, delete_documents
+    from databases.ingestion_manifest import hash_metadata
+    from pipelines.artifact_pipeline import store_embeddings, store_entities, store_extraction
+    from pipelines.extraction_pipeline import extract_and_chunk_pdf
+    from nlp.tokenization import TokenizedChunk
+    from preprocessor import create_astra_db_document
+
+    embedder_lock = threading.Lock()
+    shared = {"embedder": embedder, "entities": entity_processor}
+
+    def get_embedder():
+        with embedder_lock:
+            if shared["embedder"] is None:
+                from pipelines.embedding_pipeline import load_default_embedder
+                shared["embedder"] = load_default_embedder()
+            return shared["embedder"]
+
+    def get_entity_processor():
+        with embedder_lock:
+            if shared["entities"] is None:
+                from nlp.financial_entity import FinancialEntityProcessor
+                shared["entities"] = FinancialEntityProcessor()
+            return shared["entities"]
+
+    def extract(path):
+        def run(inputs):
+            result = extract_and_chunk_pdf(path, chunk_size, chunker=chunker, keep_pages=store is not None)
+            result.pop("extract_seconds", None)     # Keeps the output digest stable across re-extractions
+            if store is not None:
+                store_extraction(store, result)
+                del result["page_texts"]    # Stored; the later stages only need the chunks
+            # The checkpoint holds plain data only, so it never depends on the chunk classes
+            result["chunks"] = [(page, chunk_id, chunk_hash, str(chunk), getattr(chunk, "token_ids", None))
+                                for page, chunk_id, chunk_hash, chunk in result["chunks"]]
+            return result
+        return run
+
+    def nlp(extracted):
+        def run(inputs):
+            chunks = inputs[extracted]["chunks"]
+            tagged = list(get_entity_processor().iter_entities((chunk_id, text) for _, chunk_id, _, text, _ in chunks))
+            texts = {chunk_id: text for _, chunk_id, _, text, _ in chunks}
+            if store is not None:
+                store_entities(store, inputs[extracted]["source"], texts, tagged)
+            return {chunk_id: sorted({texts[chunk_id][start:end] for start, end, _ in entities})
+                    for chunk_id, entities in tagged}
+        return run
+
+    def embed(extracted):
+        def run(inputs):
+            chunks = inputs[extracted]["chunks"]
+            # Token chunks get their token IDs back, so FinBERT does not tokenize them again
+            texts = [text if token_ids is None else TokenizedChunk(text, token_ids) for _, _, _, text, token_ids in chunks]
+            embeddings = get_embedder().generate_embeddings(texts, batch_size=batch_size) if texts else None
+            if store is not None and embeddings is not None:
+                store_embeddings(store, inputs[extracted]["source"], [chunk_id for _, chunk_id, _, _, _ in chunks], embeddings)
+            return embeddings
+        return run
+
+    def load(extracted, tagged, embedded):
+        def run(inputs):
+            result, entities, embeddings = inputs[extracted], inputs[tagged], inputs[embedded]
+            documents = [create_astra_db_document(None, text, dict(result["metadata"], page=page_number,
+                                                                   entities=entities[chunk_id]),
+                                                  embedding, chunk_id)
+                         for (page_number, chunk_id, _, text, _), embedding in zip(result["chunks"], [] if embeddings is None else embeddings)]
+            # Chunks of an earlier version of the document are deleted first, like ingest_corpus does
+            chunk_ids = {chunk_id for _, chunk_id, _, _, _ in result["chunks"]}
+            stale_ids = manifest.stored_chunk_ids(result["source"]) - chunk_ids if manifest is not None else set()
+            if stale_ids:
+                delete_documents(collection, stale_ids)
+                manifest.invalidate_references(stale_ids, except_source=result["source"])
+            # The checkpoint is only written once every document is stored
+            with AstraBulkUploader(collection, **(upload_settings or {})) as uploader:
+                uploader.submit(documents)
+            if manifest is not None:
+                manifest.record(result["source"], result["file_hash"], hash_metadata(result["metadata"]),
+                                result["page_hashes"], {chunk_id: {"hash": chunk_hash, "page": page}
+                                                        for page, chunk_id, chunk_hash, _, _ in result["chunks"]})
+                manifest.save()
+            return {"documents": len(documents), "deleted": len(stale_ids)}
+        return run
+
+    dag = DAG()
+    target = getattr(collection, "full_name", None) or getattr(collection, "name", None) or getattr(collection, "path", None)
+    for path in pdf_paths:
+        extracted, tagged, embedded = f"extract:{path}", f"nlp:{path}", f"embed:{path}"
+        dag.add(extracted, extract(path), inputs=[path], params={"chunker": chunker, "chunk_size": chunk_size},
+                stage="extract", version=2)
+        dag.add(tagged, nlp(extracted), deps=[extracted], stage="ner")
+        dag.add(embedded, embed(extracted), deps=[extracted], stage="embed")
+        dag.add(f"load:{path}", load(extracted, tagged, embedded), deps=[extracted, tagged, embedded],
+                params={"collection": str(target)}, stage="upload")
+    return dag
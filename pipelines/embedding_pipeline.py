@@ -0,0 +1,433 @@
+# Corpus ingestion: process-pool extraction feeding dedicated FinBERT embedding and NER workers
+
+import logging
+import multiprocessing  # Worker processes and the bounded chunk queue
+import os       # OS library for the CPU count
+import queue    # Empty exception raised by queue timeouts
+import threading    # Collector thread that drains the embedding results
+import time     # Per-file and whole-run timings
+from concurrent.futures import ProcessPoolExecutor, as_completed   # Process pool for CPU-bound extraction
+
+from pipelines.extraction_pipeline import extract_and_chunk_pdf
+from databases.ingestion_manifest import hash_metadata
+from nlp.dedup import NearDuplicateIndex, dedup_report
+from pipelines.nlp_pipeline import entity_worker
+from preprocessor import CHUNK_WINDOW_SIZE, DEFAULT_CHUNKER, EMBEDDING_BATCH_SIZE, create_astra_db_document
+from utils.metrics import instrumentation
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of chunk windows waiting for an embedding worker (and as many for a NER worker)
+DEFAULT_QUEUE_SIZE = 8
+
+
+def load_default_embedder(inference_backend=None):
+    """Loads the FinBERT preprocessor used by the embedding workers, with an optional inference backend."""
+    from preprocessor import PDFPreprocessor
+    return PDFPreprocessor(inference_backend=inference_backend)
+
+
+def record_file_metrics(report):
+    """
+    Records the stage timings of one ingested file. Extraction and embedding run in worker
+    processes, so their timings travel back in the file report and are recorded here, in the
+    process that exports the metrics.
+    """
+    status = "processed" if report["status"] == "ok" else report["status"]
+    instrumentation.count("pipeline_documents_total", status=status)
+    if "extract_seconds" in report:
+        instrumentation.observe("pipeline_stage_seconds", report["extract_seconds"], stage="extract")
+        instrumentation.count("pipeline_items_total", report.get("pages", 0), stage="extract")
+        instrumentation.count("pipeline_items_total", report.get("chunks", 0), stage="chunk")
+    if report.get("embed_seconds"):
+        instrumentation.observe("pipeline_stage_seconds", report["embed_seconds"], stage="embed")
+        instrumentation.count("pipeline_items_total", report.get("embedded", 0), stage="embed")
+    if report.get("ner_seconds"):
+        instrumentation.observe("pipeline_stage_seconds", report["ner_seconds"], stage="ner")
+        instrumentation.count("pipeline_items_total", report.get("embedded", 0), stage="ner")
+    if report["status"] == "failed":
+        instrumentation.count("pipeline_errors_total", stage="ingest")
+    instrumentation.observe("pipeline_document_seconds", report["total_seconds"],
+                            status="ok" if report["status"] == "ok" else "failed")
+
+
+def embedding_worker(task_queue, result_queue, embedder_factory, torch_threads, batch_size):
+    """
+    Runs in a dedicated process: loads the embedder once, then embeds chunk windows from
+    `task_queue` until it receives None.
+    Args:
+        task_queue (multiprocessing.Queue): (source, window_index, texts) tasks.
+        result_queue (multiprocessing.Queue): Receives ("embed", source, window_index, embeddings, seconds, error).
+        embedder_factory (callable): A picklable callable returning an object with `generate_embeddings`.
+        torch_threads (int): The number of intra-op threads torch may use in this worker.
+        batch_size (int): The number of chunks per forward pass.
+    """
+    import torch
+    torch.set_num_threads(torch_threads)
+
+    try:
+        embedder = embedder_factory()
+    except Exception as e:
+        result_queue.put(("embed", None, None, None, 0.0, f"embedding worker failed to start: {e!r}"))
+        return
+
+    while True:
+        task = task_queue.get()
+        if task is None:    # Sentinel sent once all files are queued
+            return
+        source, window_index, texts = task
+        start = time.perf_counter()
+        try:
+            embeddings = embedder.generate_embeddings(texts, batch_size=batch_size)
+            result_queue.put(("embed", source, window_index, embeddings, time.perf_counter() - start, None))
+        except Exception as e:
+            result_queue.put(("embed", source, window_index, None, 0.0, repr(e)))
+
+
+def ingest_corpus(pdf_paths, insert_documents, embedder_factory=load_default_embedder, extract_workers=None,
+                  embed_workers=1, torch_threads=None, queue_size=DEFAULT_QUEUE_SIZE, window_size=CHUNK_WINDOW_SIZE,
+                  batch_size=EMBEDDING_BATCH_SIZE, start_method="spawn", manifest=None, delete_documents=None,
+                  chunker=DEFAULT_CHUNKER, chunk_size=None, dedup=True, dedup_index=None, flush_documents=None,
+                  entity_processor_factory=None, ner_workers=1):
+    """
+    Ingests many PDF files: a process pool extracts and chunks the files, chunk windows flow
+    through a bounded queue into one or more embedding worker processes (and, with an entity
+    processor, the same windows through a second queue into NER worker processes), and the
+    resulting documents are handed to `insert_documents` in this process. A failure in one file is
+    recorded in the report and does not stop the rest of the batch. Files are recorded in the
+    manifest only once their documents are confirmed stored.
+    With a manifest, unchanged files are skipped, only new or changed chunks are embedded and
+    inserted, and chunks that disappeared from a file are deleted. Near-duplicate chunks, within
+    a file or across the corpus, are recorded as references to their canonical chunk and are
+    neither embedded nor inserted; a file referencing chunks of a file that fails in the same run
+    fails too, as those chunks are never stored.
+    Args:
+        pdf_paths (list): The PDF files to ingest.
+        insert_documents (callable): Called with each list of Astra DB documents to store. It may
+            only queue them (e.g. `AstraBulkUploader.submit`) if `flush_documents` is given.
+        embedder_factory (callable): A picklable callable returning an object with `generate_embeddings`.
+        extract_workers (int, optional): The size of the extraction pool. Defaults to the CPU count.
+        embed_workers (int): The number of embedding worker processes.
+        torch_threads (int, optional): Torch threads per embedding worker. Defaults to the CPU
+            count divided by `embed_workers`.
+        queue_size (int): The maximum number of chunk windows waiting to be embedded.
+        window_size (int): The number of chunks per queued window.
+        batch_size (int): The number of chunks per forward pass.
+        start_method (str): The multiprocessing start method for all worker processes.
+        manifest (IngestionManifest, optional): The manifest used for incremental re-ingestion;
+            it is updated and saved at the end of the run.
+        delete_documents (callable, optional): Called with a list of chunk IDs to delete; required
+            for stale chunks to be removed.
+        chunker (str): "tokens" or "characters" (see `preprocessor.get_text_splitter`).
+        chunk_size (int, optional): The chunk size in the chunker's unit.
+        dedup (bool): Whether near-duplicate chunks are replaced by references. Default is True.
+        dedup_index (NearDuplicateIndex, optional): The near-duplicate index; a persisted index
+            is saved at the end of the run. Defaults to an empty index for this run.
+        flush_documents (callable, optional): Called once every file is handled; waits until the
+            queued documents are stored and raises if some are not (an `UploadError` names them).
+            The files of failed documents are reported as failed and left out of the manifest.
+        entity_processor_factory (callable, optional): A picklable callable returning an object
+            with `iter_entities` (see `pipelines.nlp_pipeline.load_entity_processor`); the sorted
+            entity texts of each chunk are stored in its metadata under "entities". Without it
+            no NER runs.
+        ner_workers (int): The number of NER worker processes when an entity processor is given.
+    Returns:
+        dict: A report with one entry per file (pages, chunks, duplicates, timings,
+        chunks_per_second or error) plus totals for the whole run and the dedup savings.
+    """
+    run_start = time.perf_counter()
+    cpu_count = os.cpu_count() or 1
+    torch_threads = torch_threads or max(1, cpu_count // embed_workers)
+    context = multiprocessing.get_context(start_method)
+
+    task_queue = context.Queue(maxsize=queue_size)
+    result_queue = context.Queue()
+    workers = [
+        context.Process(target=embedding_worker,
+                        args=(task_queue, result_queue, embedder_factory, torch_threads, batch_size),
+                        daemon=True)
+        for _ in range(embed_workers)
+    ]
+    # The NER workers tag the same windows; a window is inserted once both results are in
+    ner_queue = None
+    stages = {"embed": workers}
+    if entity_processor_factory is not None and ner_workers > 0:
+        ner_queue = context.Queue(maxsize=queue_size)
+        stages["ner"] = [context.Process(target=entity_worker, args=(ner_queue, result_queue, entity_processor_factory),
+                                         daemon=True)
+                         for _ in range(ner_workers)]
+    for worker in (worker for group in stages.values() for worker in group):
+        worker.start()
+
+    def dead_stage():
+        # The first stage whose workers have all exited, e.g. after failing to start
+        for stage, group in stages.items():
+            if not any(worker.is_alive() for worker in group):
+                return "no embedding worker alive" if stage == "embed" else "no NER worker alive"
+        return None
+
+    lock = threading.Lock()
+    files = {path: {"source": path, "status": "pending", "chunks": 0, "embed_seconds": 0.0} for path in pdf_paths}
+    if ner_queue is not None:
+        for report in files.values():
+            report["ner_seconds"] = 0.0
+    pending = {}        # (source, window_index) -> (metadata, window, {stage: (result, seconds)}) awaiting results
+    remaining = {}      # source -> number of windows not yet inserted
+    file_start = {}
+    manifest_entries = {}   # source -> arguments of IngestionManifest.record once the file succeeds
+    canonical_sources = {}  # source -> the other files of this run whose chunks its duplicates reference
+    dedup_index = dedup_index if dedup_index is not None else NearDuplicateIndex()
+    dedup_totals = {"duplicates": 0, "embedded": 0, "skipped_embeddings": 0}
+
+    def finish_file(report, error=None):
+        # Called with the lock held once the last window of a file is inserted or it fails
+        report["status"] = "failed" if error else "ok"
+        if error:
+            report["error"] = error
+            dedup_index.remove_source(report["source"])     # Its chunks are not stored, so nothing may reference them
+        report["total_seconds"] = time.perf_counter() - file_start.get(report["source"], run_start)
+        if not error:
+            report["chunks_per_second"] = report["chunks"] / report["total_seconds"] if report["total_seconds"] else 0.0
+        else:
+            manifest_entries.pop(report["source"], None)
+        record_file_metrics(report)
+        message = f"[{report['status']}] {report['source']}: {report['chunks']} chunks in {report['total_seconds']:.2f}s"
+        if error:
+            logger.error(f"{message} ({error})")
+        else:
+            logger.info(message)
+
+    def fail_finished(report, error, stage):
+        # A file reported as done whose documents, or the canonical chunks it references, were not stored
+        report["status"] = "failed"
+        report["error"] = error
+        report["failed_stage"] = stage
+        report.pop("chunks_per_second", None)
+        dedup_index.remove_source(report["source"])
+        manifest_entries.pop(report["source"], None)
+        instrumentation.count("pipeline_errors_total", stage="upload")
+        logger.error(f"[failed] {report['source']}: {error}")
+
+    def collect_results():
+        # Drain the embedding and NER results, build the documents and insert them
+        while True:
+            with lock:
+                if queuing_done.is_set() and not pending:
+                    return
+            try:
+                stage, source, window_index, result, seconds, error = result_queue.get(timeout=0.5)
+            except queue.Empty:
+                dead = dead_stage()
+                if dead:
+                    with lock:
+                        for source, _ in list(pending):
+                            if files[source]["status"] == "pending":
+                                finish_file(files[source], dead)
+                        pending.clear()
+                    return
+                continue
+
+            if source is None:      # A worker could not load its model
+                logger.error(error)
+                continue
+
+            with lock:
+                if (source, window_index) not in pending:     # The other stage of this window already failed
+                    continue
+                metadata, window, results = pending[(source, window_index)]
+                results[stage] = (result, seconds)
+                if error is None and len(results) < len(stages):
+                    continue        # Still waiting for the other stage
+                del pending[(source, window_index)]
+                report = files[source]
+                if report["status"] != "pending":
+                    continue
+
+            # Insert outside the lock so slow uploads never block the queuing of new windows
+            if error is None:
+                try:
+                    # The embeddings are precomputed, so no preprocessor instance is needed
+                    embeddings = results["embed"][0]
+                    entities = results["ner"][0] if "ner" in results else [None] * len(window)
+                    documents = []
+                    for (page_number, chunk_id, _, chunk), embedding, chunk_entities in zip(window, embeddings, entities):
+                        chunk_metadata = dict(metadata, page=page_number)
+                        if chunk_entities is not None:
+                            chunk_metadata["entities"] = chunk_entities
+                        documents.append(create_astra_db_document(None, chunk, chunk_metadata, embedding, chunk_id))
+                    with instrumentation.stage("upload", items=len(documents)):
+                        insert_documents(documents)
+                except Exception as e:
+                    error = repr(e)
+
+            with lock:
+                if report["status"] != "pending":
+                    continue
+                if error is not None:
+                    finish_file(report, error)
+                    continue
+                report["embed_seconds"] += results["embed"][1]
+                if "ner" in results:
+                    report["ner_seconds"] += results["ner"][1]
+                remaining[source] -= 1
+                if remaining[source] == 0:
+                    finish_file(report)
+
+    def put_task(target_queue, task):
+        # Block while the queue is full, but give up if every worker of a stage has exited
+        while True:
+            try:
+                target_queue.put(task, timeout=0.5)
+                return True
+            except queue.Full:
+                if dead_stage():
+                    return False
+
+    queuing_done = threading.Event()
+    collector = threading.Thread(target=collect_results, daemon=True)
+    collector.start()
+
+    # Extract and chunk the files in a process pool and queue their chunk windows as they finish
+    with ProcessPoolExecutor(max_workers=extract_workers or cpu_count, mp_context=context) as pool:
+        futures = {}
+        for path in pdf_paths:
+            entry = manifest.get(path) if manifest is not None else None
+            futures[pool.submit(extract_and_chunk_pdf, path, chunk_size, entry and entry["file_hash"], chunker)] = path
+        for future in as_completed(futures):
+            path = futures[future]
+            report = files[path]
+            try:
+                extracted = future.result()
+            except Exception as e:
+                with lock:
+                    finish_file(report, repr(e))
+                continue
+
+            if extracted["unchanged"]:
+                with lock:
+                    report["status"] = "unchanged"
+                instrumentation.count("pipeline_documents_total", status="unchanged")
+                continue
+
+            # Only chunks not yet stored with the same metadata are embedded and inserted
+            chunks = extracted["chunks"]
+            metadata_hash = hash_metadata(extracted["metadata"])
+            known_ids, stored_ids = set(), set()
+            if manifest is not None:
+                known_ids = manifest.known_chunk_ids(path, metadata_hash)
+                stored_ids = manifest.stored_chunk_ids(path)
+
+            # Near-duplicates of an indexed chunk become references to it instead of new vectors
+            with lock:
+                dedup_index.remove_source(path)
+                references = {}
+                for _, chunk_id, _, chunk in (chunks if dedup else []):
+                    canonical_id = dedup_index.find_or_add(chunk_id, chunk, path)
+                    if canonical_id is not None:
+                        references[chunk_id] = canonical_id
+                # Canonicals stored by earlier runs are safe; those of this run's files are only once they succeed
+                canonical_sources[path] = {dedup_index.source_of(canonical_id) for canonical_id in references.values()}
+                canonical_sources[path] &= set(files) - {path}
+            canonical_ids = {chunk_id for _, chunk_id, _, _ in chunks if chunk_id not in references}
+            stale_ids = stored_ids - (known_ids & canonical_ids)
+            if stale_ids and delete_documents is not None:
+                try:
+                    delete_documents(list(stale_ids))   # Deleted first, so re-inserted IDs never collide
+                except Exception as e:
+                    with lock:
+                        finish_file(report, repr(e))
+                    continue
+                if manifest is not None:
+                    manifest.invalidate_references(stale_ids, except_source=path)
+            new_chunks = [chunk for chunk in chunks if chunk[1] not in known_ids and chunk[1] not in references]
+
+            windows = [new_chunks[i : i + window_size] for i in range(0, len(new_chunks), window_size)]
+            with lock:
+                file_start[path] = time.perf_counter() - extracted["extract_seconds"]
+                report.update(pages=extracted["pages"], chunks=len(chunks), embedded=len(new_chunks),
+                              duplicates=len(references), deleted=len(stale_ids),
+                              extract_seconds=extracted["extract_seconds"])
+                dedup_totals["duplicates"] += len(references)
+                dedup_totals["embedded"] += len(new_chunks)
+                dedup_totals["skipped_embeddings"] += sum(chunk_id not in known_ids for chunk_id in references)
+                entries = {chunk_id: {"hash": chunk_hash, "page": page} for page, chunk_id, chunk_hash, _ in chunks}
+                for chunk_id, canonical_id in references.items():
+                    entries[chunk_id]["canonical"] = canonical_id
+                manifest_entries[path] = (extracted["file_hash"], metadata_hash, extracted["page_hashes"], entries)
+                remaining[path] = len(windows)
+                for window_index, window in enumerate(windows):
+                    pending[(path, window_index)] = (extracted["metadata"], window, {})
+                if not windows:
+                    finish_file(report)
+            for window_index, window in enumerate(windows):
+                if not put_task(task_queue, (path, window_index, [chunk for *_, chunk in window])):
+                    break
+                if ner_queue is not None and not put_task(
+                        ner_queue, (path, window_index, [(chunk_id, str(chunk)) for _, chunk_id, _, chunk in window])):
+                    break
+
+    queuing_done.set()
+    collector.join()
+    lost_workers = dead_stage()     # Checked before the sentinels stop the remaining workers
+    for stage_queue, group in ((task_queue, workers), (ner_queue, stages.get("ner", []))):
+        for _ in group:
+            # A stage whose workers all exited leaves its queue full, so its sentinels could block forever
+            while any(worker.is_alive() for worker in group):
+                try:
+                    stage_queue.put(None, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+    for worker in (worker for group in stages.values() for worker in group):
+        worker.join(timeout=10)
+
+    # Files still pending lost their embedding or NER workers before their windows were inserted
+    for report in files.values():
+        if report["status"] == "pending":
+            finish_file(report, lost_workers or "no embedding worker alive")
+
+    # Queued uploads must be confirmed before any file counts as ingested
+    if flush_documents is not None:
+        try:
+            with instrumentation.stage("upload"):
+                flush_documents()
+        except Exception as e:
+            failed_sources = {doc["metadata"]["source"] for doc in getattr(e, "failed_documents", None) or []}
+            for report in files.values():
+                # Without a list of failed documents, every file that queued documents is suspect
+                if report["status"] == "ok" and (report["source"] in failed_sources
+                                                 or (not failed_sources and report.get("embedded"))):
+                    fail_finished(report, f"upload failed: {e!r}", "upload")
+
+    # Duplicates referencing chunks of a file that failed in this run point at vectors never stored
+    while True:
+        failed = {source for source, report in files.items() if report["status"] == "failed"}
+        dependents = [(report, sorted(canonical_sources.get(source, set()) & failed)) for source, report in files.items()
+                      if report["status"] == "ok" and canonical_sources.get(source, set()) & failed]
+        if not dependents:
+            break
+        for report, failed_sources in dependents:
+            fail_finished(report, f"references chunks of failed files: {', '.join(failed_sources)}", "reference")
+
+    if manifest is not None:
+        for source, entry in manifest_entries.items():
+            if files[source]["status"] == "ok":
+                manifest.record(source, *entry)
+        manifest.save()
+    if dedup_index.path:
+        dedup_index.save()
+
+    elapsed = time.perf_counter() - run_start
+    file_reports = [files[path] for path in pdf_paths]
+    total_chunks = sum(report["chunks"] for report in file_reports if report["status"] == "ok")
+    return {
+        "files": file_reports,
+        "succeeded": sum(report["status"] == "ok" for report in file_reports),
+        "failed": sum(report["status"] == "failed" for report in file_reports),
+        "unchanged": sum(report["status"] == "unchanged" for report in file_reports),
+        "chunks": total_chunks,
+        "elapsed_seconds": elapsed,
+        "chunks_per_second": total_chunks / elapsed if elapsed else 0.0,
+        "dedup": dedup_report(total_chunks, dedup_totals["duplicates"], dedup_totals["embedded"],
+                              dedup_totals["skipped_embeddings"]),
+    }
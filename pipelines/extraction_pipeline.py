@@ -0,0 +1,90 @@
+# Functions for extracting and chunking PDF filings (used by the corpus ingestion workers)
+
+import os       # OS library for walking the input directory
+import time     # Timing of the extraction stage
+
+from databases.ingestion_manifest import ChunkIdGenerator, hash_file, hash_text
+from preprocessor import (
+    DEFAULT_CHUNKER,
+    build_document_metadata,
+    chunk_pages,
+    get_text_splitter,
+    stream_pages_and_metadata_from_pdf,
+)
+
+
+def list_pdf_files(input_dir):
+    """
+    Lists the PDF files below a directory.
+    Args:
+        input_dir (str): The directory to search, e.g. data/raw_data.
+    Returns:
+        list: The sorted file paths of all PDF files found recursively.
+    """
+    pdf_paths = []
+    for root, _, files in os.walk(input_dir):
+        for name in files:
+            if name.lower().endswith(".pdf"):
+                pdf_paths.append(os.path.join(root, name))
+    return sorted(pdf_paths)
+
+
+def extract_and_chunk_pdf(pdf_path, chunk_size=None, known_file_hash=None, chunker=DEFAULT_CHUNKER, keep_pages=False):
+    """
+    Extracts and chunks one PDF file. Runs in a worker process of the extraction pool, so
+    it only takes and returns picklable values.
+    Args:
+        pdf_path (str): The file path to the PDF document.
+        chunk_size (int, optional): The chunk size in the chunker's unit; None uses its default.
+        known_file_hash (str, optional): The file hash recorded in the ingestion manifest; if
+            the file still has this hash it is not extracted again.
+        chunker (str): "tokens" (FinBERT token budgets; the chunks carry their token IDs) or "characters".
+        keep_pages (bool): Also return the page texts, e.g. to store them in the intermediate store.
+    Returns:
+        dict: A dictionary containing:
+            - source (str): The PDF file path.
+            - file_hash (str): The hash of the file content.
+            - unchanged (bool): True if the file matches `known_file_hash`; nothing else is set then.
+            - metadata (dict): The document metadata stored with every chunk.
+            - chunks (list): (page_number, chunk_id, chunk_hash, chunk) tuples in document order.
+            - page_hashes (dict): Page number -> page text hash.
+            - pages (int): The number of pages read.
+            - page_texts (list): (page_number, text) tuples; only with `keep_pages`.
+            - extract_seconds (float): The time spent extracting and chunking.
+    """
+    start = time.perf_counter()
+    file_hash = hash_file(pdf_path)
+    if file_hash == known_file_hash:
+        return {"source": pdf_path, "file_hash": file_hash, "unchanged": True}
+
+    pages, pdf_metadata = stream_pages_and_metadata_from_pdf(pdf_path)
+    splitter = get_text_splitter(chunker, chunk_size)
+
+    # Hash every page as it streams past
+    page_hashes = {}
+    page_texts = []
+
+    def hashed(pages):
+        for page_number, page_text in pages:
+            page_hashes[page_number] = hash_text(page_text)
+            if keep_pages:
+                page_texts.append((page_number, page_text))
+            yield page_number, page_text
+
+    chunk_ids = ChunkIdGenerator(pdf_path)
+    chunks = [(page_number, *chunk_ids.next_id(chunk), chunk)
+              for page_number, chunk in chunk_pages(hashed(pages), splitter)]
+
+    result = {
+        "source": pdf_path,
+        "file_hash": file_hash,
+        "unchanged": False,
+        "metadata": build_document_metadata(pdf_path, pdf_metadata),
+        "chunks": chunks,
+        "page_hashes": page_hashes,
+        "pages": len(page_hashes),
+        "extract_seconds": time.perf_counter() - start,
+    }
+    if keep_pages:
+        result["page_texts"] = page_texts
+    return result
@@ -0,0 +1,78 @@
+# NER stage of the corpus ingestion: entity worker processes tagging the same chunk windows as the embedding workers
+
+import time     # Per-window tagging time
+
+from nlp.basic_ner import DEFAULT_NER_BATCH_SIZE, DEFAULT_SPACY_MODEL
+
+# Entity engines: the compiled financial lexicon, spaCy, or the lexicon as a pre-pass in front of spaCy
+NER_ENGINES = ("lexicon", "spacy", "both")
+
+
+def load_entity_processor(engine="lexicon", lexicon_path=None, model_name=DEFAULT_SPACY_MODEL,
+                          batch_size=DEFAULT_NER_BATCH_SIZE, n_process=1):
+    """
+    Builds the entity processor of an engine. The spaCy model is only loaded on first use, so
+    the processor is cheap to build in each worker process.
+    Args:
+        engine (str): "lexicon", "spacy" or "both".
+        lexicon_path (str, optional): CSV of term,label rows replacing the built-in financial lexicon.
+        model_name (str): The spaCy model or model directory.
+        batch_size (int): Chunks per `nlp.pipe` batch.
+        n_process (int): Processes used by `nlp.pipe`.
+    Returns:
+        FinancialEntityProcessor or BasicNERProcessor: A processor with `iter_entities`.
+    """
+    from nlp.basic_ner import BasicNERProcessor
+    from nlp.financial_entity import FinancialEntityProcessor, load_lexicon
+
+    if engine not in NER_ENGINES:
+        raise ValueError(f"Unknown NER engine {engine!r}; expected one of {', '.join(NER_ENGINES)}")
+    processor = None
+    if engine != "lexicon":
+        processor = BasicNERProcessor(model_name, batch_size=batch_size, n_process=n_process)
+    if engine == "spacy":
+        return processor
+    lexicon = load_lexicon(lexicon_path) if lexicon_path else None
+    return FinancialEntityProcessor(lexicon, ner=processor, batch_size=batch_size)
+
+
+def tag_chunks(processor, chunks):
+    """
+    Tags chunks and returns the entity texts stored in the document metadata.
+    Args:
+        processor: An object with `iter_entities`, e.g. from `load_entity_processor`.
+        chunks (list): (chunk_id, text) tuples.
+    Returns:
+        list: The sorted, distinct entity texts of each chunk, in input order.
+    """
+    texts = dict(chunks)
+    return [sorted({texts[chunk_id][start:end] for start, end, _ in entities})
+            for chunk_id, entities in processor.iter_entities(chunks)]
+
+
+def entity_worker(task_queue, result_queue, processor_factory):
+    """
+    Runs in a dedicated process: builds the entity processor once, then tags chunk windows from
+    `task_queue` until it receives None.
+    Args:
+        task_queue (multiprocessing.Queue): (source, window_index, chunks) tasks, chunks as (chunk_id, text) tuples.
+        result_queue (multiprocessing.Queue): Receives ("ner", source, window_index, entities, seconds, error).
+        processor_factory (callable): A picklable callable returning an object with `iter_entities`.
+    """
+    try:
+        processor = processor_factory()
+    except Exception as e:
+        result_queue.put(("ner", None, None, None, 0.0, f"NER worker failed to start: {e!r}"))
+        return
+
+    while True:
+        task = task_queue.get()
+        if task is None:    # Sentinel sent once all files are queued
+            return
+        source, window_index, chunks = task
+        start = time.perf_counter()
+        try:
+            entities = tag_chunks(processor, chunks)
+            result_queue.put(("ner", source, window_index, entities, time.perf_counter() - start, None))
+        except Exception as e:
+            result_queue.put(("ner", source, window_index, None, 0.0, repr(e)))
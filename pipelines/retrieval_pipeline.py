@@ -0,0 +1,351 @@
+# Hybrid retrieval: a compact BM25 inverted index kept alongside the vectors (Class: `HybridRetriever`)
+# Exact financial tokens (ARPU, DAUq, Q3 2024, dollar figures) are matched lexically; the index either
+# prefilters the candidates the vector search scores, or its ranking is fused with the vector ranking
+# by reciprocal rank fusion (RRF).
+
+import math     # BM25 inverse document frequencies
+import os       # OS library for the index path
+import re       # Financial tokenizer
+import threading    # Lock guarding index updates against concurrent queries
+
+import numpy as np  # Compact postings arrays and vectorized BM25 scoring
+
+from query_handler.query_router import QUARTER_PATTERN, FISCAL_YEAR_PATTERN, normalize_year
+from utils.metrics import instrumentation
+
+# Location of the persisted index
+DEFAULT_LEXICAL_INDEX_PATH = os.getenv('LEXICAL_INDEX_PATH', 'data/processed/bm25_index.npz')
+
+# BM25 term-frequency saturation and length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Lexical candidates per query; the Astra Data API accepts at most 100 values in an `$in` filter
+DEFAULT_CANDIDATES = 100
+
+# Rank offset of reciprocal rank fusion; 60 is the value of the original RRF paper
+DEFAULT_RRF_K = 60
+
+RETRIEVAL_MODES = ("prefilter", "rrf", "vector", "lexical")
+
+# Numbers keep their decimals ("315.1", "21%" -> "21"), words keep inner ampersands and digits ("q3", "p&l")
+TOKEN_PATTERN = re.compile(r"\d+(?:[.,]\d+)*|[a-z][a-z0-9&]*")
+STOPWORDS = frozenset("""
+a an and are as at be by did do does for from had has have how in is it its of on or our said say the
+than that their there these this to was we were what when which who why will with you your
+""".split())
+
+
+def tokenize(text):
+    """
+    Splits text into lowercase index terms. Fiscal periods also become single terms, so
+    "Q3 2024", "Q3'24" and "q3 fy24" all match "q3_2024" (and "FY2023" matches "fy_2023").
+    """
+    text = text.lower()
+    terms = [term.replace(",", "") for term in TOKEN_PATTERN.findall(text) if term not in STOPWORDS]
+    terms += [f"q{quarter}_{normalize_year(year)}" for quarter, year in QUARTER_PATTERN.findall(text)]
+    terms += [f"fy_{normalize_year(year)}" for year in FISCAL_YEAR_PATTERN.findall(text)]
+    return terms
+
+
+class BM25Index:
+    """
+    An inverted index in compressed sparse row form: per term a contiguous run of
+    (document, term frequency) postings in two NumPy arrays. New documents go to a pending
+    buffer and are merged into the arrays on the next `compact`, which also drops removed
+    documents. Scoring touches only the postings of the query terms.
+    `fingerprint` is the ingestion manifest fingerprint the index was built at; once the manifest
+    moves on, chunks ingested since are missing from the index (see `is_current`).
+    """
+
+    def __init__(self, k1=BM25_K1, b=BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.doc_ids = []       # Document index -> chunk ID
+        self._doc_index = {}    # Chunk ID -> document index
+        self._lengths = np.zeros(0, dtype=np.float32)
+        self._deleted = np.zeros(0, dtype=bool)
+        self.vocab = {}         # Term -> term index
+        self._offsets = np.zeros(1, dtype=np.int64)     # Term index -> start of its postings
+        self._postings = np.zeros(0, dtype=np.int32)    # Document indices
+        self._frequencies = np.zeros(0, dtype=np.uint16)
+        self._pending = ([], [], [])    # Term indices, document indices, frequencies not yet compacted
+        self._pending_lengths = []
+        self.fingerprint = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.doc_ids) - int(self._deleted.sum())
+
+    def add_documents(self, ids, texts):
+        """Indexes chunks; a chunk ID indexed before is replaced."""
+        with self._lock:
+            self.remove_documents([doc_id for doc_id in ids if doc_id in self._doc_index])
+            terms, docs, frequencies = self._pending
+            for doc_id, text in zip(ids, texts):
+                doc = len(self.doc_ids) + len(self._pending_lengths)
+                counts = {}
+                for term in tokenize(text):
+                    counts[term] = counts.get(term, 0) + 1
+                for term, count in counts.items():
+                    terms.append(self.vocab.setdefault(term, len(self.vocab)))
+                    docs.append(doc)
+                    frequencies.append(min(count, np.iinfo(np.uint16).max))
+                self._pending_lengths.append(sum(counts.values()))
+                self._doc_index[doc_id] = doc
+            self.doc_ids.extend(ids)
+
+    def remove_documents(self, ids):
+        """Marks chunks as removed; their postings are dropped by the next `compact`."""
+        with self._lock:
+            for doc_id in ids:
+                if doc_id not in self._doc_index:
+                    continue
+                if self._doc_index[doc_id] >= len(self._deleted):
+                    self.compact()  # A pending document gets its place in the arrays first
+                self._deleted[self._doc_index.pop(doc_id)] = True
+
+    def compact(self):
+        """Merges the pending postings into the arrays and drops removed documents."""
+        with self._lock:
+            terms, docs, frequencies = self._pending
+            if not terms and not self._pending_lengths and not self._deleted.any():
+                return
+            term_counts = np.diff(self._offsets)
+            all_terms = np.concatenate([np.repeat(np.arange(len(term_counts)), term_counts), np.asarray(terms, np.int64)])
+            all_docs = np.concatenate([self._postings.astype(np.int64), np.asarray(docs, np.int64)])
+            all_frequencies = np.concatenate([self._frequencies, np.asarray(frequencies, np.uint16)])
+            lengths = np.concatenate([self._lengths, np.asarray(self._pending_lengths, np.float32)])
+            deleted = np.concatenate([self._deleted, np.zeros(len(self._pending_lengths), dtype=bool)])
+
+            # Renumber the surviving documents and drop the postings of removed ones
+            keep = ~deleted[all_docs]
+            new_index = np.cumsum(~deleted) - 1
+            all_terms, all_docs, all_frequencies = all_terms[keep], new_index[all_docs[keep]], all_frequencies[keep]
+            order = np.lexsort((all_docs, all_terms))
+            self._postings = all_docs[order].astype(np.int32)
+            self._frequencies = all_frequencies[order]
+            self._offsets = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(all_terms, minlength=len(self.vocab)), out=self._offsets[1:])
+
+            self.doc_ids = [doc_id for doc_id, removed in zip(self.doc_ids, deleted) if not removed]
+            self._doc_index = {doc_id: doc for doc, doc_id in enumerate(self.doc_ids)}
+            self._lengths = lengths[~deleted]
+            self._deleted = np.zeros(len(self.doc_ids), dtype=bool)
+            self._pending = ([], [], [])
+            self._pending_lengths = []
+
+    def search(self, query, k=DEFAULT_CANDIDATES):
+        """
+        Ranks the indexed chunks against a query with BM25.
+        Returns:
+            list: (chunk_id, score) tuples, best first, only chunks containing a query term.
+        """
+        with self._lock:
+            self.compact()
+            if not self.doc_ids:
+                return []
+            term_indices = sorted({self.vocab[term] for term in tokenize(query) if term in self.vocab})
+            n_docs = len(self.doc_ids)
+            avg_length = float(self._lengths.mean()) or 1.0
+            scores = np.zeros(n_docs, dtype=np.float32)
+            for term in term_indices:
+                start, end = self._offsets[term], self._offsets[term + 1]
+                if start == end:
+                    continue
+                docs = self._postings[start:end]
+                tf = self._frequencies[start:end].astype(np.float32)
+                idf = math.log(1.0 + (n_docs - (end - start) + 0.5) / ((end - start) + 0.5))
+                norm = self.k1 * (1.0 - self.b + self.b * self._lengths[docs] / avg_length)
+                scores[docs] += idf * tf * (self.k1 + 1.0) / (tf + norm)
+            matched = np.flatnonzero(scores)
+            if len(matched) > k:
+                matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+            matched = matched[np.argsort(-scores[matched], kind="stable")]
+            return [(self.doc_ids[doc], float(scores[doc])) for doc in matched]
+
+    def stats(self):
+        """Returns the number of chunks, terms and postings, and the index size in bytes."""
+        with self._lock:
+            self.compact()
+            size = self._offsets.nbytes + self._postings.nbytes + self._frequencies.nbytes + self._lengths.nbytes
+            return {"documents": len(self.doc_ids), "terms": len(self.vocab), "postings": len(self._postings),
+                    "bytes": size}
+
+    def save(self, path=DEFAULT_LEXICAL_INDEX_PATH):
+        """Writes the index to a .npz file; terms and chunk IDs are stored as newline-joined UTF-8."""
+        with self._lock:
+            self.compact()
+            terms = sorted(self.vocab, key=self.vocab.get)
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path + ".tmp", "wb") as f:
+                np.savez(f, offsets=self._offsets, postings=self._postings, frequencies=self._frequencies,
+                         lengths=self._lengths, params=np.array([self.k1, self.b]),
+                         terms=np.frombuffer("\n".join(terms).encode("utf-8"), dtype=np.uint8),
+                         doc_ids=np.frombuffer("\n".join(self.doc_ids).encode("utf-8"), dtype=np.uint8),
+                         fingerprint=np.frombuffer((self.fingerprint or "").encode("utf-8"), dtype=np.uint8))
+            os.replace(path + ".tmp", path)
+        return path
+
+    @classmethod
+    def load(cls, path=DEFAULT_LEXICAL_INDEX_PATH):
+        """Loads a saved index, or returns an empty one if the file does not exist."""
+        if not os.path.exists(path):
+            return cls()
+        with np.load(path) as data:
+            index = cls(*data["params"].tolist())
+            terms = data["terms"].tobytes().decode("utf-8")
+            doc_ids = data["doc_ids"].tobytes().decode("utf-8")
+            index.vocab = {term: i for i, term in enumerate(terms.split("\n"))} if terms else {}
+            index.doc_ids = doc_ids.split("\n") if doc_ids else []
+            index._offsets, index._postings = data["offsets"], data["postings"]
+            index._frequencies, index._lengths = data["frequencies"], data["lengths"]
+            if "fingerprint" in data:
+                index.fingerprint = data["fingerprint"].tobytes().decode("utf-8") or None
+        index._doc_index = {doc_id: doc for doc, doc_id in enumerate(index.doc_ids)}
+        index._deleted = np.zeros(len(index.doc_ids), dtype=bool)
+        return index
+
+    def is_current(self, manifest):
+        """Returns True if no file was ingested or deleted since the index was built from `manifest`."""
+        return self.fingerprint is not None and self.fingerprint == manifest.fingerprint()
+
+    @classmethod
+    def from_store(cls, store, sources=None):
+        """Builds the index from the chunks of the intermediate store, one document at a time."""
+        index = cls()
+        for partition in store.scan("chunks", sources):
+            index.add_documents(partition.column("chunk_id").to_list(), partition.column("text"))
+        index.compact()
+        return index
+
+    @classmethod
+    def from_collection(cls, collection, batch_size=10_000):
+        """Builds the index from the documents of a vector collection (their _id and text)."""
+        index = cls()
+        ids, texts = [], []
+        for document in collection.find({}, projection={"text": True}):
+            ids.append(document["_id"])
+            texts.append(document.get("text") or "")
+            if len(ids) >= batch_size:
+                index.add_documents(ids, texts)
+                ids, texts = [], []
+        index.add_documents(ids, texts)
+        index.compact()
+        return index
+
+
+def reciprocal_rank_fusion(rankings, k=DEFAULT_RRF_K):
+    """
+    Fuses rankings: every list adds 1 / (k + rank) to the score of each item it ranks.
+    Args:
+        rankings (list): Lists of item IDs, best first.
+        k (int): The rank offset; larger values flatten the contribution of the top ranks.
+    Returns:
+        list: (item_id, score) tuples, best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+def _passage(document):
+    return {"id": document.get("_id", document.get("id")), "text": document.get("text"),
+            "metadata": document.get("metadata", {}), "similarity": document.get("$similarity")}
+
+
+class HybridRetriever:
+    """
+    Retrieves passages with the BM25 index and the vector collection together.
+    Modes:
+        prefilter: the vector search only scores the lexical candidates, and the lexical and
+            vector rankings of those candidates are fused with RRF. Queries with fewer
+            lexical candidates than requested passages fall back to `rrf`, and so does every
+            query while the index is stale, as chunks missing from it could never be scored.
+        rrf: a full vector search, fused with the lexical ranking.
+        vector / lexical: one ranking only.
+    """
+
+    def __init__(self, collection, index, embed_query=None, mode="prefilter", candidates=DEFAULT_CANDIDATES,
+                 rrf_k=DEFAULT_RRF_K, stale=False):
+        """
+        Args:
+            collection (object): An Astra DB or local collection with `find(filter, sort, limit, include_similarity)`.
+            index (BM25Index): The lexical index over the same chunks.
+            embed_query (callable, optional): Returns a query embedding; needed unless one is passed to `search`.
+            mode (str): One of RETRIEVAL_MODES.
+            candidates (int): Lexical candidates (and vector results for rrf) per query.
+            rrf_k (int): The rank offset of reciprocal rank fusion.
+            stale (bool): The index misses chunks ingested since it was built (see `BM25Index.is_current`).
+        """
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode {mode!r}, expected one of {RETRIEVAL_MODES}")
+        self.collection = collection
+        self.index = index
+        self.embed_query = embed_query
+        self.mode = mode
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self.stale = stale
+
+    def _find(self, **kwargs):
+        return [_passage(document) for document in self.collection.find(**kwargs)]
+
+    def search(self, query, embedding=None, k=5, timeout=None):
+        """
+        Returns the `k` best passages for a query.
+        Args:
+            query (str): The question.
+            embedding (numpy.ndarray, optional): The precomputed query embedding.
+            k (int): The number of passages.
+            timeout (float, optional): Seconds each Data API request may take.
+        Returns:
+            list: Dicts with id, text, metadata, similarity (None if not vector-scored), bm25
+            (None if no query term matched) and score (the fused score), best first.
+        """
+        with instrumentation.stage("retrieval", items=1):
+            return self._search(query, embedding, k, timeout)
+
+    def _search(self, query, embedding, k, timeout):
+        kwargs = {"timeout_ms": max(int(timeout * 1000), 1)} if timeout else {}
+        lexical = self.index.search(query, self.candidates) if self.mode != "vector" else []
+        bm25 = dict(lexical)
+        lexical_ids = [chunk_id for chunk_id, _ in lexical]
+
+        mode = self.mode
+        if mode == "prefilter" and (self.stale or len(lexical_ids) < k):
+            mode = "rrf"    # Too few exact matches to fill the answer from them, or some chunks are not indexed
+        if mode in ("prefilter", "rrf", "vector"):
+            if embedding is None:
+                embedding = self.embed_query(query)
+            vector_query = {"$vector": np.asarray(embedding, dtype=np.float32).tolist()}
+        if mode == "prefilter":
+            passages = self._find(filter={"_id": {"$in": lexical_ids}}, sort=vector_query, limit=len(lexical_ids),
+                                  include_similarity=True, **kwargs)
+        elif mode in ("rrf", "vector"):
+            passages = self._find(sort=vector_query, limit=max(self.candidates, k) if mode == "rrf" else k,
+                                  include_similarity=True, **kwargs)
+        else:
+            passages = []
+        vector_ids = [passage["id"] for passage in passages]
+        scored = len(passages) if mode == "prefilter" else None
+
+        # Lexical hits the vector search did not return are fetched by ID (chunks since deleted are dropped)
+        by_id = {passage["id"]: passage for passage in passages}
+        missing = [chunk_id for chunk_id in lexical_ids if chunk_id not in by_id]
+        if missing and mode != "vector":
+            by_id.update((passage["id"], passage) for passage in
+                         self._find(filter={"_id": {"$in": missing}}, limit=len(missing), **kwargs))
+        lexical_ids = [chunk_id for chunk_id in lexical_ids if chunk_id in by_id]
+
+        rankings = [ranking for ranking in (lexical_ids if mode != "vector" else [], vector_ids) if ranking]
+        results = []
+        for chunk_id, score in reciprocal_rank_fusion(rankings, self.rrf_k)[:k]:
+            results.append(dict(by_id[chunk_id], bm25=bm25.get(chunk_id), score=score))
+
+        instrumentation.count("retrieval_queries_total", mode=mode)
+        if scored is not None:
+            instrumentation.observe("retrieval_vector_candidates", scored)
+        return results
@@ -1,21 +1,31 @@
 # Import the necessary librarie
-# 
-from databases.db_connector import DbConnector
+# torch, transformers, langchain, PyMuPDF and the database drivers are imported where they are
+# first used, so importing this module (e.g. in worker processes or the CLI) stays fast
+from databases.astra_uploader import AstraBulkUploader, delete_documents  # Concurrent, retrying Astra DB uploader
+from databases.ingestion_manifest import (  # Manifest of ingested files for incremental re-ingestion
+    ChunkIdGenerator, IngestionManifest, hash_file, hash_metadata, hash_text,
+)
+from models.embedding_cache import EmbeddingCache   # On-disk cache of chunk embeddings
+from nlp.dedup import NearDuplicateIndex, dedup_report  # MinHash/LSH near-duplicate chunk detection
 
 # Model imports
-from transformers import BertTokenizer, BertModel   #  FinBERT model and tokenizer from the Hugging Face Transformers library
-import torch    # PyTorch library for gradient removal and tensor operations
+from models.model_registry import DEFAULT_MODEL_NAME, get_model   # Process-wide FinBERT model and tokenizer
+from models.finbert import DEFAULT_INFERENCE_BACKEND, get_encoder   # Selectable CPU inference backend (eager, int8, TorchScript)
+
+# Batch sizes, worker counts and chunk sizes from config/pipeline_config.yml and the tuned profile
+from config.config import chunk_size_setting, load_pipeline_config
+
+# Per-stage timers, counters and document traces
+from utils.metrics import instrumentation
 
 # Text processing imports
-from langchain_text_splitters import RecursiveCharacterTextSplitter # Recursive text splitter for splitting text into sentences
+from nlp.tokenization import DEFAULT_CHUNK_TOKENS, get_token_text_splitter  # Token-aware chunking with the FinBERT tokenizer
+import numpy as np  # NumPy for the contiguous embedding matrix returned by batched inference
 
 # Document imports
-import pymupdf  # PyMuPDF document text extraction of PDFs
-from langchain.docstore.document import Document    # Document class for storing document text and metadata
 import uuid # UUID for generating unique document IDs
+import itertools    # islice for batching streams of chunks
 
-# Database loader and vector store imports
-from astrapy.client import DataAPIClient
 # Environment variable loader imports
 import os   # OS library for environment variable access
 from dotenv import load_dotenv  # Load environment variables from a .env file
@@ -23,17 +33,99 @@ from dotenv import load_dotenv  # Load environment variables from a .env file
 # JSON library for parsing JSON strings
 import json 
 
+import logging
+logger = logging.getLogger(__name__)
+
+# Number of chunks sent through FinBERT in one forward pass
+EMBEDDING_BATCH_SIZE = 32
+
+# Number of chunks embedded and inserted together while streaming a PDF
+CHUNK_WINDOW_SIZE = 256
+
+# Chunker used by default: "tokens" (FinBERT token budgets) or "characters" (recursive character splitter)
+DEFAULT_CHUNKER = "tokens"
+
+# Default chunk size of the character splitter
+DEFAULT_CHUNK_CHARACTERS = 500
+
 class PDFPreprocessor:
-    def __init__(self):
-        # Step 1: Connect to Astra DB and initialize the FinBERT model and tokenizer
+    embedding_cache = None  # Optional EmbeddingCache consulted before running FinBERT
+    manifest = None         # Optional IngestionManifest enabling incremental re-ingestion
+    dedup_index = None      # Optional persistent NearDuplicateIndex for dedup across the corpus
+    db_type = 'vector_db'   # "vector_db" (Astra) or "local_vector_db"
+    inference_backend = DEFAULT_INFERENCE_BACKEND   # "eager", "dynamic_int8" or "torchscript"
+    chunker = DEFAULT_CHUNKER   # "tokens" or "characters"
+    chunk_size = None           # Chunk size in the chunker's unit; None uses its default
+    embedding_batch_size = EMBEDDING_BATCH_SIZE     # Default chunks per forward pass of generate_embeddings
+    window_size = CHUNK_WINDOW_SIZE                 # Chunks embedded and uploaded together
+    upload_settings = {}    # AstraBulkUploader arguments: batch_size, min/max_batch_size, max_in_flight
+    _db = None              # Database connection, opened on first use
+    
+    def __init__(self, embedding_cache_dir=None, db_type=None, model_name=DEFAULT_MODEL_NAME, revision=None,
+                 inference_backend=None, settings=None):
+        # Step 1: Remember which database to use and get the shared FinBERT model and tokenizer
+        
+        self.db_type = db_type or os.getenv('VECTOR_DB_TYPE', 'vector_db')
+        self.collection_name = os.getenv('ASTRA_DB_COLLECTION_NAME', 'reddit_earnings_call_transcripts')
         
-        db_connector = DbConnector(db_type="vector_db")  # Initialize the database connector
-        connection = db_connector.get_connection()
-        print(f"Connected to DB: {connection}")
+        # Every preprocessor in the process shares one copy of each (model, revision)
+        self.tokenizer, self.model = get_model(model_name, revision)
         
-        self.tokenizer = BertTokenizer.from_pretrained("ProsusAI/finbert")
-        self.model = BertModel.from_pretrained("ProsusAI/finbert")
-        print(self.model)
+        # Batch sizes and chunking come from the pipeline settings (pipeline_config.yml and the tuned profile)
+        settings = settings or load_pipeline_config()
+        embedding = settings["embedding"]
+        self.inference_backend = (inference_backend or os.getenv('INFERENCE_BACKEND')
+                                  or embedding["inference_backend"] or DEFAULT_INFERENCE_BACKEND)
+        self.chunker = os.getenv('CHUNKER', settings["chunking"]["chunker"])
+        self.chunk_size = chunk_size_setting(settings, self.chunker)
+        self.embedding_batch_size = embedding["batch_size"]
+        self.window_size = embedding["window_size"]
+        self.upload_settings = dict(settings["upload"])
+        if embedding["torch_threads"]:
+            import torch
+            torch.set_num_threads(embedding["torch_threads"])
+        
+        # Open the on-disk embedding cache so re-ingested chunks skip FinBERT inference
+        embedding_cache_dir = embedding_cache_dir or os.getenv('EMBEDDING_CACHE_DIR')
+        if embedding_cache_dir:
+            # Quantized backends produce slightly different vectors, so they get their own cache keys
+            cache_model_name = self.model.config.name_or_path
+            if self.inference_backend == "dynamic_int8":
+                cache_model_name += "+dynamic_int8"
+            self.embedding_cache = EmbeddingCache(
+                embedding_cache_dir,
+                dim=self.model.config.hidden_size,
+                model_name=cache_model_name,
+                revision=getattr(self.model.config, "_commit_hash", None),
+                max_length=512,
+                pooling="cls",
+            )
+        
+        # Load the ingestion manifest so unchanged files and chunks are not processed again
+        manifest_path = os.getenv('INGESTION_MANIFEST_PATH')
+        if manifest_path:
+            self.manifest = IngestionManifest(manifest_path)
+        
+        # Load the near-duplicate index so boilerplate repeated across filings is embedded once
+        dedup_index_path = os.getenv('DEDUP_INDEX_PATH')
+        if dedup_index_path:
+            self.dedup_index = NearDuplicateIndex.load(dedup_index_path)
+    
+    @property
+    def db(self):
+        """The Astra DB (or local vector DB) connection, opened the first time it is needed."""
+        if self._db is None:
+            from databases.db_connector import DbConnector
+            self._db = DbConnector(db_type=self.db_type).get_connection()
+        return self._db
+    
+    @db.setter
+    def db(self, connection):
+        self._db = connection
+    
+    def _use_cache(self, max_length):
+        """Returns True if the embedding cache holds vectors computed with `max_length`."""
+        return self.embedding_cache is not None and self.embedding_cache.max_length == max_length
 
     # Function to generate embeddings using FinBERT
     def generate_embedding(self, text):
@@ -45,16 +137,89 @@ class PDFPreprocessor:
             numpy.ndarray: The embedding of the input text as a numpy array.
         """
         
+        # Return the cached embedding if this chunk was embedded before
+        if self._use_cache(512):
+            embedding = self.embedding_cache.get(text)
+            if embedding is not None:
+                return embedding
+        
         # Tokenize the input text
         inputs = self.tokenizer(text, return_tensors="pt", truncation=True, padding=True, max_length=512)
                 
-        # Get the model's outputs (hidden states)
-        with torch.no_grad():   # Disable gradient calculation for faster processing
-            outputs = self.model(**inputs)
-        
         # Access generated embedding from the [CLS] token (last hidden state of the first token of the sequence)
-        embedding = outputs.last_hidden_state[:, 0, :].squeeze().numpy()    
+        embedding = get_encoder(self.model, self.inference_backend)(inputs)[0].numpy()
+        
+        if self._use_cache(512):
+            self.embedding_cache.put(text, embedding)
+            self.embedding_cache.flush()
         return embedding
+
+    # Function to generate embeddings for many chunks using batched FinBERT inference
+    def generate_embeddings(self, texts, batch_size=None, max_length=512):
+        """
+        Generates embeddings for a list of texts with one forward pass per length bucket.
+        The texts are tokenized once, sorted by token length and split into buckets of
+        `batch_size`, so each batch is only padded to the longest sequence in its bucket.
+        The [CLS] embeddings match `generate_embedding` called on each text separately.
+        Chunks from the token-aware chunker carry their token IDs, which are used directly.
+        If an embedding cache is configured, only the texts missing from it are embedded.
+        Args:
+            texts (list): The input texts to be embedded.
+            batch_size (int, optional): The number of texts per forward pass. Defaults to the
+                configured `embedding_batch_size` (EMBEDDING_BATCH_SIZE unless configured).
+            max_length (int): The maximum number of tokens per text. Default is 512.
+        Returns:
+            numpy.ndarray: A contiguous float32 matrix of shape (len(texts), hidden_size)
+            with the embeddings in the same order as the input texts.
+        """
+        texts = list(texts)
+        batch_size = batch_size or self.embedding_batch_size
+        if not self._use_cache(max_length):
+            return self._embed_in_buckets(texts, batch_size, max_length)
+        
+        # Look up every chunk in the cache and only run FinBERT on the misses
+        embeddings, missing = self.embedding_cache.get_many(texts)
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            computed = self._embed_in_buckets(missing_texts, batch_size, max_length)
+            embeddings[missing] = computed
+            self.embedding_cache.put_many(missing_texts, computed)
+            self.embedding_cache.flush()
+        return embeddings
+    
+    def _embed_in_buckets(self, texts, batch_size, max_length):
+        """Runs batched FinBERT inference over length-sorted buckets of `texts`."""
+        encoder = get_encoder(self.model, self.inference_backend)
+        embeddings = np.empty((len(texts), self.model.config.hidden_size), dtype=np.float32)
+        if not texts:
+            return embeddings
+        
+        # Reuse the token IDs of token-aware chunks that fit the window; tokenize the other texts once
+        features = [None] * len(texts)
+        for i, text in enumerate(texts):
+            token_ids = getattr(text, "token_ids", None)
+            if token_ids is not None and len(token_ids) <= max_length - 2:
+                input_ids = [self.tokenizer.cls_token_id, *token_ids, self.tokenizer.sep_token_id]
+                features[i] = {"input_ids": input_ids, "token_type_ids": [0] * len(input_ids),
+                               "attention_mask": [1] * len(input_ids)}
+        untokenized = [i for i, feature in enumerate(features) if feature is None]
+        if untokenized:
+            encoded = self.tokenizer([texts[i] for i in untokenized], truncation=True, max_length=max_length)
+            for j, i in enumerate(untokenized):
+                features[i] = {key: encoded[key][j] for key in ("input_ids", "token_type_ids", "attention_mask")}
+        
+        # Sort the texts by token length so each bucket holds sequences of similar size
+        order = sorted(range(len(texts)), key=lambda i: len(features[i]["input_ids"]))
+        
+        for start in range(0, len(order), batch_size):
+            bucket = order[start : start + batch_size]
+            
+            # Pad the bucket only to the length of its longest sequence
+            inputs = self.tokenizer.pad([features[i] for i in bucket], padding=True, return_tensors="pt")
+            
+            # Scatter the [CLS] embeddings of the bucket back to their original positions
+            embeddings[bucket] = encoder(inputs).numpy()
+        return embeddings
     
 # Step 2: Function to extract text and metadata from PDF using PyMuPDF
 def extract_text_and_metadata_from_pdf(pdf_path):
@@ -79,42 +244,79 @@ def extract_text_and_metadata_from_pdf(pdf_path):
     #      - get_text(): Extracts text from a page.
     #      - metadata: A dictionary containing the PDF's metadata.
     """
-
-    doc = pymupdf.open(pdf_path)  # Open the PDF document and load it into a doc
     
-    text = ""
+    # Join the lazily extracted pages once instead of growing a string page by page
+    pages, metadata = stream_pages_and_metadata_from_pdf(pdf_path)
+    text = "".join(page_text for _, page_text in pages)
     
-    # Extract text from each page
-    for page in doc:
-        text += page.get_text()
+    return text, metadata   # Return the extracted text and metadata as a tuple
+
+# Function to stream the pages of a PDF lazily using PyMuPDF
+def stream_pages_and_metadata_from_pdf(pdf_path):
+    """
+    Opens a PDF file and returns its metadata together with a lazy iterator over its pages.
+    Only the page currently being read is held in memory; the document is closed once the
+    iterator is exhausted.
+    Args:
+        pdf_path (str): The file path to the PDF document.
+    Returns:
+        tuple: A tuple containing:
+            - pages (iterator): Yields (page_number, text) tuples with 1-based page numbers.
+            - metadata (dict): The metadata of the PDF (see `extract_text_and_metadata_from_pdf`).
+    """
+    import pymupdf  # PyMuPDF document text extraction of PDFs
     
-    # Extract metadata from the PDF
-    metadata = doc.metadata
+    doc = pymupdf.open(pdf_path)  # Open the PDF document; pages are loaded on demand
     
-    print(f"metadata: {metadata},")
-    print(f"text: {text}")
+    def pages():
+        try:
+            for page_index in range(doc.page_count):
+                yield page_index + 1, doc.load_page(page_index).get_text()
+        finally:
+            doc.close()
     
-    return text, metadata   # Return the extracted text and metadata as a tuple
+    return pages(), doc.metadata
 
 # Step 3: Initialize the RecursiveCharacterTextSplitter
-def get_recursive_text_splitter(chunk_size=500):
+def get_recursive_text_splitter(chunk_size=DEFAULT_CHUNK_CHARACTERS):
     """
     This function creates a RecursiveCharacterTextSplitter with a specified chunk size, 
     chunk overlap, and length function. The splitter is used to divide text into smaller 
     chunks while preserving context by overlapping chunks.
     Parameters:
-    chunk_size (int): The maximum size of each chunk in tokens. Default is 500.
+    chunk_size (int): The maximum size of each chunk in characters. Default is 500.
     Returns:
     RecursiveCharacterTextSplitter: An initialized RecursiveCharacterTextSplitter object.
     """    
+    from langchain_text_splitters import RecursiveCharacterTextSplitter # Recursive text splitter for splitting text into sentences
+    
     # Initialize the RecursiveTextSplitter
     splitter = RecursiveCharacterTextSplitter(
-        chunk_size=500,  # Max chunk size in tokens
-        chunk_overlap=50,       # Overlap between chunks to preserve context
+        chunk_size=chunk_size,  # Max chunk size in characters
+        chunk_overlap=chunk_size // 10,     # Overlap between chunks to preserve context
         length_function=len     # Length function to determine chunk size
     )
     return splitter # Return the initialized RecursiveTextSplitter object
 
+# Function to create the splitter of the configured chunker
+def get_text_splitter(chunker=DEFAULT_CHUNKER, chunk_size=None, tokenizer=None):
+    """
+    Creates the text splitter of a chunker.
+    Args:
+        chunker (str): "tokens" for FinBERT token budgets (see `nlp.tokenization.TokenChunker`)
+            or "characters" for the recursive character splitter.
+        chunk_size (int, optional): The chunk size in tokens or characters; None uses the default.
+        tokenizer (object, optional): The fast tokenizer of the token chunker; by default the
+            FinBERT tokenizer from the model registry.
+    Returns:
+        object: A splitter with a split_text method.
+    """
+    if chunker == "tokens":
+        return get_token_text_splitter(chunk_size or DEFAULT_CHUNK_TOKENS, tokenizer=tokenizer)
+    if chunker == "characters":
+        return get_recursive_text_splitter(chunk_size or DEFAULT_CHUNK_CHARACTERS)
+    raise ValueError(f"Unsupported chunker {chunker!r}, expected 'tokens' or 'characters'")
+
 # Step 4: Use RecursiveCharacterTextSplitter to chunk the text
 def chunk_text(text, splitter):
     """
@@ -131,31 +333,85 @@ Returns:
     chunks = splitter.split_text(text)  
     return chunks  # Return a list of text chunks 
 
+# Function to chunk a stream of pages incrementally
+def chunk_pages(pages, splitter):
+    """
+    Chunks a stream of (page_number, text) records without joining the whole document.
+    The last chunk of each page is carried over and split again together with the next page,
+    so chunks still span page breaks while memory stays bounded by one page plus the carry.
+    Args:
+        pages (iterable): (page_number, text) tuples, e.g. from `stream_pages_and_metadata_from_pdf`.
+        splitter (object): An object with a split_text method that handles the chunking.
+    Yields:
+        tuple: (page_number, chunk) where page_number is the page on which the chunk starts.
+    """
+    carry, carry_page = "", None    # Trailing text not yet emitted and the page it starts on
+    for page_number, page_text in pages:
+        buffer = carry + page_text
+        chunks = splitter.split_text(buffer)
+        if not chunks:
+            continue
+        
+        # Emit every chunk except the last one, which may continue on the next page
+        position = 0
+        for chunk in chunks[:-1]:
+            start = buffer.find(chunk, position)
+            position = max(start, position)
+            yield (carry_page if carry and position < len(carry) else page_number), chunk
+        
+        last_start = buffer.find(chunks[-1], position)
+        if last_start < 0:
+            carry, carry_page = chunks[-1], page_number
+        elif carry and last_start < len(carry):
+            carry = buffer[last_start:]     # The carry still starts on an earlier page
+        else:
+            carry, carry_page = buffer[last_start:], page_number
+    
+    # Emit the remaining carry once all pages are consumed
+    if carry.strip():
+        for chunk in splitter.split_text(carry):
+            yield carry_page, chunk
+
 # Function to split the documents into batches
 def batch(documents, batch_size):
     for i in range(0, len(documents), batch_size):
         yield documents[i : i + batch_size]
+
+# Function to split any iterable (e.g. a stream of chunks) into lists of batch_size items
+def iter_batches(iterable, batch_size):
+    iterator = iter(iterable)
+    while True:
+        items = list(itertools.islice(iterator, batch_size))
+        if not items:
+            return
+        yield items
         
 # Step 5: Create a function to prepare the documents with id, text, embeddings and, metadata
-def create_astra_db_document(self, text, metadata):
+def create_astra_db_document(self, text, metadata, embedding=None, doc_id=None):
     """
-    Prepare a JSON-serializable document for insertion into an Astra database collection. 
+    Prepare a document for insertion into an Astra database collection. The embedding stays a
+    float32 array under "$vector"; the uploader sends it in the Data API's binary form. 
     Args:
         text (str): The text content of the document.
         metadata (dict): The metadata associated with the document.
+        embedding (numpy.ndarray, optional): A precomputed embedding of the text, e.g. a row
+            returned by `generate_embeddings`. If None, the embedding is generated here.
+        doc_id (str, optional): A deterministic chunk ID (see `ChunkIdGenerator`). If None,
+            a random UUID is used.
     Returns:
         dict: A dictionary representation of the document containing the text, metadata, and embedding.
     """
     
-    # Generate the embedding for the document chunk
-    embedding = self.generate_embedding(text)
+    # Generate the embedding for the document chunk if it was not computed in a batch
+    if embedding is None:
+        embedding = self.generate_embedding(text)
     
     # Create the document dictionary with Astra DB required fields (Id, text, metadata, and embedding)
     doc = {
-        "id": str(uuid.uuid4()),  # Generate a unique ID for the document
+        "id": doc_id or str(uuid.uuid4()),  # Use the deterministic chunk ID, or generate a unique ID
         "text": text,
         "metadata": metadata,
-        "vector": embedding.tolist()  # Convert the embedding to a list
+        "$vector": np.asarray(embedding, dtype=np.float32)  # Compact float32 array, not 768 Python floats
     }
     return doc  # Return the dictionary representation of the document        
 
@@ -170,11 +426,12 @@ def insert_documents_into_astra_db(self, documents):
     # Define the collection in the database
     collection = self.db.get_collection(self.collection_name)
     
-    # Insert the documents in batches
-    for batch_documents in batch(documents, 50):
-        # Insert the batch of documents into the collection
-        res = collection.insert_many(batch_documents)
-        print(f"Inserted batch with response: {res}")
+    # Insert the documents in concurrent, retried batches and wait for all of them
+    with instrumentation.stage("upload", items=len(documents)):
+        with AstraBulkUploader(collection, **self.upload_settings) as uploader:
+            uploader.submit(documents)
+    logger.info(f"Inserted {uploader.stats['documents']} documents in {uploader.stats['batches']} batches "
+                f"({uploader.stats['retries']} retries)")
         
 # Main Workflow
 
@@ -183,33 +440,152 @@ def process_pdf_to_astra(self, pdf_path):
     """
     Processes a PDF file and inserts its content into Astra DB.
     This function performs the following steps:
-    1. Extracts text and metadata from the given PDF file.
-    2. Initializes a RecursiveTextSplitter with a specified chunk size.
-    3. Splits the extracted text into chunks using the splitter.
+    1. Skips the file if the ingestion manifest holds the same file content hash.
+    2. Streams the pages and metadata of the given PDF file.
+    3. Initializes the text splitter (FinBERT token budgets by default) and splits the pages incrementally into chunks
+       tagged with their page number and a deterministic chunk ID.
     4. Enhances the extracted metadata with additional information.
-    5. Creates Document objects for each text chunk with the associated metadata.
-    6. Inserts the Document objects into Astra DB.
-    7. Logs the number of documents inserted.
+    5. Replaces near-duplicate chunks (within the document, and across the corpus if a dedup
+       index is configured) by references to their canonical chunk.
+    6. Generates the embeddings of new chunks in batches, one window of chunks at a time, and
+       creates Document objects for each new text chunk with the associated metadata.
+    7. Uploads the Document objects of each window to Astra DB in the background and deletes
+       the chunks that no longer exist in the file.
+    8. Records the file, page and chunk hashes in the manifest and logs the number of documents inserted.
+    Without a manifest every chunk is treated as new. The document is traced: its extract, chunk,
+    embed and upload stages are timed and counted (see `utils.metrics`).
     Args:
         pdf_path (str): The file path to the PDF document to be processed.
     Returns:
         None
     """
     
-    # Extract text and metadata from the PDF
-    pdf_text, pdf_metadata = extract_text_and_metadata_from_pdf(pdf_path)
-    print("Extracted PDF Metadata:", pdf_metadata) # Print the extracted metadata to indicate successful extraction
+    with instrumentation.trace(pdf_path) as trace:
+        _process_pdf_to_astra(self, pdf_path, trace)
+
+def _process_pdf_to_astra(self, pdf_path, trace):
+    """Runs `process_pdf_to_astra` inside the document's trace."""
+    # Skip the file entirely if its content did not change since the last ingestion
+    file_hash = hash_file(pdf_path)
+    if self.manifest is not None and self.manifest.is_unchanged(pdf_path, file_hash):
+        logger.info(f"Skipped unchanged PDF '{pdf_path}'.")
+        instrumentation.count("pipeline_documents_total", status="unchanged")
+        return
     
-    # Initialize RecursiveTextSplitter
-    splitter = get_recursive_text_splitter(chunk_size=500)
-    print("RecursiveTextSplitter Initialized") # Print a message to indicate initialization
+    # Stream the pages and extract the metadata from the PDF
+    with instrumentation.stage("extract"):
+        pages, pdf_metadata = stream_pages_and_metadata_from_pdf(pdf_path)
+    logger.debug(f"Opened '{pdf_path}' (title {pdf_metadata.get('title')!r})")
     
-    # Use the splitter to chunk the extracted text
-    chunks = chunk_text(pdf_text, splitter)
-    print(f"Chunked PDF into {len(chunks)} text chunks.") # Print the number of chunks
+    # Initialize the text splitter; the token chunker reuses the FinBERT tokenizer already loaded
+    splitter = get_text_splitter(self.chunker, self.chunk_size, tokenizer=self.tokenizer)
     
     # Enhance metadata with additional info (you could add more info based on use case)
-    metadata = {
+    metadata = build_document_metadata(pdf_path, pdf_metadata)
+    metadata_hash = hash_metadata(metadata)
+    
+    # Chunks already stored with the same content and metadata are neither embedded nor uploaded
+    collection = self.db.get_collection(self.collection_name)
+    known_ids, stored_ids = set(), set()
+    if self.manifest is not None:
+        known_ids = self.manifest.known_chunk_ids(pdf_path, metadata_hash)
+        stored_ids = self.manifest.stored_chunk_ids(pdf_path)
+        if stored_ids and not known_ids:
+            # The metadata changed: remove the old copies before the same IDs are inserted again
+            delete_documents(collection, stored_ids)
+            stored_ids = set()
+    
+    # Hash every page as it streams past
+    page_hashes = {}
+    def hashed(pages):
+        for page_number, page_text in pages:
+            page_hashes[page_number] = hash_text(page_text)
+            yield page_number, page_text
+    
+    # Upload in the background so each window uploads while the next one is being embedded
+    uploader = AstraBulkUploader(collection, **self.upload_settings)
+    chunk_ids = ChunkIdGenerator(pdf_path)
+    chunks_seen = {}
+    
+    # Deduplicate against the corpus index, or within this document only; this file's own
+    # previous chunks are dropped from the index first so they are matched afresh
+    dedup_index = self.dedup_index if self.dedup_index is not None else NearDuplicateIndex()
+    dedup_index.remove_source(pdf_path)
+    duplicates, skipped_embeddings = 0, 0
+    
+    # Chunk, embed and insert the document one window of chunks at a time; the time spent
+    # streaming pages and splitting them is recorded as the extract and chunk stages
+    inserted = 0
+    page_stream = instrumentation.timed_iter(hashed(pages), "extract")
+    chunk_stream = instrumentation.timed_iter(chunk_pages(page_stream, splitter), "chunk")
+    for window in iter_batches(chunk_stream, self.window_size):
+        new_chunks = []
+        for page_number, chunk in window:
+            chunk_id, chunk_hash = chunk_ids.next_id(chunk)
+            chunks_seen[chunk_id] = {"hash": chunk_hash, "page": page_number}
+            canonical_id = dedup_index.find_or_add(chunk_id, chunk, pdf_path)
+            if canonical_id is not None:
+                # A near-duplicate becomes a reference to its canonical chunk instead of a new vector
+                chunks_seen[chunk_id]["canonical"] = canonical_id
+                duplicates += 1
+                skipped_embeddings += chunk_id not in known_ids
+                continue
+            if chunk_id not in known_ids:
+                new_chunks.append((chunk_id, page_number, chunk))
+        if not new_chunks:
+            continue
+        
+        # Generate the embeddings for the new chunks with batched FinBERT inference
+        with instrumentation.stage("embed", items=len(new_chunks)):
+            embeddings = self.generate_embeddings([chunk for _, _, chunk in new_chunks])
+        
+        # Create Document objects with text chunks, page-level metadata and their precomputed embeddings
+        documents = []
+        for (chunk_id, page_number, chunk), embedding in zip(new_chunks, embeddings):    # loop to create a Document object for each chunk
+            doc = create_astra_db_document(self, chunk, dict(metadata, page=page_number), embedding, chunk_id)
+            documents.append(doc)  
+        
+        # Queue the documents for insertion into Astra DB
+        with instrumentation.stage("upload", items=len(documents)):
+            uploader.submit(documents)
+        inserted += len(documents)
+    
+    # Wait for the remaining uploads, then delete the chunks that disappeared from the file
+    stale_ids = stored_ids - {chunk_id for chunk_id, chunk in chunks_seen.items() if "canonical" not in chunk}
+    with instrumentation.stage("upload"):
+        uploader.close()
+        if stale_ids:
+            delete_documents(collection, stale_ids)
+    
+    # Record what is now stored for this file; files referencing deleted chunks are re-ingested next time
+    if self.manifest is not None:
+        self.manifest.record(pdf_path, file_hash, metadata_hash, page_hashes, chunks_seen)
+        self.manifest.invalidate_references(stale_ids, except_source=pdf_path)
+        self.manifest.save()
+    if dedup_index.path:
+        dedup_index.save()
+    
+    # Log the number of documents inserted and record them on the document's trace
+    report = dedup_report(len(chunks_seen), duplicates, inserted, skipped_embeddings)
+    trace["attributes"].update(pages=len(page_hashes), chunks=len(chunks_seen), inserted=inserted,
+                               duplicates=duplicates, deleted=len(stale_ids))
+    instrumentation.count("pipeline_documents_total", status="processed")
+    logger.info(f"Processed PDF '{pdf_path}'. Inserted {inserted} documents and deleted {len(stale_ids)} "
+                f"stale documents in Astra DB ({len(chunks_seen) - inserted - duplicates} chunks unchanged, "
+                f"{duplicates} near-duplicates: {report['inference_saved']:.0%} inference and "
+                f"{report['storage_saved']:.0%} storage saved).")
+
+# Function to build the document-level metadata stored with every chunk
+def build_document_metadata(pdf_path, pdf_metadata):
+    """
+    Builds the metadata stored with every chunk of a PDF.
+    Args:
+        pdf_path (str): The file path to the PDF document.
+        pdf_metadata (dict): The metadata extracted by PyMuPDF.
+    Returns:
+        dict: The source path, title, author, subject, creation and modification dates.
+    """
+    return {
         "source": pdf_path,
         "title": pdf_metadata.get('title', 'Unknown Title'),
         "author": pdf_metadata.get('author', 'Unknown Author'),
@@ -217,16 +593,3 @@ def process_pdf_to_astra(self, pdf_path):
         "created": pdf_metadata.get('created', 'Unknown Date'),
         "modified": pdf_metadata.get('modified', 'Unknown Date'),
     }
-    
-    # Create Document objects with text chunks and metadata
-    documents = []
-    for chunk in chunks:    # loop to create a Document object for each chunk
-        doc = create_astra_db_document(chunk, metadata)
-        documents.append(doc)  
-    print(f"Generated {len(documents)} Document objects.") # Print the number of Document objects generated
-          
-    # Insert documents into Astra DB
-    insert_documents_into_astra_db(documents)
-    
-    # Print or log the number of documents inserted (optional)
-    print(f"Processed PDF '{pdf_path}'. Inserted {len(documents)} documents into Astra DB.")
\ No newline at end of file
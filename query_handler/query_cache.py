@@ -0,0 +1,261 @@
+# Exact and semantic cache of routed query results (Classes: `QueryCache`, `ManifestWatcher`)
+
+import copy     # Cached results are handed out as copies
+import json     # Persisted cache file
+import os       # OS library for the manifest file status and the cache file
+import re       # Query normalization and figures
+import threading    # Lock so concurrent queries share one cache
+import time     # Entry ages for the TTL
+from collections import OrderedDict     # Least recently used order for eviction
+
+import numpy as np  # Query embeddings and their similarities
+
+from query_handler.query_router import parse_query
+
+# Maximum number of cached results and how long one stays valid
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL_SECONDS = 15 * 60
+
+# Minimum cosine similarity of two query embeddings for the semantic cache to answer
+DEFAULT_SIMILARITY_THRESHOLD = 0.97
+
+# Default location of the cache persisted between `query` runs
+DEFAULT_QUERY_CACHE_PATH = "data/processed/query_cache.json"
+
+# Figures such as 2024, 5% or 1.2; a cached answer is only reused for the same figures
+NUMBER_PATTERN = re.compile(r"\d[\d,.]*%?")
+
+
+def normalize_query(query):
+    """Returns the exact-cache key of a query: lowercase, single spaces, no trailing punctuation."""
+    return " ".join(query.lower().split()).rstrip("?!. ")
+
+
+def query_guard(query):
+    """
+    Returns what two queries must share for one to reuse the other's answer: the metrics,
+    periods and figures they name. "ad revenue in Q3 2024" and "ad revenue in Q4 2024" have
+    very similar embeddings but different answers.
+    """
+    plan = parse_query(query)
+    numbers = [number.rstrip(".,") for number in NUMBER_PATTERN.findall(query)]
+    return frozenset(plan["metrics"]), frozenset(plan["periods"]), frozenset(numbers)
+
+
+def _json_default(value):
+    """Converts the numpy values of a result (e.g. similarities) for JSON."""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class ManifestWatcher:
+    """
+    Tracks the version of the ingestion manifest on disk, so cached answers are dropped once
+    new data is ingested. The file is only re-read when its size or modification time changed.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): The ingestion manifest written by the ingestion runs.
+        """
+        self.path = path
+        self._stat = None
+        self._fingerprint = None
+
+    def version(self):
+        """Returns the manifest fingerprint, or None if no manifest exists yet."""
+        try:
+            stat = os.stat(self.path)
+            stat = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            stat = None
+        if stat != self._stat:
+            from databases.ingestion_manifest import IngestionManifest
+            self._stat = stat
+            self._fingerprint = None if stat is None else IngestionManifest(self.path).fingerprint()
+        return self._fingerprint
+
+
+class QueryCache:
+    """
+    Two-level cache of routed query results. The exact level matches the normalized query
+    text; the semantic level returns the answer of a cached query whose embedding is within
+    `similarity_threshold` (cosine) and that names the same metrics, periods and figures.
+    Entries expire after `ttl_seconds`, the least recently used entry is evicted beyond
+    `max_entries`, and everything is dropped when the data version changes.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 similarity_threshold=DEFAULT_SIMILARITY_THRESHOLD, version=None, clock=time.monotonic):
+        """
+        Args:
+            max_entries (int): The maximum number of cached results.
+            ttl_seconds (float): Seconds a result stays valid.
+            similarity_threshold (float): The minimum cosine similarity of a semantic hit.
+            version (callable, optional): Returns the current data version, e.g.
+                `ManifestWatcher(path).version`; the cache is cleared whenever it changes.
+            clock (callable): Returns the current time in seconds.
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.version = version
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # Normalized query -> (result, unit embedding or None, guard, created)
+        self._matrix = None             # (keys, stacked embeddings) for the semantic level, rebuilt when stale
+        self._version = version() if version is not None else None
+        self.stats = {"lookups": 0, "exact_hits": 0, "semantic_hits": 0, "evictions": 0, "expirations": 0,
+                      "invalidations": 0}
+
+    def get_exact(self, query):
+        """Returns a copy of the cached result of the same normalized query, or None. Counts one lookup."""
+        with self._lock:
+            self._check_version()
+            self.stats["lookups"] += 1
+            key = normalize_query(query)
+            entry = self._live_entry(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.stats["exact_hits"] += 1
+            return copy.deepcopy(entry[0])
+
+    def get_similar(self, query, embedding):
+        """
+        Returns a copy of the cached result of the most similar query, or None. Called after a
+        `get_exact` miss for the same query, so it does not count another lookup.
+        """
+        embedding = self._unit(embedding)
+        guard = query_guard(query)
+        with self._lock:
+            self._check_version()
+            if self._matrix is None:
+                keys = [key for key, entry in self._entries.items() if entry[1] is not None]
+                self._matrix = (keys, np.stack([self._entries[key][1] for key in keys]) if keys else None)
+            keys, matrix = self._matrix
+            if matrix is None:
+                return None
+            similarities = matrix @ embedding
+            for i in np.argsort(-similarities):
+                if similarities[i] < self.similarity_threshold:
+                    break
+                entry = self._live_entry(keys[i])
+                if entry is None or entry[2] != guard:
+                    continue
+                self._entries.move_to_end(keys[i])
+                self.stats["semantic_hits"] += 1
+                return copy.deepcopy(entry[0])
+            return None
+
+    def put(self, query, result, embedding=None):
+        """Caches the result of a query, with its embedding for the semantic level."""
+        key = normalize_query(query)
+        embedding = None if embedding is None else self._unit(embedding)
+        guard = query_guard(query)
+        with self._lock:
+            self._check_version()
+            self._entries[key] = (copy.deepcopy(result), embedding, guard, self.clock())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+            self._matrix = None
+
+    def save(self, path):
+        """
+        Writes the live entries and the data version they belong to to a JSON file, replaced
+        atomically. Entry ages are stored rather than clock readings, so they stay valid in
+        another process.
+        """
+        with self._lock:
+            self._check_version()
+            now = self.clock()
+            entries = [{"query": key, "result": entry[0], "age": now - entry[3],
+                        "embedding": None if entry[1] is None else entry[1].tolist()}
+                       for key, entry in self._entries.items() if now - entry[3] <= self.ttl_seconds]
+            data = {"version": self._version, "saved_at": time.time(), "entries": entries}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            json.dump(data, f, default=_json_default)
+        os.replace(path + ".tmp", path)
+        return path
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """
+        Creates a cache (see `__init__` for the arguments) holding the entries saved at `path`.
+        A missing or unreadable file, or one saved for another data version, gives an empty cache.
+        """
+        cache = cls(**kwargs)
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cache
+        if data.get("version") != cache._version:
+            return cache    # Answers computed before the last ingestion
+        elapsed = max(time.time() - data.get("saved_at", 0.0), 0.0)
+        now = cache.clock()
+        for entry in data.get("entries", []):
+            age = entry["age"] + elapsed
+            if age > cache.ttl_seconds:
+                continue
+            embedding = None if entry["embedding"] is None else np.asarray(entry["embedding"], dtype=np.float32)
+            cache._entries[entry["query"]] = (entry["result"], embedding, query_guard(entry["query"]), now - age)
+        while len(cache._entries) > cache.max_entries:
+            cache._entries.popitem(last=False)
+        return cache
+
+    def invalidate(self):
+        """Drops every cached result."""
+        with self._lock:
+            self._clear()
+
+    def report(self):
+        """Returns the counters plus the size and the exact, semantic and overall hit rates."""
+        with self._lock:
+            lookups = self.stats["lookups"]
+            hits = self.stats["exact_hits"] + self.stats["semantic_hits"]
+            return dict(self.stats, size=len(self._entries), misses=lookups - hits,
+                        hit_rate=hits / lookups if lookups else 0.0,
+                        exact_hit_rate=self.stats["exact_hits"] / lookups if lookups else 0.0,
+                        semantic_hit_rate=self.stats["semantic_hits"] / lookups if lookups else 0.0)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _live_entry(self, key):
+        """Returns the entry of a key, dropping it if it expired. Called with the lock held."""
+        entry = self._entries.get(key)
+        if entry is not None and self.clock() - entry[3] > self.ttl_seconds:
+            del self._entries[key]
+            self._matrix = None
+            self.stats["expirations"] += 1
+            return None
+        return entry
+
+    def _check_version(self):
+        """Clears the cache if the data version changed. Called with the lock held."""
+        if self.version is None:
+            return
+        version = self.version()
+        if version != self._version:
+            self._version = version
+            self._clear()
+
+    def _clear(self):
+        if self._entries:
+            self.stats["invalidations"] += 1
+        self._entries.clear()
+        self._matrix = None
+
+    @staticmethod
+    def _unit(embedding):
+        embedding = np.asarray(embedding, dtype=np.float32).ravel()
+        return embedding / (np.linalg.norm(embedding) or 1.0)
+
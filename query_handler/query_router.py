@@ -1,50 +1,420 @@
 # Class for routing queries to the right database (Class: `QueryRouter`)
 
+import os       # OS library for environment variable access
+import re       # Precompiled intent rules, metric and period patterns
+import time     # Per-stage timings and latency budgets
+from concurrent.futures import ThreadPoolExecutor, wait    # Concurrent SQL and vector stages
+
+import numpy as np  # Query embeddings and prototype similarities
+
+from utils.metrics import instrumentation
+
+# Intents returned by `analyze_query_intent`; hybrid queries go to both backends concurrently
+QUERY_INTENTS = ("sql", "vector", "hybrid")
+
+# Seconds a query may take on each route before the slow stage is dropped from the result
+DEFAULT_LATENCY_BUDGETS = {"sql": 1.0, "vector": 2.0, "hybrid": 2.5}
+
+# Number of chunks returned by the vector route and maximum rows returned by the SQL route
+DEFAULT_TOP_K = 5
+DEFAULT_SQL_LIMIT = 50
+
+# Table of structured figures queried by the SQL route, and its columns (`load-excel --metrics-sheet` fills it)
+DEFAULT_METRICS_TABLE = "financial_metrics"
+METRICS_COLUMNS = ("metric", "period", "value", "unit", "source")
+
+# The embedding fallback sends a query to both backends unless one intent is this much closer
+DEFAULT_FALLBACK_MARGIN = 0.02
+
+# Canonical metric name -> how analysts refer to it; more specific metrics come first
+METRIC_PATTERNS = {
+    "ad_revenue": r"ad(?:vertising)? revenue",
+    "other_revenue": r"other revenue|data licensing revenue",
+    "revenue": r"revenue|sales|top line",
+    "arpu": r"arpu|average revenue per (?:unique|user)",
+    "dau": r"daily active (?:uniques|users)|dauq?",
+    "wau": r"weekly active (?:uniques|users)|wauq?",
+    "net_income": r"net (?:income|loss)",
+    "adjusted_ebitda": r"(?:adjusted )?ebitda",
+    "gross_margin": r"gross margin",
+    "operating_cash_flow": r"operating cash flow|cash from operations",
+    "free_cash_flow": r"free cash flow|fcf",
+    "eps": r"eps|earnings per share",
+}
+METRIC_RULES = [(metric, re.compile(rf"\b(?:{pattern})\b", re.IGNORECASE)) for metric, pattern in METRIC_PATTERNS.items()]
+
+# Fiscal periods such as Q3 2024, Q3'24, FY2023 or a bare year
+QUARTER_PATTERN = re.compile(r"\bq([1-4])\s*(?:fy)?\s*'?(\d{4}|\d{2})\b", re.IGNORECASE)
+FISCAL_YEAR_PATTERN = re.compile(r"\bfy\s*'?(\d{4}|\d{2})\b", re.IGNORECASE)
+YEAR_PATTERN = re.compile(r"\b(20\d{2})\b")
+
+# Phrases asking for a figure (SQL) or for narrative and explanation (vector search)
+SQL_RULES = [re.compile(pattern, re.IGNORECASE) for pattern in (
+    r"\bhow (?:much|many)\b", r"\b(?:total|sum|average|median|count)\b", r"\bby (?:quarter|year|segment|region)\b",
+    r"\b(?:growth rate|year over year|yoy|quarter over quarter|qoq)\b", r"\b(?:highest|lowest|top \d+)\b",
+)]
+VECTOR_RULES = [re.compile(pattern, re.IGNORECASE) for pattern in (
+    r"\b(?:why|explain|describe|summari[sz]e|discuss(?:ed)?)\b", r"\bwhat did .+ (?:say|mention|note)\b",
+    r"\b(?:management|ceo|cfo|commentary|outlook|guidance|strategy|risks?|competition|plans?)\b",
+    r"\b(?:according to|on the call|in the transcript)\b",
+)]
+
+# Example questions per intent; the embedding fallback compares a query to them
+INTENT_EXAMPLES = {
+    "sql": [
+        "What was total revenue in Q3 2024?",
+        "How many daily active uniques did Reddit have last quarter?",
+        "Show ARPU by quarter for 2023.",
+        "What was adjusted EBITDA and net income for the year?",
+    ],
+    "vector": [
+        "What did management say about the advertising outlook?",
+        "Explain the strategy for international user growth.",
+        "What risks were discussed on the earnings call?",
+        "Summarize the commentary on data licensing and AI partners.",
+    ],
+}
+
+IDENTIFIER_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)?$")
+
+
+def normalize_year(year):
+    """Returns a four-digit year for '24' or '2024'."""
+    return year if len(year) == 4 else "20" + year
+
+
+def parse_query(query):
+    """
+    Extracts the structured parts of a question with the precompiled rules.
+    Args:
+        query (str): The user question.
+    Returns:
+        dict: metrics (canonical names), periods (e.g. "Q3 2024", "FY2023", "2023") and the
+        number of SQL and vector rules the question matches.
+    """
+    metrics = [metric for metric, rule in METRIC_RULES if rule.search(query)]
+    if "ad_revenue" in metrics or "other_revenue" in metrics:
+        metrics = [metric for metric in metrics if metric != "revenue"]     # "ad revenue" is not total revenue
+
+    periods = [f"Q{quarter} {normalize_year(year)}" for quarter, year in QUARTER_PATTERN.findall(query)]
+    periods += [f"FY{normalize_year(year)}" for year in FISCAL_YEAR_PATTERN.findall(query)]
+    quarter_years = {period[-4:] for period in periods}
+    periods += [year for year in YEAR_PATTERN.findall(query) if year not in quarter_years]
+
+    return {
+        "metrics": metrics,
+        "periods": list(dict.fromkeys(periods)),
+        "sql_rules": sum(bool(rule.search(query)) for rule in SQL_RULES) + bool(metrics) + bool(periods),
+        "vector_rules": sum(bool(rule.search(query)) for rule in VECTOR_RULES),
+    }
+
+
+def build_sql_query(plan, table=DEFAULT_METRICS_TABLE, limit=DEFAULT_SQL_LIMIT):
+    """
+    Builds the parameterized statement of the SQL route from a parsed question.
+    Args:
+        plan (dict): The result of `parse_query`.
+        table (str): The metrics table (metric, period, value, unit, source).
+        limit (int): The maximum number of rows.
+    Returns:
+        tuple: (sql, params), or None if the question names neither a metric nor a period.
+    """
+    if not IDENTIFIER_PATTERN.match(table):
+        raise ValueError(f"Invalid metrics table name: {table!r}")
+    if not plan["metrics"] and not plan["periods"]:
+        return None
+
+    # A bare year also matches its fiscal year and quarters
+    periods = []
+    for period in plan["periods"]:
+        periods.append(period)
+        if period.isdigit():
+            periods += [f"FY{period}"] + [f"Q{quarter} {period}" for quarter in range(1, 5)]
+
+    conditions, params = [], {"limit": limit}
+    if plan["metrics"]:
+        conditions.append("metric IN :metrics")
+        params["metrics"] = plan["metrics"]
+    if periods:
+        conditions.append("period IN :periods")
+        params["periods"] = periods
+    sql = (f"SELECT metric, period, value, unit, source FROM {table} "
+           f"WHERE {' AND '.join(conditions)} ORDER BY period, metric LIMIT :limit")
+    return sql, params
+
+
+def record_query_metrics(result):
+    """Records a routed query: its total time as the query stage, and the time of every step."""
+    timings = result["timings"]
+    instrumentation.observe("pipeline_stage_seconds", timings["total"], stage="query")
+    instrumentation.count("pipeline_items_total", stage="query")
+    instrumentation.count("query_requests_total", intent=result.get("intent", "unknown"), cache=result.get("cache", "miss"))
+    for step, seconds in timings.items():
+        if step != "total":
+            instrumentation.observe("query_step_seconds", seconds, step=step)
+    for stage in result.get("timed_out", ()):
+        instrumentation.count("query_timeouts_total", stage=stage)
+    for stage in result.get("errors", {}):
+        instrumentation.count("pipeline_errors_total", stage=f"query_{stage}")
+
+
 # Routes query to the right database (SQL or vector DB) based on query intent
-# 1. Define the QueryRouter class
 class QueryRouter:
-    def __init__(self, sql_db, vector_db):
-        # 2. Initialize with connections to SQL and vector databases
+    """
+    Routes questions to the SQL database (figures), the vector database (transcript passages)
+    or both. Intent comes from precompiled keyword and pattern rules, with an embedding
+    similarity fallback for questions no rule recognizes. Hybrid questions query both
+    backends concurrently; every route has a latency budget, and a stage that has not
+    answered within it is left out of the result instead of delaying the answer.
+    """
+
+    def __init__(self, sql_db=None, vector_db=None, collection_name=None, embed_query=None,
+                 metrics_table=DEFAULT_METRICS_TABLE, top_k=DEFAULT_TOP_K, latency_budgets=None,
+                 fallback_margin=DEFAULT_FALLBACK_MARGIN, max_workers=8, cache=None, retriever=None):
+        """
+        Args:
+            sql_db (object, optional): A SQLAlchemy engine or connection holding the metrics table.
+            vector_db (object, optional): An Astra DB database or LocalVectorDB.
+            collection_name (str, optional): The vector collection. Defaults to ASTRA_DB_COLLECTION_NAME.
+            embed_query (callable, optional): Returns the embedding of a question. Defaults to
+                FinBERT from the model registry, loaded on first use.
+            metrics_table (str): The table queried by the SQL route.
+            top_k (int): The number of passages returned by the vector route.
+            latency_budgets (dict, optional): Seconds per route, overriding DEFAULT_LATENCY_BUDGETS.
+            fallback_margin (float): The similarity margin the embedding fallback needs to pick one backend.
+            max_workers (int): Threads running the backend stages.
+            cache (QueryCache, optional): Exact and semantic cache of complete results.
+            retriever (HybridRetriever, optional): Answers the vector route with lexical and vector
+                retrieval combined (see `pipelines.retrieval_pipeline`) instead of a plain vector search.
+        """
+        # Initialize with connections to SQL and vector databases
         self.sql_db = sql_db
         self.vector_db = vector_db
+        self.collection_name = collection_name or os.getenv('ASTRA_DB_COLLECTION_NAME', 'reddit_earnings_call_transcripts')
+        self._embed_query = embed_query
+        self.metrics_table = metrics_table
+        self.top_k = top_k
+        self.latency_budgets = dict(DEFAULT_LATENCY_BUDGETS, **(latency_budgets or {}))
+        self.fallback_margin = fallback_margin
+        self.cache = cache
+        self.retriever = retriever
+        self._collection = None
+        self._prototypes = None     # Intent -> embeddings of INTENT_EXAMPLES, computed on first use
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="query-router")
+
+    def embed_query(self, query):
+        """Returns the query embedding as a float32 array."""
+        if self._embed_query is None:
+            from preprocessor import PDFPreprocessor    # Loads FinBERT through the model registry
+            self._embed_query = PDFPreprocessor().generate_embedding
+        return np.asarray(self._embed_query(query), dtype=np.float32).ravel()
+
+    def route_query(self, query, budget=None):
+        """
+        Answers a question from the SQL database, the vector database or both.
+        Args:
+            query (str): The user question.
+            budget (float, optional): Seconds allowed for this query, overriding the route's budget.
+        Returns:
+            dict: query, intent, results (SQL rows first, then passages by similarity), the raw
+            sql and vector results, timings in seconds per stage, the stages that timed out and
+            the errors of failed stages. A cached result also has "cache" ("exact" or "semantic").
+            A figure question is answered from the passages instead (intent "vector") without a
+            SQL database, and from both (intent "hybrid") when the SQL route fails or finds no rows.
+        """
+        start = time.perf_counter()
+        result = {"query": query, "timings": {}, "timed_out": [], "errors": {}}
+        embedding = None
 
-    def route_query(self, query):
-        # 3. Analyze the query to determine its intent
-        intent = self.analyze_query_intent(query)
-        
-        # 4. Route the query to the appropriate database based on the intent
-        if intent == 'sql':
-            return self.route_to_sql_db(query)
-        elif intent == 'vector':
-            return self.route_to_vector_db(query)
-        else:
+        # Answer from the cache: the same question first
+        if self.cache is not None:
+            cached = self.cache.get_exact(query)
+            if cached is not None:
+                return self._cached(query, cached, "exact", start)
+            result["timings"]["cache"] = time.perf_counter() - start
+
+        # Analyze the query to determine its intent
+        classify_start = time.perf_counter()
+        plan = parse_query(query)
+        intent = self._rule_intent(plan)
+        sql_only = intent == "sql" and self.sql_db is not None and build_sql_query(plan, self.metrics_table) is not None
+        result["timings"]["classify"] = time.perf_counter() - classify_start
+
+        # Then a semantically equivalent question; a question the SQL rule answers needs no embedding
+        if self.cache is not None and not sql_only:
+            semantic_start = time.perf_counter()
+            embedding = self.embed_query(query)     # Reused by the routing on a miss
+            cached = self.cache.get_similar(query, embedding)
+            if cached is not None:
+                return self._cached(query, cached, "semantic", start)
+            result["timings"]["cache"] += time.perf_counter() - semantic_start
+        if intent is None and embedding is None:
+            # No rule matched: fall back to the similarity with the example questions
+            embed_start = time.perf_counter()
+            embedding = self.embed_query(query)
+            result["timings"]["embed"] = time.perf_counter() - embed_start
+        if intent is None:
+            intent = self._embedding_intent(embedding)
+        if intent == "sql" and build_sql_query(plan, self.metrics_table) is None:
+            intent = "hybrid"   # Nothing to look up in the table, so the passages must answer it
+        if intent not in QUERY_INTENTS:
             raise ValueError("Unknown query intent")
+        if intent in ("sql", "hybrid") and self.sql_db is None:
+            intent = "vector"   # No SQL database to look the figures up in
+        result["intent"] = intent
+
+        # Route the query to the appropriate databases, concurrently, within the latency budget
+        has_vector = self.vector_db is not None or self.retriever is not None
+        deadline = start + (self.latency_budgets[intent] if budget is None else budget)
+        self._run_stages(result, query, plan, embedding, deadline,
+                         sql=intent in ("sql", "hybrid"), vector=intent in ("vector", "hybrid") and has_vector)
+
+        # Figures the SQL route could not provide: the passages answer instead, within the hybrid budget
+        if intent == "sql" and has_vector and "sql" not in result["timed_out"] and (
+                "sql" in result["errors"] or not result["sql"]):
+            result["intent"] = "hybrid"
+            if budget is None:
+                deadline = start + self.latency_budgets["hybrid"]
+            self._run_stages(result, query, plan, embedding, deadline, sql=False, vector=True)
+
+        # Merge: exact figures first, then the passages that explain them
+        merge_start = time.perf_counter()
+        result["results"] = ([dict(row, source="sql") for row in result.get("sql", [])]
+                             + [dict(doc, source="vector") for doc in result.get("vector", [])])
+        result["timings"]["merge"] = time.perf_counter() - merge_start
+        result["timings"]["total"] = time.perf_counter() - start
+
+        # Only complete answers are cached; a partial one is retried next time
+        if self.cache is not None and not result["timed_out"] and not result["errors"]:
+            self.cache.put(query, result, embedding)
+        record_query_metrics(result)
+        return result
+
+    def _run_stages(self, result, query, plan, embedding, deadline, sql, vector):
+        """Runs the SQL and vector stages concurrently and stores what answered before the deadline in `result`."""
+        stages = {}
+        if sql:
+            stages["sql"] = self._executor.submit(self._timed, self.route_to_sql_db, query, plan,
+                                                  max(deadline - time.perf_counter(), 0.0))
+        if vector:
+            stages["vector"] = self._executor.submit(self._timed, self.route_to_vector_db, query, embedding,
+                                                     max(deadline - time.perf_counter(), 0.0))
+        done, _ = wait(stages.values(), timeout=max(deadline - time.perf_counter(), 0.0))
+
+        for stage, future in stages.items():
+            if future not in done:
+                future.cancel()     # Still running stages finish in the background and are discarded
+                result["timed_out"].append(stage)
+                result[stage] = []
+                continue
+            rows, seconds, error = future.result()
+            result["timings"][stage] = seconds
+            result[stage] = rows
+            if error is not None:
+                result["errors"][stage] = error
 
     def analyze_query_intent(self, query):
-        # 5. Implement logic to analyze the query and determine its intent
-        # (This is a placeholder for actual implementation)
-        pass
-
-    def route_to_sql_db(self, query):
-        # 6. Implement logic to route the query to the SQL database
-        # (This is a placeholder for actual implementation)
-        pass
-
-    def route_to_vector_db(self, query):
-        # 7. Implement logic to route the query to the vector database
-        # (This is a placeholder for actual implementation)
-        pass
-        # 8. Define the logic to analyze the query and determine its intent
-        #    a. Check for keywords or patterns that indicate a SQL query
-        #    b. Check for keywords or patterns that indicate a vector search query
-        #    c. Return 'sql' if SQL query, 'vector' if vector search query
-
-        # 9. Define the logic to route the query to the SQL database
-        #    a. Connect to the SQL database
-        #    b. Execute the query
-        #    c. Fetch and return the results
-
-        # 10. Define the logic to route the query to the vector database
-        #    a. Connect to the vector database
-        #    b. Execute the query
-        #    c. Fetch and return the results
\ No newline at end of file
+        """
+        Returns 'sql', 'vector' or 'hybrid'. Questions naming figures (metrics, periods, totals)
+        go to SQL, narrative questions to the vector database, questions with both kinds of
+        signal to both. Without any rule match the query embedding decides.
+        """
+        intent = self._rule_intent(parse_query(query))
+        if intent is None:
+            intent = self._embedding_intent(self.embed_query(query))
+        return intent
+
+    def _rule_intent(self, plan):
+        """Returns the intent the rules agree on, or None if no rule matched."""
+        if plan["sql_rules"] and plan["vector_rules"]:
+            return "hybrid"
+        if plan["sql_rules"]:
+            return "sql"
+        if plan["vector_rules"]:
+            return "vector"
+        return None
+
+    def _embedding_intent(self, embedding):
+        """Returns the intent whose example questions are closest to the query embedding."""
+        if self._prototypes is None:
+            self._prototypes = {intent: np.stack([self.embed_query(example) for example in examples])
+                                for intent, examples in INTENT_EXAMPLES.items()}
+        norm = np.linalg.norm(embedding) or 1.0
+        similarity = {}
+        for intent, prototypes in self._prototypes.items():
+            scores = prototypes @ embedding / (np.linalg.norm(prototypes, axis=1) * norm + 1e-12)
+            similarity[intent] = float(scores.max())
+        if abs(similarity["sql"] - similarity["vector"]) < self.fallback_margin:
+            return "hybrid"
+        return max(similarity, key=similarity.get)
+
+    @staticmethod
+    def _timed(stage, *args):
+        """Runs a stage in a worker thread and returns (rows, seconds, error)."""
+        start = time.perf_counter()
+        try:
+            return stage(*args), time.perf_counter() - start, None
+        except Exception as e:
+            return [], time.perf_counter() - start, repr(e)
+
+    def route_to_sql_db(self, query, plan=None, timeout=None):
+        """
+        Looks up the figures a question names in the metrics table.
+        Args:
+            query (str): The user question.
+            plan (dict, optional): The result of `parse_query` for the question.
+            timeout (float, optional): Seconds the statement may run (enforced on PostgreSQL).
+        Returns:
+            list: One dict per row (metric, period, value, unit, source).
+        """
+        from sqlalchemy import bindparam, text     # Imported on first use to keep imports fast
+        from sqlalchemy.engine import Engine
+
+        statement = build_sql_query(plan or parse_query(query), self.metrics_table)
+        if statement is None:
+            return []
+        sql, params = statement
+        statement = text(sql).bindparams(*[bindparam(name, expanding=True) for name in ("metrics", "periods")
+                                           if name in params])
+
+        if not isinstance(self.sql_db, Engine):
+            return [dict(row._mapping) for row in self.sql_db.execute(statement, params)]
+        # A pooled connection per query, so concurrent questions never share a connection
+        with self.sql_db.connect() as connection:
+            if timeout and connection.dialect.name == "postgresql":
+                connection.execute(text(f"SET LOCAL statement_timeout = {max(int(timeout * 1000), 1)}"))
+            return [dict(row._mapping) for row in connection.execute(statement, params)]
+
+    def route_to_vector_db(self, query, embedding=None, timeout=None):
+        """
+        Finds the transcript passages most similar to a question.
+        Args:
+            query (str): The user question.
+            embedding (numpy.ndarray, optional): The precomputed query embedding.
+            timeout (float, optional): Seconds the Data API request may take.
+        Returns:
+            list: One dict per passage (id, text, metadata, similarity), most similar first.
+        """
+        if embedding is None and (self.retriever is None or self.retriever.mode != "lexical"):
+            embedding = self.embed_query(query)
+        if self.retriever is not None:
+            return self.retriever.search(query, embedding, k=self.top_k, timeout=timeout)
+        if self._collection is None:
+            self._collection = self.vector_db.get_collection(self.collection_name)
+        kwargs = {"timeout_ms": max(int(timeout * 1000), 1)} if timeout else {}
+        cursor = self._collection.find(sort={"$vector": embedding.tolist()}, limit=self.top_k,
+                                       include_similarity=True, **kwargs)
+        return [{"id": doc.get("_id", doc.get("id")), "text": doc.get("text"), "metadata": doc.get("metadata", {}),
+                 "similarity": doc.get("$similarity")} for doc in cursor]
+
+    @staticmethod
+    def _cached(query, cached, level, start):
+        # A cached answer, returned with this query and the time the lookup took
+        cached.update(query=query, cache=level,
+                      timings={"cache": time.perf_counter() - start, "total": time.perf_counter() - start})
+        record_query_metrics(cached)
+        return cached
+
+    def close(self):
+        """Stops the stage threads; running stages finish first."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,66 @@
+import pytest
+
+# Small vocabulary so a FinBERT-shaped model can be built without downloading weights
+TINY_VOCAB = [
+    "[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]",
+    "the", "company", "revenue", "grew", "by", "in", "q4", "2023", "ad", "users",
+    "reddit", "earnings", "call", "margin", "daily", "active", "percent", "million",
+    ".", ",", "%", "$", "1", "2", "3", "4", "5",
+]
+
+
+@pytest.fixture
+def tiny_finbert(tmp_path):
+    """Returns a (tokenizer, model) pair with the FinBERT architecture at a tiny size."""
+    torch = pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+
+    vocab_file = tmp_path / "vocab.txt"
+    vocab_file.write_text("\n".join(TINY_VOCAB) + "\n")
+    tokenizer = transformers.BertTokenizerFast(str(vocab_file))
+
+    torch.manual_seed(0)
+    config = transformers.BertConfig(
+        vocab_size=len(TINY_VOCAB),
+        hidden_size=32,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=64,
+        max_position_embeddings=512,
+    )
+    model = transformers.BertModel(config)
+    model.eval()
+    return tokenizer, model
+
+
+@pytest.fixture
+def tiny_preprocessor(tiny_finbert):
+    """Returns a PDFPreprocessor backed by the tiny FinBERT model and no database."""
+    from preprocessor import PDFPreprocessor
+
+    preprocessor = PDFPreprocessor.__new__(PDFPreprocessor)
+    preprocessor.tokenizer, preprocessor.model = tiny_finbert
+    return preprocessor
+
+
+@pytest.fixture
+def finbert_tokenizer(tiny_finbert, tmp_path, monkeypatch):
+    """
+    Makes the tiny tokenizer the FinBERT tokenizer of the token chunker: registered in this
+    process, and saved as an offline Hugging Face cache entry for spawned worker processes.
+    """
+    from models import model_registry
+
+    tokenizer, model = tiny_finbert
+    repo = tmp_path / "hf_home" / "hub" / ("models--" + model_registry.DEFAULT_MODEL_NAME.replace("/", "--"))
+    revision = "0" * 40
+    tokenizer.save_pretrained(str(repo / "snapshots" / revision))
+    model.config.save_pretrained(str(repo / "snapshots" / revision))
+    (repo / "refs").mkdir()
+    (repo / "refs" / "main").write_text(revision)
+    monkeypatch.setenv("HF_HOME", str(tmp_path / "hf_home"))
+    monkeypatch.setenv("HF_HUB_OFFLINE", "1")
+
+    model_registry.register_model(model_registry.DEFAULT_MODEL_NAME, tokenizer, model)
+    yield tokenizer
+    model_registry.clear_registry()
@@ -0,0 +1,123 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from databases.astra_uploader import AstraBulkUploader, UploadError, is_transient_error
+
+
+class DataAPITimeoutException(Exception):
+    """Mirrors the astrapy timeout exception by name."""
+
+
+class CollectionInsertManyException(Exception):
+    """Mirrors astrapy's insert_many exception: inserted ids plus the root errors."""
+
+    def __init__(self, inserted_ids, exceptions):
+        super().__init__(f"{len(exceptions)} errors")
+        self.inserted_ids = inserted_ids
+        self.exceptions = exceptions
+
+
+class DataAPIResponseException(Exception):
+    def __init__(self, error_codes):
+        super().__init__(", ".join(error_codes))
+        self.error_descriptors = [SimpleNamespace(error_code=code) for code in error_codes]
+
+
+class LocalDataAPICollection:
+    """
+    Local stand-in for an Astra DB collection. Documents are stored by `_id` and duplicates
+    are rejected like the Data API does. `failures` scripts what the next calls do:
+    "timeout" fails before writing, "timeout_after_write" stores the documents and then
+    times out, and "bad_request" fails permanently.
+    """
+
+    def __init__(self, failures=(), latency=0.01):
+        self.documents = {}
+        self.failures = list(failures)
+        self.latency = latency
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def insert_many(self, documents, ordered=False):
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            failure = self.failures.pop(0) if self.failures else None
+        try:
+            time.sleep(self.latency)
+            if failure == "timeout":
+                raise DataAPITimeoutException("read timeout")
+            if failure == "bad_request":
+                raise DataAPIResponseException(["INVALID_REQUEST"])
+            inserted, duplicates = [], []
+            with self._lock:
+                for doc in documents:
+                    if doc["_id"] in self.documents:
+                        duplicates.append(DataAPIResponseException(["DOCUMENT_ALREADY_EXISTS"]))
+                    else:
+                        self.documents[doc["_id"]] = doc
+                        inserted.append(doc["_id"])
+            if failure == "timeout_after_write":
+                raise DataAPITimeoutException("read timeout")
+            if duplicates:
+                raise CollectionInsertManyException(inserted, duplicates)
+            return SimpleNamespace(inserted_ids=inserted)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+@pytest.fixture
+def documents():
+    return [{"id": f"chunk-{i}", "text": f"chunk {i}", "metadata": {"source": "call.pdf"}, "vector": [0.0]}
+            for i in range(40)]
+
+
+def test_uploads_concurrently(documents):
+    collection = LocalDataAPICollection(latency=0.05)
+    with AstraBulkUploader(collection, batch_size=5, max_in_flight=4) as uploader:
+        uploader.submit(documents)
+
+    assert len(collection.documents) == len(documents)
+    assert collection.max_in_flight > 1
+    assert uploader.stats["documents"] == len(documents)
+
+
+def test_retries_are_idempotent(documents):
+    collection = LocalDataAPICollection(failures=["timeout_after_write", "timeout"])
+    with AstraBulkUploader(collection, batch_size=10, max_in_flight=1, backoff_base=0.01) as uploader:
+        uploader.submit(documents)
+
+    # The batch that was stored before timing out is re-sent without creating duplicates
+    assert sorted(collection.documents) == sorted(doc["id"] for doc in documents)
+    assert uploader.stats["retries"] == 2
+
+
+def test_permanent_errors_are_reported(documents):
+    collection = LocalDataAPICollection(failures=["bad_request"])
+    uploader = AstraBulkUploader(collection, batch_size=10, max_in_flight=1, backoff_base=0.01)
+    uploader.submit(documents)
+
+    with pytest.raises(UploadError) as excinfo:
+        uploader.close()
+    assert len(excinfo.value.failed_documents) == 10
+    assert len(collection.documents) == 30
+
+
+def test_batch_size_adapts_to_latency(documents):
+    collection = LocalDataAPICollection(latency=0.0)
+    with AstraBulkUploader(collection, batch_size=5, max_in_flight=1, target_latency=1.0) as uploader:
+        uploader.submit(documents)
+    assert uploader.batch_size > 5
+
+
+def test_is_transient_error():
+    assert is_transient_error(DataAPITimeoutException("read timeout"))
+    assert is_transient_error(ConnectionError())
+    assert not is_transient_error(DataAPIResponseException(["INVALID_REQUEST"]))
@@ -0,0 +1,209 @@
+import threading
+import time
+
+import pytest
+
+from pipelines.automation import DAG, DAGRunner, build_ingestion_dag, critical_path
+
+
+def test_independent_tasks_run_in_parallel(tmp_path):
+    barrier = threading.Barrier(2, timeout=5)     # Only passes if both documents extract at the same time
+    dag = DAG()
+    dag.add("extract:a", lambda inputs: (barrier.wait(), "a")[1])
+    dag.add("extract:b", lambda inputs: (barrier.wait(), "b")[1])
+    dag.add("merge", lambda inputs: inputs["extract:a"] + inputs["extract:b"], deps=["extract:a", "extract:b"])
+
+    report = DAGRunner(dag, str(tmp_path), max_workers=2).run()
+    assert report["ok"] == 3 and report["failed"] == 0
+    assert DAGRunner(dag, str(tmp_path)).store.load("merge") == "ab"
+
+
+def test_stage_limits_serialize_a_stage(tmp_path):
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def embed(inputs):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+
+    dag = DAG()
+    for i in range(4):
+        dag.add(f"embed:{i}", embed, stage="embed")
+    DAGRunner(dag, str(tmp_path), max_workers=4, stage_limits={"embed": 1}).run()
+    assert peak[0] == 1
+
+
+def test_failed_run_resumes_from_the_last_completed_task(tmp_path):
+    calls = []
+    crash = [True]
+
+    def step(name):
+        def run(inputs):
+            calls.append(name)
+            if name == "embed" and crash[0]:
+                raise RuntimeError("killed")
+            return name
+        return run
+
+    dag = DAG()
+    dag.add("extract", step("extract"))
+    dag.add("nlp", step("nlp"), deps=["extract"])
+    dag.add("embed", step("embed"), deps=["extract"])
+    dag.add("load", step("load"), deps=["nlp", "embed"])
+
+    report = DAGRunner(dag, str(tmp_path)).run()
+    assert report["tasks"]["embed"]["status"] == "failed" and report["tasks"]["load"]["status"] == "blocked"
+    assert report["tasks"]["nlp"]["status"] == "ok"
+
+    crash[0] = False
+    calls.clear()
+    report = DAGRunner(dag, str(tmp_path)).run()
+    assert sorted(calls) == ["embed", "load"]
+    assert report["skipped"] == 2 and report["ok"] == 2
+
+
+def test_unreadable_checkpoint_runs_again(tmp_path):
+    dag = DAG()
+    dag.add("extract", lambda inputs: "pages")
+    dag.add("embed", lambda inputs: inputs["extract"] + " embedded", deps=["extract"])
+    runner = DAGRunner(dag, str(tmp_path))
+    assert runner.run(["extract"])["ok"] == 1
+    with open(runner.store._path("extract"), "wb") as f:
+        f.write(b"not a pickle")
+
+    report = DAGRunner(dag, str(tmp_path)).run()
+    assert report["tasks"]["embed"]["status"] == "failed" and "extract" in report["tasks"]["embed"]["error"]
+    report = DAGRunner(dag, str(tmp_path)).run()
+    assert report["tasks"]["extract"]["status"] == "ok" and report["tasks"]["embed"]["status"] == "ok"
+
+
+def test_unchanged_inputs_and_outputs_are_skipped(tmp_path):
+    source = tmp_path / "q4.txt"
+    source.write_text("Revenue grew 21%")
+    calls = []
+
+    def extract(inputs):
+        calls.append("extract")
+        return source.read_text().split()[0]    # Only the first word reaches the next stage
+
+    def embed(inputs):
+        calls.append("embed")
+        return inputs["extract"].upper()
+
+    dag = DAG()
+    dag.add("extract", extract, inputs=[str(source)])
+    dag.add("embed", embed, deps=["extract"])
+    checkpoints = str(tmp_path / "checkpoints")
+
+    DAGRunner(dag, checkpoints).run()
+    assert DAGRunner(dag, checkpoints).run()["skipped"] == 2
+
+    source.write_text("Revenue grew 25%")   # Changed file, same extracted output
+    calls.clear()
+    report = DAGRunner(dag, checkpoints).run()
+    assert calls == ["extract"] and report["tasks"]["embed"]["status"] == "skipped"
+
+    assert DAGRunner(dag, checkpoints).run(force=True)["ok"] == 2
+
+
+def test_critical_path_and_dag_validation():
+    dag = DAG()
+    dag.add("extract", None)
+    dag.add("nlp", None, deps=["extract"])
+    dag.add("embed", None, deps=["extract"])
+    dag.add("load", None, deps=["nlp", "embed"])
+    path = critical_path(dag.subgraph(), {"extract": 1.0, "nlp": 0.5, "embed": 3.0, "load": 0.25})
+    assert path == {"tasks": ["extract", "embed", "load"], "seconds": 4.25}
+    assert [task.name for task in dag.subgraph(["nlp"])] == ["extract", "nlp"]
+
+    with pytest.raises(ValueError):
+        dag.add("report", None, deps=["missing"])
+    with pytest.raises(ValueError):
+        dag.add("load", None)
+
+
+def test_checkpoints_keep_the_token_ids_of_chunks(tmp_path, finbert_tokenizer):
+    from pipelines.automation import CheckpointStore
+    from pipelines.extraction_pipeline import extract_and_chunk_pdf
+    from utils.benchmark import write_synthetic_pdf
+
+    extracted = extract_and_chunk_pdf(write_synthetic_pdf(str(tmp_path / "filing.pdf"), pages=1, seed=0))
+    store = CheckpointStore(str(tmp_path / "checkpoints"))
+    store.save("extract", "fingerprint", extracted, 0.0)
+    restored = CheckpointStore(store.directory).load("extract")
+    assert [chunk.token_ids for *_, chunk in restored["chunks"]] == [chunk.token_ids for *_, chunk in extracted["chunks"]]
+
+
+def test_ingestion_dag_loads_documents_once(tmp_path, tiny_preprocessor):
+    from databases.local_vector_database import LocalVectorDB
+    from utils.benchmark import write_synthetic_pdf
+
+    pdfs = [write_synthetic_pdf(str(tmp_path / f"filing_{i}.pdf"), pages=2, seed=i) for i in range(2)]
+    collection = LocalVectorDB(str(tmp_path / "vector_db")).create_collection("chunks")
+    dag = build_ingestion_dag(pdfs, collection, embedder=tiny_preprocessor, chunker="characters")
+    checkpoints = str(tmp_path / "checkpoints")
+
+    report = DAGRunner(dag, checkpoints, max_workers=4).run()
+    assert report["ok"] == 8 and report["failed"] == 0
+    stored = collection.count_documents({}, upper_bound=10_000)
+    assert stored > 0
+    document = collection.find_one({"metadata.source": pdfs[0]})
+    assert document["metadata"]["entities"] and document["metadata"]["page"] == 1
+    assert report["critical_path"]["tasks"][0].startswith("extract:")
+
+    report = DAGRunner(dag, checkpoints, max_workers=4).run()
+    assert report["skipped"] == 8 and collection.count_documents({}, upper_bound=10_000) == stored
+
+
+def test_token_chunk_dag_resumes_from_its_checkpoints(tmp_path, tiny_preprocessor, finbert_tokenizer):
+    from databases.local_vector_database import LocalVectorDB
+    from utils.benchmark import write_synthetic_pdf
+
+    pdf = write_synthetic_pdf(str(tmp_path / "filing.pdf"), pages=2, seed=0)
+    collection = LocalVectorDB(str(tmp_path / "vector_db")).create_collection("chunks")
+    checkpoints = str(tmp_path / "checkpoints")
+    received = []
+
+    class FlakyEmbedder:
+        def generate_embeddings(self, texts, batch_size=None):
+            received.extend(texts)
+            if len(received) == len(texts):
+                raise RuntimeError("GPU lost")
+            return tiny_preprocessor.generate_embeddings(texts, batch_size=batch_size or 32)
+
+    dag = build_ingestion_dag([pdf], collection, embedder=FlakyEmbedder())     # The default token chunker
+    report = DAGRunner(dag, checkpoints).run()
+    assert report["tasks"][f"embed:{pdf}"]["status"] == "failed" and report["blocked"] == 1
+
+    report = DAGRunner(dag, checkpoints).run()
+    assert report["tasks"][f"extract:{pdf}"]["status"] == "skipped" and report["tasks"][f"load:{pdf}"]["status"] == "ok"
+    assert all(text.token_ids for text in received)     # Rebuilt from the checkpoint, not re-tokenized
+    assert collection.count_documents({}, upper_bound=10_000) == len(received) // 2
+
+
+def test_changed_document_replaces_its_old_chunks(tmp_path, tiny_preprocessor):
+    from databases.ingestion_manifest import IngestionManifest
+    from databases.local_vector_database import LocalVectorDB
+    from utils.benchmark import write_synthetic_pdf
+
+    pdf = write_synthetic_pdf(str(tmp_path / "filing.pdf"), pages=2, seed=0)
+    collection = LocalVectorDB(str(tmp_path / "vector_db")).create_collection("chunks")
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+    checkpoints = str(tmp_path / "checkpoints")
+
+    def run():
+        dag = build_ingestion_dag([pdf], collection, embedder=tiny_preprocessor, chunker="characters", manifest=manifest)
+        return DAGRunner(dag, checkpoints).run()
+
+    run()
+    old_ids = {document["_id"] for document in collection.find({})}
+    write_synthetic_pdf(pdf, pages=2, seed=1)
+    assert run()["tasks"][f"load:{pdf}"]["status"] == "ok"
+
+    new_ids = set(IngestionManifest(manifest.path).stored_chunk_ids(pdf))
+    assert {document["_id"] for document in collection.find({})} == new_ids
+    assert new_ids != old_ids
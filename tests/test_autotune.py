@@ -0,0 +1,85 @@
+import yaml
+
+from config.config import chunk_size_setting, load_pipeline_config
+from utils.autotune import autotune, calibration_documents, save_profile, tune_upload
+
+
+def write_yaml(path, data):
+    path.write_text(yaml.safe_dump(data))
+    return str(path)
+
+
+def test_settings_merge_defaults_file_and_tuned_profile(tmp_path):
+    profile = write_yaml(tmp_path / "tuned.yml", {"embedding": {"batch_size": 64, "torch_threads": 2},
+                                                  "upload": {"max_in_flight": 8}, "calibrated_at": "2026-10-18"})
+    config = write_yaml(tmp_path / "pipeline_config.yml", {"chunking": {"chunker": "characters"},
+                                                           "embedding": {"batch_size": 16},
+                                                           "autotune": {"profile_path": profile}})
+
+    settings = load_pipeline_config(config)
+    assert settings["profile"] == profile
+    assert settings["embedding"]["batch_size"] == 64 and settings["embedding"]["torch_threads"] == 2
+    assert settings["embedding"]["window_size"] == 256     # Built-in default
+    assert settings["upload"]["max_in_flight"] == 8 and settings["upload"]["batch_size"] == 50
+    assert chunk_size_setting(settings, settings["chunking"]["chunker"]) == 500
+
+    untuned = load_pipeline_config(config, use_profile=False)
+    assert untuned["profile"] is None and untuned["embedding"]["batch_size"] == 16
+
+
+def test_preprocessor_and_cli_use_the_settings(tmp_path, monkeypatch, tiny_finbert):
+    import preprocessor
+    from main import build_parser
+
+    settings = load_pipeline_config(write_yaml(tmp_path / "pipeline_config.yml", {
+        "embedding": {"batch_size": 8, "window_size": 64}, "upload": {"max_in_flight": 2},
+        "autotune": {"profile_path": None}}))
+    monkeypatch.delenv("CHUNKER", raising=False)
+    monkeypatch.setattr(preprocessor, "get_model", lambda *args: tiny_finbert)
+
+    pdf_preprocessor = preprocessor.PDFPreprocessor(settings=settings)
+    assert pdf_preprocessor.embedding_batch_size == 8 and pdf_preprocessor.window_size == 64
+    assert pdf_preprocessor.upload_settings["max_in_flight"] == 2 and pdf_preprocessor.chunk_size == 256
+
+    args = build_parser(settings).parse_args(["ingest-corpus", "--upload-concurrency", "6"])
+    assert args.embedding_batch_size == 8 and args.window_size == 64 and args.upload_concurrency == 6
+
+
+def test_upload_tuning_respects_the_memory_cap(tmp_path):
+    from databases.local_vector_database import LocalVectorDB
+
+    collection = LocalVectorDB(str(tmp_path / "vector_db")).create_collection("autotune")
+    documents = calibration_documents(200, dimension=16)
+    selected, measurements = tune_upload(collection, documents, [20, 50], [1, 2])
+    assert len(measurements) == 4 and all(m["documents_per_second"] > 0 for m in measurements)
+    assert (selected["batch_size"], selected["max_in_flight"]) in {(m["batch_size"], m["max_in_flight"]) for m in measurements}
+    assert collection.count_documents({}, upper_bound=1_000) == 0    # Calibration documents are deleted
+
+    selected, _ = tune_upload(collection, documents, [20], [1], memory_cap_mb=1)
+    assert selected is None
+
+
+def test_autotune_writes_a_profile_that_is_loaded_back(tmp_path, tiny_preprocessor):
+    settings = load_pipeline_config(use_profile=False)
+    settings["autotune"].update(calibration_chunks=16, calibration_documents=100,
+                                candidates={"embedding_batch_size": [4, 8], "torch_threads": [1],
+                                            "upload_max_in_flight": [1, 2], "upload_batch_size": [50]})
+    from databases.local_vector_database import LocalVectorDB
+
+    # Uploads measured against a throwaway local database never become upload settings
+    untargeted = autotune(settings, embedder=tiny_preprocessor, stages=("upload",))
+    assert untargeted["upload"] == {} and len(untargeted["measurements"]["upload"]) == 2
+
+    collection = LocalVectorDB(str(tmp_path / "vector_db")).create_collection("autotune")
+    profile = autotune(settings, embedder=tiny_preprocessor, collection=collection)
+    assert profile["embedding"]["batch_size"] in (4, 8) and profile["embedding"]["torch_threads"] == 1
+    assert profile["upload"]["batch_size"] == 50 and len(profile["measurements"]["embedding"]) == 3
+    # Each candidate is judged by its own RSS growth, not by the peaks of the candidates before it
+    assert all(m["rss_increase_mb"] >= 0 and m["estimated_rss_mb"] is not None
+               for m in profile["measurements"]["embedding"])
+
+    path = save_profile(profile, str(tmp_path / "tuned_profile.yml"))
+    config = write_yaml(tmp_path / "pipeline_config.yml", {"autotune": {"profile_path": path}})
+    loaded = load_pipeline_config(config)
+    assert loaded["embedding"]["batch_size"] == profile["embedding"]["batch_size"]
+    assert loaded["upload"]["max_in_flight"] == profile["upload"]["max_in_flight"]
@@ -0,0 +1,51 @@
+import pytest
+
+from nlp import basic_ner
+from nlp.basic_ner import BasicNERProcessor
+
+spacy = pytest.importorskip("spacy")
+
+
+@pytest.fixture
+def ruler_nlp():
+    """A blank English pipeline whose entity ruler stands in for the statistical NER."""
+    nlp = spacy.blank("en")
+    ruler = nlp.add_pipe("entity_ruler")
+    ruler.add_patterns([
+        {"label": "ORG", "pattern": "Reddit"},
+        {"label": "ORG", "pattern": "Tesla"},
+        {"label": "DATE", "pattern": [{"LOWER": "q4"}, {"SHAPE": "dddd"}]},
+        {"label": "PERCENT", "pattern": [{"LIKE_NUM": True}, {"ORTH": "%"}]},
+    ])
+    return nlp
+
+
+def test_extract_entities(ruler_nlp):
+    entities = BasicNERProcessor(nlp=ruler_nlp).extract_entities("Tesla stock price increased by 10 % in Q4 2023.")
+    assert entities == {"Tesla": "ORG", "10 %": "PERCENT", "Q4 2023": "DATE"}
+
+
+def test_chunks_stream_in_order_as_compact_tuples(ruler_nlp):
+    chunks = [(f"chunk-{i}", f"Reddit grew {i} % in Q4 2023." if i % 2 else "No entities here.") for i in range(7)]
+    processor = BasicNERProcessor(nlp=ruler_nlp, batch_size=2, labels={"ORG", "DATE"})
+    results = list(processor.iter_entities(iter(chunks)))
+
+    assert [chunk_id for chunk_id, _ in results] == [chunk_id for chunk_id, _ in chunks]
+    assert results[0] == ("chunk-0", ())
+    assert results[1] == ("chunk-1", ((0, 6, "ORG"), (17, 24, "DATE")))
+
+
+def test_model_is_loaded_once_per_process(monkeypatch, ruler_nlp):
+    calls = []
+    monkeypatch.setattr(basic_ner, "_models", {})
+    monkeypatch.setattr(basic_ner, "load_spacy_model", lambda name, exclude: calls.append(name) or ruler_nlp)
+
+    first, second = BasicNERProcessor("en_core_web_sm"), BasicNERProcessor("en_core_web_sm")
+    assert first.nlp is second.nlp
+    assert calls == ["en_core_web_sm"]
+
+
+def test_benchmark_reports_throughput(ruler_nlp):
+    report = BasicNERProcessor(nlp=ruler_nlp).benchmark(["Reddit grew 5 % in Q4 2023."] * 20, batch_size=8)
+    assert report["texts"] == 20 and report["entities"] == 60
+    assert report["megabytes_per_second"] > 0
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from utils.benchmark import (BENCHMARK_QUESTIONS, benchmark_report, build_corpus, compare_results, required_stages,
+                             run_benchmarks, stage_result)
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    pytest.importorskip("pymupdf")
+    pytest.importorskip("openpyxl")
+    return build_corpus(str(tmp_path / "corpus"), documents=2, pages=2, workbook_rows=60, include_bundled=False)
+
+
+def test_synthetic_corpus_is_deterministic(tmp_path, corpus):
+    from preprocessor import stream_pages_and_metadata_from_pdf
+
+    again = build_corpus(str(tmp_path / "again"), documents=2, pages=2, workbook_rows=60, include_bundled=False)
+    first, _ = stream_pages_and_metadata_from_pdf(corpus["pdfs"][0])
+    second, _ = stream_pages_and_metadata_from_pdf(again["pdfs"][0])
+    first, second = list(first), list(second)
+    assert len(first) == 2 and first == second
+    assert "Form 10-Q" in first[0][1] and "million" in first[0][1]
+
+
+def test_stage_dependencies_are_resolved():
+    assert required_stages(["retrieval"]) == ["extract", "chunk", "embed", "upload", "excel", "retrieval"]
+    assert required_stages(["ner"]) == ["extract", "chunk", "ner"]
+    with pytest.raises(ValueError):
+        required_stages(["transcode"])
+
+
+def test_every_stage_reports_throughput_latency_and_memory(tmp_path, corpus, tiny_preprocessor):
+    results = run_benchmarks(corpus, str(tmp_path), embedder=tiny_preprocessor, chunk_size=300, batch_size=8)
+
+    assert list(results) == ["extract", "chunk", "embed", "ner", "upload", "excel", "retrieval"]
+    for result in results.values():
+        assert result["seconds"] > 0 and result["items"] > 0
+        assert 0 < result["p50_ms"] <= result["p99_ms"]
+        assert result["peak_rss_mb"] is None or result["peak_rss_mb"] > 0
+    chunks = results["chunk"]["chunks"]
+    assert results["extract"]["documents"] == 2 and results["extract"]["pages"] == 4
+    assert chunks > 2 and results["embed"]["chunks"] == chunks and results["upload"]["chunks"] == chunks
+    assert results["chunk"]["chunks_per_second"] > 0 and results["extract"]["docs_per_second"] > 0
+    assert results["ner"]["entities"] > chunks and results["ner"]["megabytes_per_second"] > 0
+    assert results["excel"]["rows"] == 60
+    assert results["retrieval"]["queries"] == len(BENCHMARK_QUESTIONS) and results["retrieval"]["results"] > 0
+
+    report = benchmark_report(corpus, results, {"documents": 2})
+    assert json.loads(json.dumps(report))["stages"]["embed"]["chunks"] == chunks
+
+
+def test_only_selected_stages_are_reported(tmp_path, corpus):
+    results = run_benchmarks(corpus, str(tmp_path), stages=["ner"], chunk_size=300)
+    assert list(results) == ["ner"]
+
+
+def test_regressions_beyond_tolerance_are_flagged():
+    baseline = {"stages": {"embed": stage_result("embed", 1.0, [0.01, 0.02], documents=2, chunks=100)}}
+    current = {"stages": {"embed": stage_result("embed", 2.0, [0.01, 0.05], documents=2, chunks=100),
+                          "ner": stage_result("ner", 1.0, [0.001], chunks=100)}}
+
+    regressions = compare_results(baseline, current, max_regression=0.2)
+    assert {(entry["stage"], entry["metric"]) for entry in regressions} == {
+        ("embed", "docs_per_second"), ("embed", "chunks_per_second"), ("embed", "p50_ms"), ("embed", "p99_ms")}
+    assert compare_results(baseline, baseline) == []
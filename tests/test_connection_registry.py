@@ -0,0 +1,84 @@
+import logging
+import threading
+
+import pytest
+
+from databases import connection_registry
+from databases.db_connector import DbConnector
+
+ENDPOINT = "https://01234567-89ab-cdef-0123-456789abcdef-us-east1.apps.astra.datastax.com"
+
+
+@pytest.fixture(autouse=True)
+def empty_registry():
+    connection_registry.dispose_all()
+    yield
+    connection_registry.dispose_all()
+
+
+@pytest.fixture
+def sqlite_url(tmp_path):
+    pytest.importorskip("sqlalchemy")
+    return f"sqlite:///{tmp_path / 'metrics.db'}"
+
+
+def test_engines_and_clients_are_shared(sqlite_url):
+    engines = []
+    threads = [threading.Thread(target=lambda: engines.append(connection_registry.get_engine(sqlite_url)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(engine is engines[0] for engine in engines)
+    assert connection_registry.get_engine(sqlite_url, pool_size=2) is not engines[0]
+    assert connection_registry.get_astra_database("AstraCS:token", ENDPOINT) is \
+        connection_registry.get_astra_database("AstraCS:token", ENDPOINT)
+    assert connection_registry.get_data_api_client("AstraCS:token") is not \
+        connection_registry.get_data_api_client("AstraCS:other")
+
+
+def test_pool_metrics_report_saturation(sqlite_url):
+    engine = connection_registry.get_engine(sqlite_url, pool_size=2, max_overflow=1, pool_timeout=0.1)
+    connections = [engine.connect() for _ in range(3)]
+    [metrics] = connection_registry.pool_metrics()
+    assert metrics["capacity"] == 3 and metrics["checked_out"] == 3 and metrics["overflow"] == 1
+    assert metrics["saturation"] == 1.0 and metrics["saturated_checkouts"] == 1
+
+    for connection in connections:
+        connection.close()
+    with engine.connect():
+        pass
+    [metrics] = connection_registry.pool_metrics()
+    assert metrics["checked_out"] == 0 and metrics["peak_checked_out"] == 3
+    assert metrics["connects"] == 3     # The returned connections are reused
+
+
+def test_health_check(sqlite_url):
+    connection_registry.get_engine(sqlite_url)
+    [check] = connection_registry.health_check()
+    assert check["ok"] and check["error"] is None
+
+
+def test_credentials_are_never_logged_or_reported(monkeypatch, caplog):
+    pytest.importorskip("sqlalchemy")
+    url = connection_registry.build_postgres_url("analyst", "p@ss:word/1", "db.internal", 5432, "finance")
+    assert url.password == "p@ss:word/1"
+    assert "p@ss" not in url.render_as_string(hide_password=True)
+
+    for name, value in dict(DB_HOST="db.internal", DB_PORT="5432", DB_NAME="finance", DB_USER="analyst",
+                            DB_PASSWORD="p@ss:word/1", ASTRA_DB_APPLICATION_TOKEN="AstraCS:secret",
+                            ASTRA_DB_API_ENDPOINT=ENDPOINT).items():
+        monkeypatch.setenv(name, value)
+    with caplog.at_level(logging.DEBUG):
+        DbConnector(db_type="postgresql")
+        DbConnector(db_type="vector_db").get_connection()
+    assert "p@ss" not in caplog.text and "AstraCS:secret" not in caplog.text
+
+
+def test_db_connector_connects_lazily(monkeypatch):
+    monkeypatch.delenv("DB_HOST", raising=False)
+    connector = DbConnector(db_type="postgresql")   # No connection attempt yet
+    with pytest.raises(ValueError):
+        connector.get_connection()
@@ -0,0 +1,116 @@
+import functools
+import hashlib
+
+import numpy as np
+import pytest
+
+from databases.ingestion_manifest import IngestionManifest
+from pipelines.embedding_pipeline import ingest_corpus
+from pipelines.extraction_pipeline import extract_and_chunk_pdf, list_pdf_files
+from pipelines.nlp_pipeline import load_entity_processor
+
+
+class HashEmbedder:
+    """Deterministic stand-in for FinBERT so the test exercises only the process plumbing."""
+
+    def generate_embeddings(self, texts, batch_size=32):
+        return np.array([np.frombuffer(hashlib.sha256(text.encode()).digest()[:16], dtype=np.uint8)
+                         for text in texts], dtype=np.float32)
+
+
+def broken_entity_processor():
+    raise OSError("spaCy model not installed")
+
+
+@pytest.fixture
+def corpus_dir(tmp_path):
+    pymupdf = pytest.importorskip("pymupdf")
+    for name, pages in [("q3_call.pdf", 2), ("q4_call.pdf", 3)]:
+        doc = pymupdf.open()
+        for page_number in range(pages):
+            page = doc.new_page()
+            for line in range(10):
+                page.insert_text((72, 72 + 14 * line), f"{name} page {page_number} line {line}: ad revenue grew 20 percent.")
+        doc.save(str(tmp_path / name))
+        doc.close()
+    (tmp_path / "corrupt.pdf").write_bytes(b"not a pdf")
+    return tmp_path
+
+
+def test_extract_and_chunk_pdf(corpus_dir, tiny_finbert):
+    from models import model_registry
+    model_registry.register_model(model_registry.DEFAULT_MODEL_NAME, *tiny_finbert)
+    try:
+        extracted = extract_and_chunk_pdf(str(corpus_dir / "q4_call.pdf"), chunk_size=32)
+    finally:
+        model_registry.clear_registry()
+
+    assert extracted["pages"] == 3
+    assert extracted["metadata"]["source"].endswith("q4_call.pdf")
+    assert extracted["chunks"][0][0] == 1
+    assert set(extracted["page_hashes"]) == {1, 2, 3}
+    assert all(len(chunk.token_ids) <= 32 for *_, chunk in extracted["chunks"])
+
+
+def test_ingest_corpus_reports_failures_and_continues(corpus_dir, finbert_tokenizer):
+    inserted = []
+    manifest = IngestionManifest(str(corpus_dir / "manifest.json"))
+    options = dict(embedder_factory=HashEmbedder, extract_workers=2, embed_workers=2, torch_threads=1,
+                   queue_size=1, window_size=1, manifest=manifest, chunk_size=32)
+    report = ingest_corpus(list_pdf_files(str(corpus_dir)), inserted.extend, **options)
+
+    by_file = {entry["source"].rsplit("/", 1)[-1]: entry for entry in report["files"]}
+    assert report["succeeded"] == 2
+    assert report["failed"] == 1
+    assert by_file["corrupt.pdf"]["status"] == "failed"
+    assert by_file["q4_call.pdf"]["pages"] == 3
+    assert by_file["q4_call.pdf"]["chunks_per_second"] > 0
+    assert len(inserted) == report["chunks"]
+    assert {doc["metadata"]["page"] for doc in inserted if "q4" in doc["metadata"]["source"]} == {1, 2, 3}
+
+    # A second run with the manifest skips the unchanged files
+    rerun = ingest_corpus(list_pdf_files(str(corpus_dir)), inserted.extend, **options)
+    assert rerun["unchanged"] == 2
+    assert rerun["failed"] == 1
+    assert len(inserted) == report["chunks"]
+
+
+def test_files_with_failed_uploads_stay_out_of_the_manifest(corpus_dir, finbert_tokenizer):
+    from databases.astra_uploader import UploadError
+
+    queued = []
+    manifest = IngestionManifest(str(corpus_dir / "manifest.json"))
+    options = dict(embedder_factory=HashEmbedder, extract_workers=2, embed_workers=1, torch_threads=1,
+                   manifest=manifest)
+
+    def flush():
+        failed = [doc for doc in queued if "q4" in doc["metadata"]["source"]]
+        raise UploadError(failed, ["HTTP 400"])
+
+    report = ingest_corpus(list_pdf_files(str(corpus_dir)), queued.extend, flush_documents=flush, **options)
+    by_file = {entry["source"].rsplit("/", 1)[-1]: entry for entry in report["files"]}
+    assert by_file["q4_call.pdf"]["status"] == "failed" and by_file["q4_call.pdf"]["failed_stage"] == "upload"
+    assert report["succeeded"] == 1 and report["failed"] == 2
+    assert manifest.get(by_file["q4_call.pdf"]["source"]) is None
+    assert IngestionManifest(manifest.path).get(by_file["q3_call.pdf"]["source"]) is not None
+
+    # The next run re-ingests only the file whose upload failed
+    rerun = ingest_corpus(list_pdf_files(str(corpus_dir)), [].extend, flush_documents=lambda: None, **options)
+    assert rerun["unchanged"] == 1 and rerun["succeeded"] == 1
+
+
+def test_ner_workers_tag_every_ingested_chunk(corpus_dir, finbert_tokenizer):
+    inserted = []
+    options = dict(embedder_factory=HashEmbedder, extract_workers=2, embed_workers=1, torch_threads=1,
+                   queue_size=1, window_size=2)
+    report = ingest_corpus(list_pdf_files(str(corpus_dir)), inserted.extend, ner_workers=2,
+                           entity_processor_factory=functools.partial(load_entity_processor, "lexicon"), **options)
+    assert report["succeeded"] == 2 and len(inserted) == report["chunks"]
+    assert all({"ad revenue", "20 percent"} <= set(doc["metadata"]["entities"]) for doc in inserted)
+    assert all(entry["ner_seconds"] > 0 for entry in report["files"] if entry["status"] == "ok")
+
+    # Files cannot be stored without their entities once the NER workers are gone
+    report = ingest_corpus(list_pdf_files(str(corpus_dir)), [].extend,
+                           entity_processor_factory=broken_entity_processor, **options)
+    assert report["succeeded"] == 0
+    assert {entry["error"] for entry in report["files"] if entry["source"].endswith("_call.pdf")} == {"no NER worker alive"}
@@ -0,0 +1,159 @@
+import pytest
+
+import preprocessor
+from databases.ingestion_manifest import IngestionManifest
+from databases.local_vector_database import LocalVectorDB
+from nlp.dedup import NearDuplicateIndex, dedup_report
+from pipelines.embedding_pipeline import ingest_corpus
+from pipelines.extraction_pipeline import list_pdf_files
+
+SAFE_HARBOR = ("This call contains forward-looking statements about our business, operations and financial "
+               "performance that involve risks and uncertainties. Actual results may differ materially from "
+               "those expressed or implied, and we undertake no obligation to update these statements.")
+
+SAFE_HARBOR_LINES = [
+    "This call contains forward-looking statements about our business and operations.",
+    "These statements involve risks, uncertainties and assumptions beyond our control.",
+    "Actual results may differ materially from those expressed or implied today.",
+    "We undertake no obligation to update any forward-looking statements we make.",
+    "Please refer to our filings for a discussion of the factors that may affect results.",
+    "Non-GAAP measures are reconciled to the nearest GAAP measures in our press release.",
+]
+
+
+def write_pdf(path, pages):
+    pymupdf = pytest.importorskip("pymupdf")
+    doc = pymupdf.open()
+    for lines in pages:
+        page = doc.new_page()
+        for line_number, line in enumerate(lines):
+            page.insert_text((72, 72 + 14 * line_number), line)
+    doc.save(str(path))
+    doc.close()
+
+
+def results_page(label):
+    return [f"{label} line {i}: ad revenue grew {10 + i} percent year over year." for i in range(12)]
+
+
+def test_boilerplate_is_a_near_duplicate_within_and_across_sources():
+    index = NearDuplicateIndex()
+    assert index.find_or_add("a-1", SAFE_HARBOR, "q3.pdf") is None
+    # Whitespace and case differences do not matter
+    assert index.find_or_add("a-2", "  " + SAFE_HARBOR.upper(), "q3.pdf") == "a-1"
+    assert index.find_or_add("b-1", SAFE_HARBOR.replace(",", ""), "q4.pdf") == "a-1"
+    assert index.find_or_add("b-2", "Ad revenue grew in every region this quarter.", "q4.pdf") is None
+    assert index.source_of("a-1") == "q3.pdf"
+    assert len(index) == 2
+
+    # A reworded sentence is only a near-duplicate at a lower threshold
+    reworded = SAFE_HARBOR.replace("materially", "significantly")
+    assert index.find(reworded) is None
+    lenient = NearDuplicateIndex(threshold=0.7)
+    lenient.add("a-1", SAFE_HARBOR)
+    assert lenient.find(reworded) == "a-1"
+
+
+def test_chunks_stating_different_figures_are_kept():
+    index = NearDuplicateIndex()
+    statement = "Daily active users grew to {} million and ad revenue grew by 20% year over year in the quarter."
+    index.find_or_add("q3", statement.format(73), "q3.pdf")
+    assert index.find_or_add("q4", statement.format(76), "q4.pdf") is None
+    assert index.find_or_add("q4-again", statement.format(76), "q4.pdf") == "q4"
+
+
+def test_index_round_trip_and_source_removal(tmp_path):
+    path = str(tmp_path / "dedup_index.npz")
+    index = NearDuplicateIndex.load(path, threshold=0.8)
+    index.add("a-1", SAFE_HARBOR, "q3.pdf")
+    index.add("b-1", "Ad revenue grew in every region this quarter.", "q4.pdf")
+    index.save()
+
+    loaded = NearDuplicateIndex.load(path)
+    assert loaded.threshold == pytest.approx(0.8)
+    assert loaded.find(SAFE_HARBOR.lower()) == "a-1"
+    loaded.remove_source("q3.pdf")
+    assert loaded.find(SAFE_HARBOR) is None
+    assert len(loaded) == 1
+
+
+def test_dedup_report():
+    report = dedup_report(chunks=10, duplicates=4, embedded=6, skipped_embeddings=2)
+    assert report["storage_saved"] == pytest.approx(0.4)
+    assert report["inference_saved"] == pytest.approx(0.25)
+
+
+def test_repeated_boilerplate_is_embedded_once(tiny_preprocessor, tmp_path, monkeypatch):
+    tiny_preprocessor.db = LocalVectorDB(str(tmp_path / "vector_db"))
+    tiny_preprocessor.collection_name = "transcripts"
+    tiny_preprocessor.manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+    tiny_preprocessor.dedup_index = NearDuplicateIndex.load(str(tmp_path / "dedup_index.npz"))
+    tiny_preprocessor.chunker, tiny_preprocessor.chunk_size = "characters", 250
+    collection = tiny_preprocessor.db.get_collection("transcripts")
+
+    embedded = []
+    generate_embeddings = tiny_preprocessor.generate_embeddings
+    monkeypatch.setattr(tiny_preprocessor, "generate_embeddings",
+                        lambda texts: embedded.extend(texts) or generate_embeddings(texts))
+
+    write_pdf(tmp_path / "q3.pdf", [SAFE_HARBOR_LINES, results_page("q3")])
+    write_pdf(tmp_path / "q4.pdf", [SAFE_HARBOR_LINES, results_page("q4"), SAFE_HARBOR_LINES])
+    preprocessor.process_pdf_to_astra(tiny_preprocessor, str(tmp_path / "q3.pdf"))
+    first_count = len(embedded)
+    preprocessor.process_pdf_to_astra(tiny_preprocessor, str(tmp_path / "q4.pdf"))
+
+    # The safe-harbor pages of q4 reference the chunks already stored for q3
+    q4_chunks = tiny_preprocessor.manifest.get(str(tmp_path / "q4.pdf"))["chunks"]
+    references = {chunk["canonical"] for chunk in q4_chunks.values() if "canonical" in chunk}
+    assert references and references <= {doc["_id"] for doc in collection.find()}
+    assert len(embedded) - first_count == len(q4_chunks) - sum("canonical" in chunk for chunk in q4_chunks.values())
+    assert collection.count_documents() == len(embedded)
+
+    # Deleting the canonical chunks invalidates q4, so it is re-ingested next time
+    write_pdf(tmp_path / "q3.pdf", [results_page("q3")])
+    preprocessor.process_pdf_to_astra(tiny_preprocessor, str(tmp_path / "q3.pdf"))
+    assert tiny_preprocessor.manifest.get(str(tmp_path / "q4.pdf"))["file_hash"] is None
+    preprocessor.process_pdf_to_astra(tiny_preprocessor, str(tmp_path / "q4.pdf"))
+    texts = [doc["text"] for doc in collection.find()]
+    assert sum("forward-looking" in text for text in texts) > 0
+    assert NearDuplicateIndex.load(str(tmp_path / "dedup_index.npz")).source_of(
+        next(iter(references))) is None
+
+
+def test_ingest_corpus_skips_near_duplicates(tmp_path):
+    from tests.test_corpus_ingestion import HashEmbedder
+
+    write_pdf(tmp_path / "q3_call.pdf", [SAFE_HARBOR_LINES, results_page("q3")])
+    write_pdf(tmp_path / "q4_call.pdf", [SAFE_HARBOR_LINES, results_page("q4")])
+    inserted = []
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+    report = ingest_corpus(list_pdf_files(str(tmp_path)), inserted.extend, embedder_factory=HashEmbedder,
+                           extract_workers=1, embed_workers=1, torch_threads=1, manifest=manifest,
+                           chunker="characters")
+
+    assert report["dedup"]["duplicates"] > 0
+    assert len(inserted) == report["chunks"] - report["dedup"]["duplicates"]
+    assert report["dedup"]["inference_saved"] > 0
+    assert sum(entry["duplicates"] for entry in report["files"]) == report["dedup"]["duplicates"]
+
+
+def test_files_referencing_a_failed_file_fail_too(tmp_path):
+    from databases.astra_uploader import UploadError
+    from tests.test_corpus_ingestion import HashEmbedder
+
+    write_pdf(tmp_path / "q3_call.pdf", [SAFE_HARBOR_LINES, results_page("q3")])
+    write_pdf(tmp_path / "q4_call.pdf", [SAFE_HARBOR_LINES, results_page("q4")])
+    queued = []
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+
+    def flush():
+        # The first file queued holds the canonical safe-harbor chunks; its upload fails
+        source = queued[0]["metadata"]["source"]
+        raise UploadError([doc for doc in queued if doc["metadata"]["source"] == source], ["HTTP 400"])
+
+    report = ingest_corpus(list_pdf_files(str(tmp_path)), queued.extend, embedder_factory=HashEmbedder,
+                           extract_workers=1, embed_workers=1, torch_threads=1, manifest=manifest,
+                           chunker="characters", flush_documents=flush)
+    stages = sorted(entry["failed_stage"] for entry in report["files"])
+    assert report["failed"] == 2 and stages == ["reference", "upload"]
+    assert manifest.sources == {}
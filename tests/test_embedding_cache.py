@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from models.embedding_cache import EmbeddingCache
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / "embedding_cache")
+
+
+def test_cache_persists_across_instances(cache_dir):
+    cache = EmbeddingCache(cache_dir, dim=4, model_name="finbert", capacity=8)
+    vectors = np.arange(8, dtype=np.float32).reshape(2, 4)
+    cache.put_many(["revenue grew", "ad users"], vectors)
+    cache.flush()
+
+    reopened = EmbeddingCache(cache_dir, dim=4, model_name="finbert", capacity=8)
+    found, missing = reopened.get_many(["ad users", "unseen chunk", "revenue grew"])
+
+    assert missing == [1]
+    np.testing.assert_array_equal(found[0], vectors[1])
+    np.testing.assert_array_equal(found[2], vectors[0])
+    assert reopened.stats()["hits"] == 2
+    assert reopened.stats()["misses"] == 1
+
+
+def test_cache_key_includes_model_settings(cache_dir):
+    cache = EmbeddingCache(cache_dir, dim=4, model_name="finbert", revision="a", capacity=8)
+    cache.put("revenue grew", np.ones(4, dtype=np.float32))
+
+    assert cache.key("revenue grew") != EmbeddingCache(
+        cache_dir, dim=4, model_name="finbert", revision="b", capacity=8
+    ).key("revenue grew")
+    assert cache.key("revenue grew") != EmbeddingCache(
+        cache_dir, dim=4, model_name="finbert", revision="a", max_length=256, capacity=8
+    ).key("revenue grew")
+
+
+def test_cache_evicts_least_recently_used(cache_dir):
+    cache = EmbeddingCache(cache_dir, dim=2, model_name="finbert", capacity=2)
+    cache.put("a", [1, 1])
+    cache.put("b", [2, 2])
+    cache.get("a")          # "b" is now the least recently used entry
+    cache.put("c", [3, 3])
+
+    assert cache.get("b") is None
+    np.testing.assert_array_equal(cache.get("a"), [1, 1])
+    np.testing.assert_array_equal(cache.get("c"), [3, 3])
+    assert cache.stats()["evictions"] == 1
+
+
+def test_generate_embeddings_uses_cache(tiny_preprocessor, cache_dir):
+    tiny_preprocessor.embedding_cache = EmbeddingCache(
+        cache_dir, dim=tiny_preprocessor.model.config.hidden_size, model_name="tiny-finbert"
+    )
+    chunks = ["Reddit revenue grew by 21 %.", "Daily active users.", "Earnings call."]
+    first = tiny_preprocessor.generate_embeddings(chunks)
+
+    # A second pass must be served from the cache without running the model
+    tiny_preprocessor.model = None
+    second = tiny_preprocessor.generate_embeddings(chunks)
+
+    np.testing.assert_array_equal(first, second)
+    assert tiny_preprocessor.embedding_cache.stats()["hits"] == len(chunks)
+
+
+def test_instances_sharing_a_directory_never_mix_up_vectors(cache_dir):
+    # Two embedding workers open the same cache and both see every slot as free
+    first = EmbeddingCache(cache_dir, dim=2, model_name="finbert", capacity=4)
+    second = EmbeddingCache(cache_dir, dim=2, model_name="finbert", capacity=4)
+    first.put("revenue grew", [1, 1])
+    second.put("ad users", [2, 2])
+    first.flush()
+    second.flush()
+
+    np.testing.assert_array_equal(first.get("revenue grew"), [1, 1])
+    np.testing.assert_array_equal(second.get("ad users"), [2, 2])
+    reopened = EmbeddingCache(cache_dir, dim=2, model_name="finbert", capacity=4)
+    assert len(reopened) == 2
+    np.testing.assert_array_equal(reopened.get("revenue grew"), [1, 1])
+    np.testing.assert_array_equal(reopened.get("ad users"), [2, 2])
+
+    # A slot another instance evicted and reused reads as a miss, not as the other key's vector
+    full = EmbeddingCache(cache_dir, dim=2, model_name="finbert", capacity=4)
+    for i in range(4):
+        full.put(f"chunk {i}", [i, i])
+    assert first.get("revenue grew") is None and second.get("ad users") is None
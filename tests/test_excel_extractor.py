@@ -0,0 +1,130 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from extractors.excel_extractor import ExcelExtractor, batch_to_csv, parse_numbers
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    book = openpyxl.Workbook(write_only=True)
+    quarterly = book.create_sheet("Quarterly KPIs")
+    quarterly.append(["Date", "Revenue ($m)", "Margin", "Segment", None, "Source"])
+    for day in range(7):
+        revenue = 1000 + day if day % 2 else f"{1000 + day:,}.5"    # Numbers and numbers typed as text
+        quarterly.append([datetime.datetime(2023, 12, day + 1), revenue, f"{10 + day}%", f"segment {day}", None, "10-Q"])
+    quarterly.append([None, None, None, None, None])                # Empty rows are skipped
+    quarterly.append(["2024-01-31", "n/a", "(3%)", 'say "hi"'])     # Short row, text date and a bad number
+    notes = book.create_sheet("Notes")
+    notes.append(["Period", "Comment"])
+    notes.append(["Q3 2024", "Record ad revenue"])
+    path = tmp_path / "reddit_kpis.xlsx"
+    book.save(str(path))
+    return str(path)
+
+
+def test_small_sheet_rows(workbook):
+    rows = ExcelExtractor().extract_table(workbook, "Notes")
+    assert rows == [["Period", "Comment"], ["Q3 2024", "Record ad revenue"]]
+
+
+def test_sheet_streams_as_typed_batches(workbook):
+    stats = {}
+    batches = list(ExcelExtractor(batch_rows=3).iter_batches(workbook, "Quarterly KPIs", stats))
+
+    assert [len(batch["date"]) for batch in batches] == [3, 3, 2]
+    assert list(batches[0]) == ["date", "revenue_m", "margin", "segment", "column_5", "source"]
+    # "n/a" in the last batch widens the revenue column to text instead of becoming null
+    assert stats["kinds"] == {"date": "timestamp", "revenue_m": "text", "margin": "number",
+                              "segment": "text", "column_5": "text", "source": "text"}
+    assert stats["widened"] == ["revenue_m"]
+    assert all(batch["revenue_m"].dtype == np.float64 for batch in batches[:2]) and batches[2]["revenue_m"].dtype == object
+    assert all(batch["date"].dtype == "datetime64[us]" for batch in batches)
+
+    revenue = np.concatenate([batch["revenue_m"] for batch in batches[:2]])
+    assert revenue[:3].tolist() == [1000.5, 1001.0, 1002.5]
+    assert batches[-1]["revenue_m"].tolist() == ["1,006.5", "n/a"]
+    assert np.concatenate([batch["margin"] for batch in batches])[[0, -1]] == pytest.approx([0.10, -0.03])
+    assert batches[-1]["date"][-1] == np.datetime64("2024-01-31")
+    assert stats["rows"] == 8 and stats["invalid_values"] == 0
+
+
+def test_parse_numbers_formats():
+    numbers, invalid = parse_numbers(np.array(["1,234.5", "$1.2", "(500)", "12%", "", None, "-7"], dtype=object))
+    assert numbers[:4].tolist() == pytest.approx([1234.5, 1.2, -500.0, 0.12])
+    assert np.isnan(numbers[4]) and np.isnan(numbers[5]) and numbers[6] == -7
+    assert invalid == 0
+
+
+def test_batch_csv_for_copy():
+    batch = {"value": np.array([0.1, np.nan]), "day": np.array(["2024-01-31", "NaT"], dtype="datetime64[us]"),
+             "note": np.array(['say "hi"', None], dtype=object)}
+    rows = batch_to_csv(batch).splitlines()
+    assert rows == ['0.10000000000000001,2024-01-31T00:00:00.000000,"say ""hi"""', ",,"]
+    assert float(rows[0].split(",")[0]) == 0.1
+
+
+class RecordingCursor:
+    def __init__(self, statements):
+        self.statements = statements
+
+    def execute(self, sql):
+        self.statements.append((sql, None))
+
+    def copy_expert(self, sql, file):
+        self.statements.append((sql, file.read()))
+
+
+class RecordingEngine:
+    """DBAPI-level stand-in recording the statements a load sends to PostgreSQL."""
+
+    def __init__(self):
+        self.statements, self.commits = [], 0
+
+    def raw_connection(self):
+        engine = self
+
+        class Connection:
+            def cursor(self):
+                return RecordingCursor(engine.statements)
+
+            def commit(self):
+                engine.commits += 1
+
+            def rollback(self):
+                pass
+
+            def close(self):
+                pass
+
+        return Connection()
+
+
+def test_load_to_postgres_copies_each_batch(workbook):
+    engine = RecordingEngine()
+    report = ExcelExtractor(batch_rows=3).load_to_postgres(workbook, engine, replace=True)
+
+    assert [entry["table"] for entry in report] == ["reddit_kpis_quarterly_kpis", "reddit_kpis_notes"]
+    assert [entry["rows"] for entry in report] == [8, 1]
+    assert engine.commits == 2      # One transaction per sheet
+    create, truncate = engine.statements[0][0], engine.statements[1][0]
+    assert create.startswith('CREATE TABLE IF NOT EXISTS "reddit_kpis_quarterly_kpis"')
+    assert '"revenue_m" DOUBLE PRECISION' in create and '"date" TIMESTAMP' in create
+    assert truncate == 'TRUNCATE "reddit_kpis_quarterly_kpis"'
+    alter = 'ALTER TABLE "reddit_kpis_quarterly_kpis" ALTER COLUMN "revenue_m" TYPE TEXT'
+    assert [sql for sql, _ in engine.statements].index(alter) == 4    # Before the third batch, in the same transaction
+    assert report[0]["widened"] == ["revenue_m"]
+    copies = [(sql, data) for sql, data in engine.statements if sql.startswith("COPY")]
+    assert len(copies) == 4         # Three batches of the first sheet, one of the second
+    assert sum(len(data.splitlines()) for sql, data in copies[:3]) == 8
+    assert copies[0][0].endswith("FROM STDIN WITH (FORMAT csv)")
+
+
+def test_sheet_loaded_into_a_named_table(workbook):
+    engine = RecordingEngine()
+    report = ExcelExtractor().load_to_postgres(workbook, engine, sheets=["Notes"],
+                                               table_names={"Notes": "financial_metrics"})
+    assert report[0]["table"] == "financial_metrics"
+    assert engine.statements[0][0].startswith('CREATE TABLE IF NOT EXISTS "financial_metrics"')
@@ -0,0 +1,67 @@
+from nlp.financial_entity import DEFAULT_LEXICON, FinancialEntityProcessor, compile_lexicon, load_lexicon
+
+TEXT = ("Reddit (NYSE: RDDT) reported Q4 2023 ad revenue of $249.8 million, up 21% year over year, "
+        "and adjusted EBITDA margin of 15.5% in the fourth quarter of 2023.")
+
+
+def test_tags_kpis_periods_amounts_and_tickers():
+    entities = FinancialEntityProcessor().extract_entities(TEXT)
+    assert entities == {"Reddit": "ORG", "NYSE: RDDT": "TICKER", "Q4 2023": "PERIOD", "ad revenue": "KPI",
+                        "$249.8 million": "MONEY", "21%": "PERCENT", "year over year": "KPI",
+                        "adjusted EBITDA margin": "KPI", "15.5%": "PERCENT", "fourth quarter of 2023": "PERIOD"}
+
+
+def test_longest_term_wins_on_word_boundaries():
+    pattern = compile_lexicon(["ebitda", "adjusted ebitda", "adjusted ebitda margin", "ad"])
+    assert [m.group() for m in pattern.finditer("Adjusted EBITDA grew; adjusted\nEBITDA margin too; ads")] == \
+        ["Adjusted EBITDA", "adjusted\nEBITDA margin"]
+
+
+def test_period_and_currency_variants():
+    entities = FinancialEntityProcessor().extract_entities("FY2024 guidance: USD 1.2bn in H1 2024, €5m in Q3'24, $RDDT")
+    assert entities == {"FY2024": "PERIOD", "guidance": "KPI", "USD 1.2bn": "MONEY", "H1 2024": "PERIOD",
+                        "€5m": "MONEY", "Q3'24": "PERIOD", "$RDDT": "TICKER"}
+
+
+def test_large_lexicon_compiles_into_one_pattern(tmp_path):
+    terms = {f"metric {i} segment": "KPI" for i in range(20_000)}
+    path = tmp_path / "lexicon.csv"
+    path.write_text("term,label\n" + "".join(f"{term},KPI\n" for term in terms) + "Acme Corp,ORG\n")
+    lexicon = load_lexicon(path)
+    assert len(lexicon) == 20_001 and lexicon["acme corp"] == "ORG"
+
+    processor = FinancialEntityProcessor(lexicon)
+    text = "Metric 19999 segment rose while metric 7 segments fell at ACME Corp."
+    assert processor.tag(text) == ((0, 20, "KPI"), (58, 67, "ORG"))
+
+
+class FakeNER:
+    """Stands in for BasicNERProcessor, tagging fixed spans."""
+
+    def __init__(self):
+        self.batches = []
+
+    def iter_entities(self, chunks):
+        chunks = list(chunks)
+        self.batches.append(len(chunks))
+        for chunk_id, text in chunks:
+            found = [(text.index(word), text.index(word) + len(word), label)
+                     for word, label in (("Reddit", "ORG"), ("Q4", "DATE"), ("Steve Huffman", "PERSON")) if word in text]
+            yield chunk_id, tuple(found)
+
+
+def test_prepass_before_spacy_keeps_non_overlapping_model_entities():
+    ner = FakeNER()
+    processor = FinancialEntityProcessor(ner=ner, batch_size=2)
+    chunks = [(f"c{i}", "Steve Huffman said Reddit grew 5% in Q4 2023.") for i in range(5)]
+    results = list(processor.iter_entities(iter(chunks)))
+
+    assert [chunk_id for chunk_id, _ in results] == ["c0", "c1", "c2", "c3", "c4"]
+    assert ner.batches == [2, 2, 1]
+    assert results[0][1] == ((0, 13, "PERSON"), (19, 25, "ORG"), (31, 33, "PERCENT"), (37, 44, "PERIOD"))
+
+
+def test_benchmark_reports_megabytes_per_second():
+    report = FinancialEntityProcessor().benchmark([TEXT] * 50, repeats=2)
+    assert report["texts"] == 50 and report["entities"] == 500
+    assert report["megabytes_per_second"] > 0 and report["lexicon_terms"] == len(DEFAULT_LEXICON)
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from models.finbert import INFERENCE_BACKENDS, benchmark_backends, get_encoder, select_backend
+
+TEXTS = [
+    "reddit revenue grew by 5 % in q4 2023 .",
+    "the company daily active users grew .",
+    "ad revenue , margin and earnings call",
+    "the company",
+    "users grew by 3 million in q4",
+]
+
+
+@pytest.mark.parametrize("backend", INFERENCE_BACKENDS)
+def test_backend_parity_with_eager(tiny_preprocessor, backend):
+    baseline = tiny_preprocessor.generate_embeddings(TEXTS, batch_size=2)
+    tiny_preprocessor.inference_backend = backend
+    embeddings = tiny_preprocessor.generate_embeddings(TEXTS, batch_size=2)
+    single = tiny_preprocessor.generate_embedding(TEXTS[0])
+
+    cosine = np.sum(embeddings * baseline, axis=1) / (
+        np.linalg.norm(embeddings, axis=1) * np.linalg.norm(baseline, axis=1))
+    assert embeddings.shape == baseline.shape
+    assert cosine.min() > 0.99
+    assert np.allclose(single, embeddings[0], atol=1e-4)
+
+
+def test_encoder_is_prepared_once_per_backend(tiny_finbert):
+    _, model = tiny_finbert
+    assert get_encoder(model, "torchscript") is get_encoder(model, "torchscript")
+    assert get_encoder(model, "eager") is not get_encoder(model, "dynamic_int8")
+    with pytest.raises(ValueError):
+        get_encoder(model, "onnx")
+
+
+def test_benchmark_and_selection(tiny_preprocessor):
+    def embed(texts, backend):
+        tiny_preprocessor.inference_backend = backend
+        return tiny_preprocessor.generate_embeddings(texts)
+
+    report = benchmark_backends(embed, TEXTS, repeats=1, k=2)
+    assert [entry["backend"] for entry in report] == list(INFERENCE_BACKENDS)
+    assert report[0]["min_cosine"] == pytest.approx(1.0) and report[0]["recall_at_k"] == 1.0
+
+    fake = [dict(backend="eager", texts_per_second=10, min_cosine=1.0, recall_at_k=1.0),
+            dict(backend="dynamic_int8", texts_per_second=30, min_cosine=0.95, recall_at_k=0.9),
+            dict(backend="torchscript", texts_per_second=15, min_cosine=0.9999, recall_at_k=1.0)]
+    assert select_backend(fake) == "torchscript"
+    assert select_backend(fake, min_cosine=0.9, min_recall=0.8) == "dynamic_int8"
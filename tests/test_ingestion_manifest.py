@@ -0,0 +1,69 @@
+import pytest
+
+import preprocessor
+from databases.ingestion_manifest import ChunkIdGenerator, IngestionManifest
+from databases.local_vector_database import LocalVectorDB
+
+
+def write_pdf(path, page_texts):
+    pymupdf = pytest.importorskip("pymupdf")
+    doc = pymupdf.open()
+    for text in page_texts:
+        page = doc.new_page()
+        for line_number, line in enumerate(text.split("\n")):
+            page.insert_text((72, 72 + 14 * line_number), line)
+    doc.save(str(path))
+    doc.close()
+
+
+def page_text(label):
+    return "\n".join(f"{label} line {i}: ad revenue grew twenty percent year over year." for i in range(12))
+
+
+@pytest.fixture
+def incremental_preprocessor(tiny_preprocessor, tmp_path):
+    tiny_preprocessor.db = LocalVectorDB(str(tmp_path / "vector_db"))
+    tiny_preprocessor.collection_name = "transcripts"
+    tiny_preprocessor.manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+    return tiny_preprocessor
+
+
+def test_chunk_ids_are_deterministic():
+    first, second = ChunkIdGenerator("call.pdf"), ChunkIdGenerator("call.pdf")
+    ids = [first.next_id(chunk)[0] for chunk in ["safe harbor", "revenue", "safe harbor"]]
+
+    assert ids == [second.next_id(chunk)[0] for chunk in ["safe harbor", "revenue", "safe harbor"]]
+    assert len(set(ids)) == 3     # Repeated chunks get distinct IDs
+    assert ChunkIdGenerator("other.pdf").next_id("revenue")[0] != ids[1]
+
+
+def test_reingestion_only_touches_changed_chunks(incremental_preprocessor, tmp_path, monkeypatch):
+    pdf_path = tmp_path / "call.pdf"
+    write_pdf(pdf_path, [page_text("alpha"), page_text("beta"), page_text("gamma")])
+    collection = incremental_preprocessor.db.get_collection("transcripts")
+
+    embedded = []
+    generate_embeddings = incremental_preprocessor.generate_embeddings
+    monkeypatch.setattr(incremental_preprocessor, "generate_embeddings",
+                        lambda texts: embedded.extend(texts) or generate_embeddings(texts))
+
+    preprocessor.process_pdf_to_astra(incremental_preprocessor, str(pdf_path))
+    first_count = collection.count_documents()
+    first_ids = {doc["_id"] for doc in collection.find()}
+    assert first_count == len(embedded) > 0
+
+    # An unchanged file is skipped without extraction or inference
+    embedded.clear()
+    preprocessor.process_pdf_to_astra(incremental_preprocessor, str(pdf_path))
+    assert embedded == []
+
+    # Changing the last page re-embeds only its chunks and deletes the stale ones
+    write_pdf(pdf_path, [page_text("alpha"), page_text("beta"), page_text("delta")])
+    preprocessor.process_pdf_to_astra(incremental_preprocessor, str(pdf_path))
+    texts = [doc["text"] for doc in collection.find()]
+
+    assert 0 < len(embedded) < first_count
+    assert not any("gamma" in text for text in texts)
+    assert any("delta" in text for text in texts)
+    assert collection.count_documents() == len(incremental_preprocessor.manifest.get(str(pdf_path))["chunks"])
+    assert first_ids & {doc["_id"] for doc in collection.find()}
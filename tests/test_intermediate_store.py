@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from databases.intermediate_store import IntermediateStore, StringColumn, arrow_available
+from pipelines.artifact_pipeline import reembed_from_store, reindex_from_store, retag_from_store, store_extraction
+
+BACKENDS = ["numpy"] + (["arrow"] if arrow_available() else [])
+
+
+@pytest.fixture(params=BACKENDS)
+def store(tmp_path, request):
+    return IntermediateStore(str(tmp_path / "data"), backend=request.param)
+
+
+def test_columns_round_trip_memory_mapped(store):
+    vectors = np.arange(12, dtype=np.float32).reshape(3, 4)
+    store.write("chunks", "q4.pdf", {"chunk_id": ["a", "b", "c"], "page": [1, 1, 2],
+                                     "chunk_hash": ["h1", "h2", "h3"], "text": ["Revenue €1.3B", "", "ARPU grew"]})
+    store.write("embeddings", "q4.pdf", {"chunk_id": ["a", "b", "c"], "vector": vectors})
+
+    chunks = store.read("chunks", "q4.pdf")
+    assert chunks.source == "q4.pdf" and chunks.num_rows == 3
+    texts = chunks.column("text")
+    assert isinstance(texts, StringColumn) and texts.to_list() == ["Revenue €1.3B", "", "ARPU grew"]
+    assert texts[-1] == "ARPU grew" and chunks.column("page").tolist() == [1, 1, 2]
+
+    stored = store.read("embeddings", "q4.pdf").column("vector")
+    np.testing.assert_array_equal(stored, vectors)
+    assert not stored.flags.writeable   # Read-only view of the mapped file, not a copy
+    assert store.read("chunks", "other.pdf") is None
+
+
+def test_rewrites_replace_a_document_and_stats_count_rows(store):
+    for text in ("old", "new"):
+        store.write("pages", "q4.pdf", {"page": [1], "page_hash": ["h"], "text": [text]})
+    store.write("pages", "q3.pdf", {"page": [1, 2], "page_hash": ["h", "h"], "text": ["a", "b"]})
+    assert store.read("pages", "q4.pdf").column("text").to_list() == ["new"]
+    assert sorted(store.sources("pages")) == ["q3.pdf", "q4.pdf"]
+    assert store.stats()["pages"]["documents"] == 2 and store.stats()["pages"]["rows"] == 3
+
+    store.delete("q4.pdf")
+    assert store.sources("pages") == ["q3.pdf"]
+    with pytest.raises(ValueError):
+        store.write("pages", "q4.pdf", {"page": [1], "text": ["missing page_hash"]})
+
+
+def test_stages_rerun_from_stored_artifacts(store, tiny_preprocessor, tmp_path):
+    from databases.local_vector_database import LocalVectorDB
+    from pipelines.extraction_pipeline import extract_and_chunk_pdf
+    from utils.benchmark import write_synthetic_pdf
+
+    pdf = write_synthetic_pdf(str(tmp_path / "filing.pdf"), pages=2)
+    result = extract_and_chunk_pdf(pdf, chunker="characters", keep_pages=True)
+    store_extraction(store, result)
+    assert store.read("pages", pdf).num_rows == 2
+    assert store.read("chunks", pdf).column("chunk_id").to_list() == [chunk_id for _, chunk_id, _, _ in result["chunks"]]
+
+    tagged = retag_from_store(store)
+    assert tagged["documents"] == 1 and tagged["entities"] > 0
+    labels = set(store.read("entities", pdf).column("label"))
+    assert {"KPI", "PERIOD"} <= labels
+
+    collection = LocalVectorDB(str(tmp_path / "vector_db")).create_collection("chunks")
+    assert reindex_from_store(store, collection)["skipped"] == 1    # Nothing embedded yet
+
+    embedded = reembed_from_store(store, tiny_preprocessor, batch_size=8)
+    assert embedded["chunks"] == len(result["chunks"])
+    report = reindex_from_store(store, collection)
+    assert report["chunks"] == len(result["chunks"]) and report["upload"]["failed_documents"] == 0
+    document = collection.find_one({"metadata.source": pdf})
+    assert document["metadata"]["entities"] and document["metadata"]["page"] in (1, 2)
+
+
+def test_ingestion_dag_persists_artifacts(tmp_path, tiny_preprocessor):
+    from databases.local_vector_database import LocalVectorDB
+    from pipelines.automation import DAGRunner, build_ingestion_dag
+    from utils.benchmark import write_synthetic_pdf
+
+    pdf = write_synthetic_pdf(str(tmp_path / "filing.pdf"), pages=2)
+    store = IntermediateStore(str(tmp_path / "data"))
+    collection = LocalVectorDB(str(tmp_path / "vector_db")).create_collection("chunks")
+    dag = build_ingestion_dag([pdf], collection, embedder=tiny_preprocessor, chunker="characters", store=store)
+    assert DAGRunner(dag, str(tmp_path / "checkpoints")).run()["ok"] == 4
+
+    stats = store.stats()
+    assert all(stats[table]["documents"] == 1 for table in ("documents", "pages", "chunks", "entities", "embeddings"))
+    assert stats["embeddings"]["rows"] == stats["chunks"]["rows"] == collection.count_documents({}, upper_bound=10_000)
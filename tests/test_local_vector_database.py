@@ -0,0 +1,129 @@
+import numpy as np
+import pytest
+
+from databases.db_connector import DbConnector
+from databases.local_vector_database import LocalInsertManyException, LocalVectorDB
+
+
+@pytest.fixture
+def collection(tmp_path):
+    return LocalVectorDB(str(tmp_path / "vector_db")).create_collection("transcripts", dimension=8)
+
+
+def make_documents(count, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    return [
+        {"_id": f"chunk-{i}", "text": f"chunk {i}", "metadata": {"source": f"call-{i % 3}.pdf", "page": i % 5},
+         "$vector": rng.normal(size=dim).tolist()}
+        for i in range(count)
+    ]
+
+
+def test_find_returns_exact_top_k(collection):
+    documents = make_documents(200)
+    collection.insert_many(documents)
+    query = np.asarray(documents[7]["$vector"])
+
+    results = collection.find(sort={"$vector": query.tolist()}, limit=5, include_similarity=True)
+
+    vectors = np.asarray([doc["$vector"] for doc in documents])
+    cosine = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+    assert [doc["_id"] for doc in results] == [f"chunk-{i}" for i in np.argsort(-cosine)[:5]]
+    assert results[0]["_id"] == "chunk-7"
+    assert results[0]["$similarity"] == pytest.approx(1.0, abs=1e-5)
+
+
+def test_find_applies_metadata_filters(collection):
+    documents = make_documents(60)
+    collection.insert_many(documents)
+
+    results = collection.find({"metadata.source": "call-1.pdf", "metadata.page": {"$lte": 2}},
+                              sort={"$vector": documents[0]["$vector"]}, limit=100)
+
+    assert results
+    assert all(doc["metadata"]["source"] == "call-1.pdf" and doc["metadata"]["page"] <= 2 for doc in results)
+    assert collection.count_documents({"metadata.source": {"$in": ["call-0.pdf", "call-2.pdf"]}}) == 40
+
+
+def test_collection_persists_and_rejects_duplicates(tmp_path):
+    db = LocalVectorDB(str(tmp_path / "vector_db"))
+    documents = make_documents(10)
+    db.create_collection("transcripts").insert_many(documents)
+    db.get_collection("transcripts").delete_many({"_id": "chunk-3"})
+
+    reopened = LocalVectorDB(str(tmp_path / "vector_db")).get_collection("transcripts")
+    assert reopened.count_documents() == 9
+    with pytest.raises(LocalInsertManyException) as excinfo:
+        reopened.insert_many(documents[2:5])
+    assert excinfo.value.inserted_ids == ["chunk-3"]
+    assert reopened.find_one({"_id": "chunk-4"})["text"] == "chunk 4"
+
+
+def test_documents_without_a_vector_are_reported(collection):
+    documents = make_documents(4)
+    del documents[1]["$vector"]
+    documents[2]["$vector"] = "not a vector"
+
+    with pytest.raises(LocalInsertManyException) as excinfo:
+        collection.insert_many(documents)
+
+    assert excinfo.value.inserted_ids == ["chunk-0", "chunk-3"]
+    assert [error.error_code for error in excinfo.value.exceptions] == ["MISSING_VECTOR", "INVALID_VECTOR"]
+    assert collection.count_documents() == 2
+
+
+def test_refresh_index_trains_once_the_collection_is_large(tmp_path):
+    collection = LocalVectorDB(str(tmp_path / "vector_db")).create_collection("growing", dimension=8)
+    collection.ivf_threshold = 100
+    collection.insert_many(make_documents(50))
+    assert not collection.refresh_index()
+    assert collection.centroids is None
+
+    collection.insert_many(make_documents(150, seed=1)[50:])
+    assert collection.refresh_index()
+    assert collection.trained_rows == 150
+    # Rows added below twice the trained size go to the existing lists
+    collection.insert_many([dict(document, _id=f"more-{i}") for i, document in enumerate(make_documents(50, seed=2))])
+    assert not collection.refresh_index()
+
+    reopened = LocalVectorDB(str(tmp_path / "vector_db")).get_collection("growing")
+    assert reopened.trained_rows == 150 and reopened.centroids is not None
+
+
+def test_vector_index_command_trains_the_collection(tmp_path, monkeypatch):
+    import main
+
+    monkeypatch.setenv("LOCAL_VECTOR_DB_PATH", str(tmp_path / "vector_db"))
+    LocalVectorDB(str(tmp_path / "vector_db")).create_collection("transcripts").insert_many(make_documents(64))
+
+    collection = main.run_vector_index(main.build_parser().parse_args(
+        ["vector-index", "--collection", "transcripts", "--n-lists", "4"]))
+
+    assert len(collection.centroids) == 4
+    assert LocalVectorDB(str(tmp_path / "vector_db")).get_collection("transcripts").centroids is not None
+    with pytest.raises(SystemExit):
+        main.run_vector_index(main.build_parser().parse_args(["vector-index", "--collection", "missing"]))
+
+
+def test_ivf_index_recall(tmp_path):
+    # Clustered data, as embeddings of related chunks are
+    rng = np.random.default_rng(1)
+    centers = rng.normal(size=(20, 16))
+    vectors = centers[rng.integers(0, 20, 3000)] + 0.1 * rng.normal(size=(3000, 16))
+    collection = LocalVectorDB(str(tmp_path / "vector_db")).create_collection("large", dimension=16)
+    collection.ivf_threshold = 1000
+    collection.insert_many([{"_id": str(i), "$vector": vector.tolist()} for i, vector in enumerate(vectors)])
+
+    queries = vectors[rng.choice(3000, 20, replace=False)]
+    exact = [[doc["_id"] for doc in collection.find(sort={"$vector": q.tolist()}, limit=10)] for q in queries]
+    collection.build_index(n_lists=30, nprobe=6)
+    approx = [[doc["_id"] for doc in collection.find(sort={"$vector": q.tolist()}, limit=10)] for q in queries]
+
+    recall = np.mean([len(set(e) & set(a)) / 10 for e, a in zip(exact, approx)])
+    assert recall >= 0.9
+
+
+def test_db_connector_selects_local_backend(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOCAL_VECTOR_DB_PATH", str(tmp_path / "vector_db"))
+    connection = DbConnector(db_type="local_vector_db").get_connection()
+    assert isinstance(connection, LocalVectorDB)
@@ -0,0 +1,91 @@
+import logging
+import threading
+import time
+
+import pytest
+
+from config.config import Logger
+from utils.logging import RateLimitFilter, get_logger, setup_logging, shutdown_logging
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    root = logging.getLogger()
+    level = root.level
+    path = tmp_path / "app.log"
+    yield path
+    shutdown_logging()
+    root.setLevel(level)
+
+
+def queue_handlers():
+    return [handler for handler in logging.getLogger().handlers if type(handler).__name__ == "QueueHandler"]
+
+
+def test_handlers_are_registered_once(log_file):
+    setup_logging(log_file=str(log_file), console_level="CRITICAL", force=True)
+    setup_logging()
+    for _ in range(3):
+        get_logger("databases.db_connector")
+        Logger.get_logger("databases.db_connector")
+
+    assert len(queue_handlers()) == 1
+    assert logging.getLogger("databases.db_connector").handlers == []
+
+    get_logger("databases.db_connector").info("Connected to PostgreSQL")
+    shutdown_logging()
+    lines = log_file.read_text().splitlines()
+    assert len(lines) == 1 and lines[0].endswith("databases.db_connector - INFO - Connected to PostgreSQL")
+    assert queue_handlers() == []
+
+
+def test_records_are_written_by_the_listener_thread(log_file):
+    threads = []
+
+    class RecordingHandler(logging.Handler):
+        def emit(self, record):
+            threads.append(threading.current_thread().name)
+
+    listener = setup_logging(log_file=str(log_file), console_level="CRITICAL", force=True)
+    listener.handlers = listener.handlers + (RecordingHandler(),)
+    logging.getLogger("pipelines.embedding_pipeline").warning("Slow batch")
+    shutdown_logging()
+    assert threads and threading.current_thread().name not in threads
+
+
+def test_noisy_call_sites_are_rate_limited(log_file):
+    setup_logging(log_file=str(log_file), console_level="CRITICAL", force=True,
+                  rate_limit=RateLimitFilter(burst=5, window=0.2))
+    logger = logging.getLogger("databases.astra_uploader")
+
+    def uploaded(batch):
+        logger.info(f"Uploaded batch {batch}")
+
+    for i in range(100):
+        uploaded(i)
+    logger.error("Upload failed")   # Errors are never suppressed
+    time.sleep(0.25)
+    uploaded(100)
+    shutdown_logging()
+
+    lines = log_file.read_text().splitlines()
+    assert len(lines) == 7
+    assert lines[4].endswith("Uploaded batch 4") and lines[5].endswith("Upload failed")
+    assert lines[6].endswith("Uploaded batch 100 (95 similar messages suppressed)")
+
+
+def test_hot_path_logging_costs_microseconds(log_file):
+    setup_logging(log_file=str(log_file), level="INFO", console_level="CRITICAL", force=True, rate_limit=False)
+    logger = logging.getLogger("preprocessor")
+    start = time.perf_counter()
+    for i in range(5_000):
+        logger.info("Embedded batch %d", i)
+    queued = (time.perf_counter() - start) / 5_000
+    start = time.perf_counter()
+    for i in range(5_000):
+        logger.debug("Embedded batch %d", i)
+    disabled = (time.perf_counter() - start) / 5_000
+    shutdown_logging()
+
+    assert len(log_file.read_text().splitlines()) == 5_000
+    assert queued < 200e-6 and disabled < 20e-6
@@ -0,0 +1,103 @@
+import json
+import time
+import urllib.request
+
+import pytest
+
+from utils.metrics import Instrumentation, MetricsRegistry, StageProfiler, start_metrics_server
+
+
+@pytest.fixture
+def instrumentation(tmp_path):
+    return Instrumentation(MetricsRegistry(), StageProfiler(), trace_file=str(tmp_path / "traces.jsonl"))
+
+
+def test_prometheus_text_format():
+    registry = MetricsRegistry(buckets=(0.1, 1.0))
+    registry.describe("pipeline_stage_seconds", "Self time spent in each pipeline stage")
+    registry.observe("pipeline_stage_seconds", 0.05, stage="embed")
+    registry.observe("pipeline_stage_seconds", 0.5, stage="embed")
+    registry.inc("pipeline_items_total", 32, stage="embed")
+    registry.inc("pipeline_items_total", 32, stage="embed")
+
+    text = registry.to_prometheus()
+    assert "# TYPE pipeline_items_total counter\npipeline_items_total{stage=\"embed\"} 64" in text
+    assert "# HELP pipeline_stage_seconds Self time spent in each pipeline stage" in text
+    assert 'pipeline_stage_seconds_bucket{stage="embed",le="0.1"} 1' in text
+    assert 'pipeline_stage_seconds_bucket{stage="embed",le="1.0"} 2' in text
+    assert 'pipeline_stage_seconds_bucket{stage="embed",le="+Inf"} 2' in text
+    assert 'pipeline_stage_seconds_count{stage="embed"} 2' in text
+    assert "process_resident_memory_bytes" in text
+    assert registry.value("pipeline_stage_seconds", stage="embed") == (2, pytest.approx(0.55))
+
+
+def test_nested_stages_record_self_time_and_document_spans(instrumentation, tmp_path):
+    def pages():
+        for page in range(3):
+            time.sleep(0.01)    # Extracting a page
+            yield page
+
+    def chunks(pages):
+        for page in pages:
+            time.sleep(0.005)   # Splitting it
+            yield from (f"{page}-a", f"{page}-b")
+
+    with instrumentation.trace("q3.pdf") as trace:
+        stream = instrumentation.timed_iter(chunks(instrumentation.timed_iter(pages(), "extract")), "chunk")
+        assert len(list(stream)) == 6
+        for _ in range(2):
+            with instrumentation.stage("embed", items=3):
+                time.sleep(0.01)
+        trace["attributes"]["chunks"] = 6
+
+    registry = instrumentation.registry
+    _, extract_seconds = registry.value("pipeline_stage_seconds", stage="extract")
+    _, chunk_seconds = registry.value("pipeline_stage_seconds", stage="chunk")
+    assert extract_seconds >= 0.03 and 0.015 <= chunk_seconds < extract_seconds     # Chunking excludes extraction
+    assert registry.value("pipeline_items_total", stage="extract") == 3
+    assert registry.value("pipeline_items_total", stage="chunk") == 6
+    assert registry.value("pipeline_stage_seconds", stage="embed")[0] == 2
+
+    spans = {span["stage"]: span for span in trace["spans"]}
+    assert list(spans) == ["chunk", "extract", "embed"]     # Ordered by start; chunking pulls the first page
+    assert spans["embed"]["calls"] == 2 and spans["embed"]["items"] == 6
+    assert spans["chunk"]["seconds"] > spans["chunk"]["self_seconds"]
+    written = [json.loads(line) for line in open(tmp_path / "traces.jsonl")]
+    assert written[0]["document"] == "q3.pdf" and written[0]["attributes"] == {"chunks": 6}
+    assert written[0]["status"] == "ok" and written[0]["seconds"] >= extract_seconds
+
+
+def test_failures_are_counted(instrumentation):
+    with pytest.raises(RuntimeError):
+        with instrumentation.trace("broken.pdf"):
+            with instrumentation.stage("upload"):
+                raise RuntimeError("Astra unavailable")
+    assert instrumentation.registry.value("pipeline_errors_total", stage="upload") == 1
+    assert instrumentation.registry.value("pipeline_documents_total", status="failed") == 1
+    assert instrumentation.recent_traces()[-1]["status"] == "failed"
+
+
+def test_profiling_is_toggled_per_stage(instrumentation, tmp_path):
+    instrumentation.profiler.configure("embed")
+    with instrumentation.stage("embed"):
+        sum(i * i for i in range(10_000))
+    with instrumentation.stage("upload"):
+        pass
+    paths = instrumentation.profiler.dump(str(tmp_path / "profiles"))
+    assert [path.rsplit("/", 1)[-1] for path in paths] == ["embed.prof"]
+    assert "cumulative" in (tmp_path / "profiles" / "embed.txt").read_text()
+
+    instrumentation.profiler.configure("0")
+    assert not instrumentation.profiler.enabled
+
+
+def test_metrics_endpoint_serves_prometheus_text():
+    registry = MetricsRegistry()
+    registry.inc("pipeline_items_total", 5, stage="upload")
+    server = start_metrics_server(0, registry=registry)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert 'pipeline_items_total{stage="upload"} 5' in response.read().decode()
+    finally:
+        server.shutdown()
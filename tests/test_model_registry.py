@@ -0,0 +1,73 @@
+import os
+import threading
+
+import pytest
+
+from models import model_registry
+from utils.startup import HEAVY_MODULES, measure_import
+
+
+@pytest.fixture(autouse=True)
+def empty_registry():
+    model_registry.clear_registry()
+    yield
+    model_registry.clear_registry()
+
+
+def test_each_model_revision_is_loaded_once():
+    calls = []
+
+    def loader(model_name, revision):
+        calls.append((model_name, revision))
+        return object(), object()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(model_registry.get_model("finbert", "v1", loader)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [("finbert", "v1")]
+    assert all(result is results[0] for result in results)
+    model_registry.get_model("finbert", "v2", loader)
+    assert len(calls) == 2
+    assert {entry["revision"] for entry in model_registry.registry_report()} == {"v1", "v2"}
+
+
+def test_dotenv_is_read_once_before_the_first_load(monkeypatch):
+    import dotenv
+
+    def load_dotenv():
+        calls.append("dotenv")
+        os.environ["FINBERT_HUGGINGFACE_TOKEN"] = "token-from-dotenv"
+
+    calls = []
+    monkeypatch.delenv("FINBERT_HUGGINGFACE_TOKEN", raising=False)
+    monkeypatch.setattr(dotenv, "load_dotenv", load_dotenv)
+    monkeypatch.setattr(model_registry, "_dotenv_loaded", False)
+    loader = lambda model_name, revision: (calls.append(os.getenv("FINBERT_HUGGINGFACE_TOKEN")), object())
+    model_registry.get_model("finbert", "v1", loader)
+    model_registry.get_model("finbert", "v2", loader)
+    assert calls == ["dotenv", "token-from-dotenv", "token-from-dotenv"]
+    os.environ.pop("FINBERT_HUGGINGFACE_TOKEN")
+
+
+def test_preprocessor_shares_the_registered_model(tiny_finbert):
+    from models.finbert import load_finbert
+    from preprocessor import PDFPreprocessor
+
+    model_registry.register_model(model_registry.DEFAULT_MODEL_NAME, *tiny_finbert)
+    first, second = PDFPreprocessor(), PDFPreprocessor()
+
+    assert first.model is second.model is load_finbert()[1]
+    # No database connection is opened until it is used
+    assert first._db is None
+
+
+@pytest.mark.parametrize("module", ["preprocessor", "pipelines.embedding_pipeline", "main"])
+def test_imports_do_not_load_heavy_dependencies(module):
+    result = measure_import(module, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert result["heavy_modules"] == []
+    assert set(HEAVY_MODULES) >= {"torch", "transformers"}
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from preprocessor import chunk_pages, extract_text_and_metadata_from_pdf, stream_pages_and_metadata_from_pdf
+
+
+@pytest.fixture
+def sample_chunks():
+    return [
+        "Reddit revenue grew by 21 % in Q4 2023.",
+        "Daily active users.",
+        "The company ad revenue grew by 5 million $ in Q4 2023 , margin grew by 3 percent .",
+        "Earnings call.",
+        "Revenue",
+    ]
+
+
+def test_generate_embeddings_matches_per_chunk(tiny_preprocessor, sample_chunks):
+    embeddings = tiny_preprocessor.generate_embeddings(sample_chunks, batch_size=2)
+
+    assert isinstance(embeddings, np.ndarray)
+    assert embeddings.dtype == np.float32
+    assert embeddings.flags["C_CONTIGUOUS"]
+    assert embeddings.shape == (len(sample_chunks), tiny_preprocessor.model.config.hidden_size)
+
+    # Each row must match the single-chunk path in the original order
+    for chunk, embedding in zip(sample_chunks, embeddings):
+        expected = tiny_preprocessor.generate_embedding(chunk)
+        np.testing.assert_allclose(embedding, expected, rtol=1e-4, atol=1e-5)
+
+
+def test_generate_embeddings_empty(tiny_preprocessor):
+    embeddings = tiny_preprocessor.generate_embeddings([])
+    assert embeddings.shape == (0, tiny_preprocessor.model.config.hidden_size)
+
+
+@pytest.fixture
+def sample_pdf(tmp_path):
+    pymupdf = pytest.importorskip("pymupdf")
+    pdf_path = tmp_path / "transcript.pdf"
+    doc = pymupdf.open()
+    for page_number in range(1, 4):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {page_number} revenue grew by {page_number}0 percent.")
+    doc.set_metadata({"title": "Earnings Call"})
+    doc.save(str(pdf_path))
+    doc.close()
+    return str(pdf_path)
+
+
+def test_stream_pages_and_wrapper(sample_pdf):
+    pages, metadata = stream_pages_and_metadata_from_pdf(sample_pdf)
+    pages = list(pages)
+
+    assert [page_number for page_number, _ in pages] == [1, 2, 3]
+    assert "Page 2 revenue" in pages[1][1]
+    assert metadata["title"] == "Earnings Call"
+
+    text, wrapper_metadata = extract_text_and_metadata_from_pdf(sample_pdf)
+    assert text == "".join(page_text for _, page_text in pages)
+    assert wrapper_metadata == metadata
+
+
+def test_chunk_pages_tracks_page_numbers():
+    splitter = RecursiveCharacterTextSplitter(chunk_size=40, chunk_overlap=0)
+    pages = [
+        (1, "alpha beta gamma delta epsilon zeta eta theta iota kappa\n"),
+        (2, "lambda mu nu xi omicron pi rho sigma tau upsilon phi\n"),
+        (3, "chi psi omega\n"),
+    ]
+    chunks = list(chunk_pages(iter(pages), splitter))
+
+    # Every word survives, in order, and page numbers never go backwards
+    words = " ".join(chunk for _, chunk in chunks).split()
+    assert words == " ".join(text for _, text in pages).split()
+    assert [page for page, _ in chunks] == sorted(page for page, _ in chunks)
+    assert chunks[0][0] == 1
+    assert any(page == 2 and chunk.startswith("lambda") for page, chunk in chunks)
+    assert all(len(chunk) <= 40 for _, chunk in chunks)
@@ -0,0 +1,167 @@
+import numpy as np
+import pytest
+
+from databases.ingestion_manifest import IngestionManifest
+from databases.local_vector_database import LocalVectorDB
+from query_handler.query_cache import ManifestWatcher, QueryCache, normalize_query
+from query_handler.query_router import QueryRouter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def vector(*values):
+    return np.array(values, dtype=np.float32)
+
+
+def test_exact_and_semantic_hits():
+    cache = QueryCache(similarity_threshold=0.95)
+    cache.put("What was ad revenue in Q3 2024?", {"answer": 315.1}, vector(1, 0, 0))
+
+    assert normalize_query("  what was AD revenue in q3 2024 ? ") == normalize_query("What was ad revenue in Q3 2024?")
+    assert cache.get_exact("what was ad revenue in Q3 2024") == {"answer": 315.1}
+    assert cache.get_exact("Ad revenue for Q3 2024") is None
+    assert cache.get_similar("Ad revenue for Q3 2024", vector(1, 0.1, 0)) == {"answer": 315.1}
+    # Close embedding, but another period: never answered from the cache
+    assert cache.get_similar("Ad revenue for Q4 2024", vector(1, 0.1, 0)) is None
+    assert cache.get_similar("Ad revenue for Q3 2024", vector(0, 1, 0)) is None
+
+    report = cache.report()
+    assert report["lookups"] == 2 and report["exact_hits"] == 1 and report["semantic_hits"] == 1
+    assert report["hit_rate"] == 1.0 and report["size"] == 1
+
+
+def test_cached_results_are_copies():
+    cache = QueryCache()
+    cache.put("dau", {"rows": [1, 2]})
+    cache.get_exact("dau")["rows"].append(3)
+    assert cache.get_exact("dau") == {"rows": [1, 2]}
+
+
+def test_ttl_and_size_bound():
+    clock = Clock()
+    cache = QueryCache(max_entries=2, ttl_seconds=10, clock=clock)
+    cache.put("a", 1, vector(1, 0))
+    cache.put("b", 2, vector(0, 1))
+    cache.get_exact("a")            # "b" is now the least recently used
+    cache.put("c", 3)
+    assert cache.get_exact("b") is None and len(cache) == 2
+
+    clock.now = 11
+    assert cache.get_exact("a") is None
+    assert cache.get_similar("a", vector(1, 0)) is None
+    assert cache.report()["evictions"] == 1 and cache.report()["expirations"] == 1
+
+
+def test_manifest_change_invalidates(tmp_path):
+    path = str(tmp_path / "manifest.json")
+    manifest = IngestionManifest(path)
+    manifest.record("q3.pdf", "hash-1", "meta", {}, {})
+    manifest.save()
+    cache = QueryCache(version=ManifestWatcher(path).version)
+    cache.put("dau", 97.2)
+
+    manifest.save()     # Rewritten without new data: answers stay valid
+    assert cache.get_exact("dau") == 97.2
+
+    manifest.record("q4.pdf", "hash-2", "meta", {}, {})
+    manifest.save()
+    assert cache.get_exact("dau") is None
+    assert cache.report()["invalidations"] == 1
+
+
+def test_router_answers_repeated_questions_from_the_cache(tmp_path):
+    db = LocalVectorDB(str(tmp_path / "vector_db"))
+    db.create_collection("transcripts").insert_many([
+        {"_id": "outlook", "text": "Advertising demand stays strong.", "$vector": vector(1, 0, 0)},
+        {"_id": "licensing", "text": "Data licensing grew.", "$vector": vector(0, 1, 0)},
+    ])
+    searches = []
+
+    class CountingRouter(QueryRouter):
+        def route_to_vector_db(self, query, embedding=None, timeout=None):
+            searches.append(query)
+            return super().route_to_vector_db(query, embedding, timeout)
+
+    embeddings = {"what did management say about the outlook": vector(1, 0.05, 0),
+                  "what is management's outlook": vector(1, 0.1, 0)}
+    router = CountingRouter(vector_db=db, collection_name="transcripts", cache=QueryCache(),
+                            embed_query=lambda text: embeddings.get(normalize_query(text), vector(0, 0, 1)))
+    try:
+        first = router.route_query("What did management say about the outlook?")
+        exact = router.route_query("what did management say about the outlook")
+        semantic = router.route_query("What is management's outlook?")
+    finally:
+        router.close()
+
+    assert searches == ["What did management say about the outlook?"]
+    assert "cache" not in first and exact["cache"] == "exact" and semantic["cache"] == "semantic"
+    assert semantic["results"] == first["results"] and semantic["query"] == "What is management's outlook?"
+    assert router.cache.report()["hit_rate"] == pytest.approx(2 / 3)
+
+
+def test_questions_answered_by_the_sql_rule_are_not_embedded():
+    sqlalchemy = pytest.importorskip("sqlalchemy")
+    engine = sqlalchemy.create_engine("sqlite://", poolclass=sqlalchemy.pool.StaticPool,
+                                      connect_args={"check_same_thread": False})
+    with engine.begin() as connection:
+        connection.execute(sqlalchemy.text(
+            "CREATE TABLE financial_metrics (metric TEXT, period TEXT, value REAL, unit TEXT, source TEXT)"))
+        connection.execute(sqlalchemy.text("INSERT INTO financial_metrics VALUES ('ad_revenue', 'Q3 2024', 315.1, 'USD m', 'q3.xlsx')"))
+    embedded = []
+    router = QueryRouter(sql_db=engine, cache=QueryCache(), embed_query=lambda text: embedded.append(text) or vector(1, 0, 0))
+    try:
+        result = router.route_query("What was ad revenue in Q3 2024?")
+        router.route_query("Why did advertising demand stay strong?")
+    finally:
+        router.close()
+    assert result["intent"] == "sql" and "cache" in result["timings"]
+    assert embedded == ["Why did advertising demand stay strong?"]     # Only the semantic lookup of the second
+
+
+def test_cache_persists_between_runs(tmp_path):
+    path = str(tmp_path / "query_cache.json")
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+    manifest.record("q3.pdf", "hash-1", "meta", {}, {})
+    manifest.save()
+    cache = QueryCache(version=ManifestWatcher(manifest.path).version)
+    cache.put("What did management say about the outlook?", {"similarity": np.float32(0.5)}, vector(1, 0, 0))
+    cache.save(path)
+
+    loaded = QueryCache.load(path, version=ManifestWatcher(manifest.path).version)
+    assert loaded.get_exact("what did management say about the outlook") == {"similarity": 0.5}
+    assert loaded.get_similar("What is management's outlook?", vector(1, 0.01, 0)) == {"similarity": 0.5}
+    assert len(QueryCache.load(path, version=ManifestWatcher(manifest.path).version, ttl_seconds=0)) == 0
+
+    # Answers saved before an ingestion, or an unreadable file, give an empty cache
+    manifest.record("q4.pdf", "hash-2", "meta", {}, {})
+    manifest.save()
+    assert len(QueryCache.load(path, version=ManifestWatcher(manifest.path).version)) == 0
+    (tmp_path / "broken.json").write_text("{")
+    assert len(QueryCache.load(str(tmp_path / "broken.json"))) == 0
+
+
+def test_query_command_reuses_the_persisted_cache(tmp_path, monkeypatch, capsys, finbert_tokenizer):
+    from main import build_parser, run_query
+    from preprocessor import PDFPreprocessor
+
+    monkeypatch.setenv("LOCAL_VECTOR_DB_PATH", str(tmp_path / "vector_db"))
+    monkeypatch.delenv("DB_HOST", raising=False)
+    texts = ["Management expects advertising demand to stay strong.", "Users grew in every region."]
+    LocalVectorDB(str(tmp_path / "vector_db")).create_collection("reddit_earnings_call_transcripts").insert_many(
+        [{"_id": str(i), "text": text, "$vector": embedding}
+         for i, (text, embedding) in enumerate(zip(texts, PDFPreprocessor().generate_embeddings(texts)))])
+    args = build_parser().parse_args(["query", "What did management say about the outlook?", "--db-type", "local_vector_db",
+                                      "--cache", "--cache-path", str(tmp_path / "query_cache.json"),
+                                      "--manifest", str(tmp_path / "manifest.json")])
+
+    first = run_query(args)
+    assert "cache" not in first and first["results"]
+    second = run_query(args)
+    assert second["cache"] == "exact" and second["results"] == first["results"]
+    assert "Answered from the exact query cache" in capsys.readouterr().out
@@ -0,0 +1,167 @@
+import time
+
+import numpy as np
+import pytest
+
+from databases.local_vector_database import LocalVectorDB
+from query_handler.query_router import INTENT_EXAMPLES, QueryRouter, build_sql_query, parse_query
+
+PASSAGES = {
+    "outlook": "Management expects advertising demand to stay strong into the holiday season.",
+    "licensing": "Data licensing agreements with AI partners contributed to other revenue.",
+    "users": "Daily active uniques grew across every region, led by international markets.",
+}
+
+
+def embed(text):
+    """Bag-of-keywords embedding, so similarities are predictable without a model."""
+    keywords = ["revenue", "users", "uniques", "outlook", "management", "licensing", "ai", "quarter", "arpu"]
+    words = text.lower().replace("?", " ").replace(".", " ").split()
+    return np.array([1.0] + [float(keyword in words) for keyword in keywords], dtype=np.float32)
+
+
+@pytest.fixture
+def sql_engine():
+    sqlalchemy = pytest.importorskip("sqlalchemy")
+    # One shared in-memory database for the router's worker threads
+    engine = sqlalchemy.create_engine("sqlite://", poolclass=sqlalchemy.pool.StaticPool,
+                                      connect_args={"check_same_thread": False})
+    with engine.begin() as connection:
+        connection.execute(sqlalchemy.text(
+            "CREATE TABLE financial_metrics (metric TEXT, period TEXT, value REAL, unit TEXT, source TEXT)"))
+        connection.execute(sqlalchemy.text("INSERT INTO financial_metrics VALUES (:m, :p, :v, :u, 'q_reports.xlsx')"), [
+            dict(m="ad_revenue", p="Q3 2024", v=315.1, u="USD m"),
+            dict(m="ad_revenue", p="Q4 2023", v=226.0, u="USD m"),
+            dict(m="dau", p="Q3 2024", v=97.2, u="m"),
+            dict(m="revenue", p="FY2023", v=804.0, u="USD m"),
+        ])
+    return engine
+
+
+@pytest.fixture
+def vector_db(tmp_path):
+    db = LocalVectorDB(str(tmp_path / "vector_db"))
+    collection = db.create_collection("transcripts")
+    collection.insert_many([{"_id": key, "text": text, "metadata": {"page": page}, "$vector": embed(text)}
+                            for page, (key, text) in enumerate(PASSAGES.items(), start=1)])
+    return db
+
+
+@pytest.fixture
+def router(sql_engine, vector_db):
+    router = QueryRouter(sql_db=sql_engine, vector_db=vector_db, collection_name="transcripts", embed_query=embed,
+                         top_k=2)
+    yield router
+    router.close()
+
+
+def test_parse_query_normalizes_metrics_and_periods():
+    plan = parse_query("How did ad revenue and DAUq compare in Q3'24 vs FY2023 and 2022?")
+    assert plan["metrics"] == ["ad_revenue", "dau"]
+    assert plan["periods"] == ["Q3 2024", "FY2023", "2022"]
+
+    sql, params = build_sql_query(plan)
+    assert "metric IN :metrics" in sql and "period IN :periods" in sql
+    assert "Q4 2022" in params["periods"]
+    assert build_sql_query(parse_query("Tell me about the company")) is None
+    with pytest.raises(ValueError):
+        build_sql_query(plan, table="metrics; DROP TABLE users")
+
+
+@pytest.mark.parametrize("query, intent", [
+    ("What was ad revenue in Q3 2024?", "sql"),
+    ("How many daily active uniques were there in 2024?", "sql"),
+    ("What did management say about the holiday outlook?", "vector"),
+    ("Why did ad revenue grow in Q3 2024?", "hybrid"),
+])
+def test_rule_intents(router, query, intent):
+    assert router.analyze_query_intent(query) == intent
+
+
+def test_embedding_fallback_for_queries_without_rules(router):
+    # No rule matches; the examples decide by embedding similarity
+    assert router.analyze_query_intent("licensing ai partners") == "vector"
+    assert router.analyze_query_intent("arpu quarter revenue") == "sql"
+    assert router.analyze_query_intent("reddit") == "hybrid"    # Equally close to both sets of examples
+    assert set(router._prototypes) == set(INTENT_EXAMPLES)
+
+
+def test_sql_route_returns_matching_figures(router):
+    result = router.route_query("What was ad revenue in Q3 2024?")
+
+    assert result["intent"] == "sql"
+    assert result["sql"] == [dict(metric="ad_revenue", period="Q3 2024", value=315.1, unit="USD m",
+                                  source="q_reports.xlsx")]
+    assert "vector" not in result
+    assert set(result["timings"]) >= {"classify", "sql", "merge", "total"}
+
+
+def test_hybrid_route_merges_figures_and_passages(router):
+    result = router.route_query("Why did daily active uniques grow in Q3 2024?")
+
+    assert result["intent"] == "hybrid"
+    assert [item["source"] for item in result["results"]] == ["sql", "vector", "vector"]
+    assert result["vector"][0]["id"] == "users"
+    assert result["vector"][0]["similarity"] >= result["vector"][1]["similarity"]
+    assert result["timed_out"] == [] and result["errors"] == {}
+
+
+def test_stages_run_concurrently_and_slow_stages_are_dropped(sql_engine, vector_db):
+    class SlowSqlRouter(QueryRouter):
+        sql_delay = 0.3
+
+        def route_to_sql_db(self, query, plan=None, timeout=None):
+            time.sleep(self.sql_delay)
+            return super().route_to_sql_db(query, plan, timeout)
+
+        def route_to_vector_db(self, query, embedding=None, timeout=None):
+            time.sleep(0.3)
+            return super().route_to_vector_db(query, embedding, timeout)
+
+    router = SlowSqlRouter(sql_db=sql_engine, vector_db=vector_db, collection_name="transcripts", embed_query=embed)
+    try:
+        # Both 0.3 s stages together take about 0.3 s, not 0.6 s
+        result = router.route_query("Why did ad revenue grow in Q3 2024?", budget=2.0)
+        assert result["sql"] and result["vector"]
+        assert result["timings"]["total"] < 0.55
+
+        # A stage over the budget is reported and left out instead of delaying the answer
+        router.sql_delay = 2.0
+        result = router.route_query("Why did ad revenue grow in Q3 2024?", budget=0.6)
+        assert result["timed_out"] == ["sql"]
+        assert result["vector"] and result["sql"] == []
+        assert result["timings"]["total"] < 1.0
+    finally:
+        router.close()
+
+
+def test_failed_stage_is_reported(vector_db):
+    router = QueryRouter(sql_db=object(), vector_db=vector_db, collection_name="transcripts", embed_query=embed)
+    try:
+        result = router.route_query("Why did ad revenue grow in Q3 2024?")
+    finally:
+        router.close()
+    assert "sql" in result["errors"]
+    assert [item["source"] for item in result["results"]] == ["vector"] * 3
+
+
+def test_figure_questions_fall_back_to_the_passages(sql_engine, vector_db):
+    # Without a SQL database the passages answer
+    router = QueryRouter(vector_db=vector_db, collection_name="transcripts", embed_query=embed, top_k=2)
+    try:
+        result = router.route_query("How many daily active uniques?")
+    finally:
+        router.close()
+    assert result["intent"] == "vector" and "sql" not in result
+    assert result["vector"][0]["id"] == "users" and result["errors"] == {}
+
+    # A figure the table does not have, or a failing SQL database, is answered from both
+    for sql_db in (sql_engine, object()):
+        router = QueryRouter(sql_db=sql_db, vector_db=vector_db, collection_name="transcripts", embed_query=embed, top_k=2)
+        try:
+            result = router.route_query("What were daily active uniques in Q1 2021?")
+        finally:
+            router.close()
+        assert result["intent"] == "hybrid" and result["sql"] == []
+        assert result["vector"][0]["id"] == "users"
+    assert "sql" in result["errors"]
@@ -0,0 +1,131 @@
+import numpy as np
+import pytest
+
+from databases.local_vector_database import LocalVectorDB
+from pipelines.retrieval_pipeline import BM25Index, HybridRetriever, reciprocal_rank_fusion, tokenize
+
+PASSAGES = {
+    "arpu": "Global ARPU was $3.77, up 9% year over year, on ad pricing.",
+    "dauq": "DAUq reached 97.2 million in Q3 2024, up 27% from a year ago.",
+    "outlook": "Management expects advertising revenue to grow with holiday demand.",
+    "licensing": "Other revenue grew on data licensing agreements.",
+    "users": "Logged-in users grew across every international market.",
+    "costs": "Cost of revenue rose with hosting and infrastructure spend.",
+}
+
+
+def embed(text):
+    """Bag-of-keywords embedding without the financial abbreviations, like a general-purpose model."""
+    keywords = ["revenue", "users", "grew", "advertising", "ad", "licensing", "year", "market"]
+    words = text.lower().replace("?", " ").replace(".", " ").replace(",", " ").split()
+    return np.array([1.0] + [float(keyword in words) for keyword in keywords], dtype=np.float32)
+
+
+@pytest.fixture
+def collection(tmp_path):
+    collection = LocalVectorDB(str(tmp_path / "vector_db")).create_collection("transcripts")
+    collection.insert_many([{"_id": key, "text": text, "metadata": {}, "$vector": embed(text)}
+                            for key, text in PASSAGES.items()])
+    return collection
+
+
+@pytest.fixture
+def index():
+    index = BM25Index()
+    index.add_documents(list(PASSAGES), list(PASSAGES.values()))
+    return index
+
+
+def test_tokenize_normalizes_periods_and_figures():
+    assert "q3_2024" in tokenize("What happened in Q3'24?") and "q3_2024" in tokenize("q3 fy24 results")
+    assert "fy_2023" in tokenize("FY2023 revenue")
+    terms = tokenize("Revenue of $1,315.1 million, up 21%, and the P&L")
+    assert {"revenue", "1315.1", "million", "21", "p&l"} <= set(terms) and "the" not in terms
+
+
+def test_bm25_ranks_exact_terms(index):
+    assert index.search("What was ARPU?")[0][0] == "arpu"
+    assert index.search("DAUq in Q3'24", k=1) == [("dauq", pytest.approx(index.search("dauq q3_2024")[0][1]))]
+    ranked = [chunk_id for chunk_id, _ in index.search("revenue")]
+    assert set(ranked) == {"outlook", "licensing", "costs"}
+    assert index.search("unknown words") == []
+
+
+def test_updates_removals_and_round_trip(index, tmp_path):
+    index.add_documents(["arpu"], ["Ad pricing recovered."])    # Replaces the indexed chunk
+    index.remove_documents(["dauq", "missing"])
+    assert index.search("ARPU") == [] and index.search("DAUq") == []
+    assert len(index) == 5 and index.search("pricing")[0][0] == "arpu"
+
+    loaded = BM25Index.load(index.save(str(tmp_path / "bm25.npz")))
+    assert loaded.stats() == index.stats()
+    assert loaded.search("revenue grew") == index.search("revenue grew")
+    loaded.add_documents(["new"], ["ARPU rose again"])
+    assert loaded.search("ARPU")[0][0] == "new"
+    assert len(BM25Index.load(str(tmp_path / "missing.npz"))) == 0
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "c", "d"]], k=1)
+    assert [item for item, _ in fused] == ["b", "c", "a", "d"]
+    assert fused[0][1] == pytest.approx(1 / 3 + 1 / 2)
+
+
+def test_prefilter_scores_only_lexical_candidates(collection, index):
+    query = "ARPU trend for users"
+    vector_only = HybridRetriever(collection, index, embed, mode="vector").search(query, k=3)
+    assert "arpu" not in [passage["id"] for passage in vector_only]     # The embedding misses the abbreviation
+
+    hybrid = HybridRetriever(collection, index, embed, mode="prefilter")
+    results = hybrid.search(query, k=2)
+    assert {passage["id"] for passage in results} == {"arpu", "users"}
+    assert all(passage["similarity"] is not None and passage["bm25"] > 0 for passage in results)
+
+    # Fewer lexical candidates than requested passages: fused with a full vector search instead
+    results = hybrid.search("ARPU trend", k=3)
+    assert results[0]["id"] == "arpu" and len(results) == 3 and results[1]["bm25"] is None
+
+
+def test_stale_index_entries_are_dropped(collection, index):
+    collection.delete_many({"_id": "arpu"})
+    results = HybridRetriever(collection, index, embed, mode="lexical").search("ARPU revenue", k=5)
+    assert [passage["id"] for passage in results] != [] and "arpu" not in [passage["id"] for passage in results]
+    with pytest.raises(ValueError):
+        HybridRetriever(collection, index, embed, mode="bm25")
+
+
+def test_router_uses_the_hybrid_retriever(tmp_path, collection, index):
+    from query_handler.query_router import QueryRouter
+
+    retriever = HybridRetriever(collection, index, embed, mode="rrf")
+    router = QueryRouter(collection_name="transcripts", embed_query=embed, top_k=2, retriever=retriever)
+    try:
+        result = router.route_query("Why did DAUq grow?")
+    finally:
+        router.close()
+    assert result["intent"] in ("vector", "hybrid") and result["errors"] == {}
+    assert result["vector"][0]["id"] == "dauq" and result["vector"][0]["score"] > 0
+
+
+def test_stale_index_falls_back_to_rrf(collection, index, tmp_path, monkeypatch):
+    from databases.ingestion_manifest import IngestionManifest
+
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+    manifest.record("q3.pdf", "h1", "m", {}, {})
+    index.fingerprint = manifest.fingerprint()
+    loaded = BM25Index.load(index.save(str(tmp_path / "bm25.npz")))
+    assert loaded.is_current(manifest) and not BM25Index().is_current(manifest)
+
+    # A chunk ingested after the index was built is only reachable by a full vector search
+    collection.insert_many([{"_id": "late", "text": "Users grew.", "metadata": {}, "$vector": embed("users grew")}])
+    manifest.record("q4.pdf", "h2", "m", {}, {})
+    assert not loaded.is_current(manifest)
+    searches = []
+    find = collection.find
+    monkeypatch.setattr(collection, "find", lambda *args, **kwargs: searches.append(kwargs) or find(*args, **kwargs))
+
+    current = HybridRetriever(collection, loaded, embed, mode="prefilter").search("users grew", k=2)
+    assert "late" not in [passage["id"] for passage in current] and "filter" in searches[0]
+    searches.clear()
+    stale = HybridRetriever(collection, loaded, embed, mode="prefilter", stale=True).search("users grew", k=3)
+    assert "filter" not in searches[0] and "late" in [passage["id"] for passage in stale]
@@ -1,3 +1,4 @@
+import numpy as np
 import pytest
 from nlp.tokenization import Tokenizer
 
@@ -15,3 +16,55 @@ def test_tokenization(sample_text):
     assert len(tokens) == 5  # Example: 'This', 'is', 'a', 'test', 'sentence'
     assert "test" in tokens
     assert isinstance(tokens, list)
+
+
+PAGE = " ".join(
+    f"reddit revenue grew by {i} % in q4 2023 . the company ad users grew , margin grew ."
+    for i in range(1, 6)
+) * 4
+
+
+@pytest.fixture
+def chunker(tiny_finbert):
+    from nlp.tokenization import TokenChunker
+    return TokenChunker(tiny_finbert[0], chunk_size=40, chunk_overlap=8)
+
+
+def test_chunks_respect_the_token_budget(chunker, tiny_finbert):
+    tokenizer = tiny_finbert[0]
+    chunks = chunker.split_text(PAGE)
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert 0 < len(chunk.token_ids) <= 40
+        assert chunk in PAGE
+        # The carried token IDs are exactly what the tokenizer produces for the chunk text
+        assert chunk.token_ids == tokenizer(str(chunk), add_special_tokens=False)["input_ids"]
+    # Consecutive chunks share overlapping tokens
+    assert any(chunks[1].token_ids[:k] == chunks[0].token_ids[-k:] for k in range(1, 9))
+
+
+def test_chunks_survive_pickling(chunker):
+    import pickle
+
+    chunk = chunker.split_text(PAGE)[0]
+    restored = pickle.loads(pickle.dumps(chunk, protocol=pickle.HIGHEST_PROTOCOL))
+    assert type(restored) is type(chunk) and restored == chunk and restored.token_ids == chunk.token_ids
+
+
+def test_chunks_prefer_sentence_boundaries(chunker):
+    chunks = chunker.split_text(PAGE)
+    assert all(chunk.endswith(".") for chunk in chunks[:-1])
+
+
+def test_token_ids_go_straight_to_the_model(tiny_preprocessor, chunker):
+    chunks = chunker.split_text(PAGE)
+    reused = tiny_preprocessor.generate_embeddings(chunks)
+    retokenized = tiny_preprocessor.generate_embeddings([str(chunk) for chunk in chunks])
+    assert np.allclose(reused, retokenized, atol=1e-5)
+
+
+def test_character_splitter_honours_chunk_size():
+    from preprocessor import get_recursive_text_splitter
+    chunks = get_recursive_text_splitter(chunk_size=100).split_text(PAGE)
+    assert max(len(chunk) for chunk in chunks) <= 100
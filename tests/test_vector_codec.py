@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from databases.astra_uploader import AstraBulkUploader
+from databases.local_vector_database import LocalVectorCollection, LocalVectorDB
+from databases.vector_codec import (bytes_per_vector, decode_vectors, encode_vectors, quantize,
+                                    recall_vs_size_report, synthetic_embeddings, upload_bytes_per_vector)
+
+
+def test_int8_round_trip_keeps_per_vector_scale():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(50, 64)).astype(np.float32) * rng.uniform(0.01, 100, size=(50, 1))
+    codes, scales = encode_vectors(vectors, "int8")
+
+    assert codes.dtype == np.int8 and scales.shape == (50,)
+    error = np.abs(decode_vectors(codes, scales) - vectors)
+    # Rounding error is at most half a quantization step of each vector
+    assert np.all(error <= scales[:, None] / 2 + 1e-6)
+
+
+def test_sizes():
+    assert bytes_per_vector(768, "float32") == 3072
+    assert bytes_per_vector(768, "float16") == 1536
+    assert bytes_per_vector(768, "int8") == 772
+    vector = np.random.default_rng(0).normal(size=768)
+    assert upload_bytes_per_vector(vector, binary=True) * 3 < upload_bytes_per_vector(vector, binary=False)
+
+
+def test_recall_vs_size_report():
+    vectors = synthetic_embeddings(3000, 128)
+    rng = np.random.default_rng(1)
+    queries = vectors[:50] + 0.3 * rng.normal(size=(50, 128)).astype(np.float32)
+    report = {row["format"]: row for row in recall_vs_size_report(vectors, queries, k=10)}
+
+    assert report["float32"]["recall_at_k"] == 1.0
+    assert report["float16"]["recall_at_k"] >= 0.98
+    assert report["int8"]["recall_at_k"] >= 0.9
+    assert report["int8"]["bytes_per_vector"] * 3 < report["float32"]["bytes_per_vector"]
+    assert report["float32"]["bytes_per_vector"] * 5 < report["python_list"]["bytes_per_vector"]
+
+
+@pytest.mark.parametrize("vector_format", ["float16", "int8"])
+def test_quantized_collection_search_and_persistence(tmp_path, vector_format):
+    vectors = synthetic_embeddings(500, 32)
+    collection = LocalVectorCollection(str(tmp_path / "chunks"), vector_format=vector_format)
+    collection.insert_many([{"_id": str(i), "$vector": vector} for i, vector in enumerate(vectors)])
+
+    reopened = LocalVectorDB(str(tmp_path)).get_collection("chunks")
+    assert reopened.vector_format == vector_format
+    assert np.allclose(reopened.vectors, quantize(vectors, vector_format))
+
+    # The nearest neighbour of a stored vector is itself, with a similarity of ~1
+    result = reopened.find(sort={"$vector": vectors[42]}, limit=1, include_similarity=True)[0]
+    assert result["_id"] == "42"
+    assert result["$similarity"] == pytest.approx(1.0, abs=1e-3)
+
+
+def test_uploader_sends_binary_vectors(tmp_path):
+    sent = []
+
+    class RecordingCollection(LocalVectorCollection):
+        def insert_many(self, documents, ordered=False, **kwargs):
+            sent.extend(documents)
+            return super().insert_many(documents, ordered=ordered)
+
+    collection = RecordingCollection(str(tmp_path / "chunks"), vector_format="int8")
+    vectors = synthetic_embeddings(20, 16)
+    with AstraBulkUploader(collection, batch_size=8) as uploader:
+        uploader.submit([{"id": str(i), "text": "", "$vector": vector} for i, vector in enumerate(vectors)])
+
+    assert type(sent[0]["$vector"]).__name__ == "DataAPIVector"
+    assert collection.count_documents({}) == 20
@@ -0,0 +1,233 @@
+# Throughput autotuner: measures embedding batch sizes, torch threads and upload concurrency on this machine
+# and writes the fastest settings within the memory cap to the tuned profile read by `load_pipeline_config`
+
+import datetime     # Calibration timestamp stored in the profile
+import os       # OS library for paths and the CPU count
+import platform     # Machine description stored in the profile
+import tempfile     # Throwaway local vector database for the upload calibration
+import time     # Pass timings
+
+import numpy as np  # Synthetic calibration vectors
+
+from config.config import load_pipeline_config, resolve_path
+from utils.benchmark import PeakRSSSampler, synthetic_paragraph
+from utils.metrics import current_rss_mb
+
+# Prefix of the calibration documents, so they can be told apart (and deleted) in a real collection
+CALIBRATION_ID_PREFIX = "autotune-"
+
+
+def calibration_texts(count, pdf_path=None, seed=0):
+    """
+    Returns `count` chunk-sized texts: the chunks of a PDF (repeated if it is short), or
+    synthetic filing paragraphs when no PDF is given.
+    """
+    if pdf_path:
+        from preprocessor import get_recursive_text_splitter, stream_pages_and_metadata_from_pdf
+
+        splitter = get_recursive_text_splitter()
+        pages, _ = stream_pages_and_metadata_from_pdf(pdf_path)
+        chunks = [chunk for _, text in pages for chunk in splitter.split_text(text)]
+        if chunks:
+            return [chunks[i % len(chunks)] for i in range(count)]
+    rng = np.random.default_rng(seed)
+    return [synthetic_paragraph(rng, sentences=4) for _ in range(count)]
+
+
+def calibration_documents(count, dimension=768, seed=0):
+    """Returns `count` Astra DB documents with random unit vectors and `autotune-` IDs."""
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((count, dimension)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return [{"_id": f"{CALIBRATION_ID_PREFIX}{i}", "text": f"Calibration chunk {i}",
+             "metadata": {"source": "autotune"}, "$vector": vector} for i, vector in enumerate(vectors)]
+
+
+def measure_embedding(embedder, texts, batch_size, torch_threads=None):
+    """
+    Embeds `texts` once with the given settings, after a warm-up batch. The memory use is the
+    RSS growth over the RSS just before the warm-up, so it is not inflated by earlier candidates
+    (the process rarely returns memory after a large batch).
+    Args:
+        embedder (object): Anything with `generate_embeddings(texts, batch_size=...)`, e.g. a PDFPreprocessor.
+        texts (list): The calibration chunks.
+        batch_size (int): The number of chunks per forward pass.
+        torch_threads (int, optional): The torch intra-op threads; None keeps the current setting.
+    Returns:
+        dict: batch_size, torch_threads, chunks_per_second, seconds, rss_increase_mb and peak_rss_mb
+        (the whole process's peak).
+    """
+    import torch    # Imported on first use to keep imports fast
+
+    previous_threads = torch.get_num_threads()
+    if torch_threads:
+        torch.set_num_threads(torch_threads)
+    try:
+        with PeakRSSSampler() as sampler:
+            embedder.generate_embeddings(texts[:batch_size], batch_size=batch_size)     # Warm-up
+            start = time.perf_counter()
+            embedder.generate_embeddings(texts, batch_size=batch_size)
+            seconds = time.perf_counter() - start
+    finally:
+        torch.set_num_threads(previous_threads)
+    return {"batch_size": batch_size, "torch_threads": torch_threads or previous_threads,
+            "chunks_per_second": len(texts) / seconds if seconds else 0.0, "seconds": seconds,
+            "rss_increase_mb": sampler.increase_mb, "peak_rss_mb": sampler.peak_mb}
+
+
+def _estimate_rss(measurements, reference_mb):
+    """
+    Sets the `estimated_rss_mb` of each measurement: the RSS before tuning started plus the
+    candidate's own growth, so every candidate is judged from the same starting point.
+    """
+    for m in measurements:
+        if reference_mb is not None and m.get("rss_increase_mb") is not None:
+            m["estimated_rss_mb"] = reference_mb + m["rss_increase_mb"]
+        else:
+            m["estimated_rss_mb"] = m["peak_rss_mb"]
+    return measurements
+
+
+def _within_cap(measurement, memory_cap_mb):
+    rss = measurement["estimated_rss_mb"]
+    return not memory_cap_mb or rss is None or rss <= memory_cap_mb
+
+
+def _fastest(measurements, key, memory_cap_mb):
+    """Returns the fastest measurement within the memory cap, or None if every one exceeds it."""
+    allowed = [m for m in measurements if _within_cap(m, memory_cap_mb)]
+    return max(allowed, key=lambda m: m[key]) if allowed else None
+
+
+def tune_embedding(embedder, texts, batch_sizes, thread_counts, memory_cap_mb=None):
+    """
+    Picks the embedding batch size and torch thread count by coordinate descent: first the
+    batch size with the current thread count, then the thread count with the best batch size.
+    Settings whose estimated peak resident memory (see `_estimate_rss`) exceeds `memory_cap_mb`
+    are never selected.
+    Args:
+        embedder (object): Anything with `generate_embeddings(texts, batch_size=...)`.
+        texts (list): The calibration chunks.
+        batch_sizes (list): Candidate chunks per forward pass.
+        thread_counts (list): Candidate torch threads; counts above the CPU count are skipped.
+        memory_cap_mb (float, optional): The peak RSS allowed.
+    Returns:
+        tuple: (the selected {"batch_size", "torch_threads"}, or None if nothing fits the cap,
+        the list of measurements).
+    """
+    cpu_count = os.cpu_count() or 1
+    thread_counts = sorted({n for n in thread_counts if n <= cpu_count}) or [cpu_count]
+    reference_mb = current_rss_mb()
+
+    measurements = _estimate_rss([dict(measure_embedding(embedder, texts, batch_size), tuned="batch_size")
+                                  for batch_size in sorted(set(batch_sizes))], reference_mb)
+    best = _fastest(measurements, "chunks_per_second", memory_cap_mb)
+    if best is None:
+        return None, measurements
+    thread_measurements = _estimate_rss([dict(measure_embedding(embedder, texts, best["batch_size"], threads),
+                                              tuned="torch_threads") for threads in thread_counts], reference_mb)
+    measurements += thread_measurements
+    best = _fastest(thread_measurements, "chunks_per_second", memory_cap_mb) or best
+    return {"batch_size": best["batch_size"], "torch_threads": best["torch_threads"]}, measurements
+
+
+def measure_upload(collection, documents, batch_size, max_in_flight):
+    """
+    Uploads `documents` with a fixed batch size and concurrency, then deletes them again.
+    Returns:
+        dict: batch_size, max_in_flight, documents_per_second, seconds, retries, rss_increase_mb and peak_rss_mb.
+    """
+    from databases.astra_uploader import AstraBulkUploader, delete_documents
+
+    with PeakRSSSampler() as sampler:
+        start = time.perf_counter()
+        uploader = AstraBulkUploader(collection, batch_size=batch_size, max_in_flight=max_in_flight,
+                                     min_batch_size=batch_size, max_batch_size=batch_size)
+        try:
+            uploader.submit(documents)
+        finally:
+            stats = uploader.close()
+        seconds = time.perf_counter() - start
+    delete_documents(collection, [doc["_id"] for doc in documents])
+    return {"batch_size": batch_size, "max_in_flight": max_in_flight,
+            "documents_per_second": len(documents) / seconds if seconds else 0.0, "seconds": seconds,
+            "retries": stats["retries"], "rss_increase_mb": sampler.increase_mb, "peak_rss_mb": sampler.peak_mb}
+
+
+def tune_upload(collection, documents, batch_sizes, in_flight_counts, memory_cap_mb=None):
+    """
+    Measures every combination of upload batch size and concurrency and picks the fastest
+    within the memory cap.
+    Returns:
+        tuple: (the selected {"batch_size", "max_in_flight"} or None, the list of measurements).
+    """
+    reference_mb = current_rss_mb()
+    measurements = _estimate_rss([measure_upload(collection, documents, batch_size, max_in_flight)
+                                  for max_in_flight in sorted(set(in_flight_counts))
+                                  for batch_size in sorted(set(batch_sizes))], reference_mb)
+    best = _fastest(measurements, "documents_per_second", memory_cap_mb)
+    if best is None:
+        return None, measurements
+    return {"batch_size": best["batch_size"], "max_in_flight": best["max_in_flight"]}, measurements
+
+
+def autotune(settings=None, embedder=None, collection=None, pdf_path=None, stages=("embed", "upload")):
+    """
+    Calibrates the pipeline throughput settings on this machine.
+    Args:
+        settings (dict, optional): The pipeline settings; defaults to `load_pipeline_config(use_profile=False)`.
+        embedder (object, optional): The embedder; defaults to a PDFPreprocessor with the configured backend.
+        collection (object, optional): The collection uploaded to. Calibration documents are deleted
+            after each pass. Without one, uploads are measured against a throwaway local vector
+            database for reference only: local disk throughput says nothing about Data API latency
+            or rate limits, so the profile's upload section is left empty.
+        pdf_path (str, optional): A PDF whose chunks are embedded instead of synthetic text.
+        stages (tuple): "embed" and/or "upload".
+    Returns:
+        dict: The profile: the embedding and upload sections to apply, plus calibrated_at,
+        machine, memory_cap_mb and every measurement.
+    """
+    settings = settings or load_pipeline_config(use_profile=False)
+    tuning = settings["autotune"]
+    candidates = tuning["candidates"]
+    memory_cap_mb = tuning["memory_cap_mb"]
+    profile = {"embedding": {}, "upload": {}, "measurements": {},
+               "calibrated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+               "machine": {"platform": platform.platform(), "processor": platform.processor() or platform.machine(),
+                           "cpu_count": os.cpu_count()},
+               "memory_cap_mb": memory_cap_mb}
+
+    if "embed" in stages:
+        if embedder is None:
+            from preprocessor import PDFPreprocessor
+            embedder = PDFPreprocessor(settings=settings)
+        texts = calibration_texts(tuning["calibration_chunks"], pdf_path)
+        selected, measurements = tune_embedding(embedder, texts, candidates["embedding_batch_size"],
+                                                candidates["torch_threads"], memory_cap_mb)
+        profile["embedding"] = selected or {}
+        profile["measurements"]["embedding"] = measurements
+
+    if "upload" in stages:
+        documents = calibration_documents(tuning["calibration_documents"])
+        with tempfile.TemporaryDirectory() as tmp:
+            if collection is None:
+                from databases.local_vector_database import LocalVectorDB
+                target = LocalVectorDB(tmp).create_collection("autotune")
+            else:
+                target = collection
+            selected, measurements = tune_upload(target, documents, candidates["upload_batch_size"],
+                                                 candidates["upload_max_in_flight"], memory_cap_mb)
+        profile["upload"] = (selected or {}) if collection is not None else {}
+        profile["measurements"]["upload"] = measurements
+    return profile
+
+
+def save_profile(profile, path):
+    """Writes a tuned profile as YAML; a relative path is resolved against the repository root."""
+    import yaml     # Imported on first use to keep imports fast
+
+    path = resolve_path(path)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        yaml.safe_dump(profile, f, sort_keys=False)
+    return path
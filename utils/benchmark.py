@@ -0,0 +1,459 @@
+# Per-stage benchmark suite: synthetic filing corpora run through every pipeline stage against local database stand-ins
+
+import os       # OS library for file paths and /proc access
+import platform     # Machine description stored with the results
+import threading    # Resident set size sampler
+import time     # Stage and per-item timings
+
+import numpy as np  # Latency percentiles and synthetic figures
+
+from utils.metrics import current_rss_mb
+
+# Pipeline stages in the order they run; a stage needs the outputs of the stages it depends on
+STAGES = ("extract", "chunk", "embed", "ner", "upload", "excel", "retrieval")
+STAGE_DEPENDENCIES = {
+    "chunk": ("extract",),
+    "embed": ("chunk",),
+    "ner": ("chunk",),
+    "upload": ("embed",),
+    "retrieval": ("upload", "excel"),
+}
+
+# Filing shipped with the repository, benchmarked next to the synthetic documents
+BUNDLED_PDF = "data/raw_data/reddit_earnings_call_transcript.pdf"
+
+# Collection and table the upload and retrieval stages use in the local stand-ins
+BENCHMARK_COLLECTION = "benchmark_chunks"
+BENCHMARK_METRICS_TABLE = "financial_metrics"
+
+# Questions routed by the retrieval stage: figures, narrative and both
+BENCHMARK_QUESTIONS = (
+    "What was ad revenue in Q3 2024?",
+    "How many daily active uniques did Reddit have in Q4 2023?",
+    "What did management say about the advertising outlook?",
+    "Explain the growth in international users.",
+    "Why did adjusted EBITDA improve in FY2024?",
+    "Summarize the commentary on data licensing.",
+)
+
+# Building blocks of the synthetic filing text
+METRICS = ("revenue", "ad_revenue", "other_revenue", "arpu", "dau", "wau", "net_income", "adjusted_ebitda",
+           "gross_margin", "free_cash_flow", "eps")
+METRIC_NAMES = {"revenue": "Revenue", "ad_revenue": "Ad revenue", "other_revenue": "Other revenue", "arpu": "ARPU",
+                "dau": "Daily active uniques", "wau": "Weekly active uniques", "net_income": "Net income",
+                "adjusted_ebitda": "Adjusted EBITDA", "gross_margin": "Gross margin",
+                "free_cash_flow": "Free cash flow", "eps": "Diluted EPS"}
+SENTENCES = (
+    "{metric} was ${value:.1f} million in {period}, up {growth:.0f}% year over year.",
+    "In {period}, {metric_lower} grew {growth:.0f}% driven by performance ads and improved pricing.",
+    "Management noted that {metric_lower} reached ${value:.1f} million, ahead of guidance for {period}.",
+    "We expect {metric_lower} between ${low:.0f} million and ${high:.0f} million in the next quarter.",
+    "International users grew {growth:.0f}% and now represent {share:.0f}% of daily active uniques.",
+    "Our outlook reflects continued investment in machine learning, safety and the logged-out experience.",
+    "Operating expenses were ${value:.1f} million, or {share:.0f}% of revenue, in {period}.",
+)
+
+
+def synthetic_periods(years=(2022, 2023, 2024)):
+    return [f"Q{quarter} {year}" for year in years for quarter in range(1, 5)]
+
+
+def synthetic_paragraph(rng, sentences=6):
+    """Returns a paragraph of filing-like text with KPIs, periods, amounts and percentages."""
+    periods = synthetic_periods()
+    text = []
+    for _ in range(sentences):
+        metric = METRIC_NAMES[METRICS[rng.integers(len(METRICS))]]
+        value = float(rng.uniform(5, 900))
+        text.append(SENTENCES[rng.integers(len(SENTENCES))].format(
+            metric=metric, metric_lower=metric.lower(), value=value, growth=rng.uniform(-5, 60),
+            period=periods[rng.integers(len(periods))], low=value * 0.9, high=value * 1.1, share=rng.uniform(5, 60)))
+    return " ".join(text)
+
+
+def write_synthetic_pdf(path, pages=10, paragraphs_per_page=5, seed=0):
+    """
+    Writes a filing-like PDF: numbered pages of KPI paragraphs laid out like a 10-Q.
+    Args:
+        path (str): The output file.
+        pages (int): The number of pages.
+        paragraphs_per_page (int): Paragraphs of about six sentences on every page.
+        seed (int): The random seed, so the same arguments always produce the same file.
+    Returns:
+        str: The path.
+    """
+    import pymupdf  # Imported on first use to keep imports fast
+
+    rng = np.random.default_rng(seed)
+    doc = pymupdf.open()
+    for page_number in range(1, pages + 1):
+        page = doc.new_page()
+        text = f"Reddit, Inc. Quarterly Report (Form 10-Q), page {page_number}\n\n"
+        text += "\n\n".join(synthetic_paragraph(rng) for _ in range(paragraphs_per_page))
+        page.insert_textbox(pymupdf.Rect(50, 50, page.rect.width - 50, page.rect.height - 50), text, fontsize=8)
+    doc.set_metadata({"title": os.path.basename(path), "author": "Reddit, Inc.", "subject": "Form 10-Q"})
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def write_synthetic_workbook(path, rows=1_000, seed=0):
+    """
+    Writes a workbook whose "financial_metrics" sheet has the (metric, period, value, unit,
+    source) columns of the SQL route's table, with numbers partly formatted as text.
+    Args:
+        path (str): The output .xlsx file.
+        rows (int): The number of data rows.
+        seed (int): The random seed.
+    Returns:
+        str: The path.
+    """
+    import openpyxl     # Imported on first use to keep imports fast
+
+    rng = np.random.default_rng(seed)
+    periods = synthetic_periods()
+    book = openpyxl.Workbook(write_only=True)
+    sheet = book.create_sheet(BENCHMARK_METRICS_TABLE)
+    sheet.append(["metric", "period", "value", "unit", "source"])
+    for row in range(rows):
+        metric = METRICS[row % len(METRICS)]
+        value = round(float(rng.uniform(1, 1_000)), 2)
+        sheet.append([metric, periods[(row // len(METRICS)) % len(periods)],
+                      value if row % 4 else f"${value:,.2f}", "USD millions", os.path.basename(path)])
+    book.save(path)
+    return path
+
+
+def build_corpus(workdir, documents=4, pages=10, workbook_rows=1_000, include_bundled=True, seed=0):
+    """
+    Generates the benchmark corpus in a directory.
+    Args:
+        workdir (str): The directory the files are written to.
+        documents (int): The number of synthetic PDFs.
+        pages (int): Pages per synthetic PDF.
+        workbook_rows (int): Rows of the synthetic workbook; 0 writes no workbook.
+        include_bundled (bool): Add the bundled earnings call transcript if it exists.
+        seed (int): The random seed of the first document.
+    Returns:
+        dict: {"pdfs": [...], "workbooks": [...]} file paths.
+    """
+    os.makedirs(workdir, exist_ok=True)
+    pdfs = [write_synthetic_pdf(os.path.join(workdir, f"synthetic_filing_{i}.pdf"), pages, seed=seed + i)
+            for i in range(documents)]
+    bundled = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), BUNDLED_PDF)
+    if include_bundled and os.path.exists(bundled):
+        pdfs.append(bundled)
+    workbooks = []
+    if workbook_rows:
+        workbooks.append(write_synthetic_workbook(os.path.join(workdir, "synthetic_metrics.xlsx"), workbook_rows, seed))
+    return {"pdfs": pdfs, "workbooks": workbooks}
+
+
+class PeakRSSSampler:
+    """
+    Samples the resident set size on a background thread while a stage runs and keeps the peak,
+    and the resident set size when the stage started.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak_mb = None
+        self.baseline_mb = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = current_rss_mb()
+        if rss is not None:
+            self.peak_mb = rss if self.peak_mb is None else max(self.peak_mb, rss)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    @property
+    def increase_mb(self):
+        """The peak growth of the resident set size over its size when the stage started."""
+        if self.peak_mb is None or self.baseline_mb is None:
+            return None
+        return max(self.peak_mb - self.baseline_mb, 0.0)
+
+    def __enter__(self):
+        self.baseline_mb = current_rss_mb()
+        self._sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def stage_result(stage, seconds, latencies, documents=0, chunks=0, peak_rss_mb=None, **extra):
+    """
+    Builds the result entry of a stage.
+    Args:
+        stage (str): The stage name.
+        seconds (float): Wall time of the whole stage.
+        latencies (list): Seconds per item (document, batch, chunk or query, depending on the stage).
+        documents (int): Documents processed.
+        chunks (int): Chunks processed.
+        peak_rss_mb (float, optional): The peak resident set size during the stage.
+    Returns:
+        dict: stage, seconds, documents, chunks, docs_per_second, chunks_per_second, items,
+        p50_ms, p99_ms, peak_rss_mb and any stage-specific values.
+    """
+    latencies = np.asarray(latencies, dtype=np.float64)
+    return dict({
+        "stage": stage,
+        "seconds": seconds,
+        "documents": documents,
+        "chunks": chunks,
+        "docs_per_second": documents / seconds if seconds else 0.0,
+        "chunks_per_second": chunks / seconds if seconds else 0.0,
+        "items": len(latencies),
+        "p50_ms": float(np.percentile(latencies, 50) * 1000) if len(latencies) else 0.0,
+        "p99_ms": float(np.percentile(latencies, 99) * 1000) if len(latencies) else 0.0,
+        "peak_rss_mb": peak_rss_mb,
+    }, **extra)
+
+
+class _TimedCollection:
+    """Wraps a collection and records the latency of every insert_many call."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.latencies = []
+        self._lock = threading.Lock()
+
+    def insert_many(self, documents, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.collection.insert_many(documents, **kwargs)
+        finally:
+            with self._lock:
+                self.latencies.append(time.perf_counter() - start)
+
+
+def required_stages(stages):
+    """Returns the selected stages plus every stage they depend on, in pipeline order."""
+    needed = set()
+
+    def add(stage):
+        if stage not in STAGES:
+            raise ValueError(f"Unknown benchmark stage {stage!r}, expected one of {', '.join(STAGES)}")
+        needed.add(stage)
+        for dependency in STAGE_DEPENDENCIES.get(stage, ()):
+            add(dependency)
+
+    for stage in stages:
+        add(stage)
+    return [stage for stage in STAGES if stage in needed]
+
+
+def run_benchmarks(corpus, workdir, stages=STAGES, embedder=None, chunker="characters", chunk_size=None,
+                   batch_size=32, ner=None, questions=BENCHMARK_QUESTIONS):
+    """
+    Runs the pipeline stages over a corpus and measures each of them: PDF text extraction,
+    chunking, FinBERT embedding, entity tagging, upload through AstraBulkUploader into a local
+    vector collection (the Data API stand-in), streaming the workbooks into a SQLite metrics
+    table (the PostgreSQL stand-in) and routing questions through QueryRouter against both.
+    Stages the selected ones depend on are run as well but not reported.
+    Args:
+        corpus (dict): {"pdfs": [...], "workbooks": [...]}, e.g. from `build_corpus`.
+        workdir (str): Directory of the local vector database.
+        stages (iterable): The stages reported.
+        embedder (object, optional): An object with `generate_embeddings(texts, batch_size)`.
+            Defaults to the FinBERT preprocessor; its embedding cache is bypassed.
+        chunker (str): "tokens" or "characters" (see `preprocessor.get_text_splitter`).
+        chunk_size (int, optional): The chunk size in the chunker's unit.
+        batch_size (int): Chunks per embedding forward pass.
+        ner (object, optional): An entity processor with `iter_entities`. Defaults to the
+            financial lexicon matcher.
+        questions (tuple): The questions routed by the retrieval stage.
+    Returns:
+        dict: The stage results in pipeline order, keyed by stage name.
+    """
+    from preprocessor import chunk_pages, get_text_splitter, stream_pages_and_metadata_from_pdf
+
+    selected = set(stages)
+    results = {}
+    state = {}
+
+    def measure(stage, run):
+        with PeakRSSSampler() as sampler:
+            start = time.perf_counter()
+            result = run()
+            seconds = time.perf_counter() - start
+        if stage in selected:
+            latencies, counts = result
+            results[stage] = stage_result(stage, seconds, latencies, peak_rss_mb=sampler.peak_mb, **counts)
+
+    def extract():
+        latencies, state["pages"] = [], {}
+        for path in corpus["pdfs"]:
+            start = time.perf_counter()
+            pages, _ = stream_pages_and_metadata_from_pdf(path)
+            state["pages"][path] = list(pages)
+            latencies.append(time.perf_counter() - start)
+        return latencies, {"documents": len(corpus["pdfs"]),
+                           "pages": sum(len(pages) for pages in state["pages"].values())}
+
+    def chunk():
+        latencies, state["chunks"] = [], []
+        for path, pages in state["pages"].items():
+            start = time.perf_counter()
+            state["chunks"] += [(f"{os.path.basename(path)}-{i}", path, page_number, text)
+                                for i, (page_number, text) in enumerate(chunk_pages(iter(pages), splitter))]
+            latencies.append(time.perf_counter() - start)
+        return latencies, {"documents": len(state["pages"]), "chunks": len(state["chunks"])}
+
+    def embed():
+        nonlocal embedder
+        if embedder is None:
+            from pipelines.embedding_pipeline import load_default_embedder
+            embedder = load_default_embedder()
+        embedder.embedding_cache = None     # Measure inference, not cache hits
+        texts = [str(text) for *_, text in state["chunks"]]
+        latencies, batches = [], []
+        for start_index in range(0, len(texts), batch_size):
+            start = time.perf_counter()
+            batches.append(embedder.generate_embeddings(texts[start_index : start_index + batch_size],
+                                                        batch_size=batch_size))
+            latencies.append(time.perf_counter() - start)
+        state["embeddings"] = np.concatenate(batches) if batches else np.empty((0, 0), dtype=np.float32)
+        return latencies, {"documents": len(state["pages"]), "chunks": len(texts)}
+
+    def tag_entities():
+        from nlp.financial_entity import FinancialEntityProcessor
+        processor = ner or FinancialEntityProcessor()
+        latencies, entities = [], 0
+        iterator = processor.iter_entities((chunk_id, str(text)) for chunk_id, _, _, text in state["chunks"])
+        while True:
+            start = time.perf_counter()
+            item = next(iterator, None)
+            if item is None:
+                break
+            latencies.append(time.perf_counter() - start)
+            entities += len(item[1])
+        megabytes = sum(len(str(text).encode("utf-8")) for *_, text in state["chunks"]) / 1e6
+        seconds = sum(latencies)
+        return latencies, {"documents": len(state["pages"]), "chunks": len(state["chunks"]), "entities": entities,
+                           "megabytes_per_second": megabytes / seconds if seconds else 0.0}
+
+    def upload():
+        from databases.astra_uploader import AstraBulkUploader
+        from databases.local_vector_database import LocalVectorDB
+        from preprocessor import create_astra_db_document
+
+        state["vector_db"] = LocalVectorDB(os.path.join(workdir, "vector_db"))
+        collection = _TimedCollection(state["vector_db"].create_collection(BENCHMARK_COLLECTION))
+        uploader = AstraBulkUploader(collection)
+        for (chunk_id, path, page_number, text), embedding in zip(state["chunks"], state["embeddings"]):
+            uploader.submit([create_astra_db_document(None, str(text), {"source": path, "page": page_number},
+                                                      embedding, chunk_id)])
+        stats = uploader.close()
+        return collection.latencies, {"documents": len(state["pages"]), "chunks": stats["documents"],
+                                      "batches": stats["batches"], "retries": stats["retries"]}
+
+    def excel():
+        import sqlalchemy
+        from extractors.excel_extractor import ExcelExtractor
+
+        engine = sqlalchemy.create_engine("sqlite://", poolclass=sqlalchemy.pool.StaticPool,
+                                          connect_args={"check_same_thread": False})
+        insert = sqlalchemy.text(f"INSERT INTO {BENCHMARK_METRICS_TABLE} VALUES (:metric, :period, :value, :unit, :source)")
+        extractor = ExcelExtractor()
+        latencies, rows = [], 0
+        with engine.begin() as connection:
+            connection.execute(sqlalchemy.text(
+                f"CREATE TABLE {BENCHMARK_METRICS_TABLE} (metric TEXT, period TEXT, value REAL, unit TEXT, source TEXT)"))
+            for path in corpus["workbooks"]:
+                batches = extractor.iter_batches(path, BENCHMARK_METRICS_TABLE)
+                while True:
+                    start = time.perf_counter()
+                    batch = next(batches, None)
+                    if batch is None:
+                        break
+                    columns = {name: [None if value != value else value for value in values.tolist()]
+                               for name, values in batch.items()}       # NaN becomes NULL
+                    connection.execute(insert, [dict(zip(columns, row)) for row in zip(*columns.values())])
+                    latencies.append(time.perf_counter() - start)
+                    rows += len(batch["metric"])
+        state["sql_db"] = engine
+        return latencies, {"documents": len(corpus["workbooks"]), "rows": rows}
+
+    def retrieval():
+        from query_handler.query_router import QueryRouter
+
+        router = QueryRouter(sql_db=state["sql_db"], vector_db=state["vector_db"],
+                             collection_name=BENCHMARK_COLLECTION, metrics_table=BENCHMARK_METRICS_TABLE,
+                             embed_query=lambda question: embedder.generate_embeddings([question])[0],
+                             latency_budgets={"sql": 60.0, "vector": 60.0, "hybrid": 60.0})
+        try:
+            router.route_query(questions[0])    # Warm-up: intent prototypes are embedded on first use
+            latencies, intents, results = [], {}, 0
+            for question in questions:
+                start = time.perf_counter()
+                result = router.route_query(question)
+                latencies.append(time.perf_counter() - start)
+                intents[result["intent"]] = intents.get(result["intent"], 0) + 1
+                results += len(result["results"])
+        finally:
+            router.close()
+        return latencies, {"queries": len(questions), "intents": intents, "results": results}
+
+    runners = {"extract": extract, "chunk": chunk, "embed": embed, "ner": tag_entities, "upload": upload,
+               "excel": excel, "retrieval": retrieval}
+    needed = required_stages(stages)
+    if "chunk" in needed:
+        splitter = get_text_splitter(chunker, chunk_size)   # Loading the tokenizer is not part of the chunk stage
+    for stage in needed:
+        measure(stage, runners[stage])
+    return results
+
+
+def benchmark_report(corpus, stage_results, config):
+    """
+    Assembles the machine-readable benchmark result.
+    Returns:
+        dict: config, environment (python, platform, cpu_count), corpus and per-stage results.
+    """
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": config,
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpu_count": os.cpu_count()},
+        "corpus": {"pdfs": [os.path.basename(path) for path in corpus["pdfs"]],
+                   "workbooks": [os.path.basename(path) for path in corpus["workbooks"]]},
+        "stages": stage_results,
+    }
+
+
+def compare_results(baseline, current, max_regression=0.2):
+    """
+    Compares two benchmark results stage by stage.
+    Args:
+        baseline (dict): An earlier result of `benchmark_report`.
+        current (dict): The new result.
+        max_regression (float): Tolerated relative drop in throughput or rise in p50/p99 latency.
+    Returns:
+        list: One dict (stage, metric, baseline, current, change) per regression beyond the tolerance.
+    """
+    regressions = []
+    for stage, result in current["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if not previous:
+            continue
+        for metric, higher_is_better in (("docs_per_second", True), ("chunks_per_second", True),
+                                         ("p50_ms", False), ("p99_ms", False)):
+            before, after = previous.get(metric) or 0.0, result.get(metric) or 0.0
+            if not before or not after:
+                continue
+            change = after / before - 1
+            if (change < -max_regression) if higher_is_better else (change > max_regression):
+                regressions.append({"stage": stage, "metric": metric, "baseline": before, "current": after,
+                                    "change": change})
+    return regressions
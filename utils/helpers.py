@@ -3,9 +3,8 @@ from dotenv import load_dotenv
 import logging
 import os
 
-# Configure logger
+# Module logger; handlers are configured once by utils.logging.setup_logging
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
 
 def load_env_vars(env_file="/Users/vivakepandey/Python Projects/financial_analyst/.env"):
     """
@@ -1,48 +1,164 @@
+# Single logging subsystem: handlers registered once, records written by a background thread, noisy call sites rate-limited
+
+import atexit   # Flush the queued records when the interpreter exits
 import logging  # Importing the logging module to handle logging
 import os       # Importing the os module to work with file system operations
+import queue    # Queue between the logging callers and the writer thread
+import threading    # Lock guarding the one-time setup
+import time     # Rate-limit windows
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
-# Ensure that the 'logs' directory exists. If not, it will be created.
-log_dir = 'logs'  # Directory where log files will be saved
-os.makedirs(log_dir, exist_ok=True)  # Creates the logs directory if it doesn't exist
+# Directory and file the log records are written to
+LOG_DIR = os.getenv('LOG_DIR', 'logs')
+LOG_FILE = os.getenv('LOG_FILE', os.path.join(LOG_DIR, 'app.log'))
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+CONSOLE_LOG_LEVEL = os.getenv('CONSOLE_LOG_LEVEL', 'INFO')
 
-# Function to setup logging configuration
-def setup_logger():
+# Log format: timestamp, logger name, log level and the message
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Rotation of the log file
+MAX_LOG_BYTES = 5_000_000
+LOG_BACKUP_COUNT = 3
+
+# Per call site, at most this many records below ERROR are written per window; the rest are
+# counted and reported with the next record written from the same call site
+RATE_LIMIT_BURST = int(os.getenv('LOG_RATE_LIMIT_BURST', '20'))
+RATE_LIMIT_WINDOW = float(os.getenv('LOG_RATE_LIMIT_WINDOW', '1.0'))
+
+_lock = threading.Lock()
+_queue_handler = None   # The QueueHandler installed on the root logger
+_listener = None        # The QueueListener writing the records on its own thread
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Limits each call site (logger, file and line) to `burst` records per `window` seconds.
+    Records at `max_level` or above always pass. It runs on the caller's thread before the
+    record is queued, so a suppressed record costs a dict lookup and no I/O.
     """
-    This function sets up the logger for the application, configuring it to log to both a file
-    and the console, with detailed formatting and appropriate log levels.
+
+    def __init__(self, burst=RATE_LIMIT_BURST, window=RATE_LIMIT_WINDOW, max_level=logging.ERROR):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.max_level = max_level
+        self._sites = {}    # (name, pathname, lineno) -> [window start, records passed, records suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.burst <= 0 or record.levelno >= self.max_level:
+            return True
+        key = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= self.window:
+                suppressed = site[2] if site is not None else 0
+                self._sites[key] = [now, 1, 0]
+            elif site[1] < self.burst:
+                site[1] += 1
+                suppressed, site[2] = site[2], 0
+            else:
+                site[2] += 1
+                return False
+        if suppressed:
+            record.msg = f"{record.msg!s} ({suppressed} similar messages suppressed)"
+        return True
+
+    def suppressed(self):
+        """Returns the number of records currently suppressed and not yet reported."""
+        with self._lock:
+            return sum(site[2] for site in self._sites.values())
+
+
+def _level(level):
+    return logging.getLevelName(level.upper()) if isinstance(level, str) else level
+
+
+def setup_logging(level=None, log_file=None, console_level=None, rate_limit=True, force=False):
     """
-    
-    # Create a logger instance. This will be used to write log messages
-    logger = logging.getLogger('sec_analyst_project')  # Logger name can be any string, it's often the app name
-    logger.setLevel(logging.DEBUG)  # Set the log level to DEBUG, meaning all logs from DEBUG level and higher are captured
-
-    # File handler for logging messages to a file
-    # All logs will be saved in the 'logs/app.log' file
-    file_handler = logging.FileHandler(os.path.join(log_dir, 'app.log'))  # Creating the file handler
-    file_handler.setLevel(logging.DEBUG)  # Set the minimum log level to DEBUG for the file handler (captures all messages)
-
-    # Console handler for logging messages to the console (terminal)
-    console_handler = logging.StreamHandler()  # Creating the console handler
-    console_handler.setLevel(logging.INFO)  # Set the minimum log level to INFO for the console handler
-
-    # Log format specifies how each log message will appear in the logs
-    # The format includes the timestamp, logger name, log level, and the actual message
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    
-    # Set the formatter for both the file handler and console handler
-    file_handler.setFormatter(formatter)  # Applying formatter to file handler
-    console_handler.setFormatter(formatter)  # Applying formatter to console handler
-
-    # Add both handlers to the logger
-    logger.addHandler(file_handler)  # Attach the file handler to the logger
-    logger.addHandler(console_handler)  # Attach the console handler to the logger
-
-    return logger  # Return the configured logger instance
-
-# Initialize the logger by calling the setup_logger function
-logger = setup_logger()
-
-# Example usage of the logger:
-logger.debug("This is a debug message")  # This log will appear in both the file and the console (if log level is DEBUG or higher)
-logger.info("This is an info message")  # This log will appear in both the file and the console (if log level is INFO or higher)
-logger.warning("This is a warning message")  # This log will appear in both the file and the console (if log level is WARNING or higher)
+    Configures logging for the whole process, exactly once: the root logger gets a single
+    QueueHandler, and a QueueListener thread writes the queued records to a rotating log
+    file and the console. Loggers obtained with `logging.getLogger(__name__)` need no
+    handlers of their own; their records propagate to the root. Calling it again is a no-op
+    unless `force` is set, which replaces the previous configuration.
+    Args:
+        level (str or int, optional): The root level. Defaults to LOG_LEVEL (env).
+        log_file (str, optional): The log file. Defaults to LOG_FILE (env), logs/app.log.
+        console_level (str or int, optional): The console level. Defaults to CONSOLE_LOG_LEVEL (env).
+        rate_limit (bool or RateLimitFilter): Rate-limit noisy call sites. Default is True.
+        force (bool): Reconfigure even if logging was already set up.
+    Returns:
+        logging.handlers.QueueListener: The running listener.
+    """
+    global _queue_handler, _listener
+    with _lock:
+        if _listener is not None and not force:
+            return _listener
+        _shutdown()
+
+        log_file = log_file or LOG_FILE
+        os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)
+        formatter = logging.Formatter(LOG_FORMAT)
+        file_handler = RotatingFileHandler(log_file, maxBytes=MAX_LOG_BYTES, backupCount=LOG_BACKUP_COUNT)
+        file_handler.setFormatter(formatter)
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(_level(console_level or CONSOLE_LOG_LEVEL))
+        console_handler.setFormatter(formatter)
+
+        # The callers only enqueue; formatting of the output and all file writes happen on the listener thread
+        log_queue = queue.SimpleQueue()
+        _queue_handler = QueueHandler(log_queue)
+        if rate_limit:
+            _queue_handler.addFilter(rate_limit if isinstance(rate_limit, RateLimitFilter) else RateLimitFilter())
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            if type(handler) in (logging.StreamHandler, logging.FileHandler):
+                root.removeHandler(handler)     # Added by logging.basicConfig, so records would be written twice
+        root.addHandler(_queue_handler)
+        root.setLevel(_level(level or LOG_LEVEL))
+
+        _listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+        _listener.start()
+        return _listener
+
+
+def _shutdown():
+    global _queue_handler, _listener
+    if _listener is not None:
+        _listener.stop()    # Writes every record still queued
+        for handler in _listener.handlers:
+            handler.close()
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+    _queue_handler, _listener = None, None
+
+
+def shutdown_logging():
+    """Flushes the queued records, stops the writer thread and removes the handlers."""
+    with _lock:
+        _shutdown()
+
+
+atexit.register(shutdown_logging)
+
+
+def get_logger(name):
+    """
+    Returns a logger of the shared logging setup, configuring it on first use. Safe to call
+    any number of times: no handler is ever added to the named logger.
+    Args:
+        name (str): The logger name, usually `__name__`.
+    Returns:
+        logging.Logger: The logger.
+    """
+    setup_logging()
+    return logging.getLogger(name)
+
+
+# Function to setup logging configuration
+def setup_logger():
+    """Returns the application logger; kept for callers of the former per-module setup."""
+    return get_logger('sec_analyst_project')
+
@@ -0,0 +1,423 @@
+# Pipeline instrumentation: per-stage timers and counters, per-document trace spans, Prometheus text export and profiling hooks
+
+import bisect   # Histogram bucket lookup
+import collections  # Bounded deque of finished traces
+import contextlib   # Stage and trace context managers
+import json     # Trace export as JSON lines
+import logging
+import os       # OS library for environment variables, file paths and /proc access
+import platform     # ru_maxrss units differ between Linux and macOS
+import threading    # Lock of the registry, thread-local span stacks and the HTTP exporter thread
+import time     # Stage timings
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds of the stage latency histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# Finished document traces kept in memory for `recent_traces`
+MAX_TRACES = 1_000
+
+# Profiling: "1" profiles every stage, a comma-separated list only those stages
+PROFILE_ENV = "PIPELINE_PROFILE"
+DEFAULT_PROFILE_DIR = os.getenv('PIPELINE_PROFILE_DIR', 'logs/profiles')
+
+
+def current_rss_mb():
+    """Returns the resident set size of this process in MB, or None where it cannot be read."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource     # Unix only; ru_maxrss is the lifetime peak, in KB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1e6 if platform.system() == "Darwin" else peak / 1e3
+    except ImportError:
+        return None
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items() if value is not None))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (f'{name}="{value}"'.replace("\n", "\\n") for name, value in
+               ((name, str(value).replace("\\", "\\\\").replace('"', '\\"')) for name, value in pairs))
+    return "{" + ",".join(escaped) + "}"
+
+
+class MetricsRegistry:
+    """
+    Thread-safe counters, gauges and histograms keyed by metric name and labels, rendered in
+    the Prometheus text exposition format. Recording a value is a dict update under a lock,
+    cheap enough for per-chunk and per-batch hot paths.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}     # name -> {label key: value}
+        self._gauges = {}
+        self._histograms = {}   # name -> {label key: [bucket counts..., sum, count]}
+
+    def describe(self, name, help):
+        self._help[name] = help
+
+    def inc(self, name, value=1, **labels):
+        """Adds `value` to a counter."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """Sets a gauge."""
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name, value, **labels):
+        """Records one observation, e.g. a duration in seconds, in a histogram."""
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def value(self, name, **labels):
+        """Returns a counter or gauge value, or a histogram's (count, sum); None if never recorded."""
+        key = _label_key(labels)
+        with self._lock:
+            for kind in (self._counters, self._gauges):
+                if key in kind.get(name, {}):
+                    return kind[name][key]
+            state = self._histograms.get(name, {}).get(key)
+            return None if state is None else (state[-1], state[-2])
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def to_prometheus(self):
+        """
+        Renders every metric in the Prometheus text format (version 0.0.4). The process
+        resident memory gauge is refreshed first.
+        Returns:
+            str: The exposition text.
+        """
+        rss = current_rss_mb()
+        if rss is not None:
+            self.set("process_resident_memory_bytes", int(rss * 1e6))
+        lines = []
+        with self._lock:
+            for kind, metrics in (("counter", self._counters), ("gauge", self._gauges)):
+                for name in sorted(metrics):
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    for key, value in sorted(metrics[name].items()):
+                        lines.append(f"{name}{_format_labels(key)} {value}")
+            for name in sorted(self._histograms):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, state in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(self.buckets + ("+Inf",), state):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {state[-2]}")
+                    lines.append(f"{name}_count{_format_labels(key)} {state[-1]}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Writes the exposition text to a file atomically, e.g. for the node exporter's textfile collector."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as f:
+            f.write(self.to_prometheus())
+        os.replace(temporary, path)
+
+
+class StageProfiler:
+    """
+    Hot-path profiling hooks: while enabled, the selected stages run under cProfile and
+    their statistics accumulate per stage until `dump` writes them. Only one profiler can
+    be active in a process at a time, so a stage starting while another is being profiled
+    (nested or on another thread) is timed but not profiled. Disabled, a hook costs one
+    attribute check.
+    """
+
+    def __init__(self, stages=None):
+        self.enabled = False
+        self.stages = None
+        self._profiles = {}
+        self._active = threading.Lock()
+        self.configure(stages)
+
+    def configure(self, stages=None):
+        """
+        Args:
+            stages (str or iterable, optional): "1"/"all" for every stage, stage names to profile
+                only those, or None/"0"/"" to disable profiling.
+        """
+        if isinstance(stages, str):
+            stages = stages.strip()
+            if stages.lower() in ("", "0", "false", "off"):
+                stages = None
+            elif stages.lower() in ("1", "true", "on", "all"):
+                stages = ()
+            else:
+                stages = [stage.strip() for stage in stages.split(",") if stage.strip()]
+        self.enabled = stages is not None
+        self.stages = set(stages) if stages else None
+
+    @contextlib.contextmanager
+    def profile(self, stage):
+        if not self.enabled or (self.stages is not None and stage not in self.stages) \
+                or not self._active.acquire(blocking=False):
+            yield
+            return
+        import cProfile     # Imported on first use to keep imports fast
+
+        profile = self._profiles.setdefault(stage, cProfile.Profile())
+        try:
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+        finally:
+            self._active.release()
+
+    def dump(self, directory=DEFAULT_PROFILE_DIR, top=30):
+        """
+        Writes one `<stage>.prof` file (for snakeviz or pstats) and one `<stage>.txt` summary
+        of the `top` functions by cumulative time per profiled stage.
+        Returns:
+            list: The written .prof paths.
+        """
+        import io
+        import pstats
+
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for stage, profile in self._profiles.items():
+            path = os.path.join(directory, f"{stage}.prof")
+            profile.dump_stats(path)
+            summary = io.StringIO()
+            pstats.Stats(profile, stream=summary).sort_stats("cumulative").print_stats(top)
+            with open(os.path.join(directory, f"{stage}.txt"), "w") as f:
+                f.write(summary.getvalue())
+            paths.append(path)
+        return paths
+
+
+class Instrumentation:
+    """
+    The instrumentation surface of the pipeline. Stage timers feed the
+    `pipeline_stage_seconds` histogram with the stage's self time (time spent in nested stages
+    is attributed to them), and inside a document trace every stage also becomes a span of
+    that document's trace, so the trace shows where the document's time went.
+    """
+
+    def __init__(self, registry=None, profiler=None, trace_file=None, max_traces=MAX_TRACES):
+        self.registry = registry or MetricsRegistry()
+        self.profiler = profiler or StageProfiler(os.getenv(PROFILE_ENV))
+        self.trace_file = trace_file
+        self.traces = collections.deque(maxlen=max_traces)
+        self._local = threading.local()
+        self._trace_lock = threading.Lock()
+        self.registry.describe("pipeline_stage_seconds", "Self time spent in each pipeline stage")
+        self.registry.describe("pipeline_items_total", "Documents, pages, chunks or queries processed per stage")
+        self.registry.describe("pipeline_errors_total", "Failures per stage")
+        self.registry.describe("pipeline_documents_total", "Documents by outcome (processed, unchanged, failed)")
+        self.registry.describe("pipeline_document_seconds", "Wall time per traced document")
+        self.registry.describe("process_resident_memory_bytes", "Resident set size of the process")
+
+    def _frames(self):
+        frames = getattr(self._local, "frames", None)
+        if frames is None:
+            frames = self._local.frames = []
+        return frames
+
+    @contextlib.contextmanager
+    def trace(self, document, **attributes):
+        """
+        Traces one document: the stages run inside the block become its spans. On exit the
+        trace (document, seconds, peak RSS and spans) is kept in `traces` and appended to the
+        trace file as one JSON line.
+        """
+        trace = {"document": document, "attributes": attributes, "spans": {}, "status": "ok"}
+        previous = getattr(self._local, "trace", None)
+        self._local.trace = trace
+        start = time.perf_counter()
+        try:
+            yield trace
+        except BaseException as e:
+            trace.update(status="failed", error=repr(e))
+            self.registry.inc("pipeline_documents_total", status="failed")
+            raise
+        finally:
+            self._local.trace = previous
+            trace["seconds"] = time.perf_counter() - start
+            trace["rss_mb"] = current_rss_mb()
+            self.registry.observe("pipeline_document_seconds", trace["seconds"], status=trace["status"])
+            self._finish_trace(trace)
+
+    def _finish_trace(self, trace):
+        trace["spans"] = sorted(trace["spans"].values(), key=lambda span: span["start"])
+        with self._trace_lock:
+            self.traces.append(trace)
+            if self.trace_file:
+                os.makedirs(os.path.dirname(self.trace_file) or ".", exist_ok=True)
+                with open(self.trace_file, "a") as f:
+                    f.write(json.dumps(trace, default=str) + "\n")
+
+    def _record(self, stage, start, elapsed, child_seconds, items, labels):
+        self_seconds = max(elapsed - child_seconds, 0.0)
+        self.registry.observe("pipeline_stage_seconds", self_seconds, stage=stage, **labels)
+        if items:
+            self.registry.inc("pipeline_items_total", items, stage=stage, **labels)
+        trace = getattr(self._local, "trace", None)
+        if trace is not None:
+            # Repeated stages of a document (e.g. one embed per window) merge into one span
+            span = trace["spans"].setdefault(stage, {"stage": stage, "start": start, "seconds": 0.0,
+                                                     "self_seconds": 0.0, "calls": 0, "items": 0})
+            span["seconds"] += elapsed
+            span["self_seconds"] += self_seconds
+            span["calls"] += 1
+            span["items"] += items
+
+    @contextlib.contextmanager
+    def stage(self, stage, items=0, **labels):
+        """
+        Times a block as one run of a stage.
+        Args:
+            stage (str): The stage, e.g. "embed".
+            items (int): Items the block processes; more can be added through the yielded dict.
+            labels: Extra metric labels, e.g. backend="eager".
+        Yields:
+            dict: {"items": n}; set "items" inside the block when the count is known only then.
+        """
+        frames = self._frames()
+        frame = {"children": 0.0, "items": items}
+        frames.append(frame)
+        start = time.perf_counter()
+        try:
+            with self.profiler.profile(stage):
+                yield frame
+        except BaseException:
+            self.registry.inc("pipeline_errors_total", stage=stage, **labels)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            frames.pop()
+            if frames:
+                frames[-1]["children"] += elapsed
+            self._record(stage, start, elapsed, frame["children"], frame["items"], labels)
+
+    def timed_iter(self, iterable, stage, **labels):
+        """
+        Wraps a (lazy) iterator so the time spent producing its items is recorded as one run
+        of a stage, e.g. pages streamed from a PDF as "extract". Nested timed iterators, such as
+        chunking over streamed pages, each get their own self time.
+        Yields:
+            object: The items of `iterable`.
+        """
+        frames = self._frames()
+        frame = {"children": 0.0}
+        iterator = iter(iterable)
+        first_start, elapsed, items = None, 0.0, 0
+        try:
+            while True:
+                frames.append(frame)
+                start = time.perf_counter()
+                if first_start is None:
+                    first_start = start
+                try:
+                    with self.profiler.profile(stage):
+                        item = next(iterator)
+                except StopIteration:
+                    return
+                except BaseException:
+                    self.registry.inc("pipeline_errors_total", stage=stage, **labels)
+                    raise
+                finally:
+                    step = time.perf_counter() - start
+                    elapsed += step
+                    frames.pop()
+                    if frames:
+                        frames[-1]["children"] += step
+                items += 1
+                yield item
+        finally:
+            if first_start is not None:
+                self._record(stage, first_start, elapsed, frame["children"], items, labels)
+
+    def count(self, name, value=1, **labels):
+        self.registry.inc(name, value, **labels)
+
+    def observe(self, name, value, **labels):
+        self.registry.observe(name, value, **labels)
+
+    def recent_traces(self, limit=None):
+        with self._trace_lock:
+            traces = list(self.traces)
+        return traces if limit is None else traces[-limit:]
+
+
+def _metrics_handler(registry):
+    """Returns the request handler class serving the registry at /metrics."""
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = registry.to_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return MetricsHandler
+
+
+def start_metrics_server(port, host="127.0.0.1", registry=None):
+    """
+    Serves the Prometheus text format at http://host:port/metrics from a daemon thread.
+    Args:
+        port (int): The port; 0 picks a free one.
+        host (str): The interface; local only by default.
+        registry (MetricsRegistry, optional): Defaults to the process-wide registry.
+    Returns:
+        http.server.ThreadingHTTPServer: The running server; its `server_address` has the port.
+    """
+    from http.server import ThreadingHTTPServer
+
+    server = ThreadingHTTPServer((host, port), _metrics_handler(registry or instrumentation.registry))
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics-exporter").start()
+    logger.info(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+# Process-wide instrumentation used by the pipeline modules
+instrumentation = Instrumentation(trace_file=os.getenv('PIPELINE_TRACE_FILE') or None)
@@ -0,0 +1,59 @@
+# Startup-time report: cold import time of the project modules and model load times
+
+import json     # JSON result printed by the measuring subprocess
+import subprocess   # Fresh interpreter per module so every import is measured cold
+import sys      # Path of the running interpreter
+
+# Project modules measured by default
+DEFAULT_MODULES = (
+    "main",
+    "preprocessor",
+    "pipelines.extraction_pipeline",
+    "pipelines.embedding_pipeline",
+    "databases.db_connector",
+    "databases.local_vector_database",
+    "models.finbert",
+)
+
+# Dependencies that should only be imported once they are actually used
+HEAVY_MODULES = ("torch", "transformers", "langchain", "langchain_text_splitters", "pymupdf", "astrapy", "sqlalchemy")
+
+_MEASURE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "heavy_modules": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import(module, cwd=None):
+    """
+    Imports a module in a fresh interpreter and measures how long the import takes.
+    Args:
+        module (str): The dotted module name.
+        cwd (str, optional): The directory the interpreter runs in (the repository root).
+    Returns:
+        dict: module, seconds and the heavy dependencies the import pulled in.
+    """
+    code = _MEASURE.format(module=module, heavy=HEAVY_MODULES)
+    result = subprocess.run([sys.executable, "-c", code], cwd=cwd, capture_output=True, text=True, check=True)
+    return dict(json.loads(result.stdout.strip().splitlines()[-1]), module=module)
+
+
+def startup_report(modules=DEFAULT_MODULES, load_model=False, cwd=None):
+    """
+    Measures the cold import time of each module and, optionally, the FinBERT load time.
+    Args:
+        modules (tuple): The modules to import.
+        load_model (bool): Also load the default model through the model registry.
+        cwd (str, optional): The directory the import subprocesses run in.
+    Returns:
+        dict: {"imports": [...], "models": [...]} with one entry per module and loaded model.
+    """
+    report = {"imports": [measure_import(module, cwd) for module in modules], "models": []}
+    if load_model:
+        from models.model_registry import get_model, registry_report
+        get_model()
+        report["models"] = registry_report()
+    return report